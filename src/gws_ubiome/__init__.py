@@ -1,6 +1,14 @@
 # > base_env
+# > beta diversity statistics
+from .beta_diversity_statistics.beta_diversity_group_significance import BetaDiversityGroupSignificance
+from .beta_diversity_statistics.beta_diversity_pcoa import BetaDiversityPCoA
+from .beta_diversity_statistics.distance_matrix_file import DistanceMatrixFile
+
 # > fastq
 
+# > dashboard bundle
+from .dashboard_bundle.dashboard_bundle import DashboardBundle
+
 # > differential analysis
 from .differential_analysis.qiime2_differential_analysis import Qiime2DifferentialAnalysis
 
@@ -27,3 +35,4 @@ from .table_db_annotator.table_db_annotator import Qiime2TableDbAnnotator
 
 # > taxonomy/diversity
 from .taxonomy_diversity.qiime2_taxonomy_diversity import Qiime2TaxonomyDiversity
+from .taxonomy_diversity.qiime2_taxonomy_diversity_sweep import Qiime2TaxonomyDiversitySweep
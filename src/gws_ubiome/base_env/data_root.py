@@ -0,0 +1,19 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import os
+
+
+class DataRoot:
+    """
+    Root directory of the data of a class (scratch, checkpoints, stores), read from the ``ROOT_ENV``
+    environment variable, ``DEFAULT_ROOT`` when it is not set.
+    """
+
+    ROOT_ENV: str
+    DEFAULT_ROOT: str
+
+    @classmethod
+    def get_root(cls) -> str:
+        return os.environ.get(cls.ROOT_ENV) or cls.DEFAULT_ROOT
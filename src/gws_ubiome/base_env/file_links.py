@@ -0,0 +1,103 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import fcntl
+import json
+import os
+import shutil
+
+from gws_core import Logger
+
+# ioctl cloning a file on the filesystems with copy-on-write (btrfs, xfs), from linux/fs.h
+FICLONE = 0x40049409
+# manifest of the upstream files referenced by a result folder instead of being copied into it
+UPSTREAM_FILES_NAME = "upstream_files.json"
+# size from which a plain copy is reported, e.g. a feature table or a distance matrix
+LARGE_FILE_SIZE = 100 * 1024 ** 2
+
+
+def _clone(source: str, destination: str) -> bool:
+    """Reflink of the source at the destination, False if the filesystem does not support it."""
+    if os.path.lexists(destination):
+        os.remove(destination)
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        try:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+            return True
+        except OSError:
+            # other filesystem, or no copy-on-write support
+            pass
+    os.remove(destination)
+    return False
+
+
+def clone_or_copy(source: str, destination: str) -> str:
+    """
+    Put a copy of a file at the destination, sharing its data blocks with the source when the
+    filesystem supports it (reflink, copy-on-write clone), else a plain copy.
+
+    The destination is an independent file either way: writing to it never modifies the source.
+    An existing destination is replaced, never written through. A plain copy of a large file is
+    logged, as it costs its full size in I/O and storage.
+
+    :return: how the file was put, ``reflink`` or ``copy``
+    """
+    if _clone(source, destination):
+        return "reflink"
+    size = os.path.getsize(source)
+    if size >= LARGE_FILE_SIZE:
+        Logger.warning(f"Copying {size / 1024 ** 2:.0f} MB from '{source}', the filesystem has no reflink support")
+    shutil.copyfile(source, destination)
+    return "copy"
+
+
+def reference_upstream_file(source: str, folder: str) -> str:
+    """
+    Put a file of an upstream resource (e.g. the ``demux.qza`` of a quality check folder) in a result
+    folder, without copying it: a reflink when the filesystem supports it, else a reference to the
+    source in the ``upstream_files.json`` manifest of the folder. The referenced file is read through
+    ``resolve_file``.
+
+    The source must be a file of a saved resource: the resources are never modified and are kept as
+    long as a scenario uses them.
+
+    :return: how the file was put, ``reflink`` or ``reference``
+    """
+    name = os.path.basename(source)
+    upstream_files = get_upstream_files(folder)
+    if _clone(source, os.path.join(folder, name)):
+        upstream_files.pop(name, None)
+        method = "reflink"
+    else:
+        upstream_files[name] = os.path.abspath(source)
+        method = "reference"
+    with open(os.path.join(folder, UPSTREAM_FILES_NAME), "w", encoding="utf-8") as manifest_file:
+        json.dump(upstream_files, manifest_file, indent=2)
+    return method
+
+
+def get_upstream_files(folder: str) -> dict[str, str]:
+    """Paths of the upstream files referenced by the folder, by file name."""
+    manifest_path = os.path.join(folder, UPSTREAM_FILES_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def resolve_file(folder: str, name: str) -> str:
+    """
+    Path of a file of a result folder, the file itself or the upstream file it references.
+
+    :raises FileNotFoundError: if the folder neither holds nor references the file
+    """
+    path = os.path.join(folder, name)
+    if os.path.exists(path):
+        return path
+    upstream_path = get_upstream_files(folder).get(name)
+    if upstream_path is None:
+        raise FileNotFoundError(f"No file '{name}' in the folder '{folder}'")
+    if not os.path.exists(upstream_path):
+        raise FileNotFoundError(f"The file '{name}' of the folder '{folder}' references the missing file '{upstream_path}'")
+    return upstream_path
@@ -4,7 +4,7 @@
 
 import os
 
-from gws_core import CondaShellProxy, MessageDispatcher
+from gws_core import CondaShellProxy, MessageDispatcher, ShellProxy
 
 
 class Qiime2ShellProxyHelper:
@@ -13,9 +13,29 @@ class Qiime2ShellProxyHelper:
         os.path.abspath(os.path.dirname(__file__)),
         "./env_files/qiime2-2022.8.3-py38-linux-conda.yml"
     )
+    EXPORT_FEATURE_TABLE_SCRIPT_PATH = os.path.join(
+        os.path.abspath(os.path.dirname(__file__)),
+        "./sh/export_feature_table.sh"
+    )
 
     @classmethod
-    def create_proxy(cls, message_dispatcher: MessageDispatcher = None):
+    def create_proxy(cls, message_dispatcher: MessageDispatcher = None, working_dir: str = None):
+        """
+        :param working_dir: working directory of the commands, e.g. the ``StageCheckpoint`` directory of a
+        resumable run, a new temporary directory by default
+        """
         return CondaShellProxy(
             env_file_path=cls.ENV_FILE_PATH, env_name=cls.ENV_DIR_NAME,
-            message_dispatcher=message_dispatcher)
+            working_dir=working_dir, message_dispatcher=message_dispatcher)
+
+    @classmethod
+    def export_feature_table(cls, shell_proxy: ShellProxy, table_qza_path: str, output_tsv_path: str) -> str:
+        """
+        Export a ``table.qza`` as a biom TSV file, read by ``CountMatrix.from_tsv``.
+
+        :return: the path of the TSV file
+        """
+        res = shell_proxy.run(["bash", cls.EXPORT_FEATURE_TABLE_SCRIPT_PATH, table_qza_path, output_tsv_path])
+        if res != 0:
+            raise Exception(f"Could not export the feature table '{table_qza_path}'")
+        return output_tsv_path
@@ -0,0 +1,136 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from gws_core import ShellProxy
+
+from .data_root import DataRoot
+
+
+class ScratchSpace(DataRoot):
+    """
+    Scratch directory of a task run, for the files the scripts only use within a step (unzipped Qiime2
+    artifacts, exports, ``TMPDIR`` of Qiime2). It is created in the ``GWS_UBIOME_SCRATCH_DIR`` directory,
+    e.g. a local NVMe disk or a tmpfs, ``/data/tmp`` by default, so that the working directory, on shared
+    storage, only receives the outputs.
+
+    The scripts run with ``run`` get the scratch directory as their last argument. Used as a context
+    manager, the scratch directory is removed when the run ends, except on failure when ``keep_on_failure``
+    is set (``GWS_UBIOME_KEEP_SCRATCH_ON_FAILURE=1``), to inspect it.
+
+    The bytes written by each step in the scratch directory are logged and returned by ``get_bytes_written``.
+    They are the growth of the directory during the step: the files the step removes before its end are not
+    counted. The working directory, on shared storage, is only measured with ``measure_working_dir``
+    (``GWS_UBIOME_MEASURE_WORKING_DIR=1``), as it is walked before and after every step.
+    """
+
+    ROOT_ENV = "GWS_UBIOME_SCRATCH_DIR"
+    DEFAULT_ROOT = "/data/tmp"
+    KEEP_ON_FAILURE_ENV = "GWS_UBIOME_KEEP_SCRATCH_ON_FAILURE"
+    MEASURE_WORKING_DIR_ENV = "GWS_UBIOME_MEASURE_WORKING_DIR"
+
+    _path: str
+    _working_dir: str
+    _log: Callable[[str], None]
+    _keep_on_failure: bool
+    _measure_working_dir: bool
+    _bytes_written: dict[str, dict[str, int]]
+
+    def __init__(self, working_dir: str, log: Callable[[str], None], root_dir: str | None = None,
+                 keep_on_failure: bool | None = None, measure_working_dir: bool | None = None) -> None:
+        """
+        :param log: logger of the task, e.g. its ``log_info_message``
+        :param root_dir: directory of the scratch directories, ``GWS_UBIOME_SCRATCH_DIR`` by default
+        :param keep_on_failure: keep the scratch directory when the run fails, ``GWS_UBIOME_KEEP_SCRATCH_ON_FAILURE``
+        by default
+        :param measure_working_dir: also measure the bytes written in the working directory,
+        ``GWS_UBIOME_MEASURE_WORKING_DIR`` by default
+        """
+        root_dir = root_dir or self.get_root()
+        os.makedirs(root_dir, exist_ok=True)
+        self._path = tempfile.mkdtemp(prefix="gws_ubiome_", dir=root_dir)
+        self._working_dir = working_dir
+        self._log = log
+        if keep_on_failure is None:
+            keep_on_failure = self._get_env_flag(self.KEEP_ON_FAILURE_ENV)
+        self._keep_on_failure = keep_on_failure
+        if measure_working_dir is None:
+            measure_working_dir = self._get_env_flag(self.MEASURE_WORKING_DIR_ENV)
+        self._measure_working_dir = measure_working_dir
+        self._bytes_written = {}
+
+    @staticmethod
+    def _get_env_flag(name: str) -> bool:
+        return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def run(self, shell_proxy: ShellProxy, cmd: list, step: str) -> int:
+        """
+        Run a script with the scratch directory as last argument and log the bytes it wrote.
+
+        :return: the exit code of the script
+        """
+        with self.measure(step):
+            return shell_proxy.run([*cmd, self._path])
+
+    @contextmanager
+    def measure(self, step: str) -> Iterator[None]:
+        """Log the bytes written by a step run in the context."""
+        scratch_size = self.get_size(self._path)
+        working_dir_size = self.get_size(self._working_dir) if self._measure_working_dir else 0
+        try:
+            yield
+        finally:
+            bytes_written = {"scratch": max(self.get_size(self._path) - scratch_size, 0)}
+            message = f"[{step}] : {self.format_size(bytes_written['scratch'])} written in the scratch directory"
+            if self._measure_working_dir:
+                bytes_written["working_dir"] = max(self.get_size(self._working_dir) - working_dir_size, 0)
+                message += f", {self.format_size(bytes_written['working_dir'])} in the working directory"
+            self._bytes_written[step] = bytes_written
+            self._log(message)
+
+    def get_bytes_written(self) -> dict[str, dict[str, int]]:
+        """Bytes written by each step, in the ``scratch`` directory and, when measured, the ``working_dir``."""
+        return dict(self._bytes_written)
+
+    def remove(self) -> None:
+        shutil.rmtree(self._path, ignore_errors=True)
+
+    def __enter__(self) -> 'ScratchSpace':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None and self._keep_on_failure:
+            self._log(f"The run failed, its scratch directory is kept in {self._path}")
+            return
+        self.remove()
+
+    @staticmethod
+    def get_size(path: str) -> int:
+        """Size of the files of a directory, the links are not followed."""
+        size = 0
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in file_names:
+                try:
+                    size += os.lstat(os.path.join(dir_path, file_name)).st_size
+                except OSError:
+                    # removed while walking
+                    continue
+        return size
+
+    @staticmethod
+    def format_size(size: int) -> str:
+        for unit in ["B", "KB", "MB", "GB"]:
+            if size < 1024:
+                return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} TB"
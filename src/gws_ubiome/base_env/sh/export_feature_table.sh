@@ -0,0 +1,21 @@
+#!/usr/bin/bash
+
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+# Export a Qiime2 feature table (table.qza) as a tab separated count matrix (features x samples)
+
+table_qza=$1
+output_tsv=$2
+
+qiime tools export \
+  --input-path $table_qza \
+  --output-path exported_feature_table
+
+biom convert \
+  -i exported_feature_table/feature-table.biom \
+  -o $output_tsv \
+  --to-tsv
+
+rm -rf exported_feature_table
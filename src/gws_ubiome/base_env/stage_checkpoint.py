@@ -0,0 +1,267 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator
+
+from .data_root import DataRoot
+
+
+class StageCheckpoint(DataRoot):
+    """
+    Checkpoint manifest of a multi-stage shell task, written in its working directory after every
+    completed stage: the stage, the fingerprint of its inputs and parameters, the fingerprint of its
+    outputs and a small JSON result (e.g. stage metrics).
+
+    A retry of a failed run (same task, inputs and parameters) gets the same working directory from
+    ``open_run_dir`` and resumes: the completed stages whose inputs, parameters and outputs are unchanged
+    are skipped, until the first stage to run again. The later stages are always run again.
+
+    The progress is the share of the stages completed, weighted by their expected duration (e.g. the
+    estimates of the ``ResourceEstimator``). A stage can report its own progress within its share with
+    ``get_progress_callback``.
+
+    The file fingerprints are the paths, sizes and modification times of the files (of the files of the
+    folders), so large inputs such as fastq folders are not read.
+    """
+
+    ROOT_ENV = "GWS_UBIOME_CHECKPOINT_DIR"
+    DEFAULT_ROOT = "/data/gws_ubiome/checkpoints"
+    MANIFEST_FILE_NAME = "checkpoint_manifest.json"
+    LOCK_FILE_NAME = ".lock"
+    # the failed runs are removed after a week without a new attempt
+    FAILED_RUN_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+    _working_dir: str
+    _weights: dict[str, float]
+    _update_progress: Callable[[float, str], None]
+    _log: Callable[[str], None]
+    _manifest: dict
+    _completed_weight: float
+    _resuming: bool
+
+    def __init__(self, working_dir: str, weights: dict[str, float], update_progress: Callable[[float, str], None],
+                 log: Callable[[str], None]) -> None:
+        """
+        :param weights: expected duration (or any relative weight) of each stage, in the order of the stages
+        :param log: logger of the task, e.g. its ``log_info_message``
+        """
+        self._working_dir = working_dir
+        self._weights = weights
+        self._update_progress = update_progress
+        self._log = log
+        self._manifest = self._read_manifest()
+        self._completed_weight = 0
+        self._resuming = bool(self._manifest["stages"])
+
+    @classmethod
+    @contextmanager
+    def open_run_dir(cls, task_name: str, input_paths: list[str], params: dict,
+                     log_warning: Callable[[str], None]) -> Iterator[str | None]:
+        """
+        Working directory of a run, the same for all the attempts of the run (same task, inputs and
+        parameters), locked until the end of the context. The expired failed runs are removed.
+
+        The directory of a completed run is never reused nor removed, as its files may back the saved outputs
+        of the run.
+
+        :return: the run directory, None when the same run is in progress or completed
+        """
+        cls.remove_expired_runs()
+        key = cls.hash_value({"inputs": cls.fingerprint(input_paths), "params": params})
+        run_dir = os.path.join(cls.get_root(), task_name, key)
+        os.makedirs(run_dir, exist_ok=True)
+        # the lock is released when the file is closed
+        with open(os.path.join(run_dir, cls.LOCK_FILE_NAME), "w", encoding="utf-8") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                log_warning("The same run is already in progress, running in a temporary directory without checkpoint")
+                yield None
+                return
+            if cls.is_completed(run_dir):
+                log_warning("The same run was already completed, running in a temporary directory without checkpoint")
+                yield None
+                return
+            yield run_dir
+
+    @classmethod
+    @contextmanager
+    def open_task_run_dir(cls, task_name: str, input_paths: list[str], params: dict,
+                          log_warning: Callable[[str], None]) -> Iterator[str | None]:
+        """
+        ``open_run_dir`` of a task with a ``resume_from_checkpoint`` parameter, None (a new temporary working
+        directory) when the parameter is not set.
+        """
+        if not params["resume_from_checkpoint"]:
+            yield None
+            return
+        run_params = {name: value for name, value in params.items() if name != "resume_from_checkpoint"}
+        with cls.open_run_dir(task_name, input_paths, run_params, log_warning) as run_dir:
+            yield run_dir
+
+    @classmethod
+    def is_completed(cls, run_dir: str) -> bool:
+        manifest_path = os.path.join(run_dir, cls.MANIFEST_FILE_NAME)
+        try:
+            return bool(os.path.exists(manifest_path) and cls._load_json(manifest_path).get("completed"))
+        except ValueError:
+            # partially written by an interrupted attempt
+            return False
+
+    @classmethod
+    def remove_expired_runs(cls) -> None:
+        """Remove the failed runs not attempted for ``FAILED_RUN_MAX_AGE_SECONDS``, the completed ones are kept."""
+        root = cls.get_root()
+        if not os.path.isdir(root):
+            return
+        now = time.time()
+        for task_name in os.listdir(root):
+            task_dir = os.path.join(root, task_name)
+            if not os.path.isdir(task_dir):
+                continue
+            for run_key in os.listdir(task_dir):
+                run_dir = os.path.join(task_dir, run_key)
+                manifest_path = os.path.join(run_dir, cls.MANIFEST_FILE_NAME)
+                try:
+                    if cls.is_completed(run_dir) or now - os.path.getmtime(
+                            manifest_path if os.path.exists(manifest_path) else run_dir) \
+                            <= cls.FAILED_RUN_MAX_AGE_SECONDS:
+                        continue
+                    lock_file = open(os.path.join(run_dir, cls.LOCK_FILE_NAME), "w", encoding="utf-8")
+                except OSError:
+                    continue
+                with lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        # attempted again
+                        continue
+                    shutil.rmtree(run_dir, ignore_errors=True)
+
+    @staticmethod
+    def hash_value(value: Any) -> str:
+        return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def fingerprint(cls, paths: list[str]) -> str:
+        """Fingerprint of files and folders, from the paths, sizes and modification times of their files."""
+        entries = []
+        for path in paths:
+            if os.path.isdir(path):
+                for dir_path, dir_names, file_names in os.walk(path):
+                    dir_names.sort()
+                    for file_name in sorted(file_names):
+                        file_path = os.path.join(dir_path, file_name)
+                        stat = os.stat(file_path)
+                        entries.append([os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns])
+            elif os.path.exists(path):
+                stat = os.stat(path)
+                entries.append([path, stat.st_size, stat.st_mtime_ns])
+            else:
+                entries.append([path, None, None])
+        return cls.hash_value(entries)
+
+    @property
+    def working_dir(self) -> str:
+        return self._working_dir
+
+    def run_stage(self, stage: str, run: Callable[[], Any], inputs: list[str] | None = None,
+                  outputs: list[str] | None = None, params: dict | None = None) -> Any:
+        """
+        Run the stage, or skip it when it is resumed from the checkpoint.
+
+        :param run: runs the stage, returns its JSON result (None if the stage has no result)
+        :param inputs: paths read by the stage outside of the working directory
+        :param outputs: paths written by the stage, relative to the working directory, checked after the stage
+        :param params: parameters of the stage
+        :return: the result of the stage, read from the manifest when the stage is skipped
+        """
+        outputs = outputs or []
+        inputs_fingerprint = self.hash_value({"inputs": self.fingerprint(inputs or []), "params": params})
+        entry = self._manifest["stages"].get(stage)
+        if self._resuming and entry is not None and entry["inputs"] == inputs_fingerprint \
+                and entry["outputs"] == self._fingerprint_outputs(entry["outputs"]):
+            self._log(f"[{stage}] : Completed by a previous attempt, resumed from the checkpoint")
+            self._complete_stage(stage, "Resumed")
+            return entry["result"]
+
+        # the stages after a stage run again are run again
+        if self._resuming:
+            self._resuming = False
+            self._manifest["stages"] = {name: value for name, value in self._manifest["stages"].items()
+                                        if self._is_before(name, stage)}
+            self._write_manifest()
+        result = run()
+
+        missing_outputs = [output for output in outputs
+                           if not os.path.exists(os.path.join(self._working_dir, output))]
+        if missing_outputs:
+            raise Exception(f"The stage {stage} did not write {', '.join(missing_outputs)}")
+        self._manifest["stages"][stage] = {
+            "inputs": inputs_fingerprint,
+            "outputs": self._fingerprint_outputs({output: None for output in outputs}),
+            "result": result,
+            "completed_at": datetime.now(timezone.utc).isoformat()
+        }
+        self._write_manifest()
+        self._complete_stage(stage, "Done")
+        return result
+
+    def get_result(self, stage: str) -> Any:
+        """Result of a completed stage, run or resumed."""
+        return self._manifest["stages"][stage]["result"]
+
+    def get_progress_callback(self, stage: str, max_value: float = 100) -> Callable[[float, str], None]:
+        """Callback reporting the progress of the stage (``0`` to ``max_value``) within its share of the task."""
+        total_weight = sum(self._weights.values())
+
+        def update_progress(value: float, message: str) -> None:
+            stage_weight = self._weights.get(stage, 0) * min(max(value / max_value, 0), 1)
+            self._update_progress(100 * (self._completed_weight + stage_weight) / total_weight, message)
+        return update_progress
+
+    def complete(self) -> None:
+        """Mark the run as completed, its working directory is no longer resumed nor removed."""
+        self._manifest["completed"] = True
+        self._write_manifest()
+
+    def _complete_stage(self, stage: str, status: str) -> None:
+        self._completed_weight += self._weights.get(stage, 0)
+        self._update_progress(100 * self._completed_weight / sum(self._weights.values()), f"[{stage}] : {status}")
+
+    def _is_before(self, name: str, stage: str) -> bool:
+        stages = list(self._weights)
+        return name in stages and stage in stages and stages.index(name) < stages.index(stage)
+
+    def _fingerprint_outputs(self, outputs: dict[str, str | None]) -> dict[str, str]:
+        return {output: self.fingerprint([os.path.join(self._working_dir, output)]) for output in outputs}
+
+    def _read_manifest(self) -> dict:
+        path = os.path.join(self._working_dir, self.MANIFEST_FILE_NAME)
+        if not os.path.exists(path):
+            return {"stages": {}}
+        try:
+            return self._load_json(path)
+        except ValueError:
+            # partially written by an interrupted attempt
+            return {"stages": {}}
+
+    def _write_manifest(self) -> None:
+        path = os.path.join(self._working_dir, self.MANIFEST_FILE_NAME)
+        with open(path + ".part", "w", encoding="utf-8") as manifest_file:
+            json.dump(self._manifest, manifest_file, indent=2, default=str)
+        os.replace(path + ".part", path)
+
+    @staticmethod
+    def _load_json(path: str) -> dict:
+        with open(path, encoding="utf-8") as json_file:
+            return json.load(json_file)
@@ -0,0 +1,98 @@
+import numpy as np
+from gws_core import (
+    ConfigParams,
+    ConfigSpecs,
+    InputSpec,
+    InputSpecs,
+    IntParam,
+    OutputSpec,
+    OutputSpecs,
+    StrParam,
+    Table,
+    Task,
+    TaskInputs,
+    TaskOutputs,
+    task_decorator,
+)
+
+from ..diversity_engine.group_significance import GroupSignificanceTests
+from .distance_matrix_file import DistanceMatrixFile
+
+
+@task_decorator("BetaDiversityGroupSignificance", human_name="Beta diversity group significance",
+                short_description="PERMANOVA, PERMDISP and ANOSIM tests on a beta diversity table")
+class BetaDiversityGroupSignificance(Task):
+    """
+    BetaDiversityGroupSignificance class.
+
+    This task tests if the samples of the groups defined by a metadata column differ, on any "Beta Diversity - *" distance matrix of the `Q2 Taxonomy Diversity` task (its samples are annotated with the metadata):
+
+    - **PERMANOVA**: difference of the group centroids (pseudo-F)
+    - **PERMDISP**: difference of the group dispersions (F-value of the distances to the group centroids,
+      not to the spatial medians used by default by scikit-bio and QIIME 2)
+    - **ANOSIM**: difference of the ranks of the distances between and within the groups (R)
+
+    The distances of the kept samples are read from the memory-mapped file of the matrix. A distance table annotated with the metadata (e.g. from the older runs) is also accepted.
+
+    The p-values are computed with `permutations` permutations of the groups, spread over `threads` worker processes. The samples without a value for `metadata_column` are ignored.
+    """
+
+    input_specs: InputSpecs = InputSpecs({
+        'distance_table': InputSpec([DistanceMatrixFile, Table], human_name="Beta diversity table",
+                                    short_description="Distance matrix annotated with the metadata")
+    })
+    output_specs: OutputSpecs = OutputSpecs({
+        'result_table': OutputSpec(Table, human_name="Group significance",
+                                   short_description="Test statistic and p-value of each test")
+    })
+    config_specs: ConfigSpecs = ConfigSpecs({
+        "metadata_column": StrParam(
+            human_name="Metadata column",
+            short_description="Column defining the groups of samples"),
+        "permutations": IntParam(default_value=999, min_value=0, short_description="Number of permutations"),
+        "threads": IntParam(default_value=2, min_value=1, short_description="Number of worker processes"),
+        "random_seed": IntParam(
+            optional=True, visibility=IntParam.PROTECTED_VISIBILITY,
+            short_description="Seed of the permutations, set it to get reproducible p-values")
+    })
+
+    def run(self, params: ConfigParams, inputs: TaskInputs) -> TaskOutputs:
+        distance_table: DistanceMatrixFile | Table = inputs["distance_table"]
+        metadata_column = params["metadata_column"]
+
+        if isinstance(distance_table, Table):
+            data = distance_table.get_data()
+            if list(data.index) != list(data.columns):
+                raise Exception("The input table is not a distance matrix: the rows and columns must be the same samples")
+
+        row_tags = distance_table.get_row_tags()
+        if not any(metadata_column in tags for tags in row_tags):
+            raise Exception(
+                f"The metadata column '{metadata_column}' was not found in the row tags of the table. "
+                f"Available columns: {', '.join(sorted(distance_table.get_available_row_tags()))}")
+
+        groups = [tags.get(metadata_column) for tags in row_tags]
+        kept = [i for i, group in enumerate(groups) if group not in (None, "")]
+        if len(kept) < len(groups):
+            self.log_warning_message(
+                f"{len(groups) - len(kept)} sample(s) without a value for '{metadata_column}' are ignored")
+
+        if isinstance(distance_table, DistanceMatrixFile):
+            distances = distance_table.open_matrix().get_submatrix(kept)
+        else:
+            distances = data.to_numpy(dtype=np.float64)[np.ix_(kept, kept)]
+
+        self.log_info_message(
+            f"Running PERMANOVA, PERMDISP and ANOSIM with {params['permutations']} permutations")
+        tests = GroupSignificanceTests(
+            distances,
+            [str(groups[i]) for i in kept],
+            permutations=params["permutations"],
+            workers=params["threads"],
+            seed=params["random_seed"])
+        results = tests.compute()
+        results.insert(1, "grouping", metadata_column)
+
+        result_table = Table(results)
+        result_table.name = f"{distance_table.name} - Group significance ({metadata_column})"
+        return {"result_table": result_table}
@@ -0,0 +1,66 @@
+import numpy as np
+from gws_core import (
+    ConfigParams,
+    ConfigSpecs,
+    InputSpec,
+    InputSpecs,
+    IntParam,
+    OutputSpec,
+    OutputSpecs,
+    Table,
+    Task,
+    TaskInputs,
+    TaskOutputs,
+    task_decorator,
+)
+
+from ..diversity_engine.principal_coordinates import PrincipalCoordinates
+from .distance_matrix_file import DistanceMatrixFile
+
+
+@task_decorator("BetaDiversityPCoA", human_name="Beta diversity PCoA",
+                short_description="Principal coordinates analysis of a beta diversity table")
+class BetaDiversityPCoA(Task):
+    """
+    BetaDiversityPCoA class.
+
+    This task computes the first `nb_components` principal coordinates of any "Beta Diversity - *" distance matrix of the `Q2 Taxonomy Diversity` task. Only these axes are extracted (Lanczos eigensolver on a memory-mapped, double-centred copy of the matrix), so that the analysis stays fast for several thousand samples.
+
+    The input is a distance matrix file, read from its memory-mapped file, or a distance table (e.g. from the older runs).
+    The rows of the transformed table keep the metadata tags of the input.
+    """
+
+    input_specs: InputSpecs = InputSpecs({
+        'distance_table': InputSpec([DistanceMatrixFile, Table], human_name="Beta diversity table",
+                                    short_description="Distance matrix")
+    })
+    output_specs: OutputSpecs = OutputSpecs({
+        'transformed_table': OutputSpec(Table, human_name="Transformed table",
+                                        short_description="Coordinates of the samples on the principal axes"),
+        'variance_table': OutputSpec(Table, human_name="Variance table",
+                                     short_description="Proportion of the variance explained by each axis")
+    })
+    config_specs: ConfigSpecs = ConfigSpecs({
+        "nb_components": IntParam(default_value=2, min_value=1, short_description="Number of principal axes")
+    })
+
+    def run(self, params: ConfigParams, inputs: TaskInputs) -> TaskOutputs:
+        distance_table: DistanceMatrixFile | Table = inputs["distance_table"]
+        if isinstance(distance_table, DistanceMatrixFile):
+            distance_matrix = distance_table.open_matrix()
+            distances, sample_ids = distance_matrix, distance_matrix.ids
+        else:
+            data = distance_table.get_data()
+            if list(data.index) != list(data.columns):
+                raise Exception("The input table is not a distance matrix: the rows and columns must be the same samples")
+            distances, sample_ids = data.to_numpy(dtype=np.float64), [str(sample_id) for sample_id in data.index]
+
+        self.log_info_message(f"Computing the first {params['nb_components']} principal coordinates")
+        transformed, variance = PrincipalCoordinates(distances, sample_ids, params["nb_components"]).compute()
+
+        transformed_table = Table(transformed)
+        transformed_table.set_all_row_tags(distance_table.get_row_tags())
+        transformed_table.name = f"{distance_table.name} - PCoA transformed table"
+        variance_table = Table(variance)
+        variance_table.name = f"{distance_table.name} - PCoA variance table"
+        return {"transformed_table": transformed_table, "variance_table": variance_table}
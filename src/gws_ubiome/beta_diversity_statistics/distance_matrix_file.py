@@ -0,0 +1,75 @@
+import os
+import shutil
+
+from gws_core import (
+    ConfigParams,
+    File,
+    ListRField,
+    Table,
+    TableView,
+    resource_decorator,
+    view,
+)
+from pandas import DataFrame
+
+from ..diversity_engine.distance_matrix import DistanceMatrix
+
+
+@resource_decorator(unique_name="DistanceMatrixFile", human_name="Distance matrix",
+                    short_description="Beta diversity distance matrix, memory-mapped from its file")
+class DistanceMatrixFile(File):
+    """
+    Beta diversity distance matrix of the `Q2 Taxonomy Diversity` task, stored as the condensed float32
+    ``.dist`` file of a ``DistanceMatrix`` (a quarter of the size of a square float64 table).
+
+    The sample ids and the metadata tags of the samples (as the row tags of a table) are stored with the
+    resource. The `Beta diversity PCoA` and `Beta diversity group significance` tasks read the memory-mapped
+    file directly, the square table is only built to be viewed.
+    """
+
+    sample_ids: list[str] = ListRField()
+    row_tags: list[dict] = ListRField()
+
+    @classmethod
+    def move_from(cls, distance_matrix: DistanceMatrix, destination_dir: str, row_tags: list[dict],
+                  name: str) -> 'DistanceMatrixFile':
+        """Resource of the matrix, whose ``.dist`` file is moved to the destination directory."""
+        os.makedirs(destination_dir, exist_ok=True)
+        path = shutil.move(distance_matrix.path, os.path.join(destination_dir, os.path.basename(distance_matrix.path)))
+        distance_matrix_file = cls(path)
+        distance_matrix_file.sample_ids = list(distance_matrix.ids)
+        distance_matrix_file.row_tags = row_tags
+        distance_matrix_file.name = name
+        return distance_matrix_file
+
+    def open_matrix(self) -> DistanceMatrix:
+        """Memory-mapped matrix, in read-only mode."""
+        return DistanceMatrix.open(self.path, ids=self.sample_ids)
+
+    def get_row_tags(self) -> list[dict]:
+        return self.row_tags
+
+    def get_available_row_tags(self) -> set[str]:
+        return {key for tags in self.row_tags for key in tags}
+
+    def get_preview(self, max_samples: int) -> DataFrame:
+        """Distances between the first ``max_samples`` samples."""
+        distance_matrix = self.open_matrix()
+        count = min(max_samples, distance_matrix.sample_count)
+        ids = distance_matrix.ids[:count]
+        return DataFrame(distance_matrix.get_rows(0, count)[:, :count], index=ids, columns=ids)
+
+    def get_data(self) -> DataFrame:
+        """Square matrix, loaded in memory."""
+        return self.open_matrix().to_dataframe()
+
+    def to_table(self) -> Table:
+        table = Table(self.get_data())
+        table.set_all_row_tags(self.row_tags)
+        table.name = self.name
+        return table
+
+    @view(view_type=TableView, human_name="Distance table", short_description="Square distance matrix",
+          default_view=True)
+    def view_as_table(self, params: ConfigParams) -> TableView:
+        return TableView(self.to_table())
@@ -0,0 +1,176 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+from gws_core import File, Resource, ResourceSet, Table, resource_decorator
+from pandas import DataFrame
+
+from ..beta_diversity_statistics.distance_matrix_file import DistanceMatrixFile
+
+
+@resource_decorator(unique_name="DashboardBundle", human_name="Dashboard bundle",
+                    short_description="Compact preview of the results of a task, read by the ubiome dashboard",
+                    hide=True)
+class DashboardBundle(File):
+    """
+    Compact preview of the results of a task: reduced tables (top rows, evenly spaced points of the curves)
+    and summary statistics, in a single columnar ``.npz`` file.
+
+    The tables are grouped by output name and named after the resources (e.g. group ``result_tables``,
+    table ``Genus - ANCOM Stat``). Each column is a separate array of the file, so reading a table only
+    reads its columns. The bundle is written by ``DashboardBundleBuilder``.
+    """
+
+    META_KEY = "meta"
+
+    def get_meta(self) -> dict:
+        with np.load(self.path, allow_pickle=False) as arrays:
+            return json.loads(arrays[self.META_KEY].tobytes().decode("utf-8"))
+
+    def get_stats(self) -> dict:
+        return self.get_meta()["stats"]
+
+    def get_table_names(self, group: str) -> list[str]:
+        return [table["name"] for table in self.get_meta()["tables"] if table["group"] == group]
+
+    def get_table_info(self, group: str, name: str) -> dict | None:
+        """Full shape (``rows``, ``columns``) of the table and whether the bundle holds a reduced copy (``reduced``)."""
+        return next((table for table in self.get_meta()["tables"]
+                     if table["group"] == group and table["name"] == name), None)
+
+    def get_table(self, group: str, name: str) -> DataFrame | None:
+        table = self.get_table_info(group, name)
+        if table is None:
+            return None
+        with np.load(self.path, allow_pickle=False) as arrays:
+            data = DataFrame({i: arrays[f"{table['key']}/{i}"] for i in range(len(table["column_names"]))},
+                             index=arrays[f"{table['key']}/index"])
+        data.columns = table["column_names"]
+        return data
+
+
+class DashboardBundleBuilder:
+    """
+    Build the ``DashboardBundle`` of the outputs of a task:
+
+        builder = DashboardBundleBuilder()
+        builder.add_outputs(outputs)
+        builder.add_stats({"sample_count": 12})
+        outputs["dashboard_bundle"] = builder.build()
+
+    The tables larger than ``max_rows`` x ``max_columns`` are reduced: by default to their rows with the
+    largest total (e.g. the most abundant taxa), or to evenly spaced rows and columns for curves and
+    position profiles (``sample=True``). The boolean and text columns are stored as strings.
+    """
+
+    MAX_ROWS = 200
+    MAX_COLUMNS = 200
+
+    _tables: list[tuple[dict, DataFrame]]
+    _stats: dict
+
+    def __init__(self) -> None:
+        self._tables = []
+        self._stats = {}
+
+    def add_table(self, group: str, name: str, data: DataFrame, sample: bool = False,
+                  max_rows: int = MAX_ROWS, max_columns: int = MAX_COLUMNS,
+                  shape: tuple[int, int] | None = None) -> None:
+        """
+        :param shape: full shape of the table when ``data`` is already a preview of it
+        """
+        reduced = self.reduce(data, max_rows, max_columns, sample)
+        shape = shape or data.shape
+        info = {
+            "group": group,
+            "name": name,
+            "key": f"table_{len(self._tables)}",
+            "rows": int(shape[0]),
+            "columns": int(shape[1]),
+            "reduced": reduced.shape != tuple(shape),
+            "column_names": [str(column) for column in reduced.columns]
+        }
+        self._tables.append((info, reduced))
+
+    def add_resource(self, group: str, resource: Resource, sample: bool = False) -> None:
+        """
+        Add the tables of a resource (a table, a distance matrix or a resource set), the other resources are ignored.
+        A distance matrix is previewed by the distances between its first samples, without loading it.
+        """
+        if isinstance(resource, ResourceSet):
+            for name, child in resource.get_resources().items():
+                self._add_table_resource(group, name, child, sample)
+        else:
+            self._add_table_resource(group, resource.name or group, resource, sample)
+
+    def _add_table_resource(self, group: str, name: str, resource: Resource, sample: bool) -> None:
+        if isinstance(resource, DistanceMatrixFile):
+            sample_count = len(resource.sample_ids)
+            self.add_table(group, name, resource.get_preview(min(self.MAX_ROWS, self.MAX_COLUMNS)),
+                           shape=(sample_count, sample_count))
+        elif isinstance(resource, Table):
+            self.add_table(group, name, resource.get_data(), sample=sample)
+
+    def add_outputs(self, outputs: dict, sample_outputs: list[str] | None = None) -> None:
+        """
+        Add the tables of the task outputs, grouped by output name.
+
+        :param sample_outputs: outputs holding curves or profiles, reduced to evenly spaced points
+        """
+        for output_name, resource in outputs.items():
+            self.add_resource(output_name, resource, sample=output_name in (sample_outputs or []))
+
+    def add_stats(self, stats: dict) -> None:
+        self._stats.update(stats)
+
+    def build(self, name: str = "Dashboard bundle") -> DashboardBundle:
+        path = os.path.join(tempfile.mkdtemp(), "dashboard_bundle.npz")
+        self.save(path)
+        bundle = DashboardBundle(path)
+        bundle.name = name
+        return bundle
+
+    def save(self, path: str) -> None:
+        arrays = {}
+        for info, data in self._tables:
+            arrays[f"{info['key']}/index"] = np.asarray(data.index.astype(str), dtype=str)
+            for i in range(data.shape[1]):
+                arrays[f"{info['key']}/{i}"] = self._to_array(data.iloc[:, i])
+        meta = {"tables": [info for info, _ in self._tables], "stats": self._stats}
+        arrays[DashboardBundle.META_KEY] = np.frombuffer(json.dumps(meta, default=str).encode("utf-8"), dtype=np.uint8)
+        with open(path, "wb") as bundle_file:
+            np.savez_compressed(bundle_file, **arrays)
+
+    @classmethod
+    def reduce(cls, data: DataFrame, max_rows: int, max_columns: int, sample: bool) -> DataFrame:
+        if data.shape[1] > max_columns:
+            if sample:
+                data = data.iloc[:, cls._spaced_positions(data.shape[1], max_columns)]
+            else:
+                # the text columns (annotations) are kept first
+                totals = data.apply(lambda column: column.sum() if column.dtype.kind in "iuf" else np.inf).to_numpy()
+                data = data.iloc[:, cls._top_positions(totals, max_columns)]
+        if data.shape[0] > max_rows:
+            if sample:
+                data = data.iloc[cls._spaced_positions(data.shape[0], max_rows)]
+            else:
+                data = data.iloc[cls._top_positions(data.select_dtypes("number").sum(axis=1).to_numpy(), max_rows)]
+        return data
+
+    @staticmethod
+    def _spaced_positions(size: int, count: int) -> np.ndarray:
+        """``count`` evenly spaced positions, including the first and the last ones."""
+        return np.unique(np.linspace(0, size - 1, count).round().astype(int))
+
+    @staticmethod
+    def _top_positions(totals: np.ndarray, count: int) -> np.ndarray:
+        """Positions of the ``count`` largest totals, in their original order."""
+        return np.sort(np.argsort(-totals, kind="stable")[:count])
+
+    @staticmethod
+    def _to_array(column) -> np.ndarray:
+        if column.dtype.kind in "iuf":
+            return column.to_numpy()
+        # booleans, text and mixed columns, also avoids the checkbox display of the booleans
+        return np.asarray(column.astype(str), dtype=str)
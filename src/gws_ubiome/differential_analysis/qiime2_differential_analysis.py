@@ -26,6 +26,7 @@ from gws_core import (
 )
 
 from ..base_env.qiime2_env_task import Qiime2ShellProxyHelper
+from ..dashboard_bundle.dashboard_bundle import DashboardBundle, DashboardBundleBuilder
 
 
 @task_decorator("Qiime2DifferentialAnalysis", human_name="Qiime2 ANCOM differential analysis",
@@ -61,6 +62,7 @@ class Qiime2DifferentialAnalysis(Task):
         "Genus - Percentile abundances": "6.percent-abundances.tsv",
         "Species - Percentile abundances": "7.percent-abundances.tsv"
     }
+    REJECT_COLUMN = "Reject null hypothesis"
 
     input_specs: InputSpecs = InputSpecs({
         'taxonomy_diversity_folder': InputSpec(Folder),
@@ -68,7 +70,9 @@ class Qiime2DifferentialAnalysis(Task):
     })
     output_specs: OutputSpecs = OutputSpecs({
         'result_tables': OutputSpec(ResourceSet),
-        'result_folder': OutputSpec(Folder)
+        'result_folder': OutputSpec(Folder),
+        'dashboard_bundle': OutputSpec(DashboardBundle, human_name="Dashboard bundle",
+                                       short_description="Compact preview of the results, read by the dashboard")
     })
     config_specs: ConfigSpecs = ConfigSpecs({
         "metadata_column": StrParam(
@@ -100,8 +104,22 @@ class Qiime2DifferentialAnalysis(Task):
                                script_file_dir
                                )
 
+        bundle_builder = DashboardBundleBuilder()
+        bundle_builder.add_outputs(outputs)
+        bundle_builder.add_stats({"significant_features": self.count_significant_features(outputs["result_tables"])})
+        outputs["dashboard_bundle"] = bundle_builder.build()
+
         return outputs
 
+    def count_significant_features(self, result_tables: ResourceSet) -> dict[str, int]:
+        """Number of features with a rejected null hypothesis, by ANCOM Stat table."""
+        counts = {}
+        for name, table in result_tables.get_resources().items():
+            data = table.get_data()
+            if "ANCOM Stat" in name and self.REJECT_COLUMN in data.columns:
+                counts[name] = int(data[self.REJECT_COLUMN].astype(str).str.lower().eq("true").sum())
+        return counts
+
     def run_cmd(self, shell_proxy: ShellProxy,  # shell_proxy: Qiime2_2022_11_ShellProxyHelper,
                 qiime2_folder: Folder,
                 metadata_col: str,
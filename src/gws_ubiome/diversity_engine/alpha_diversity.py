@@ -0,0 +1,87 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import numpy as np
+from pandas import DataFrame
+from scipy.sparse import csr_matrix
+
+from .count_matrix import CountMatrix
+from .phylogenetic_tree import PhylogeneticTree
+
+
+class AlphaDiversityEngine:
+    """
+    All the alpha diversity indices of a count matrix, computed together from the non-zero entries
+    of the sparse matrix (no loop over the samples).
+
+    The definitions follow the scikit-bio implementations used by ``qiime diversity alpha``:
+
+    - ``shannon_entropy``: Shannon index in base 2
+    - ``simpson``: Gini-Simpson index ``1 - sum(p^2)``
+    - ``pielou_evenness``: ``H / ln(S)``, NaN for the samples with less than 2 features
+    - ``chao1``: bias-corrected Chao1 ``S + F1 (F1 - 1) / (2 (F2 + 1))``
+    - ``observed_features``: number of features with a non-zero count
+    - ``goods_coverage``: ``1 - F1 / N``
+    - ``faith_pd``: sum of the branch lengths covered by the sample, when a tree is given
+    """
+
+    METRICS = ["shannon_entropy", "simpson", "pielou_evenness", "chao1",
+               "observed_features", "goods_coverage", "faith_pd"]
+
+    _count_matrix: CountMatrix
+    _tree: PhylogeneticTree | None
+
+    def __init__(self, count_matrix: CountMatrix, tree: PhylogeneticTree | None = None) -> None:
+        self._count_matrix = count_matrix
+        self._tree = tree
+
+    def compute(self) -> DataFrame:
+        """
+        :return: one row per sample-id, one column per metric (``faith_pd`` only when a tree is given)
+        """
+        counts = self._count_matrix.counts.astype(np.float64)
+        counts.eliminate_zeros()
+        sample_count = counts.shape[0]
+        # sample index of each non-zero entry
+        rows = np.repeat(np.arange(sample_count), np.diff(counts.indptr))
+
+        totals = np.bincount(rows, weights=counts.data, minlength=sample_count)
+        observed = np.diff(counts.indptr).astype(np.float64)
+        singletons = np.bincount(rows, weights=counts.data == 1, minlength=sample_count)
+        doubletons = np.bincount(rows, weights=counts.data == 2, minlength=sample_count)
+
+        proportions = counts.data / totals[rows]
+        shannon = 0.0 - np.bincount(rows, weights=proportions * np.log2(proportions), minlength=sample_count)
+        dominance = np.bincount(rows, weights=proportions ** 2, minlength=sample_count)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            evenness = np.where(observed > 1, shannon / np.log2(observed), np.nan)
+            goods_coverage = np.where(totals > 0, 1 - singletons / totals, np.nan)
+        empty = totals == 0
+
+        metrics = {
+            "shannon_entropy": np.where(empty, np.nan, shannon),
+            "simpson": np.where(empty, np.nan, 1 - dominance),
+            "pielou_evenness": evenness,
+            "chao1": observed + singletons * (singletons - 1) / (2 * (doubletons + 1)),
+            "observed_features": observed,
+            "goods_coverage": goods_coverage
+        }
+        if self._tree is not None:
+            metrics["faith_pd"] = self._get_faith_pd(counts)
+
+        return DataFrame(metrics, index=self._count_matrix.sample_ids).rename_axis("sample-id")
+
+    def _get_faith_pd(self, counts: csr_matrix) -> np.ndarray:
+        feature_tips = self._tree.get_tip_indices(self._count_matrix.feature_ids)
+        present = counts.tocoo()
+        in_tree = feature_tips[present.col] >= 0
+        # presence of each tip in each sample, shape (samples x tips)
+        tip_presence = csr_matrix(
+            (np.ones(int(in_tree.sum())), (present.row[in_tree], feature_tips[present.col[in_tree]])),
+            shape=(counts.shape[0], len(self._tree.tip_names)))
+        # number of present tips below each branch, shape (samples x nodes)
+        covered = tip_presence @ self._tree.get_tip_ancestry()
+        covered.data = (covered.data > 0).astype(np.float64)
+        return np.asarray(covered @ self._tree.branch_lengths).ravel()
@@ -0,0 +1,101 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .count_matrix import CountMatrix
+from .distance_matrix import DistanceMatrix
+
+
+class BetaDiversityEngine:
+    """
+    Pairwise Bray-Curtis or Jaccard distances between the samples of a count matrix.
+
+    The samples are split in blocks of ``block_size`` rows and each pair of blocks is computed by a
+    thread, only on the features present in the two blocks, so that the dense working arrays stay small.
+    The distances are written in a memory-mapped ``DistanceMatrix``.
+
+    - ``braycurtis``: ``sum(|u - v|) / sum(u + v)``
+    - ``jaccard``: Jaccard distance on presence/absence, as ``qiime diversity beta``
+    """
+
+    BRAY_CURTIS = "braycurtis"
+    JACCARD = "jaccard"
+    METRICS = [BRAY_CURTIS, JACCARD]
+    BLOCK_SIZE = 128
+
+    _count_matrix: CountMatrix
+    _metric: str
+    _workers: int
+    _block_size: int
+
+    def __init__(self, count_matrix: CountMatrix, metric: str, workers: int = 1,
+                 block_size: int = BLOCK_SIZE) -> None:
+        if metric not in self.METRICS:
+            raise Exception(f"Unknown beta diversity metric '{metric}', expected one of {', '.join(self.METRICS)}")
+        self._count_matrix = count_matrix
+        self._metric = metric
+        self._workers = max(workers, 1)
+        self._block_size = block_size
+
+    def compute(self, path: str) -> DistanceMatrix:
+        """Compute the distances in the memory-mapped file ``path``."""
+        distance_matrix = DistanceMatrix.create(path, self._count_matrix.sample_ids)
+        counts = self._count_matrix.counts.astype(np.float64)
+        sample_count = counts.shape[0]
+
+        blocks = [(start, min(start + self._block_size, sample_count))
+                  for start in range(0, sample_count, self._block_size)]
+        block_pairs = [(rows, columns) for i, rows in enumerate(blocks) for columns in blocks[i:]]
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            # consume the results to raise the errors of the threads
+            list(executor.map(lambda pair: self._compute_block(counts, distance_matrix, *pair), block_pairs))
+
+        distance_matrix.flush()
+        return distance_matrix
+
+    def _compute_block(self, counts: csr_matrix, distance_matrix: DistanceMatrix,
+                       rows: tuple[int, int], columns: tuple[int, int]) -> None:
+        row_counts = counts[rows[0]:rows[1]]
+        column_counts = counts[columns[0]:columns[1]]
+        if self._metric == self.BRAY_CURTIS:
+            distances = self._bray_curtis(row_counts, column_counts)
+        else:
+            distances = self._jaccard(row_counts, column_counts)
+
+        same_block = rows == columns
+        for row, i in enumerate(range(rows[0], rows[1])):
+            start = i + 1 if same_block else columns[0]
+            if start < columns[1]:
+                distance_matrix.set_row_segment(i, start, distances[row, start - columns[0]:])
+
+    @staticmethod
+    def _bray_curtis(row_counts: csr_matrix, column_counts: csr_matrix) -> np.ndarray:
+        # only the features present in one of the two blocks
+        features = np.union1d(row_counts.indices, column_counts.indices)
+        row_dense = row_counts[:, features].toarray()
+        column_dense = column_counts[:, features].toarray()
+        column_totals = column_dense.sum(axis=1)
+
+        distances = np.zeros((row_dense.shape[0], column_dense.shape[0]), dtype=np.float64)
+        for row, sample in enumerate(row_dense):
+            denominators = sample.sum() + column_totals
+            differences = np.abs(column_dense - sample).sum(axis=1)
+            np.divide(differences, denominators, out=distances[row], where=denominators > 0)
+        return distances
+
+    @staticmethod
+    def _jaccard(row_counts: csr_matrix, column_counts: csr_matrix) -> np.ndarray:
+        row_presence = (row_counts > 0).astype(np.float64)
+        column_presence = (column_counts > 0).astype(np.float64)
+        intersections = (row_presence @ column_presence.T).toarray()
+        unions = np.asarray(row_presence.sum(axis=1)) + np.asarray(column_presence.sum(axis=1)).T - intersections
+
+        distances = np.zeros_like(intersections)
+        np.divide(unions - intersections, unions, out=distances, where=unions > 0)
+        return distances
@@ -0,0 +1,63 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import numpy as np
+from pandas import read_csv
+from scipy.sparse import coo_matrix, csr_matrix
+
+
+class CountMatrix:
+    """
+    Sparse ASV count matrix (samples x features) used by the native diversity computations.
+
+    The matrix is built from the biom TSV export of a Qiime2 ``table.qza``: one row per feature,
+    one column per sample, preceded by a ``# Constructed from biom file`` comment line (see
+    ``Qiime2ShellProxyHelper.export_feature_table``).
+    """
+
+    # features parsed at a time, only their dense block is held in memory
+    CHUNK_ROWS = 10000
+
+    sample_ids: list[str]
+    feature_ids: list[str]
+    counts: csr_matrix
+
+    def __init__(self, sample_ids: list[str], feature_ids: list[str], counts: csr_matrix) -> None:
+        if counts.shape != (len(sample_ids), len(feature_ids)):
+            raise Exception(
+                f"The count matrix shape {counts.shape} does not match the number of samples ({len(sample_ids)}) and features ({len(feature_ids)})")
+        self.sample_ids = sample_ids
+        self.feature_ids = feature_ids
+        self.counts = counts
+
+    @classmethod
+    def from_tsv(cls, path: str) -> 'CountMatrix':
+        """Load a biom TSV export (features in rows, samples in columns), ``CHUNK_ROWS`` features at a time."""
+        options = {"sep": "\t", "skiprows": 1, "index_col": 0, "dtype": {0: str}}
+        sample_ids = [str(sample_id) for sample_id in read_csv(path, nrows=0, **options).columns]
+        feature_ids = []
+        # coordinates and values of the non-zero counts, one array per chunk
+        sample_indices = [np.zeros(0, dtype=np.int64)]
+        feature_indices = [np.zeros(0, dtype=np.int64)]
+        values = [np.zeros(0, dtype=np.int64)]
+        for chunk in read_csv(path, chunksize=cls.CHUNK_ROWS, **options):
+            counts = chunk.to_numpy(dtype=np.float64).round().astype(np.int64)
+            rows, columns = np.nonzero(counts)
+            feature_indices.append(rows + len(feature_ids))
+            sample_indices.append(columns)
+            values.append(counts[rows, columns])
+            feature_ids += [str(feature_id) for feature_id in chunk.index]
+
+        counts = coo_matrix((np.concatenate(values), (np.concatenate(sample_indices), np.concatenate(feature_indices))),
+                            shape=(len(sample_ids), len(feature_ids))).tocsr()
+        return cls(sample_ids=sample_ids, feature_ids=feature_ids, counts=counts)
+
+    @property
+    def sample_totals(self) -> np.ndarray:
+        return np.asarray(self.counts.sum(axis=1)).ravel()
+
+    def get_sample_counts(self, sample_index: int) -> np.ndarray:
+        """Return the non-zero counts of a sample."""
+        start, end = self.counts.indptr[sample_index], self.counts.indptr[sample_index + 1]
+        return self.counts.data[start:end]
@@ -0,0 +1,123 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import json
+import os
+
+import numpy as np
+from pandas import DataFrame
+from scipy.spatial.distance import squareform
+
+
+class DistanceMatrix:
+    """
+    Symmetric distance matrix stored on disk as a memory-mapped condensed float32 array.
+
+    The condensed array holds the upper triangle row by row (as ``scipy.spatial.distance.pdist``):
+    the distance between the samples ``i < j`` is at ``n * i - i * (i + 1) / 2 + j - i - 1``.
+    The sample ids are stored next to the array, in ``<path>.ids.json``.
+    """
+
+    IDS_SUFFIX = ".ids.json"
+    EXPORT_BLOCK_ROWS = 256
+
+    path: str
+    ids: list[str]
+    condensed: np.ndarray
+
+    def __init__(self, path: str, ids: list[str], condensed: np.ndarray) -> None:
+        self.path = path
+        self.ids = ids
+        self.condensed = condensed
+
+    @classmethod
+    def create(cls, path: str, ids: list[str]) -> 'DistanceMatrix':
+        """Create a zero-filled matrix on disk, opened in write mode."""
+        with open(path + cls.IDS_SUFFIX, "w", encoding="utf-8") as ids_file:
+            json.dump(ids, ids_file)
+        size = len(ids) * (len(ids) - 1) // 2
+        if size == 0:
+            # an empty file cannot be memory-mapped
+            open(path, "wb").close()
+            return cls(path, ids, np.zeros(0, dtype=np.float32))
+        return cls(path, ids, np.memmap(path, dtype=np.float32, mode="w+", shape=(size,)))
+
+    @classmethod
+    def open(cls, path: str, writable: bool = False, ids: list[str] | None = None) -> 'DistanceMatrix':
+        """
+        Open an existing matrix without loading it in memory, in read-only mode unless ``writable``.
+
+        :param ids: sample ids of the matrix, read from ``<path>.ids.json`` by default
+        """
+        if ids is None:
+            with open(path + cls.IDS_SUFFIX, encoding="utf-8") as ids_file:
+                ids = json.load(ids_file)
+        if os.path.getsize(path) == 0:
+            return cls(path, ids, np.zeros(0, dtype=np.float32))
+        return cls(path, ids, np.memmap(path, dtype=np.float32, mode="r+" if writable else "r"))
+
+    @property
+    def sample_count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """Shape of the square matrix."""
+        return self.sample_count, self.sample_count
+
+    def get_offset(self, i: int, j: int) -> int:
+        """Position of the distance between the samples ``i < j`` in the condensed array."""
+        n = self.sample_count
+        return n * i - i * (i + 1) // 2 + j - i - 1
+
+    def set_row_segment(self, i: int, start: int, values: np.ndarray) -> None:
+        """Set the distances between the sample ``i`` and the samples ``start ... start + len(values) - 1``,
+        with ``i < start``. These distances are contiguous in the condensed array."""
+        offset = self.get_offset(i, start)
+        self.condensed[offset:offset + values.size] = values
+
+    def get_rows(self, start: int, end: int) -> np.ndarray:
+        """Rows ``start ... end - 1`` of the square matrix."""
+        n = self.sample_count
+        rows = np.zeros((end - start, n), dtype=np.float64)
+        for row, i in enumerate(range(start, end)):
+            # lower part: distances (k, i) with k < i, one per row of the condensed triangle
+            k = np.arange(i)
+            rows[row, :i] = self.condensed[n * k - k * (k + 1) // 2 + i - k - 1]
+            # upper part: contiguous
+            if i + 1 < n:
+                offset = self.get_offset(i, i + 1)
+                rows[row, i + 1:] = self.condensed[offset:offset + n - i - 1]
+        return rows
+
+    def get_submatrix(self, indices: list[int]) -> np.ndarray:
+        """Square matrix of the distances between the samples at the indices, in their order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        i = np.minimum(indices[:, None], indices[None, :])
+        j = np.maximum(indices[:, None], indices[None, :])
+        submatrix = np.zeros(i.shape, dtype=np.float64)
+        pairs = i < j
+        # only the distances of the pairs are read from the memory-mapped array
+        submatrix[pairs] = self.condensed[self.get_offset(i[pairs], j[pairs])]
+        return submatrix
+
+    def to_square(self) -> np.ndarray:
+        return squareform(np.asarray(self.condensed, dtype=np.float64), checks=False)
+
+    def to_dataframe(self) -> DataFrame:
+        return DataFrame(self.to_square(), index=self.ids, columns=self.ids)
+
+    def export_tsv(self, path: str) -> None:
+        """Write the square matrix in the Qiime2 ``distance-matrix.tsv`` format, ``EXPORT_BLOCK_ROWS`` rows
+        at a time."""
+        with open(path, "w", encoding="utf-8") as tsv_file:
+            tsv_file.write("\t" + "\t".join(self.ids) + "\n")
+            for start in range(0, self.sample_count, self.EXPORT_BLOCK_ROWS):
+                end = min(start + self.EXPORT_BLOCK_ROWS, self.sample_count)
+                DataFrame(self.get_rows(start, end), index=self.ids[start:end]).to_csv(
+                    tsv_file, sep="\t", header=False)
+
+    def flush(self) -> None:
+        if isinstance(self.condensed, np.memmap):
+            self.condensed.flush()
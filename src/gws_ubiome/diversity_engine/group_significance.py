@@ -0,0 +1,202 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from pandas import DataFrame
+from scipy.stats import rankdata
+
+# pre-computed matrices shared by the workers of the process pool, set once by _init_worker
+_WORKER_SQUARED_DISTANCES: np.ndarray | None = None
+_WORKER_CENTRED: np.ndarray | None = None
+_WORKER_RANKS: np.ndarray | None = None
+
+
+def _init_worker(squared_distances: np.ndarray, centred: np.ndarray, ranks: np.ndarray) -> None:
+    global _WORKER_SQUARED_DISTANCES, _WORKER_CENTRED, _WORKER_RANKS
+    _WORKER_SQUARED_DISTANCES = squared_distances
+    _WORKER_CENTRED = centred
+    _WORKER_RANKS = ranks
+
+
+def _one_hot(labels: np.ndarray, group_count: int) -> np.ndarray:
+    """(samples x batch * groups) indicator matrix of a batch of labellings (batch x samples)."""
+    batch_size, sample_count = labels.shape
+    indicators = np.zeros((sample_count, batch_size * group_count), dtype=np.float64)
+    columns = labels + group_count * np.arange(batch_size)[:, None]
+    indicators[np.tile(np.arange(sample_count), batch_size), columns.ravel()] = 1
+    return indicators
+
+
+def _within_group_sums(matrix: np.ndarray, indicators: np.ndarray) -> np.ndarray:
+    """``sum_{i, j in g} matrix_ij`` of each column (labelling, group) of the indicator matrix."""
+    return (indicators * (matrix @ indicators)).sum(axis=0)
+
+
+def _compute_statistics(labels: np.ndarray, group_count: int) -> dict[str, np.ndarray]:
+    """
+    PERMANOVA pseudo-F, PERMDISP F and ANOSIM R of a batch of labellings (batch x samples),
+    using the matrices of the worker.
+    """
+    batch_size, sample_count = labels.shape
+    indicators = _one_hot(labels, group_count)
+    group_sizes = indicators.sum(axis=0).reshape(batch_size, group_count)
+
+    # PERMANOVA: within-group sum of squares from the squared distances
+    within_squares = _within_group_sums(_WORKER_SQUARED_DISTANCES, indicators).reshape(batch_size, group_count)
+    total_squares = _WORKER_SQUARED_DISTANCES.sum() / (2 * sample_count)
+    within = (within_squares / (2 * group_sizes)).sum(axis=1)
+    permanova = ((total_squares - within) / (group_count - 1)) / (within / (sample_count - group_count))
+
+    # PERMDISP: distances to the group centroids in the space of the Gower-centred matrix
+    centred_indicators = _WORKER_CENTRED @ indicators
+    centroid_norms = (indicators * centred_indicators).sum(axis=0).reshape(batch_size, group_count)
+    rows = np.arange(sample_count)
+    own_columns = labels + group_count * np.arange(batch_size)[:, None]
+    own_sizes = np.take_along_axis(group_sizes, labels, axis=1)
+    squared_centroid_distances = (np.diag(_WORKER_CENTRED)[None, :]
+                                  - 2 * centred_indicators[rows[None, :], own_columns] / own_sizes
+                                  + np.take_along_axis(centroid_norms, labels, axis=1) / own_sizes ** 2)
+    # negative values come from the negative eigenvalues, as in Anderson (2006)
+    centroid_distances = np.sqrt(np.abs(squared_centroid_distances))
+    permdisp = _anova_f(centroid_distances, indicators, group_sizes, group_count)
+
+    # ANOSIM: mean rank of the between- and within-group distances
+    pair_count = sample_count * (sample_count - 1) / 2
+    within_pairs = (group_sizes * (group_sizes - 1) / 2).sum(axis=1)
+    within_ranks = _within_group_sums(_WORKER_RANKS, indicators).reshape(batch_size, group_count).sum(axis=1) / 2
+    between_ranks = (_WORKER_RANKS.sum() / 2 - within_ranks) / (pair_count - within_pairs)
+    anosim = (between_ranks - within_ranks / within_pairs) / (pair_count / 2)
+
+    return {"PERMANOVA": permanova, "PERMDISP": permdisp, "ANOSIM": anosim}
+
+
+def _anova_f(values: np.ndarray, indicators: np.ndarray, group_sizes: np.ndarray, group_count: int) -> np.ndarray:
+    """One-way ANOVA F statistic of the values (batch x samples) of each labelling."""
+    batch_size, sample_count = values.shape
+    # sum of the values of each group, shape (batch, groups)
+    group_sums = np.einsum("bs,sbg->bg", values, indicators.reshape(sample_count, batch_size, group_count))
+    grand_mean = values.mean(axis=1)
+    between = (group_sums ** 2 / group_sizes).sum(axis=1) - sample_count * grand_mean ** 2
+    within = (values ** 2).sum(axis=1) - (group_sums ** 2 / group_sizes).sum(axis=1)
+    return (between / (group_count - 1)) / (within / (sample_count - group_count))
+
+
+def _run_permutations(labels: np.ndarray, group_count: int, permutations: int,
+                      batch_size: int, seed: np.random.SeedSequence) -> dict[str, np.ndarray]:
+    generator = np.random.default_rng(seed)
+    results = []
+    for start in range(0, permutations, batch_size):
+        size = min(batch_size, permutations - start)
+        permuted = generator.permuted(np.tile(labels, (size, 1)), axis=1)
+        results.append(_compute_statistics(permuted, group_count))
+    return {test: np.concatenate([result[test] for result in results]) for test in results[0]}
+
+
+class GroupSignificanceTests:
+    """
+    PERMANOVA, PERMDISP and ANOSIM tests of the differences between groups of samples on a distance matrix.
+
+    PERMANOVA and ANOSIM have the statistics of scikit-bio (``qiime diversity beta-group-significance``).
+    PERMDISP measures the distances to the group centroids, as ``skbio.stats.distance.permdisp`` with
+    ``test="centroid"``, whereas scikit-bio and QIIME 2 default to the group spatial medians: its F-value
+    differs from theirs when the groups are skewed.
+
+    The squared distances, the Gower-centred matrix and the ranks of the distances are computed once.
+    The statistics of a batch of permutations are then obtained with matrix products on the group
+    indicator matrices. The batches are spread over a process pool, each worker with its own random
+    stream spawned from the seed.
+
+    The p-value of a test is ``(number of permuted statistics >= observed + 1) / (permutations + 1)``.
+    """
+
+    TESTS = ["PERMANOVA", "PERMDISP", "ANOSIM"]
+    STATISTIC_NAMES = {"PERMANOVA": "pseudo-F", "PERMDISP": "F-value (centroid)", "ANOSIM": "R"}
+    BATCH_SIZE = 64
+
+    _distances: np.ndarray
+    _groups: list[str]
+    _permutations: int
+    _workers: int
+    _seed: int | None
+
+    def __init__(self, distances: np.ndarray, groups: list[str], permutations: int = 999,
+                 workers: int = 1, seed: int | None = None) -> None:
+        """
+        :param distances: square distance matrix
+        :param groups: group of each sample of the matrix
+        """
+        if distances.shape != (len(groups), len(groups)):
+            raise Exception(
+                f"The distance matrix shape {distances.shape} does not match the number of samples ({len(groups)})")
+        group_count = len(set(groups))
+        if group_count < 2 or group_count == len(groups):
+            raise Exception(
+                f"The samples must be split in 2 to {len(groups) - 1} groups, got {group_count} group(s)")
+        self._distances = distances
+        self._groups = groups
+        self._permutations = permutations
+        self._workers = max(workers, 1)
+        self._seed = seed
+
+    def compute(self) -> DataFrame:
+        """
+        :return: one row per test with the test statistic, the p-value and the test parameters
+        """
+        group_names, labels = np.unique(np.array(self._groups, dtype=str), return_inverse=True)
+        group_count = len(group_names)
+        squared_distances = self._distances ** 2
+        centred = self._get_gower_centred(squared_distances)
+        ranks = self._get_ranks(self._distances)
+
+        _init_worker(squared_distances, centred, ranks)
+        observed = _compute_statistics(labels[None, :], group_count)
+
+        permuted = {test: [] for test in self.TESTS}
+        if self._permutations > 0:
+            batch_count = min(self._workers * 4, -(-self._permutations // self.BATCH_SIZE))
+            batch_permutations = np.diff(np.linspace(0, self._permutations, batch_count + 1).astype(int))
+            seeds = np.random.SeedSequence(self._seed).spawn(batch_count)
+            with ProcessPoolExecutor(max_workers=self._workers, initializer=_init_worker,
+                                     initargs=(squared_distances, centred, ranks)) as executor:
+                futures = [executor.submit(_run_permutations, labels, group_count, int(count), self.BATCH_SIZE, seed)
+                           for count, seed in zip(batch_permutations, seeds)]
+                for future in futures:
+                    for test, statistics in future.result().items():
+                        permuted[test].append(statistics)
+
+        rows = []
+        for test in self.TESTS:
+            statistic = float(observed[test][0])
+            p_value = np.nan
+            if self._permutations > 0:
+                statistics = np.concatenate(permuted[test])
+                p_value = (np.sum(statistics >= statistic - 1e-12) + 1) / (self._permutations + 1)
+            rows.append({
+                "method name": test,
+                "test statistic name": self.STATISTIC_NAMES[test],
+                "sample size": len(self._groups),
+                "number of groups": group_count,
+                "test statistic": statistic,
+                "p-value": p_value,
+                "number of permutations": self._permutations
+            })
+        return DataFrame(rows)
+
+    @staticmethod
+    def _get_gower_centred(squared_distances: np.ndarray) -> np.ndarray:
+        """Double-centred ``-1/2 D^2`` matrix."""
+        centred = -0.5 * squared_distances
+        centred -= centred.mean(axis=0, keepdims=True)
+        centred -= centred.mean(axis=1, keepdims=True)
+        return centred
+
+    @staticmethod
+    def _get_ranks(distances: np.ndarray) -> np.ndarray:
+        """Square matrix of the ranks of the distances (ties averaged), with a zero diagonal."""
+        upper = np.triu_indices(distances.shape[0], k=1)
+        ranks = np.zeros_like(distances, dtype=np.float64)
+        ranks[upper] = rankdata(distances[upper])
+        return ranks + ranks.T
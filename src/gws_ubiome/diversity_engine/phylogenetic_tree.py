@@ -0,0 +1,171 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import zipfile
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class PhylogeneticTree:
+    """
+    Rooted phylogenetic tree stored as flat arrays in postorder (children before their parent, root last).
+
+    - ``parents[i]``: index of the parent of node ``i`` (-1 for the root)
+    - ``branch_lengths[i]``: length of the branch between node ``i`` and its parent (0 for the root)
+    - ``tip_nodes``: node index of each tip, in the order of ``tip_names``
+    """
+
+    tip_names: list[str]
+    tip_nodes: np.ndarray
+    parents: np.ndarray
+    branch_lengths: np.ndarray
+
+    _tip_ancestry: csr_matrix | None
+
+    def __init__(self, tip_names: list[str], tip_nodes: np.ndarray,
+                 parents: np.ndarray, branch_lengths: np.ndarray) -> None:
+        self.tip_names = tip_names
+        self.tip_nodes = tip_nodes
+        self.parents = parents
+        self.branch_lengths = branch_lengths
+        self._tip_ancestry = None
+
+    @property
+    def node_count(self) -> int:
+        return self.parents.size
+
+    def get_tip_indices(self, feature_ids: list[str]) -> np.ndarray:
+        """Return the tip index of each feature, -1 when the feature is not in the tree."""
+        tip_positions = {name: i for i, name in enumerate(self.tip_names)}
+        return np.array([tip_positions.get(feature_id, -1) for feature_id in feature_ids], dtype=np.int64)
+
+    def get_tip_ancestry(self) -> csr_matrix:
+        """
+        Sparse (tips x nodes) matrix, with a 1 for each branch on the path between a tip and the root.
+
+        The branches covered by a set of tips are the non-zero columns of the sum of their rows.
+        """
+        if self._tip_ancestry is None:
+            # all the tips climb one level at a time, a loop per level of the deepest tip
+            tips = np.arange(len(self.tip_names), dtype=np.int64)
+            nodes = self.tip_nodes
+            rows = [np.empty(0, dtype=np.int64)]
+            columns = [np.empty(0, dtype=np.int64)]
+            while nodes.size:
+                below_root = self.parents[nodes] >= 0
+                tips = tips[below_root]
+                nodes = nodes[below_root]
+                rows.append(tips)
+                columns.append(nodes)
+                nodes = self.parents[nodes]
+            rows = np.concatenate(rows)
+            self._tip_ancestry = csr_matrix(
+                (np.ones(rows.size, dtype=np.float64), (rows, np.concatenate(columns))),
+                shape=(len(self.tip_names), self.node_count))
+        return self._tip_ancestry
+
+    @classmethod
+    def from_qza(cls, path: str) -> 'PhylogeneticTree':
+        """Read the Newick tree of a Qiime2 ``Phylogeny[Rooted]`` artifact (e.g. rooted-tree.qza)."""
+        with zipfile.ZipFile(path) as archive:
+            tree_files = [name for name in archive.namelist() if name.endswith("/data/tree.nwk")]
+            if not tree_files:
+                raise Exception(f"No tree found in the artifact '{path}'")
+            return cls.from_newick(archive.read(tree_files[0]).decode("utf-8"))
+
+    @classmethod
+    def from_newick(cls, newick: str) -> 'PhylogeneticTree':
+        """Parse a Newick string. Internal node labels (e.g. support values) are ignored."""
+        root = 0
+        children: list[list[int]] = [[]]
+        labels: list[str] = [""]
+        lengths: list[float] = [0.0]
+        # parents of the node being parsed
+        stack = []
+        current = root
+        position = 0
+        text = newick.strip()
+
+        while position < len(text):
+            char = text[position]
+            if char == "(":
+                stack.append(current)
+                current = cls._add_node(children, labels, lengths, current)
+                position += 1
+            elif char == ",":
+                current = cls._add_node(children, labels, lengths, stack[-1])
+                position += 1
+            elif char == ")":
+                current = stack.pop()
+                position += 1
+            elif char == ";":
+                break
+            elif char == ":":
+                end = position + 1
+                while end < len(text) and text[end] not in ",);[":
+                    end += 1
+                lengths[current] = float(text[position + 1:end])
+                position = end
+            elif char == "[":
+                # comment
+                position = text.index("]", position) + 1
+            elif char.isspace():
+                position += 1
+            else:
+                label, position = cls._read_label(text, position)
+                labels[current] = label
+
+        return cls._from_children(root, children, labels, lengths)
+
+    @staticmethod
+    def _add_node(children: list[list[int]], labels: list[str], lengths: list[float], parent: int) -> int:
+        children.append([])
+        labels.append("")
+        lengths.append(0.0)
+        node = len(children) - 1
+        children[parent].append(node)
+        return node
+
+    @staticmethod
+    def _read_label(text: str, position: int) -> tuple[str, int]:
+        if text[position] in "'\"":
+            quote = text[position]
+            end = text.index(quote, position + 1)
+            return text[position + 1:end], end + 1
+        end = position
+        while end < len(text) and text[end] not in ":,);[":
+            end += 1
+        return text[position:end].strip(), end
+
+    @classmethod
+    def _from_children(cls, root: int, children: list[list[int]], labels: list[str],
+                       lengths: list[float]) -> 'PhylogeneticTree':
+        # iterative postorder traversal
+        order = []
+        stack = [(root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                order.append(node)
+                continue
+            stack.append((node, True))
+            for child in reversed(children[node]):
+                stack.append((child, False))
+
+        new_index = {node: i for i, node in enumerate(order)}
+        parents = np.full(len(order), -1, dtype=np.int64)
+        branch_lengths = np.zeros(len(order), dtype=np.float64)
+        tip_names = []
+        tip_nodes = []
+        for node in order:
+            for child in children[node]:
+                parents[new_index[child]] = new_index[node]
+            if node != root:
+                branch_lengths[new_index[node]] = lengths[node]
+            if not children[node]:
+                tip_names.append(labels[node])
+                tip_nodes.append(new_index[node])
+
+        return cls(tip_names, np.array(tip_nodes, dtype=np.int64), parents, branch_lengths)
@@ -0,0 +1,97 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import os
+import tempfile
+
+import numpy as np
+from pandas import DataFrame
+from scipy.sparse.linalg import eigsh
+
+from .distance_matrix import DistanceMatrix
+
+
+class PrincipalCoordinates:
+    """
+    Principal coordinates analysis (PCoA) of a distance matrix, limited to the first ``nb_components`` axes.
+
+    The distance matrix is copied in a memory-mapped file and Gower double-centred in place
+    (``-1/2 (I - J/n) D^2 (I - J/n)``), by blocks of rows. The top eigenpairs are then extracted with
+    the Lanczos solver of ARPACK, which only needs matrix-vector products, instead of a full
+    (cubic) eigendecomposition. The explained variance of an axis is its eigenvalue over the trace of
+    the centred matrix (the sum of all the eigenvalues).
+
+    The distances are a square array or a memory-mapped ``DistanceMatrix``, read by blocks of rows.
+    """
+
+    BLOCK_ROWS = 512
+
+    _distances: np.ndarray | DistanceMatrix
+    _sample_ids: list[str]
+    _nb_components: int
+
+    def __init__(self, distances: np.ndarray | DistanceMatrix, sample_ids: list[str], nb_components: int = 2) -> None:
+        if distances.shape != (len(sample_ids), len(sample_ids)):
+            raise Exception(
+                f"The distance matrix shape {distances.shape} does not match the number of samples ({len(sample_ids)})")
+        self._distances = distances
+        self._sample_ids = sample_ids
+        self._nb_components = nb_components
+
+    def compute(self, tmp_dir: str | None = None) -> tuple[DataFrame, DataFrame]:
+        """
+        :param tmp_dir: directory of the memory-mapped centred matrix, the system one by default
+        :return: the coordinates of the samples (columns ``PC1`` ... ``PCk``) and the explained variance
+        of each axis (column ``ExplainedVariance``)
+        """
+        sample_count = len(self._sample_ids)
+        with tempfile.TemporaryDirectory(dir=tmp_dir) as centred_dir:
+            centred = np.memmap(os.path.join(centred_dir, "centred.dat"), dtype=np.float64, mode="w+",
+                                shape=(sample_count, sample_count))
+            self._fill_centred(centred)
+            trace = float(np.trace(centred))
+            eigenvalues, eigenvectors = self._get_top_eigenpairs(centred)
+            del centred
+
+        # the sign of the eigenvectors is arbitrary, make the largest coordinate positive for stable outputs
+        signs = np.sign(eigenvectors[np.abs(eigenvectors).argmax(axis=0), np.arange(eigenvectors.shape[1])])
+        eigenvectors *= np.where(signs == 0, 1, signs)
+
+        positive = np.clip(eigenvalues, 0, None)
+        axes = [f"PC{i + 1}" for i in range(eigenvalues.size)]
+        transformed = DataFrame(eigenvectors * np.sqrt(positive), index=self._sample_ids, columns=axes)
+        variance = DataFrame({"ExplainedVariance": eigenvalues / trace if trace > 0 else np.nan}, index=axes)
+        return transformed, variance
+
+    def _fill_centred(self, centred: np.ndarray) -> None:
+        sample_count = centred.shape[0]
+        row_means = np.empty(sample_count)
+        for start in range(0, sample_count, self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, sample_count)
+            block = -0.5 * self._get_rows(start, end) ** 2
+            centred[start:end] = block
+            row_means[start:end] = block.mean(axis=1)
+        # the matrix is symmetric: the column means are the row means
+        grand_mean = row_means.mean()
+        for start in range(0, sample_count, self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, sample_count)
+            centred[start:end] -= row_means[start:end, None] + row_means[None, :] - grand_mean
+
+    def _get_rows(self, start: int, end: int) -> np.ndarray:
+        if isinstance(self._distances, DistanceMatrix):
+            return self._distances.get_rows(start, end)
+        return np.asarray(self._distances[start:end], dtype=np.float64)
+
+    def _get_top_eigenpairs(self, centred: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        sample_count = centred.shape[0]
+        nb_components = min(self._nb_components, sample_count)
+        if nb_components >= sample_count - 1:
+            # ARPACK needs k < n, the matrix is small
+            eigenvalues, eigenvectors = np.linalg.eigh(np.asarray(centred))
+        else:
+            # fixed starting vector for reproducible results
+            eigenvalues, eigenvectors = eigsh(centred, k=nb_components, which="LA",
+                                              v0=np.ones(sample_count) / np.sqrt(sample_count))
+        order = np.argsort(eigenvalues)[::-1][:nb_components]
+        return eigenvalues[order], eigenvectors[:, order]
@@ -0,0 +1,173 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+import numpy as np
+from pandas import DataFrame, concat
+from scipy.sparse import csr_matrix
+
+from .alpha_diversity import AlphaDiversityEngine
+from .beta_diversity import BetaDiversityEngine
+from .count_matrix import CountMatrix
+from .distance_matrix import DistanceMatrix
+from .phylogenetic_tree import PhylogeneticTree
+from .unifrac import UniFracEngine
+
+# count matrix and tree shared by the workers of the process pool, set once by _init_worker
+_WORKER_SHARED_MEMORIES: list[SharedMemory] = []
+_WORKER_COUNT_MATRIX: CountMatrix | None = None
+_WORKER_TREE: PhylogeneticTree | None = None
+
+
+def _init_worker(shared_arrays: dict[str, tuple[str, tuple, str]], sample_ids: list[str],
+                 feature_ids: list[str], tree: PhylogeneticTree | None) -> None:
+    global _WORKER_COUNT_MATRIX, _WORKER_TREE
+    arrays = {}
+    for name, (memory_name, shape, dtype) in shared_arrays.items():
+        shared_memory = SharedMemory(name=memory_name)
+        # keep a reference, the arrays are only views on the shared buffers
+        _WORKER_SHARED_MEMORIES.append(shared_memory)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shared_memory.buf)
+    counts = csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                        shape=(len(sample_ids), len(feature_ids)), copy=False)
+    _WORKER_COUNT_MATRIX = CountMatrix(sample_ids, feature_ids, counts)
+    _WORKER_TREE = tree
+
+
+def _rarefy(count_matrix: CountMatrix, depth: int, seed: np.random.SeedSequence) -> CountMatrix:
+    """Subsample each sample to ``depth`` counts without replacement."""
+    generator = np.random.default_rng(seed)
+    counts = count_matrix.counts
+    data = np.zeros(counts.data.size, dtype=np.int64)
+    for i in range(counts.shape[0]):
+        start, end = counts.indptr[i], counts.indptr[i + 1]
+        data[start:end] = generator.multivariate_hypergeometric(
+            counts.data[start:end].astype(np.int64), depth, method="marginals")
+    rarefied = csr_matrix((data, counts.indices.copy(), counts.indptr.copy()), shape=counts.shape)
+    rarefied.eliminate_zeros()
+    return CountMatrix(count_matrix.sample_ids, count_matrix.feature_ids, rarefied)
+
+
+def _run_iteration(iteration: int, seed: np.random.SeedSequence, depth: int, beta_metrics: list[str],
+                   output_dir: str, workers: int) -> tuple[DataFrame, dict[str, str]]:
+    """
+    Rarefy the shared count matrix once and compute its alpha and beta diversity.
+
+    :return: the alpha diversity table and the path of the distance matrix of each beta metric
+    """
+    rarefied = _rarefy(_WORKER_COUNT_MATRIX, depth, seed)
+    alpha = AlphaDiversityEngine(rarefied, _WORKER_TREE).compute()
+
+    iteration_dir = os.path.join(output_dir, f"iter-{iteration + 1}")
+    os.makedirs(iteration_dir, exist_ok=True)
+    distance_paths = {}
+    for metric in beta_metrics:
+        if metric in UniFracEngine.METRICS:
+            engine = UniFracEngine(rarefied, _WORKER_TREE, metric, workers=workers)
+        else:
+            engine = BetaDiversityEngine(rarefied, metric, workers=workers)
+        distance_paths[metric] = os.path.join(iteration_dir, f"{metric}.dist")
+        engine.compute(distance_paths[metric])
+    return alpha, distance_paths
+
+
+class RepeatedRarefaction:
+    """
+    Alpha and beta diversity averaged over ``iterations`` rarefactions of the count matrix at ``depth``.
+
+    The iterations run in a process pool. The count matrix is loaded once and shared with the workers
+    through shared memory (no copy per worker); each iteration gets its own random stream spawned from
+    the seed. The remaining workers are given to the beta diversity engines of each iteration.
+    The samples with less than ``depth`` counts are dropped.
+    """
+
+    _count_matrix: CountMatrix
+    _depth: int
+    _iterations: int
+    _tree: PhylogeneticTree | None
+    _workers: int
+    _seed: int | None
+
+    def __init__(self, count_matrix: CountMatrix, depth: int, iterations: int,
+                 tree: PhylogeneticTree | None = None, workers: int = 1, seed: int | None = None) -> None:
+        self._count_matrix = count_matrix
+        self._depth = depth
+        self._iterations = iterations
+        self._tree = tree
+        self._workers = max(workers, 1)
+        self._seed = seed
+
+    def compute(self, beta_metrics: dict[str, str], tmp_dir: str,
+                update_progress: Callable[[float, str], None] | None = None
+                ) -> tuple[DataFrame, DataFrame, dict[str, DistanceMatrix]]:
+        """
+        :param beta_metrics: path of the mean distance matrix of each beta metric
+        :param tmp_dir: directory for the distance matrices of the iterations, removed at the end
+        :param update_progress: called with the percentage of finished iterations
+        :return: the mean and the standard deviation of the alpha diversity over the iterations,
+        and the mean distance matrix of each beta metric
+        """
+        count_matrix = self._get_rarefiable_samples()
+        pool_workers = min(self._workers, self._iterations)
+        engine_workers = max(self._workers // pool_workers, 1)
+        seeds = np.random.SeedSequence(self._seed).spawn(self._iterations)
+
+        alphas = []
+        distance_sums = {metric: None for metric in beta_metrics}
+        shared_memories, shared_arrays = self._share_counts(count_matrix)
+        try:
+            with ProcessPoolExecutor(
+                    max_workers=pool_workers, initializer=_init_worker,
+                    initargs=(shared_arrays, count_matrix.sample_ids, count_matrix.feature_ids, self._tree)) as executor:
+                futures = [executor.submit(_run_iteration, iteration, seed, self._depth, list(beta_metrics),
+                                           tmp_dir, engine_workers)
+                           for iteration, seed in enumerate(seeds)]
+                for i, future in enumerate(futures):
+                    alpha, distance_paths = future.result()
+                    alphas.append(alpha)
+                    for metric, path in distance_paths.items():
+                        condensed = np.asarray(DistanceMatrix.open(path).condensed, dtype=np.float64)
+                        distance_sums[metric] = condensed if distance_sums[metric] is None \
+                            else distance_sums[metric] + condensed
+                        os.remove(path)
+                        os.remove(path + DistanceMatrix.IDS_SUFFIX)
+                    if update_progress:
+                        update_progress(100 * (i + 1) / self._iterations, f"Rarefaction iteration {i + 1} done")
+        finally:
+            for shared_memory in shared_memories:
+                shared_memory.close()
+                shared_memory.unlink()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        grouped = concat(alphas).groupby(level=0, sort=False)
+        distance_matrices = {}
+        for metric, path in beta_metrics.items():
+            distance_matrices[metric] = DistanceMatrix.create(path, count_matrix.sample_ids)
+            distance_matrices[metric].condensed[:] = distance_sums[metric] / self._iterations
+            distance_matrices[metric].flush()
+        return grouped.mean(), grouped.std(ddof=1), distance_matrices
+
+    def _get_rarefiable_samples(self) -> CountMatrix:
+        keep = np.flatnonzero(self._count_matrix.sample_totals >= self._depth)
+        counts = self._count_matrix.counts[keep].astype(np.int64)
+        return CountMatrix([self._count_matrix.sample_ids[i] for i in keep], self._count_matrix.feature_ids, counts)
+
+    @staticmethod
+    def _share_counts(count_matrix: CountMatrix) -> tuple[list[SharedMemory], dict[str, tuple[str, tuple, str]]]:
+        """Copy the sparse arrays of the count matrix in shared memory blocks."""
+        shared_memories = []
+        shared_arrays = {}
+        counts = count_matrix.counts
+        for name, array in [("data", counts.data), ("indices", counts.indices), ("indptr", counts.indptr)]:
+            # a shared memory block cannot be empty
+            shared_memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shared_memory.buf)[:] = array
+            shared_memories.append(shared_memory)
+            shared_arrays[name] = (shared_memory.name, array.shape, array.dtype.str)
+        return shared_memories, shared_arrays
@@ -0,0 +1,149 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+from .count_matrix import CountMatrix
+from .distance_matrix import DistanceMatrix
+from .phylogenetic_tree import PhylogeneticTree
+
+# branch values shared by the workers of the process pool, set once by _init_worker
+_WORKER_BRANCH_VALUES: csr_matrix | None = None
+_WORKER_BRANCH_LENGTHS: np.ndarray | None = None
+_WORKER_METRIC: str | None = None
+
+
+def _init_worker(branch_values: csr_matrix, branch_lengths: np.ndarray, metric: str) -> None:
+    global _WORKER_BRANCH_VALUES, _WORKER_BRANCH_LENGTHS, _WORKER_METRIC
+    _WORKER_BRANCH_VALUES = branch_values
+    _WORKER_BRANCH_LENGTHS = branch_lengths
+    _WORKER_METRIC = metric
+
+
+def _compute_stripe(path: str, rows: tuple[int, int], block_size: int) -> None:
+    """
+    Compute the distances between the samples of ``rows`` and all the following samples, one block of
+    ``block_size`` columns at a time, and write them in the memory-mapped matrix.
+    """
+    distance_matrix = DistanceMatrix.open(path, writable=True)
+    sample_count = distance_matrix.sample_count
+    row_values = _WORKER_BRANCH_VALUES[rows[0]:rows[1]]
+
+    for start in range(rows[0], sample_count, block_size):
+        columns = (start, min(start + block_size, sample_count))
+        column_values = _WORKER_BRANCH_VALUES[columns[0]:columns[1]]
+        if _WORKER_METRIC == UniFracEngine.WEIGHTED:
+            distances = _weighted_distances(row_values, column_values)
+        else:
+            distances = _unweighted_distances(row_values, column_values, _WORKER_BRANCH_LENGTHS)
+
+        for row, i in enumerate(range(rows[0], rows[1])):
+            first = max(i + 1, columns[0])
+            if first < columns[1]:
+                distance_matrix.set_row_segment(i, first, distances[row, first - columns[0]:])
+    distance_matrix.flush()
+
+
+def _weighted_distances(row_values: csr_matrix, column_values: csr_matrix) -> np.ndarray:
+    # the values are the branch lengths times the sample proportions below the branches,
+    # weighted UniFrac is the L1 distance on the branches used by the two blocks
+    branches = np.union1d(row_values.indices, column_values.indices)
+    row_dense = row_values[:, branches].toarray()
+    column_dense = column_values[:, branches].toarray()
+    distances = np.empty((row_dense.shape[0], column_dense.shape[0]), dtype=np.float64)
+    for row, sample in enumerate(row_dense):
+        distances[row] = np.abs(column_dense - sample).sum(axis=1)
+    return distances
+
+
+def _unweighted_distances(row_values: csr_matrix, column_values: csr_matrix,
+                          branch_lengths: np.ndarray) -> np.ndarray:
+    # the values are the presence of the samples below the branches
+    shared = (row_values @ diags(branch_lengths) @ column_values.T).toarray()
+    row_lengths = row_values @ branch_lengths
+    column_lengths = column_values @ branch_lengths
+    union = row_lengths[:, None] + column_lengths[None, :] - shared
+    distances = np.zeros_like(shared)
+    np.divide(union - shared, union, out=distances, where=union > 0)
+    return distances
+
+
+class UniFracEngine:
+    """
+    Weighted (non normalized) and unweighted UniFrac distances, as ``qiime diversity beta-phylogenetic``.
+
+    The counts of each sample are propagated from the tips to the root with the sparse tip ancestry
+    of the tree, giving a (samples x branches) matrix:
+
+    - weighted: ``sum_b l_b |u_b / U - v_b / V|``, with ``u_b`` the counts of the sample below the branch
+      ``b`` and ``U`` the total counts of the sample
+    - unweighted: length of the branches covered by only one of the two samples over the length of the
+      branches covered by any of them
+
+    The distances are computed in stripes of ``stripe_size`` samples spread over a process pool, each
+    stripe being computed by blocks of columns, and written in a memory-mapped ``DistanceMatrix``.
+    The features that are not tips of the tree are ignored.
+    """
+
+    WEIGHTED = "weighted_unifrac"
+    UNWEIGHTED = "unweighted_unifrac"
+    METRICS = [WEIGHTED, UNWEIGHTED]
+    STRIPE_SIZE = 64
+    BLOCK_SIZE = 256
+
+    _count_matrix: CountMatrix
+    _tree: PhylogeneticTree
+    _metric: str
+    _workers: int
+    _stripe_size: int
+
+    def __init__(self, count_matrix: CountMatrix, tree: PhylogeneticTree, metric: str,
+                 workers: int = 1, stripe_size: int = STRIPE_SIZE) -> None:
+        if metric not in self.METRICS:
+            raise Exception(f"Unknown UniFrac metric '{metric}', expected one of {', '.join(self.METRICS)}")
+        self._count_matrix = count_matrix
+        self._tree = tree
+        self._metric = metric
+        self._workers = max(workers, 1)
+        self._stripe_size = stripe_size
+
+    def get_branch_values(self) -> csr_matrix:
+        """
+        Sparse (samples x branches) matrix: the branch lengths times the proportions of the samples below
+        the branches (weighted), or the presence of the samples below the branches (unweighted).
+        """
+        counts = self._count_matrix.counts.astype(np.float64).tocoo()
+        feature_tips = self._tree.get_tip_indices(self._count_matrix.feature_ids)
+        in_tree = feature_tips[counts.col] >= 0
+        tip_counts = csr_matrix(
+            (counts.data[in_tree], (counts.row[in_tree], feature_tips[counts.col[in_tree]])),
+            shape=(counts.shape[0], len(self._tree.tip_names)))
+        branch_counts = tip_counts @ self._tree.get_tip_ancestry()
+
+        if self._metric == self.UNWEIGHTED:
+            branch_counts.data = (branch_counts.data > 0).astype(np.float64)
+            return branch_counts
+
+        totals = self._count_matrix.sample_totals.astype(np.float64)
+        totals[totals == 0] = 1
+        return (diags(1 / totals) @ branch_counts @ diags(self._tree.branch_lengths)).tocsr()
+
+    def compute(self, path: str) -> DistanceMatrix:
+        """Compute the distances in the memory-mapped file ``path``."""
+        distance_matrix = DistanceMatrix.create(path, self._count_matrix.sample_ids)
+        distance_matrix.flush()
+        sample_count = distance_matrix.sample_count
+        stripes = [(start, min(start + self._stripe_size, sample_count))
+                   for start in range(0, sample_count, self._stripe_size)]
+
+        with ProcessPoolExecutor(max_workers=self._workers, initializer=_init_worker,
+                                 initargs=(self.get_branch_values(), self._tree.branch_lengths, self._metric)) as executor:
+            futures = [executor.submit(_compute_stripe, path, stripe, self.BLOCK_SIZE) for stripe in stripes]
+            for future in futures:
+                future.result()
+
+        return DistanceMatrix.open(path)
@@ -0,0 +1,183 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable
+
+import psutil
+from pandas import DataFrame
+
+
+class Dada2ProgressMonitor:
+    """
+    Follow the verbose log of ``qiime dada2 denoise-paired`` / ``denoise-single`` while the command runs.
+
+    The DADA2 R scripts print numbered stage markers (``1) Filtering``, ``2) Learning Error Rates``,
+    ``3) Denoise samples``...) and one dot per processed sample during filtering and denoising. The
+    monitor polls the log written by the shell script, converts these markers into progress values
+    and records the wall-clock time and the peak resident memory of the child processes for each stage.
+    """
+
+    LOG_FILE_NAME = "dada2_verbose.log"
+    POLL_INTERVAL_SECONDS = 5
+
+    # (stage key, human name, marker regex, progress at stage start, progress at stage end)
+    # The first group of the filtering and denoising markers captures the per-sample dots.
+    STAGES = [
+        ("filtering", "Filtering", re.compile(r"1\) Filtering ?(\.*)"), 0, 10),
+        ("learning_errors", "Learning error rates", re.compile(r"2\) Learning Error Rates"), 10, 25),
+        ("denoising", "Denoising and merging samples",
+         re.compile(r"3\) Denoise (?:remaining )?samples ?(\.*)"), 25, 80),
+        ("chimera_removal", "Chimera removal", re.compile(r"4\) Remove chimeras"), 80, 85),
+        ("reporting", "Read numbers report", re.compile(r"5\) Report read numbers"), 85, 87),
+        ("writing_output", "Writing output", re.compile(r"6\) Write output"), 87, 90),
+    ]
+
+    _log_path: str
+    _sample_count: int
+    _update_progress: Callable[[float, str], None]
+    _stage_started_at: dict[str, float]
+    _stage_peak_rss: dict[str, int]
+    _stage_processed_samples: dict[str, int]
+    _current_stage: str | None
+    _last_progress: float
+    _last_message: str | None
+    _started_at: float
+    _ended_at: float | None
+
+    def __init__(self, working_dir: str, sample_count: int,
+                 update_progress: Callable[[float, str], None]) -> None:
+        self._log_path = os.path.join(working_dir, self.LOG_FILE_NAME)
+        self._sample_count = max(sample_count, 1)
+        self._update_progress = update_progress
+        self._stage_started_at = {}
+        self._stage_peak_rss = {}
+        self._stage_processed_samples = {}
+        self._current_stage = None
+        self._last_progress = 0
+        self._last_message = None
+        self._started_at = time.time()
+        self._ended_at = None
+
+    @classmethod
+    def count_manifest_samples(cls, qiime2_folder_path: str) -> int:
+        """Return the number of samples listed in the Qiime2 manifest of the quality check folder."""
+        manifest_path = os.path.join(qiime2_folder_path, "qiime2_manifest.csv")
+        if not os.path.exists(manifest_path):
+            return 0
+        with open(manifest_path, encoding="utf-8") as manifest:
+            lines = [line for line in manifest if line.strip() and not line.startswith("#")]
+        # first line is the header
+        return max(len(lines) - 1, 0)
+
+    def run(self, run_command: Callable[[], int]) -> int:
+        """
+        Execute the DADA2 command in a worker thread and poll its log until it returns.
+
+        :param run_command: callable running the shell command and returning its exit code
+        :return: the exit code of the command
+        """
+        # the log of a previous attempt in the same working directory
+        if os.path.exists(self._log_path):
+            os.remove(self._log_path)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(run_command)
+            while not future.done():
+                wait([future], timeout=self.POLL_INTERVAL_SECONDS)
+                self.poll()
+            res = future.result()
+
+        self.poll()
+        self._ended_at = time.time()
+        return res
+
+    def poll(self) -> None:
+        """Read the log, update the current stage and the progress, and sample the memory usage."""
+        log_content = self._read_log()
+        progress = self._last_progress
+        message = None
+
+        for key, name, marker, start, end in self.STAGES:
+            match = marker.search(log_content)
+            if not match:
+                continue
+            if key not in self._stage_started_at:
+                self._stage_started_at[key] = time.time()
+            self._current_stage = key
+
+            stage_progress = start
+            message = name
+            if match.groups():
+                processed = min(len(match.group(1)), self._sample_count)
+                self._stage_processed_samples[key] = processed
+                stage_progress = start + (end - start) * processed / self._sample_count
+                message = f"{name} : sample {processed}/{self._sample_count}"
+            progress = max(progress, stage_progress)
+
+        if self._current_stage:
+            rss = self._get_children_rss()
+            self._stage_peak_rss[self._current_stage] = max(
+                self._stage_peak_rss.get(self._current_stage, 0), rss)
+
+        if message and (progress > self._last_progress or message != self._last_message):
+            self._last_progress = progress
+            self._last_message = message
+            self._update_progress(progress, f"[DADA2] {message}")
+
+    def get_metrics(self) -> DataFrame:
+        """
+        Build the per-stage metrics table.
+
+        A stage ends when the next observed stage starts (or when the command returns). Timings are
+        therefore accurate to the poll interval. For the stages reporting one dot per sample, the mean
+        time spent per sample is also given.
+        """
+        ended_at = self._ended_at or time.time()
+        observed_stages = [stage for stage in self.STAGES if stage[0] in self._stage_started_at]
+
+        rows = []
+        for index, (key, name, _, _, _) in enumerate(observed_stages):
+            stage_start = self._stage_started_at[key]
+            if index + 1 < len(observed_stages):
+                stage_end = self._stage_started_at[observed_stages[index + 1][0]]
+            else:
+                stage_end = ended_at
+            processed = self._stage_processed_samples.get(key)
+            rows.append({
+                "stage": name,
+                "wall_clock_seconds": round(stage_end - stage_start, 1),
+                "peak_rss_mb": round(self._stage_peak_rss.get(key, 0) / (1024 * 1024), 1),
+                "processed_samples": processed,
+                "seconds_per_sample": round((stage_end - stage_start) / processed, 1) if processed else None
+            })
+
+        rows.append({
+            "stage": "Total",
+            "wall_clock_seconds": round(ended_at - self._started_at, 1),
+            "peak_rss_mb": round(max(self._stage_peak_rss.values(), default=0) / (1024 * 1024), 1),
+            "processed_samples": self._sample_count,
+            "seconds_per_sample": None
+        })
+
+        return DataFrame(rows).set_index("stage")
+
+    def _read_log(self) -> str:
+        if not os.path.exists(self._log_path):
+            return ""
+        with open(self._log_path, encoding="utf-8", errors="replace") as log_file:
+            return log_file.read()
+
+    def _get_children_rss(self) -> int:
+        """Sum the resident memory of all the processes started by the current process."""
+        total_rss = 0
+        for child in psutil.Process(os.getpid()).children(recursive=True):
+            try:
+                total_rss += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                # the process ended between the listing and the memory read
+                continue
+        return total_rss
@@ -3,6 +3,7 @@ import os
 
 import plotly.graph_objects as go
 from gws_core import (
+    BoolParam,
     ConfigParams,
     ConfigSpecs,
     File,
@@ -22,8 +23,14 @@ from gws_core import (
     TaskOutputs,
     task_decorator,
 )
+from pandas import DataFrame
 
+from ..base_env.file_links import reference_upstream_file, resolve_file
 from ..base_env.qiime2_env_task import Qiime2ShellProxyHelper
+from ..base_env.scratch_space import ScratchSpace
+from ..base_env.stage_checkpoint import StageCheckpoint
+from ..dashboard_bundle.dashboard_bundle import DashboardBundle, DashboardBundleBuilder
+from .dada2_progress_monitor import Dada2ProgressMonitor
 
 
 @task_decorator("Qiime2FeatureTableExtractorSE", human_name="Q2FeatureInferenceSE",
@@ -52,24 +59,36 @@ class Qiime2FeatureTableExtractorSE(Task):
 
     Dada2 turns single-end sequences into merged, denoised, chimera-free, inferred sample sequences. The core denoising algorithm is built on a model of the errors in sequenced amplicon reads. For more information about Dada2, we suggest reading Benjamin J. Callahan *et al.*, 2016 (https://www.nature.com/articles/nmeth.3869)
 
+    **About resuming:**
+
+    The run is checkpointed after the DADA2 inference and after the formatting of the outputs. With ```resume_from_checkpoint```, a retry with the same inputs and parameters skips the completed steps whose outputs are unchanged, e.g. the DADA2 inference when the formatting failed. The unzipped Qiime2 artifacts are written in a scratch directory (```GWS_UBIOME_SCRATCH_DIR``` directory, ```/data/tmp``` by default), removed at the end of the run.
+
     """
+    # Share of the progress of the steps, the DADA2 stages go from 0 to 90 (see Dada2ProgressMonitor)
+    STAGE_WEIGHTS = {"dada2": 90, "formatting": 10}
+
     input_specs: InputSpecs = InputSpecs({
         'quality_check_folder': InputSpec(Folder)
     })
     output_specs: OutputSpecs = OutputSpecs({
         'boxplot': OutputSpec(PlotlyResource),
         'stats': OutputSpec(Table),
+        'metrics': OutputSpec(Table, human_name="DADA2 stage metrics",
+                              short_description="Wall-clock time and peak memory of each DADA2 stage"),
         'result_folder':
         OutputSpec(
             Folder,
             short_description="Rarefaction curves folder. Can be used with taxonomy task (!no rarefaction are done on counts!))",
-            human_name="Rarefaction_curves")
+            human_name="Rarefaction_curves"),
+        'dashboard_bundle': OutputSpec(DashboardBundle, human_name="Dashboard bundle",
+                                       short_description="Compact preview of the results, read by the dashboard")
     })
     config_specs: ConfigSpecs = ConfigSpecs({
         "threads": IntParam(default_value=2, min_value=2, short_description="Number of threads"),
         "truncated_reads_size": IntParam(min_value=20, short_description="Read size to conserve after quality PHRED check in the previous step"),
         "5_prime_hard_trimming_reads_size": IntParam(optional=True, default_value=0, min_value=0, short_description="Read size to trim in 5prime"),
-        "p-min-fold-parent-over-abundance": IntParam(optional=True, default_value=1, min_value=1, short_description="The minimum abundance of potential parents of a sequence being tested as chimeric")
+        "p-min-fold-parent-over-abundance": IntParam(optional=True, default_value=1, min_value=1, short_description="The minimum abundance of potential parents of a sequence being tested as chimeric"),
+        "resume_from_checkpoint": BoolParam(default_value=False, visibility=BoolParam.PROTECTED_VISIBILITY, short_description="Resume a failed run after its last completed step")
 
     })
 
@@ -82,39 +101,67 @@ class Qiime2FeatureTableExtractorSE(Task):
         min_fold=params["p-min-fold-parent-over-abundance"]
         script_file_dir=os.path.dirname(os.path.realpath(__file__))
 
-        shell_proxy=Qiime2ShellProxyHelper.create_proxy(
-            self.message_dispatcher)
-
-        if hard_trim == 0:  # When sequencing data are not being hard-trimmed
-            outputs=self.run_cmd_single_end(shell_proxy,
-                                              script_file_dir,
-                                              qiime2_folder_path,
-                                              trct_forward,
-                                              thrd,
-                                              min_fold
-                                              )
-        else:  # When sequencing data are being hard-trimmed
-            outputs=self.run_cmd_single_end_hard_trim(shell_proxy,
-                                                        script_file_dir,
-                                                        qiime2_folder_path,
-                                                        trct_forward,
-                                                        thrd,
-                                                        hard_trim,
-                                                        min_fold
-                                                        )
-
-        # Output formatting and annotation
-
-        annotated_outputs=self.outputs_annotation(outputs)
-
-        return annotated_outputs
+        # the attempts of the run share a working directory, a retry resumes after the last completed step
+        with StageCheckpoint.open_task_run_dir(
+                Qiime2FeatureTableExtractorSE.get_brick_name(), [qiime2_folder_path], params,
+                self.log_warning_message) as working_dir:
+            shell_proxy=Qiime2ShellProxyHelper.create_proxy(
+                self.message_dispatcher, working_dir)
+            checkpoint=StageCheckpoint(shell_proxy.working_dir, self.STAGE_WEIGHTS,
+                                       self.update_progress_value, self.log_info_message)
+            dada2_monitor=Dada2ProgressMonitor(
+                shell_proxy.working_dir,
+                Dada2ProgressMonitor.count_manifest_samples(qiime2_folder_path),
+                checkpoint.get_progress_callback("dada2", max_value=90))
+
+            with ScratchSpace(shell_proxy.working_dir, self.log_info_message) as scratch:
+                if hard_trim == 0:  # When sequencing data are not being hard-trimmed
+                    outputs=self.run_cmd_single_end(shell_proxy,
+                                                      script_file_dir,
+                                                      qiime2_folder_path,
+                                                      trct_forward,
+                                                      thrd,
+                                                      min_fold,
+                                                      dada2_monitor,
+                                                      checkpoint,
+                                                      scratch
+                                                      )
+                else:  # When sequencing data are being hard-trimmed
+                    outputs=self.run_cmd_single_end_hard_trim(shell_proxy,
+                                                                script_file_dir,
+                                                                qiime2_folder_path,
+                                                                trct_forward,
+                                                                thrd,
+                                                                hard_trim,
+                                                                min_fold,
+                                                                dada2_monitor,
+                                                                checkpoint,
+                                                                scratch
+                                                                )
+
+            # Output formatting and annotation
+
+            # the DADA2 metrics are read from the checkpoint, also when the inference was resumed
+            annotated_outputs=self.outputs_annotation(
+                outputs, DataFrame(checkpoint.get_result("dada2")).set_index("stage"))
+
+            bundle_builder = DashboardBundleBuilder()
+            bundle_builder.add_outputs(annotated_outputs)
+            bundle_builder.add_stats({"sample_count": annotated_outputs["stats"].get_data().shape[0]})
+            annotated_outputs["dashboard_bundle"] = bundle_builder.build()
+            checkpoint.complete()
+
+            return annotated_outputs
 
     def run_cmd_single_end(self, shell_proxy: ShellProxy,
                            script_file_dir: str,
                            qiime2_folder_path: str,
                            trct_forward: int,
                            thrd: int,
-                           min_fold: int
+                           min_fold: int,
+                           dada2_monitor: Dada2ProgressMonitor,
+                           checkpoint: StageCheckpoint,
+                           scratch: ScratchSpace
                            ) -> str:
 
         cmd_1=[
@@ -127,10 +174,8 @@ class Qiime2FeatureTableExtractorSE(Task):
             str(min_fold)
         ]
         self.log_info_message("[Step-1] : Qiime2 features inference")
-        res=shell_proxy.run(cmd_1)
-        if res != 0:
-            raise Exception("First step did not finish")
-        self.update_progress_value(90, "[Step-1] : Done")
+        self.run_dada2_stage(shell_proxy, scratch, cmd_1, qiime2_folder_path, dada2_monitor, checkpoint,
+                             "First step did not finish")
 
         # This script performs Qiime2 demux, quality assessment
         cmd_2=[
@@ -142,10 +187,7 @@ class Qiime2FeatureTableExtractorSE(Task):
         ]
         self.log_info_message(
             "[Step-2] : Formatting output files for data visualization")
-        res=shell_proxy.run(cmd_2)
-        if res != 0:
-            raise Exception("Second step did not finish")
-        self.update_progress_value(100, "[Step-2] : Done")
+        self.run_formatting_stage(shell_proxy, scratch, cmd_2, qiime2_folder_path, checkpoint, "Second step did not finish")
 
         output_folder_path=os.path.join(
             shell_proxy.working_dir, "sample_freq_details")
@@ -158,7 +200,10 @@ class Qiime2FeatureTableExtractorSE(Task):
                                      trct_forward: int,
                                      thrd: int,
                                      hard_trim: int,
-                                     min_fold: int
+                                     min_fold: int,
+                                     dada2_monitor: Dada2ProgressMonitor,
+                                     checkpoint: StageCheckpoint,
+                                     scratch: ScratchSpace
                                      ) -> str:
 
         cmd_1=[
@@ -173,10 +218,8 @@ class Qiime2FeatureTableExtractorSE(Task):
         ]
         self.log_info_message(
             "Qiime2 features inference + reads hard trimming")
-        res=shell_proxy.run(cmd_1)
-        if res != 0:
-            raise Exception("Qiime2 features inference did not finish")
-        self.update_progress_value(90, "Done")
+        self.run_dada2_stage(shell_proxy, scratch, cmd_1, qiime2_folder_path, dada2_monitor, checkpoint,
+                             "Qiime2 features inference did not finish")
 
         # This script performs Qiime2 demux, quality assessment
         cmd_2=[
@@ -187,17 +230,40 @@ class Qiime2FeatureTableExtractorSE(Task):
             shell_proxy.working_dir
         ]
         self.log_info_message("Formatting output files for data visualization")
-        res=shell_proxy.run(cmd_2)
-        if res != 0:
-            raise Exception("One error occurred when formatting output files")
-        self.update_progress_value(100, "Done")
+        self.run_formatting_stage(shell_proxy, scratch, cmd_2, qiime2_folder_path, checkpoint, "One error occurred when formatting output files")
 
         output_folder_path=os.path.join(
             shell_proxy.working_dir, "sample_freq_details")
 
         return output_folder_path
 
-    def outputs_annotation(self, output_folder_path: str) -> TaskOutputs:
+    def run_dada2_stage(self, shell_proxy: ShellProxy, scratch: ScratchSpace, cmd: list, qiime2_folder_path: str,
+                        dada2_monitor: Dada2ProgressMonitor, checkpoint: StageCheckpoint, error_message: str) -> None:
+        def run_dada2() -> list[dict]:
+            res = dada2_monitor.run(lambda: scratch.run(shell_proxy, cmd, "dada2"))
+            if res != 0:
+                raise Exception(error_message)
+            return dada2_monitor.get_metrics().reset_index().to_dict("records")
+
+        # table.qza and rep-seqs.qza are moved by 2_qiime2_outputs_formating.sh, they are not checked
+        checkpoint.run_stage("dada2", run_dada2, inputs=[os.path.join(qiime2_folder_path, "demux.qza")],
+                             outputs=["feature-table.qzv", "denoising-stats.qza"])
+
+    def run_formatting_stage(self, shell_proxy: ShellProxy, scratch: ScratchSpace, cmd: list,
+                             qiime2_folder_path: str, checkpoint: StageCheckpoint, error_message: str) -> None:
+        def run_formatting() -> None:
+            res = scratch.run(shell_proxy, cmd, "formatting")
+            if res != 0:
+                raise Exception(error_message)
+            # the demultiplexed reads of the quality check are referenced, not copied
+            reference_upstream_file(resolve_file(qiime2_folder_path, "demux.qza"),
+                                    os.path.join(shell_proxy.working_dir, "sample_freq_details"))
+
+        checkpoint.run_stage("formatting", run_formatting,
+                             outputs=[os.path.join("sample_freq_details", "denoising-stats.tsv"),
+                                      os.path.join("sample_freq_details", "gws_metadata.csv")])
+
+    def outputs_annotation(self, output_folder_path: str, dada2_metrics: DataFrame) -> TaskOutputs:
 
         result_file=Folder()
         result_file.path=output_folder_path
@@ -223,9 +289,13 @@ class Qiime2FeatureTableExtractorSE(Task):
         # Generate boxplot from the feature table
         boxplot=self.view_frequency_table_as_box_plot(feature_table)
 
+        metrics_table=Table(dada2_metrics)
+        metrics_table.name="DADA2 Stage Metrics"
+
         return {
             "result_folder": result_file,
             "stats": stats_table,
+            "metrics": metrics_table,
             "boxplot": boxplot
         }
 
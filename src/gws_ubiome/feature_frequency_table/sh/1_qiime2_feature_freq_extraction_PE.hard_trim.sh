@@ -1,6 +1,4 @@
-
-
-  #!/usr/bin/bash
+#!/usr/bin/bash
 
 # This software is the exclusive property of Gencovery SAS. 
 # The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
@@ -16,7 +14,12 @@ threads=$4
 trm=$5
 minFold=$6
 
-qiime dada2 denoise-paired --i-demultiplexed-seqs $qiime_dir/demux.qza --p-trunc-len-f $trcF --p-trunc-len-r $trcR --p-trim-left-f $trm --p-trim-left-r $trm --p-min-fold-parent-over-abundance $minFold --p-n-threads $threads --o-table table.qza --o-representative-sequences rep-seqs.qza --o-denoising-stats denoising-stats.qza
+# any failed command fails the script, DADA2 included although piped to tee
+set -eo pipefail
+
+# --verbose prints the DADA2 stage markers, parsed by the task to report progress
+qiime dada2 denoise-paired --i-demultiplexed-seqs $qiime_dir/demux.qza --p-trunc-len-f $trcF --p-trunc-len-r $trcR --p-trim-left-f $trm --p-trim-left-r $trm --p-min-fold-parent-over-abundance $minFold --p-n-threads $threads --o-table table.qza --o-representative-sequences rep-seqs.qza --o-denoising-stats denoising-stats.qza \
+  --verbose 2>&1 | tee dada2_verbose.log
 
 qiime feature-table summarize --i-table table.qza --o-visualization feature-table.qzv --m-sample-metadata-file $qiime_dir/qiime2_manifest.csv
 
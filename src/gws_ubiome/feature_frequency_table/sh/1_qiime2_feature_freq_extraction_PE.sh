@@ -13,6 +13,10 @@ trcR=$3
 threads=$4
 minFold=$5
 
+# any failed command fails the script, DADA2 included although piped to tee
+set -eo pipefail
+
+# --verbose prints the DADA2 stage markers, parsed by the task to report progress
 qiime dada2 denoise-paired \
   --i-demultiplexed-seqs $qiime_dir/demux.qza \
   --p-trunc-len-f $trcF \
@@ -21,7 +25,8 @@ qiime dada2 denoise-paired \
   --p-n-threads $threads \
   --o-table table.qza \
   --o-representative-sequences rep-seqs.qza \
-  --o-denoising-stats denoising-stats.qza
+  --o-denoising-stats denoising-stats.qza \
+  --verbose 2>&1 | tee dada2_verbose.log
 
 qiime feature-table summarize \
   --i-table table.qza \
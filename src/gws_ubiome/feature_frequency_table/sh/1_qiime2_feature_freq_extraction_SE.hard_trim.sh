@@ -13,6 +13,11 @@ threads=$3
 trm=$4
 minFold=$5
 
-qiime dada2 denoise-single --i-demultiplexed-seqs $qiime_dir/demux.qza --p-trunc-len $trcF --p-trim-left $trm --p-min-fold-parent-over-abundance $minFold --p-n-threads $threads --o-table table.qza --o-representative-sequences rep-seqs.qza --o-denoising-stats denoising-stats.qza
+# any failed command fails the script, DADA2 included although piped to tee
+set -eo pipefail
+
+# --verbose prints the DADA2 stage markers, parsed by the task to report progress
+qiime dada2 denoise-single --i-demultiplexed-seqs $qiime_dir/demux.qza --p-trunc-len $trcF --p-trim-left $trm --p-min-fold-parent-over-abundance $minFold --p-n-threads $threads --o-table table.qza --o-representative-sequences rep-seqs.qza --o-denoising-stats denoising-stats.qza \
+  --verbose 2>&1 | tee dada2_verbose.log
 
 qiime feature-table summarize --i-table table.qza --o-visualization feature-table.qzv --m-sample-metadata-file $qiime_dir/qiime2_manifest.csv
@@ -12,6 +12,10 @@ trcL=$2
 threads=$3
 minFold=$4
 
+# any failed command fails the script, DADA2 included although piped to tee
+set -eo pipefail
+
+# --verbose prints the DADA2 stage markers, parsed by the task to report progress
 qiime dada2 denoise-single \
   --i-demultiplexed-seqs $qiime_dir/demux.qza \
   --p-trunc-len $trcL \
@@ -20,7 +24,8 @@ qiime dada2 denoise-single \
   --p-n-reads-learn 1000 \
   --o-table table.qza \
   --o-representative-sequences rep-seqs.qza \
-  --o-denoising-stats denoising-stats.qza
+  --o-denoising-stats denoising-stats.qza \
+  --verbose 2>&1 | tee dada2_verbose.log
 
 qiime feature-table summarize \
   --i-table table.qza \
@@ -9,24 +9,33 @@
 
 qiime_dir=$1
 output_dir=$2
+# scratch directory of the run (ScratchSpace), for the unzipped artifacts
+scratch_dir=${3:-.}
 
-mkdir sample_freq_details ;
-unzip $output_dir/feature-table.qzv -d tmp_dir ;
+# copy of a small file, sharing its data blocks (reflink) when the filesystem supports it.
+# The copy is an independent file: the upstream file is never modified through it.
+# demux.qza is not copied, the task references it (upstream_files.json)
+clone_or_copy() {
+  rm -f "$2/$(basename "$1")" ;
+  cp --reflink=auto "$1" "$2" ;
+}
 
-cat tmp_dir/*/data/sample-frequency-detail.csv | tr ',' '\t' > ./sample_freq_details/sample-frequency-detail.tsv;
+mkdir -p sample_freq_details ;
+unzip -o $output_dir/feature-table.qzv -d $scratch_dir/tmp_dir ;
 
-unzip $output_dir/denoising-stats.qza -d tmp_dir_2
-cat tmp_dir_2/*/data/stats.tsv | grep -v "^#" > ./sample_freq_details/denoising-stats.tsv ;
+cat $scratch_dir/tmp_dir/*/data/sample-frequency-detail.csv | tr ',' '\t' > ./sample_freq_details/sample-frequency-detail.tsv;
 
-unzip $output_dir/rep-seqs.qza -d tmp_dir_3
-cat tmp_dir_3/*/data/dna-sequences.fasta > ./sample_freq_details/ASV-sequences.fasta ;
+unzip -o $output_dir/denoising-stats.qza -d $scratch_dir/tmp_dir_2
+cat $scratch_dir/tmp_dir_2/*/data/stats.tsv | grep -v "^#" > ./sample_freq_details/denoising-stats.tsv ;
+
+unzip -o $output_dir/rep-seqs.qza -d $scratch_dir/tmp_dir_3
+cat $scratch_dir/tmp_dir_3/*/data/dna-sequences.fasta > ./sample_freq_details/ASV-sequences.fasta ;
 
 
 mv $output_dir/rep-seqs.qza ./sample_freq_details ;
 mv $output_dir/table.qza ./sample_freq_details ;
-cp $qiime_dir/demux.qza ./sample_freq_details ;
-cp $output_dir/feature-table.qzv ./sample_freq_details ;
+clone_or_copy $output_dir/feature-table.qzv ./sample_freq_details ;
 
-cp $qiime_dir/qiime2_manifest.csv ./sample_freq_details ;
-cp $qiime_dir/gws_metadata.csv  ./sample_freq_details ;
-cp $qiime_dir/qiime2_metadata.csv ./sample_freq_details ;
+clone_or_copy $qiime_dir/qiime2_manifest.csv ./sample_freq_details ;
+clone_or_copy $qiime_dir/gws_metadata.csv  ./sample_freq_details ;
+clone_or_copy $qiime_dir/qiime2_metadata.csv ./sample_freq_details ;
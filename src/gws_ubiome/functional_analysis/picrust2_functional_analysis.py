@@ -1,6 +1,7 @@
 
 import os
 
+import pandas as pd
 from gws_core import (
     ConfigParams,
     ConfigSpecs,
@@ -19,6 +20,7 @@ from gws_core import (
 
 from ..base_env.Picrust2_env import Picrust2ShellProxyHelper
 from ..base_env.qiime2_env_task import Qiime2ShellProxyHelper
+from ..dashboard_bundle.dashboard_bundle import DashboardBundle, DashboardBundleBuilder
 
 
 @task_decorator("Picrust2FunctionalAnalysis", human_name="16s Functional Analysis Prediction",
@@ -50,13 +52,23 @@ class Picrust2FunctionalAnalysis(Task):
         'Folder_result':
         OutputSpec(
             Folder, human_name="picrust2_out_pipeline",
-            short_description="This folder contain the outputs")
+            short_description="This folder contain the outputs"),
+        'dashboard_bundle':
+        OutputSpec(
+            DashboardBundle, human_name="Dashboard bundle",
+            short_description="Compact preview of the results, read by the dashboard")
     })
 
     config_specs: ConfigSpecs = ConfigSpecs({
         "num_processes": IntParam(default_value=2, min_value=2, short_description="Number of threads ")
     })
 
+    PREDICTION_FILES = {
+        "Pathways": os.path.join("pathways_out", "path_abun_unstrat.tsv.gz"),
+        "KO": os.path.join("KO_metagenome_out", "pred_metagenome_unstrat.tsv.gz"),
+        "EC": os.path.join("EC_metagenome_out", "pred_metagenome_unstrat.tsv.gz"),
+    }
+
     python_file_path = os.path.join(
         os.path.abspath(os.path.dirname(__file__)),
         "_picrust2_functional_analysis.py"
@@ -107,4 +119,16 @@ class Picrust2FunctionalAnalysis(Task):
 
         return {
             'Folder_result': Folder(combined_results),
+            'dashboard_bundle': self.build_dashboard_bundle(combined_results),
         }
+
+    def build_dashboard_bundle(self, picrust2_folder_path: str) -> DashboardBundle:
+        """Most abundant pathways, KO and EC numbers of the unstratified PICRUSt2 predictions."""
+        bundle_builder = DashboardBundleBuilder()
+        for name, file_name in self.PREDICTION_FILES.items():
+            path = os.path.join(picrust2_folder_path, file_name)
+            if os.path.exists(path):
+                data = pd.read_csv(path, sep="\t", index_col=0)
+                bundle_builder.add_table("Folder_result", name, data)
+                bundle_builder.add_stats({f"{name} count": data.shape[0]})
+        return bundle_builder.build()
@@ -3,6 +3,7 @@ import os
 
 import plotly.graph_objects as go
 from gws_core import (
+    BoolParam,
     ConfigParams,
     ConfigSpecs,
     File,
@@ -26,6 +27,9 @@ from gws_omix import FastqFolder
 from pandas import DataFrame
 
 from ..base_env.qiime2_env_task import Qiime2ShellProxyHelper
+from ..base_env.scratch_space import ScratchSpace
+from ..base_env.stage_checkpoint import StageCheckpoint
+from ..dashboard_bundle.dashboard_bundle import DashboardBundle, DashboardBundleBuilder
 
 
 @task_decorator("Qiime2QualityCheck", human_name="Q2QualityCheck",
@@ -38,6 +42,8 @@ class Qiime2QualityCheck(Task):
 
     More information here https://docs.qiime2.org/2022.8/plugins/available/demux/summarize/
 
+    The unzipped Qiime2 visualizations are written in a scratch directory (`GWS_UBIOME_SCRATCH_DIR` directory, `/data/tmp` by default), removed at the end of the run. The run is checkpointed after each step. With `resume_from_checkpoint`, a retry with the same inputs and parameters skips the completed steps whose outputs are unchanged.
+
     [Mandatory]:
         - fastq_folder must contains all fastq files (paired or not).
 
@@ -71,18 +77,26 @@ class Qiime2QualityCheck(Task):
     READS_FILE_PATH = "quality-boxplot.csv"
     FORWARD_READ_FILE_PATH = "forward_boxplot.csv"
     REVERSE_READ_FILE_PATH = "reverse_boxplot.csv"
+    # Relative duration of the steps, in their order
+    PAIRED_END_STAGE_WEIGHTS = {"metadata": 1, "demux": 20, "boxplot": 2}
+    SINGLE_END_STAGE_WEIGHTS = {"demux": 1}
 
     input_specs: InputSpecs = InputSpecs({'fastq_folder': InputSpec(FastqFolder), 'metadata_table': InputSpec(
         File, short_description="A metadata file with at least sequencing file names", human_name="A metadata file")})
     output_specs: OutputSpecs = OutputSpecs({
         'result_folder': OutputSpec(Folder),
-        'quality_table': OutputSpec(ResourceSet)
+        'quality_table': OutputSpec(ResourceSet),
+        'dashboard_bundle': OutputSpec(DashboardBundle, human_name="Dashboard bundle",
+                                       short_description="Compact preview of the results, read by the dashboard")
     })
     config_specs: ConfigSpecs = ConfigSpecs({
         "sequencing_type":
         StrParam(
             default_value="paired-end", allowed_values=["paired-end", "single-end"],
-            short_description="Type of sequencing. Defaults to paired-end")
+            short_description="Type of sequencing. Defaults to paired-end"),
+        "resume_from_checkpoint": BoolParam(
+            default_value=False, visibility=BoolParam.PROTECTED_VISIBILITY,
+            short_description="Resume a failed run after its last completed step")
     })
 
     def run(self, params: ConfigParams, inputs: TaskInputs) -> TaskOutputs:
@@ -94,31 +108,48 @@ class Qiime2QualityCheck(Task):
         manifest_table_file_path = metadata_table.path
         script_file_dir = os.path.dirname(os.path.realpath(__file__))
 
-        shell_proxy = Qiime2ShellProxyHelper.create_proxy(
-            self.message_dispatcher)
-
-        if seq == "paired-end":
-            outputs = self.run_cmd_paired_end(shell_proxy,
-                                              script_file_dir,
-                                              fastq_folder_path,
-                                              manifest_table_file_path,
-                                              params
-                                              )
-        else:
-            outputs = self.run_cmd_single_end(shell_proxy,
-                                              script_file_dir,
-                                              fastq_folder_path,
-                                              manifest_table_file_path,
-                                              params
-                                              )
-
-        return outputs
+        # the attempts of the run share a working directory, a retry resumes after the last completed step
+        with StageCheckpoint.open_task_run_dir(
+                Qiime2QualityCheck.get_brick_name(), [fastq_folder_path, manifest_table_file_path], params,
+                self.log_warning_message) as working_dir:
+            shell_proxy = Qiime2ShellProxyHelper.create_proxy(
+                self.message_dispatcher, working_dir)
+
+            with ScratchSpace(shell_proxy.working_dir, self.log_info_message) as scratch:
+                if seq == "paired-end":
+                    outputs = self.run_cmd_paired_end(shell_proxy,
+                                                      script_file_dir,
+                                                      fastq_folder_path,
+                                                      manifest_table_file_path,
+                                                      params,
+                                                      scratch
+                                                      )
+                else:
+                    outputs = self.run_cmd_single_end(shell_proxy,
+                                                      script_file_dir,
+                                                      fastq_folder_path,
+                                                      manifest_table_file_path,
+                                                      params,
+                                                      scratch
+                                                      )
+
+            # quality profiles are sampled along the read positions
+            bundle_builder = DashboardBundleBuilder()
+            bundle_builder.add_outputs(outputs, sample_outputs=["quality_table"])
+            bundle_builder.add_stats({"sequencing_type": seq})
+            outputs["dashboard_bundle"] = bundle_builder.build()
+
+            return outputs
 
     def run_cmd_paired_end(self, shell_proxy: ShellProxy,
                            script_file_dir: str,
                            fastq_folder_path: str,
                            manifest_table_file_path: str,
-                           params: ConfigParams) -> TaskOutputs:
+                           params: ConfigParams,
+                           scratch: ScratchSpace) -> TaskOutputs:
+
+        checkpoint = StageCheckpoint(shell_proxy.working_dir, self.PAIRED_END_STAGE_WEIGHTS,
+                                     self.update_progress_value, self.log_info_message)
 
         # This script create Qiime2 metadata file by modify initial gws metedata file
         cmd_1 = [
@@ -129,10 +160,11 @@ class Qiime2QualityCheck(Task):
             manifest_table_file_path
         ]
         self.log_info_message("[Step-1] : Creating Qiime2 metadata file ")
-        res = shell_proxy.run(cmd_1)
-        if res != 0:
-            raise Exception("First step did not finished")
-        self.update_progress_value(33, "[Step-1] : Done")
+        checkpoint.run_stage(
+            "metadata", lambda: self.run_script(shell_proxy, scratch, cmd_1, "metadata", "First step"),
+            inputs=[fastq_folder_path, manifest_table_file_path],
+            outputs=[os.path.join("quality_check", "qiime2_manifest.csv"),
+                     os.path.join("quality_check", "gws_metadata.csv")])
 
         # This script perform Qiime2 demux , quality assessment
         cmd_2 = [
@@ -141,10 +173,9 @@ class Qiime2QualityCheck(Task):
             os.path.join(shell_proxy.working_dir, "quality_check")
         ]
         self.log_info_message("[Step-2] : Qiime2 demux , quality assessment")
-        res = shell_proxy.run(cmd_2)
-        if res != 0:
-            raise Exception("First step did not finished")
-        self.update_progress_value(66, "[Step-2] : Done")
+        checkpoint.run_stage(
+            "demux", lambda: self.run_script(shell_proxy, scratch, cmd_2, "demux", "Second step"),
+            outputs=[os.path.join("quality_check", "demux.qza"), os.path.join("quality_check", "demux.qzv")])
 
         # This script create visualisation output files for users (Boxplot compatible with Constellab front)
         cmd_3 = [
@@ -154,10 +185,10 @@ class Qiime2QualityCheck(Task):
             os.path.join(shell_proxy.working_dir, "quality_check")
         ]
         self.log_info_message("[Step-3] : Creating visualisation output files")
-        res = shell_proxy.run(cmd_3)
-        if res != 0:
-            raise Exception("First step did not finished")
-        self.update_progress_value(100, "[Step-3] : Done")
+        checkpoint.run_stage(
+            "boxplot", lambda: self.run_script(shell_proxy, scratch, cmd_3, "boxplot", "Third step"),
+            outputs=[os.path.join("quality_check", self.FORWARD_READ_FILE_PATH),
+                     os.path.join("quality_check", self.REVERSE_READ_FILE_PATH)])
 
         result_folder = Folder()
 
@@ -207,6 +238,7 @@ class Qiime2QualityCheck(Task):
         resource_table.add_resource(quality_table_rvs_annotated)
         resource_table.add_resource(quality_check_boxplot_reverse)
         resource_table.add_resource(quality_check_lineplot_reverse)
+        checkpoint.complete()
         return {
             "result_folder": result_folder,
             "quality_table": resource_table
@@ -216,8 +248,11 @@ class Qiime2QualityCheck(Task):
                            script_file_dir: str,
                            fastq_folder_path: str,
                            manifest_table_file_path: str,
-                           params: ConfigParams
+                           params: ConfigParams,
+                           scratch: ScratchSpace
                            ) -> TaskOutputs:
+        checkpoint = StageCheckpoint(shell_proxy.working_dir, self.SINGLE_END_STAGE_WEIGHTS,
+                                     self.update_progress_value, self.log_info_message)
         cmd = [
             "bash",
             os.path.join(
@@ -226,7 +261,14 @@ class Qiime2QualityCheck(Task):
             manifest_table_file_path
         ]
 
-        shell_proxy.run(cmd)
+        def run_demux() -> None:
+            # the exit code is not checked, the quality file is checked by the checkpoint
+            scratch.run(shell_proxy, cmd, "demux")
+        checkpoint.run_stage(
+            "demux", run_demux,
+            inputs=[fastq_folder_path, manifest_table_file_path],
+            outputs=[os.path.join("quality_check", self.READS_FILE_PATH),
+                     os.path.join("quality_check", "gws_metadata.csv")])
 
         result_folder = Folder(os.path.join(
             shell_proxy.working_dir, "quality_check"))
@@ -257,11 +299,18 @@ class Qiime2QualityCheck(Task):
         resource_table.add_resource(quality_table)
         resource_table.add_resource(quality_table_boxplot)
         resource_table.add_resource(quality_table_lineplot)
+        checkpoint.complete()
         return {
             "result_folder": result_folder,
             "quality_table": resource_table
         }
 
+    def run_script(self, shell_proxy: ShellProxy, scratch: ScratchSpace, cmd: list, stage: str,
+                   step_name: str) -> None:
+        res = scratch.run(shell_proxy, cmd, stage)
+        if res != 0:
+            raise Exception(f"{step_name} did not finished")
+
     def plotly_boxplot(self, data: DataFrame) -> PlotlyResource:
         # Create a boxplot for each base position using the five-number summary
         fig = go.Figure()
@@ -12,7 +12,7 @@ metadatacsv=$2
 
 # create metadata files and manifest file compatible with qiime2 env and gencovery env
 
-mkdir quality_check ;
+mkdir -p quality_check ;
 
 cat $metadatacsv > gws_metadata.csv
 cat <(grep -v "^#" gws_metadata.csv | head -1 ) <( egrep "^#column-type\t" gws_metadata.csv | sed 's/#column-type/#q2:types/' ) <( grep -v "^#" gws_metadata.csv | sed '1d' ) > qiime2_metadata.csv
@@ -9,6 +9,8 @@
 
 fastq_dir=$1
 metadatacsv=$2
+# scratch directory of the run (ScratchSpace), for the unzipped visualization
+scratch_dir=${3:-.}
 
 cat $metadatacsv > gws_metadata.csv
 
@@ -29,15 +31,15 @@ qiime demux summarize \
   --i-data demux.qza \
   --o-visualization demux.qzv
 
-unzip demux.qzv -d tmp_dir
-mkdir quality_check ;
+unzip -o demux.qzv -d $scratch_dir/tmp_dir
+mkdir -p quality_check ;
 
 echo -e "\n############# Quality file generated #############\n"
-ls ./tmp_dir ;
-ls ./tmp_dir/*/data/forward-seven-number-summaries.tsv  ;
+ls $scratch_dir/tmp_dir ;
+ls $scratch_dir/tmp_dir/*/data/forward-seven-number-summaries.tsv  ;
 echo -e "\n############# Quality file generated #############\n"
 
-cat ./tmp_dir/*/data/forward-seven-number-summaries.tsv  | sed -n '1p;4,8p' > ./quality_check/quality-boxplot.csv # de 9% à 91% ; rajouter nom échantillons dans nom fichier et dans figures éventuellements
+cat $scratch_dir/tmp_dir/*/data/forward-seven-number-summaries.tsv  | sed -n '1p;4,8p' > ./quality_check/quality-boxplot.csv # de 9% à 91% ; rajouter nom échantillons dans nom fichier et dans figures éventuellements
 
 mv demux.qza ./quality_check ;
 
@@ -8,8 +8,10 @@
 ## paired-end project
 
 output_folder=$1
+# scratch directory of the run (ScratchSpace), for the unzipped visualization
+scratch_dir=${2:-.}
 
-unzip $output_folder/demux.qzv -d tmp_dir
+unzip -o $output_folder/demux.qzv -d $scratch_dir/tmp_dir
 
-cat ./tmp_dir/*/data/reverse-seven-number-summaries.tsv | sed -n '1p;4,8p' > $output_folder/reverse_boxplot.csv ; # de 9% à 91% ; rajouter nom échantillons dans nom fichier et dans figures éventuellements
-cat ./tmp_dir/*/data/forward-seven-number-summaries.tsv  | sed -n '1p;4,8p' > $output_folder/forward_boxplot.csv ; # de 9% à 91% ; rajouter nom échantillons dans nom fichier et dans figures éventuellements
+cat $scratch_dir/tmp_dir/*/data/reverse-seven-number-summaries.tsv | sed -n '1p;4,8p' > $output_folder/reverse_boxplot.csv ; # de 9% à 91% ; rajouter nom échantillons dans nom fichier et dans figures éventuellements
+cat $scratch_dir/tmp_dir/*/data/forward-seven-number-summaries.tsv  | sed -n '1p;4,8p' > $output_folder/forward_boxplot.csv ; # de 9% à 91% ; rajouter nom échantillons dans nom fichier et dans figures éventuellements
@@ -0,0 +1,163 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import numpy as np
+from pandas import DataFrame, MultiIndex
+from scipy.special import gammaln
+
+from ..diversity_engine.count_matrix import CountMatrix
+
+
+class AnalyticalRarefaction:
+    """
+    Exact expected rarefaction curves, computed without random subsampling.
+
+    Rarefying a sample of ``N`` reads to depth ``n`` draws ``n`` reads without replacement, so the
+    number of reads ``X`` kept for a feature of count ``c`` follows an hypergeometric law. Then:
+
+    - the expected number of observed features is ``sum(1 - P(X = 0))`` and its variance follows
+      Heck et al. (1975) using the joint absence probabilities of each pair of features;
+    - the expected Shannon index (base 2, as ``qiime diversity alpha``) is
+      ``-sum(E[X/n * log2(X/n)])``, computed on the hypergeometric pmf truncated to +/- 12 standard
+      deviations around its mean.
+
+    Features sharing the same count share the same law, so all computations are made on the unique
+    count values of each sample, weighted by their multiplicity.
+    """
+
+    EXPECTED_ROW = "expected"
+    LOWER_ROW = "expected - sd"
+    UPPER_ROW = "expected + sd"
+
+    # half width (in standard deviations) of the hypergeometric support used for the Shannon index
+    PMF_TRUNCATION_SD = 12
+
+    _count_matrix: CountMatrix
+    _depths: list[int]
+    _with_variance: bool
+
+    def __init__(self, count_matrix: CountMatrix, depths: list[int], with_variance: bool = True) -> None:
+        self._count_matrix = count_matrix
+        self._depths = depths
+        self._with_variance = with_variance
+
+    @classmethod
+    def get_depths(cls, min_depth: int, max_depth: int, steps: int = 10) -> list[int]:
+        """Return the evenly spaced depths used by ``qiime diversity alpha-rarefaction``."""
+        return sorted(set(np.linspace(min_depth, max_depth, num=steps, dtype=int).tolist()))
+
+    def compute(self) -> dict[str, DataFrame]:
+        """
+        Compute the curves of all the samples.
+
+        :return: the ``observed_features`` and ``shannon`` tables. Rows are the expected value (and the
+        +/- one standard deviation band for the observed features), columns are indexed by
+        (depth, sample-id). Depths greater than the sample size are NaN, as in Qiime2.
+        """
+        sample_ids = sorted(self._count_matrix.sample_ids)
+        sample_positions = {sample_id: i for i, sample_id in enumerate(self._count_matrix.sample_ids)}
+        columns = MultiIndex.from_product([self._depths, sample_ids], names=["depth", "sample-id"])
+
+        observed_rows = [self.LOWER_ROW, self.EXPECTED_ROW, self.UPPER_ROW] if self._with_variance \
+            else [self.EXPECTED_ROW]
+        observed = DataFrame(np.nan, index=observed_rows, columns=columns)
+        shannon = DataFrame(np.nan, index=[self.EXPECTED_ROW], columns=columns)
+
+        for sample_id in sample_ids:
+            sample_counts = self._count_matrix.get_sample_counts(sample_positions[sample_id])
+            total = int(sample_counts.sum())
+            depths = np.array([depth for depth in self._depths if depth <= total], dtype=np.int64)
+            if depths.size == 0:
+                continue
+            values, multiplicities = np.unique(sample_counts, return_counts=True)
+            sample_columns = [(depth, sample_id) for depth in depths.tolist()]
+
+            mean, variance = self.expected_observed_features(values, multiplicities, total, depths)
+            observed.loc[self.EXPECTED_ROW, sample_columns] = mean
+            if self._with_variance:
+                sd = np.sqrt(variance)
+                observed.loc[self.LOWER_ROW, sample_columns] = mean - sd
+                observed.loc[self.UPPER_ROW, sample_columns] = mean + sd
+
+            shannon.loc[self.EXPECTED_ROW, sample_columns] = self.expected_shannon(
+                values, multiplicities, total, depths)
+
+        return {"observed_features": observed, "shannon": shannon}
+
+    def expected_observed_features(self, values: np.ndarray, multiplicities: np.ndarray,
+                                   total: int, depths: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Expected number of observed features (and its variance) for each depth.
+
+        :param values: unique non-zero feature counts of the sample
+        :param multiplicities: number of features having each count
+        :param total: sample size
+        :param depths: rarefaction depths (all lower or equal to ``total``)
+        """
+        # probability that a feature of count c is absent from the subsample, shape (values, depths)
+        absent = self._absence_probability(values[:, None], total, depths[None, :])
+        mean = (multiplicities[:, None] * (1 - absent)).sum(axis=0)
+
+        if not self._with_variance:
+            return mean, np.zeros_like(mean)
+
+        variance = (multiplicities[:, None] * absent * (1 - absent)).sum(axis=0)
+
+        # covariance of the absence of each ordered pair of distinct features
+        pair_weights = np.outer(multiplicities, multiplicities).astype(np.float64)
+        np.fill_diagonal(pair_weights, multiplicities * (multiplicities - 1))
+        pair_counts = values[:, None] + values[None, :]
+        for i, depth in enumerate(depths.tolist()):
+            joint_absent = self._absence_probability(pair_counts, total, depth)
+            covariance = joint_absent - np.outer(absent[:, i], absent[:, i])
+            variance[i] += (pair_weights * covariance).sum()
+
+        return mean, np.clip(variance, 0, None)
+
+    def expected_shannon(self, values: np.ndarray, multiplicities: np.ndarray,
+                         total: int, depths: np.ndarray) -> np.ndarray:
+        """Expected Shannon index (base 2) for each depth."""
+        result = np.empty(depths.size, dtype=np.float64)
+        for i, depth in enumerate(depths.tolist()):
+            # truncated support of the hypergeometric law of each unique count
+            expected_x = depth * values / total
+            sd = np.sqrt(depth * (values / total) * (1 - values / total) * (total - depth) / max(total - 1, 1))
+            lower = np.maximum(np.maximum(0, depth - (total - values)),
+                               np.floor(expected_x - self.PMF_TRUNCATION_SD * sd - 1)).astype(np.int64)
+            upper = np.minimum(np.minimum(values, depth),
+                               np.ceil(expected_x + self.PMF_TRUNCATION_SD * sd + 1)).astype(np.int64)
+            lower = np.maximum(lower, 1)  # x = 0 does not contribute to the index
+            sizes = np.maximum(upper - lower + 1, 0)
+
+            # flatten all the supports to evaluate the pmf in one call
+            owners = np.repeat(np.arange(values.size), sizes)
+            offsets = np.arange(owners.size) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+            x = lower[owners] + offsets
+
+            pmf = self._hypergeometric_pmf(x, values[owners], total, depth)
+            proportions = x / depth
+            contributions = pmf * proportions * np.log2(proportions)
+            result[i] = -(multiplicities[owners] * contributions).sum()
+        return result
+
+    @classmethod
+    def _hypergeometric_pmf(cls, x: np.ndarray, counts: np.ndarray, total: int, depth: int) -> np.ndarray:
+        """P(X = x) when drawing ``depth`` reads out of ``total``, ``counts`` of them being the feature."""
+        log_pmf = (cls._log_binomial(counts, x) + cls._log_binomial(total - counts, depth - x)
+                   - cls._log_binomial(total, depth))
+        return np.exp(log_pmf)
+
+    @staticmethod
+    def _log_binomial(n: np.ndarray | int, k: np.ndarray | int) -> np.ndarray:
+        return gammaln(n + 1) - gammaln(k + 1) - gammaln(n - k + 1)
+
+    @staticmethod
+    def _absence_probability(counts: np.ndarray, total: int, depth: np.ndarray | int) -> np.ndarray:
+        """C(total - counts, depth) / C(total, depth), 0 when the depth cannot avoid the features."""
+        remaining = total - counts
+        possible = remaining >= depth
+        safe_remaining = np.where(possible, remaining, depth)
+        log_probability = (gammaln(safe_remaining + 1) - gammaln(safe_remaining - depth + 1)
+                           - gammaln(total + 1) + gammaln(total - depth + 1))
+        return np.where(possible, np.exp(log_probability), 0.0)
@@ -2,9 +2,9 @@ import os
 
 import plotly.graph_objects as go
 from gws_core import (
+    BoolParam,
     ConfigParams,
     ConfigSpecs,
-    File,
     Folder,
     InputSpec,
     InputSpecs,
@@ -12,7 +12,7 @@ from gws_core import (
     OutputSpec,
     OutputSpecs,
     ResourceSet,
-    ShellProxy,
+    StrParam,
     Table,
     Task,
     TaskInputs,
@@ -20,10 +20,15 @@ from gws_core import (
     task_decorator,
 )
 from gws_core.impl.plotly.plotly_resource import PlotlyResource
-from numpy import nanquantile
+from pandas import DataFrame
 
 from ..base_env.qiime2_env_task import Qiime2ShellProxyHelper
-from .rarefaction_table import RarefactionTableImporter
+from ..dashboard_bundle.dashboard_bundle import DashboardBundle, DashboardBundleBuilder
+from ..diversity_engine.count_matrix import CountMatrix
+from .analytical_rarefaction import AnalyticalRarefaction
+from .rarefaction_curves import RarefactionCurves
+from .rarefaction_engine import RarefactionEngine
+from .rarefaction_plateau import RarefactionPlateauDetector
 
 
 @task_decorator("Qiime2RarefactionAnalysis", human_name="Q2RarefactionAnalysis",
@@ -32,18 +37,42 @@ class Qiime2RarefactionAnalysis(Task):
     """
     This task generates interactive alpha rarefaction curves by computing rarefactions between `min_coverage` and `max_coverage`. For Illumina sequencing with MiSeq sequencing platform, we recommand using 1,000 reads for `min_coverage` and 10,000 for `max_coverage`.
 
-    `iteration` refers as the number of rarefied feature tables to compute at each step. We recommand to use at least 10 iterations (default values).
+    `iteration` refers as the number of rarefied feature tables to compute at each step. We recommand to use at least 10 iterations (default values). The subsampling is done in-process: all the iterations of a sample are drawn at once and the samples are spread over `threads` worker processes. Observed features, Shannon index and Chao1 curves are computed in the same pass.
+
+    A Michaelis-Menten saturation model is fitted on the median observed features curve of each sample to detect its plateau. The `plateau_table` output gives, for each tested depth and for the recommended depth, the number of samples at their plateau and the samples that would be dropped when rarefying at this depth. The recommended depth can be used as `rarefaction_plateau_value` of the taxonomy task.
+
+    The curves are stored in long format (`*.rarefaction.tsv`), one row per sample-id, depth and iteration.
+
+    With `rarefaction_mode` set to `analytical`, no random subsampling is done: the exact expected observed features and Shannon index are computed at each depth from the hypergeometric law of the rarefied counts. `iteration` is then ignored and, if `variance_bands` is set, the observed features table contains the expected value +/- one standard deviation as iterations.
 
     """
-    OBSERVED_FEATURE_FILE = "observed_features.for_boxplot.csv"
-    SHANNON_INDEX_FILE = "shannon.for_boxplot.csv"
+    ITERATIVE_MODE = "iterative"
+    ANALYTICAL_MODE = "analytical"
+    OBSERVED_FEATURE_FILE = "observed_features.rarefaction.tsv"
+    SHANNON_INDEX_FILE = "shannon.rarefaction.tsv"
+    CHAO1_FILE = "chao1.rarefaction.tsv"
+
+    METRIC_FILES = {
+        "observed_features": OBSERVED_FEATURE_FILE,
+        "shannon": SHANNON_INDEX_FILE,
+        "chao1": CHAO1_FILE
+    }
+    METRIC_NAMES = {
+        "observed_features": "Observed features",
+        "shannon": "Shannon index",
+        "chao1": "Chao1 index"
+    }
 
     input_specs: InputSpecs = InputSpecs({
         'feature_frequency_folder': InputSpec(Folder)
     })
     output_specs: OutputSpecs = OutputSpecs({
         "rarefaction_table": OutputSpec(ResourceSet),
-        'result_folder': OutputSpec(Folder)
+        "plateau_table": OutputSpec(Table, human_name="Rarefaction plateau",
+                                    short_description="Recommended rarefaction depth and samples dropped at each candidate depth"),
+        'result_folder': OutputSpec(Folder),
+        'dashboard_bundle': OutputSpec(DashboardBundle, human_name="Dashboard bundle",
+                                       short_description="Compact preview of the results, read by the dashboard")
     })
     config_specs: ConfigSpecs = ConfigSpecs({
         "min_coverage": IntParam(default_value=20, min_value=20, short_description="Minimum number of reads to test"),
@@ -51,8 +80,17 @@ class Qiime2RarefactionAnalysis(Task):
         IntParam(
             min_value=20,
             short_description="Maximum number of reads to test. Near to median value of the previous sample frequencies is advised"),
-        "iteration": IntParam(default_value=10, min_value=10, short_description="Number of iteration for the rarefaction step")
-
+        "iteration": IntParam(default_value=10, min_value=10, short_description="Number of iteration for the rarefaction step"),
+        "rarefaction_mode": StrParam(
+            default_value="iterative", allowed_values=["iterative", "analytical"],
+            short_description="'iterative': random subsampling, 'analytical': exact expected curves"),
+        "variance_bands": BoolParam(
+            default_value=True, visibility=BoolParam.PROTECTED_VISIBILITY,
+            short_description="In analytical mode, add the +/- one standard deviation band of the observed features"),
+        "threads": IntParam(default_value=2, min_value=1, short_description="Number of worker processes"),
+        "random_seed": IntParam(
+            optional=True, visibility=IntParam.PROTECTED_VISIBILITY,
+            short_description="Seed of the random subsampling, set it to get reproducible curves")
     })
 
     def run(self, params: ConfigParams, inputs: TaskInputs) -> TaskOutputs:
@@ -61,107 +99,90 @@ class Qiime2RarefactionAnalysis(Task):
         min_depth = params["min_coverage"]
         max_depth = params["max_coverage"]
         iteration_number = params["iteration"]
-        script_file_dir = os.path.dirname(os.path.realpath(__file__))
 
         shell_proxy = Qiime2ShellProxyHelper.create_proxy(
             self.message_dispatcher)
 
-        outputs = self.run_cmd_lines(shell_proxy,
-                                     script_file_dir,
-                                     feature_frequency_folder_path,
-                                     min_depth,
-                                     max_depth,
-                                     iteration_number
-                                     )
+        self.log_info_message("Exporting the feature table")
+        count_matrix = CountMatrix.from_tsv(Qiime2ShellProxyHelper.export_feature_table(
+            shell_proxy,
+            os.path.join(feature_frequency_folder_path, "table.qza"),
+            os.path.join(shell_proxy.working_dir, "feature-table.tsv")))
+        self.update_progress_value(10, "[Step-1] : Done")
+
+        depths = AnalyticalRarefaction.get_depths(min_depth, max_depth)
+        if params["rarefaction_mode"] == self.ANALYTICAL_MODE:
+            self.log_info_message("Computing the expected rarefaction curves")
+            curves = AnalyticalRarefaction(count_matrix, depths, params["variance_bands"]).compute()
+        else:
+            self.log_info_message("Rarefying the feature table")
+            engine = RarefactionEngine(count_matrix, depths, iteration_number,
+                                       workers=params["threads"], seed=params["random_seed"])
+            curves = engine.compute(
+                lambda value, message: self.update_progress_value(10 + 0.8 * value, message))
+        self.update_progress_value(90, "[Step-2] : Done")
 
         # Output formating and annotation
 
-        annotated_outputs = self.outputs_annotation(outputs, params)
-
-        return annotated_outputs
-
-    def run_cmd_lines(self, shell_proxy: ShellProxy,
-                      script_file_dir: str,
-                      feature_frequency_folder_path: str,
-                      min_depth: int,
-                      max_depth: int,
-                      iteration_number: int
-                      ) -> str:
-
-        cmd_1 = [
-            " bash ",
-            os.path.join(script_file_dir, "./sh/1_qiime2_rarefaction.sh"),
-            feature_frequency_folder_path,
-            min_depth,
-            max_depth,
-            iteration_number
-        ]
-        self.log_info_message("Qiime2 rarefaction step")
-        res = shell_proxy.run(cmd_1)
-        if res != 0:
-            raise Exception("First step did not finished")
-        self.update_progress_value(90, "[Step-1] : Done")
-
-        # This script perform Qiime2 demux , quality assessment
-        cmd_2 = [
-            "bash",
-            os.path.join(script_file_dir,
-                         "./sh/2_converting_table_for_visualisation.sh"),
-            os.path.join(script_file_dir,
-                         "./perl/3_transform_table_for_boxplot.pl")
-        ]
-        self.log_info_message("Formating output files for data visualisation")
-        res = shell_proxy.run(cmd_2)
-        if res != 0:
-            raise Exception("Second step did not finished")
-        self.update_progress_value(100, "[Step-2] : Done")
-
         output_folder_path = os.path.join(
             shell_proxy.working_dir, "rarefaction_curves_analysis")
+        os.makedirs(output_folder_path, exist_ok=True)
+        long_curves = {metric: RarefactionCurves.from_wide(metric_curves)
+                       for metric, metric_curves in curves.items()}
+        for metric, metric_curves in long_curves.items():
+            metric_curves.to_csv(os.path.join(output_folder_path, self.METRIC_FILES[metric]),
+                                 sep="\t", index=False)
+
+        annotated_outputs = self.outputs_annotation(output_folder_path, long_curves)
+
+        self.log_info_message("Detecting the rarefaction plateau")
+        plateau_detector = RarefactionPlateauDetector(
+            RarefactionCurves.get_median_curves(long_curves["observed_features"]),
+            dict(zip(count_matrix.sample_ids, count_matrix.sample_totals.tolist())))
+        sample_plateaus = Table(plateau_detector.get_sample_plateaus())
+        sample_plateaus.name = "Rarefaction plateau per sample"
+        annotated_outputs["rarefaction_table"].add_resource(sample_plateaus)
+
+        plateau_table = Table(plateau_detector.get_depth_trade_off(depths))
+        plateau_table.name = "Rarefaction plateau"
+        annotated_outputs["plateau_table"] = plateau_table
+
+        # plot-ready median curves (one row per sample, one column per depth) instead of the long tables
+        bundle_builder = DashboardBundleBuilder()
+        for metric, metric_curves in long_curves.items():
+            bundle_builder.add_table("rarefaction_table", f"{self.METRIC_NAMES[metric]} median curves",
+                                     RarefactionCurves.get_median_curves(metric_curves), sample=True)
+        bundle_builder.add_table("rarefaction_table", sample_plateaus.name, sample_plateaus.get_data())
+        bundle_builder.add_resource("plateau_table", plateau_table)
+        bundle_builder.add_stats({"sample_count": len(count_matrix.sample_ids), "depth_count": len(depths)})
+        annotated_outputs["dashboard_bundle"] = bundle_builder.build()
+        self.update_progress_value(100, "[Step-3] : Done")
 
-        return output_folder_path
+        return annotated_outputs
 
-    def outputs_annotation(self, output_folder_path: str, params: ConfigParams) -> TaskOutputs:
+    def outputs_annotation(self, output_folder_path: str, long_curves: dict[str, DataFrame]) -> TaskOutputs:
 
         result_folder = Folder(output_folder_path)
 
-        observed_path = os.path.join(
-            result_folder.path, self.OBSERVED_FEATURE_FILE)
-        shannon_path = os.path.join(
-            result_folder.path, self.SHANNON_INDEX_FILE)
-
-        observed_feature_table = RarefactionTableImporter.call(
-            File(path=observed_path),
-            {'delimiter': 'tab', "index_column": 0})
-        observed_feature_table.name = "Observed features"
-
-        shannon_index_table = RarefactionTableImporter.call(
-            File(path=shannon_path),
-            {'delimiter': 'tab', "index_column": 0})
-        shannon_index_table.name = "Shannon index"
-
-        observed_feature_table_lineplot: PlotlyResource = self.plotly_lineplot(observed_feature_table)
-
-        observed_feature_table_lineplot.name = "Observed features Lineplot"
-
-        shannon_index_table_lineplot: PlotlyResource = self.plotly_lineplot(shannon_index_table)
-
-        shannon_index_table_lineplot.name = "Shannon index Lineplot"
-
         resource_table: ResourceSet = ResourceSet()
         resource_table.name = "Rarefaction tables"
 
-        resource_table.add_resource(observed_feature_table)
-        resource_table.add_resource(observed_feature_table_lineplot)
-        resource_table.add_resource(shannon_index_table)
-        resource_table.add_resource(shannon_index_table_lineplot)
+        for metric, metric_curves in long_curves.items():
+            table = Table(metric_curves)
+            table.name = self.METRIC_NAMES[metric]
+
+            lineplot: PlotlyResource = self.plotly_lineplot(metric_curves)
+            lineplot.name = f"{self.METRIC_NAMES[metric]} Lineplot"
+
+            resource_table.add_resource(table)
+            resource_table.add_resource(lineplot)
 
         return {"result_folder": result_folder,
                 "rarefaction_table": resource_table}
 
-    def plotly_lineplot(self, table: Table) -> PlotlyResource:
-        column_tags = table.get_column_tags()
-        all_sample_ids = list(set([tag["sample-id"] for tag in column_tags]))
+    def plotly_lineplot(self, long_curves: DataFrame) -> PlotlyResource:
+        # median of all the sample curves in one pass, one row per sample, one column per depth
+        median_curves = RarefactionCurves.get_median_curves(long_curves)
 
         fig = go.Figure()
 
@@ -172,22 +193,14 @@ class Qiime2RarefactionAnalysis(Task):
         ]
 
         # Collect all unique depth positions for x-axis ticks
-        all_positions = sorted(set(float(tag["depth"]) for tag in column_tags))
-
-        for idx, sample_id in enumerate(all_sample_ids):
-            sample_table = table.select_by_column_tags(
-                [{"sample-id": sample_id}])
-            sample_column_tags = sample_table.get_column_tags()
-            positions = [float(tag["depth"]) for tag in sample_column_tags]
-            sample_data = sample_table.get_data()
-
-            quantile = nanquantile(sample_data.to_numpy(), q=[
-                0.25, 0.5, 0.75], axis=0)
-            median = quantile[1, :].tolist()
+        all_positions = [float(depth) for depth in median_curves.columns]
+
+        for idx, (sample_id, median) in enumerate(median_curves.iterrows()):
+            median = median.dropna()
             color = colors[idx % len(colors)]
             fig.add_trace(go.Scatter(
-                y=median,
-                x=positions,
+                y=median.tolist(),
+                x=[float(depth) for depth in median.index],
                 mode='lines+markers',
                 name=sample_id,
                 line=dict(color=color),
@@ -0,0 +1,54 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+from pandas import DataFrame, MultiIndex
+
+
+class RarefactionCurves:
+    """
+    Reshaping of rarefaction curves.
+
+    Curves are stored in long format, one row per (sample-id, depth, iteration) with the metric in
+    the ``value`` column, so that all the sample curves are summarised with a single groupby.
+    """
+
+    SAMPLE_COLUMN = "sample-id"
+    DEPTH_COLUMN = "depth"
+    ITERATION_COLUMN = "iteration"
+    VALUE_COLUMN = "value"
+
+    @classmethod
+    def from_wide(cls, curves: DataFrame) -> DataFrame:
+        """
+        Convert curves with one row per iteration and columns indexed by (depth, sample-id).
+
+        Missing values (depths greater than the sample size) are dropped.
+        """
+        long = curves.rename_axis(index=cls.ITERATION_COLUMN).melt(
+            value_name=cls.VALUE_COLUMN, ignore_index=False).reset_index()
+        long = long.dropna(subset=[cls.VALUE_COLUMN])
+        long = long.sort_values([cls.SAMPLE_COLUMN, cls.DEPTH_COLUMN], kind="stable")
+        return long[[cls.SAMPLE_COLUMN, cls.DEPTH_COLUMN, cls.ITERATION_COLUMN, cls.VALUE_COLUMN]] \
+            .reset_index(drop=True)
+
+    @classmethod
+    def from_tagged_table(cls, data: DataFrame, column_tags: list[dict]) -> DataFrame:
+        """Convert a legacy table whose columns are tagged with their depth and sample-id."""
+        wide = data.copy()
+        wide.columns = MultiIndex.from_tuples(
+            [(float(tags.get(cls.DEPTH_COLUMN, "nan")), tags.get(cls.SAMPLE_COLUMN)) for tags in column_tags],
+            names=[cls.DEPTH_COLUMN, cls.SAMPLE_COLUMN])
+        return cls.from_wide(wide)
+
+    @classmethod
+    def get_quantiles(cls, long: DataFrame, quantiles: list[float]) -> DataFrame:
+        """Quantiles of each (sample-id, depth) over the iterations, one column per quantile."""
+        return long.groupby([cls.SAMPLE_COLUMN, cls.DEPTH_COLUMN])[cls.VALUE_COLUMN] \
+            .quantile(quantiles).unstack()
+
+    @classmethod
+    def get_median_curves(cls, long: DataFrame) -> DataFrame:
+        """Median curve of each sample: one row per sample-id, one column per depth."""
+        medians = long.groupby([cls.SAMPLE_COLUMN, cls.DEPTH_COLUMN])[cls.VALUE_COLUMN].median()
+        return medians.unstack(cls.DEPTH_COLUMN)
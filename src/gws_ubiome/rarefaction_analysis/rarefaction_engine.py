@@ -0,0 +1,104 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+import numpy as np
+from pandas import DataFrame, MultiIndex
+
+from ..diversity_engine.count_matrix import CountMatrix
+
+
+def _rarefy_sample(sample_counts: np.ndarray, depths: list[int], iterations: int,
+                   seed: np.random.SeedSequence) -> dict[str, np.ndarray]:
+    """
+    Rarefy one sample ``iterations`` times at each depth and compute its alpha diversity metrics.
+
+    :return: one (iterations x depths) array per metric, NaN for the depths greater than the sample size
+    """
+    generator = np.random.default_rng(seed)
+    total = int(sample_counts.sum())
+    metrics = {metric: np.full((iterations, len(depths)), np.nan) for metric in RarefactionEngine.METRICS}
+
+    for i, depth in enumerate(depths):
+        if depth > total:
+            continue
+        # all the iterations of the depth in one draw, shape (iterations, features)
+        rarefied = generator.multivariate_hypergeometric(
+            sample_counts, depth, size=iterations, method="marginals")
+
+        metrics["observed_features"][:, i] = (rarefied > 0).sum(axis=1)
+
+        proportions = rarefied / depth
+        with np.errstate(divide="ignore", invalid="ignore"):
+            entropy_terms = np.where(rarefied > 0, proportions * np.log2(proportions), 0.0)
+        metrics["shannon"][:, i] = -entropy_terms.sum(axis=1)
+
+        # bias-corrected Chao1, as the skbio default used by qiime diversity alpha
+        singletons = (rarefied == 1).sum(axis=1)
+        doubletons = (rarefied == 2).sum(axis=1)
+        metrics["chao1"][:, i] = metrics["observed_features"][:, i] + \
+            singletons * (singletons - 1) / (2 * (doubletons + 1))
+
+    return metrics
+
+
+class RarefactionEngine:
+    """
+    In-process rarefaction: multivariate hypergeometric subsampling of the count matrix.
+
+    All the iterations of a (sample, depth) are drawn in a single vectorised call and the samples are
+    spread over a process pool. Each sample gets its own random stream spawned from the seed, so the
+    results do not depend on the number of workers.
+    """
+
+    METRICS = ["observed_features", "shannon", "chao1"]
+
+    _count_matrix: CountMatrix
+    _depths: list[int]
+    _iterations: int
+    _workers: int
+    _seed: int | None
+
+    def __init__(self, count_matrix: CountMatrix, depths: list[int], iterations: int,
+                 workers: int = 1, seed: int | None = None) -> None:
+        self._count_matrix = count_matrix
+        self._depths = depths
+        self._iterations = iterations
+        self._workers = max(workers, 1)
+        self._seed = seed
+
+    def compute(self, update_progress: Callable[[float, str], None] | None = None) -> dict[str, DataFrame]:
+        """
+        :param update_progress: called with the percentage of processed samples
+        :return: one table per metric, rows ``iter-1`` ... ``iter-N`` and columns indexed by (depth, sample-id)
+        """
+        sample_ids = sorted(self._count_matrix.sample_ids)
+        sample_positions = {sample_id: i for i, sample_id in enumerate(self._count_matrix.sample_ids)}
+        seeds = np.random.SeedSequence(self._seed).spawn(len(sample_ids))
+
+        results: dict[str, dict[str, np.ndarray]] = {}
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            futures = {}
+            for sample_id, seed in zip(sample_ids, seeds):
+                sample_counts = self._count_matrix.get_sample_counts(sample_positions[sample_id])
+                futures[sample_id] = executor.submit(
+                    _rarefy_sample, sample_counts, self._depths, self._iterations, seed)
+
+            for i, (sample_id, future) in enumerate(futures.items()):
+                results[sample_id] = future.result()
+                if update_progress:
+                    update_progress(100 * (i + 1) / len(sample_ids), f"Rarefied sample {sample_id}")
+
+        columns = MultiIndex.from_product([self._depths, sample_ids], names=["depth", "sample-id"])
+        index = [f"iter-{i + 1}" for i in range(self._iterations)]
+
+        tables = {}
+        for metric in self.METRICS:
+            # (iterations, samples, depths) -> (iterations, depths, samples) to match the column order
+            values = np.stack([results[sample_id][metric] for sample_id in sample_ids], axis=1)
+            values = values.transpose(0, 2, 1).reshape(self._iterations, -1)
+            tables[metric] = DataFrame(values, index=index, columns=columns)
+        return tables
@@ -0,0 +1,113 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import numpy as np
+from pandas import DataFrame, Series
+from scipy.optimize import curve_fit
+
+
+class RarefactionPlateauDetector:
+    """
+    Recommend a rarefaction depth from the observed features curves.
+
+    A Michaelis-Menten model ``S(n) = s_max * n / (k + n)`` is fitted on the median curve of each
+    sample. The sample reaches its plateau at the depth where ``S(n) = SATURATION * s_max``, i.e.
+    ``n = k * SATURATION / (1 - SATURATION)``. When the fit fails, the plateau is the first depth where
+    the curve increases by less than ``SLOPE_THRESHOLD`` (relative increase) until the next depth.
+
+    The recommended depth is the median plateau of the samples, lowered if needed so that at most
+    ``MAX_DROPPED_SAMPLES_FRACTION`` of the samples have less reads than the depth.
+    """
+
+    SATURATION = 0.9
+    SLOPE_THRESHOLD = 0.01
+    MAX_DROPPED_SAMPLES_FRACTION = 0.1
+    MIN_DEPTH = 20
+
+    _median_curves: DataFrame
+    _sample_totals: dict[str, int]
+
+    def __init__(self, median_curves: DataFrame, sample_totals: dict[str, int]) -> None:
+        """
+        :param median_curves: median observed features curves, one row per sample-id, one column per depth
+        :param sample_totals: number of reads of each sample
+        """
+        self._median_curves = median_curves
+        self._sample_totals = sample_totals
+
+    def get_sample_plateaus(self) -> DataFrame:
+        """Fit the model on the median curve of each sample."""
+        rows = []
+        for sample_id, sample_median in self._median_curves.iterrows():
+            sample_median = sample_median.dropna()
+            depths = sample_median.index.to_numpy(dtype=np.float64)
+            values = sample_median.to_numpy(dtype=np.float64)
+            s_max, half_saturation, plateau_depth, method = self._fit_sample(depths, values)
+            rows.append({
+                "sample-id": sample_id,
+                "total_reads": self._sample_totals.get(sample_id),
+                "max_observed_features": s_max,
+                "half_saturation_depth": half_saturation,
+                "plateau_depth": plateau_depth,
+                "method": method
+            })
+        return DataFrame(rows).set_index("sample-id")
+
+    def get_depth_trade_off(self, candidate_depths: list[int]) -> DataFrame:
+        """
+        Number of samples at their plateau and of dropped samples at each candidate depth and at the
+        recommended depth (flagged in the ``recommended`` column).
+        """
+        sample_plateaus = self.get_sample_plateaus()
+        recommended_depth = self.get_recommended_depth(sample_plateaus)
+        totals = Series(self._sample_totals, dtype=np.int64)
+
+        rows = []
+        for depth in sorted(set(candidate_depths) | {recommended_depth}):
+            dropped = sorted(totals[totals < depth].index.tolist())
+            rows.append({
+                "depth": depth,
+                "samples_at_plateau": int((sample_plateaus["plateau_depth"] <= depth).sum()),
+                "samples_kept": len(totals) - len(dropped),
+                "samples_dropped": len(dropped),
+                "dropped_samples": ", ".join(dropped),
+                "recommended": depth == recommended_depth
+            })
+        return DataFrame(rows)
+
+    def get_recommended_depth(self, sample_plateaus: DataFrame) -> int:
+        plateaus = sample_plateaus["plateau_depth"].dropna()
+        if plateaus.empty:
+            depth = float(np.median(list(self._sample_totals.values())))
+        else:
+            depth = float(plateaus.median())
+
+        # do not drop more than MAX_DROPPED_SAMPLES_FRACTION of the samples
+        totals = np.sort(np.array(list(self._sample_totals.values()), dtype=np.float64))
+        if totals.size > 0:
+            max_dropped = int(np.floor(self.MAX_DROPPED_SAMPLES_FRACTION * totals.size))
+            depth = min(depth, totals[max_dropped])
+        return max(int(round(depth)), self.MIN_DEPTH)
+
+    def _fit_sample(self, depths: np.ndarray, values: np.ndarray) -> tuple[float, float, float, str]:
+        if depths.size >= 3 and values[-1] > 0:
+            try:
+                (s_max, half_saturation), _ = curve_fit(
+                    self._michaelis_menten, depths, values,
+                    p0=[values[-1], np.median(depths)], bounds=(0, np.inf))
+                plateau_depth = half_saturation * self.SATURATION / (1 - self.SATURATION)
+                return float(s_max), float(half_saturation), float(plateau_depth), "michaelis-menten"
+            except (RuntimeError, ValueError):
+                pass
+
+        # slope threshold on the raw curve
+        for i in range(depths.size - 1):
+            if values[i] > 0 and (values[i + 1] - values[i]) / values[i] < self.SLOPE_THRESHOLD:
+                return float(values.max()), np.nan, float(depths[i]), "slope"
+        # the curve does not flatten on the tested depths
+        return float(values.max()), np.nan, np.nan, "not reached"
+
+    @staticmethod
+    def _michaelis_menten(depth: np.ndarray, s_max: float, half_saturation: float) -> np.ndarray:
+        return s_max * depth / (half_saturation + depth)
@@ -13,9 +13,10 @@ from gws_core import (
     resource_decorator,
     view,
 )
-from numpy import nanquantile
 from pandas import DataFrame
 
+from .rarefaction_curves import RarefactionCurves
+
 
 @resource_decorator(unique_name="RarefactionTable", hide=True,
                     deprecated=TypingDeprecated(deprecated_since="0.7.0", deprecated_message="Use Table instead"))
@@ -30,26 +31,21 @@ class RarefactionTable(Table):
           default_view=True)
     def view_as_lineplot(self, params: ConfigParams) -> LinePlot2DView:
         lp_view = LinePlot2DView()
-        column_tags = self.get_column_tags()
-        all_sample_ids = list(set([tag["sample-id"] for tag in column_tags]))
-
-        for sample_id in all_sample_ids:
-            sample_table = self.select_by_column_tags([{"sample-id": sample_id}])
-            sample_column_tags = sample_table.get_column_tags()
-            positions = [float(tag["depth"]) for tag in sample_column_tags]
-
-            sample_data = sample_table.get_data()
-
-            quantile = nanquantile(sample_data.to_numpy(), q=[0.25, 0.5, 0.75], axis=0)
-            median = quantile[1, :].tolist()
-            lp_view.add_series(x=positions, y=median, name=sample_id, tags=sample_column_tags)
+        long_curves = RarefactionCurves.from_tagged_table(self.get_data(), self.get_column_tags())
+        median_curves = RarefactionCurves.get_median_curves(long_curves)
+
+        for sample_id, median in median_curves.iterrows():
+            median = median.dropna()
+            positions = [float(depth) for depth in median.index]
+            tags = [{"depth": depth, "sample-id": sample_id} for depth in positions]
+            lp_view.add_series(x=positions, y=median.tolist(), name=sample_id, tags=tags)
         lp_view.x_label = "Count depth"
         lp_view.y_label = "Index value"
-#        lp_view.y_label = "Shannon index" if self.get_default_name() == "rarefaction_shannon" else "Observed features value"
 
         return lp_view
 
 
+# Importer of the legacy rarefaction files, whose column names are JSON encoded tags
 @importer_decorator(unique_name="RarefactionTableImporter", human_name="Rarefaction Table importer",
                     target_type=Table, supported_extensions=Table.ALLOWED_FILE_FORMATS, hide=True)
 class RarefactionTableImporter(TableImporter):
@@ -63,7 +59,7 @@ class RarefactionTableImporter(TableImporter):
         for column_name in dataframe:
             try:
                 tags = loads(column_name)
-            except:
+            except (ValueError, TypeError):
                 tags = {}
             column_tags.append(tags)
 
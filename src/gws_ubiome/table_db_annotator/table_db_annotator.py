@@ -23,6 +23,7 @@ from gws_core import (
 from gws_core.impl.plotly.plotly_resource import PlotlyResource
 
 from ..base_env.qiime2_env_task import Qiime2ShellProxyHelper
+from ..dashboard_bundle.dashboard_bundle import DashboardBundle, DashboardBundleBuilder
 
 
 @task_decorator("Qiime2TableDbAnnotator", human_name="Qiime2 taxa composition annotator",
@@ -65,7 +66,9 @@ class Qiime2TableDbAnnotator(Task):
         'relative_abundance_table': OutputSpec(Table, human_name="Relative_Abundance_Annotated_Table"),
         'relative_abundance_plotly_resource': OutputSpec(PlotlyResource, human_name="Relative_Abundance_Annotated_Plotly_Resource"),
         'absolute_abundance_table': OutputSpec(Table, human_name="Absolute_Abundance_Annotated_Table"),
-        'absolute_abundance_plotly_resource': OutputSpec(PlotlyResource, human_name="Absolute_Abundance_Annotated_Plotly_Resource")
+        'absolute_abundance_plotly_resource': OutputSpec(PlotlyResource, human_name="Absolute_Abundance_Annotated_Plotly_Resource"),
+        'dashboard_bundle': OutputSpec(DashboardBundle, human_name="Dashboard bundle",
+                                       short_description="Compact preview of the results, read by the dashboard")
     })
 
     def run(self, params: ConfigParams, inputs: TaskInputs) -> TaskOutputs:
@@ -85,6 +88,10 @@ class Qiime2TableDbAnnotator(Task):
                                params
                                )
 
+        bundle_builder = DashboardBundleBuilder()
+        bundle_builder.add_outputs(outputs)
+        outputs["dashboard_bundle"] = bundle_builder.build()
+
         return outputs
 
     def run_cmd(self, shell_proxy: ShellProxy,
@@ -0,0 +1,159 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+# Warm taxonomy classifier, run in the Qiime2 environment.
+#
+#   python3 _classifier_worker.py classify <pipeline_dir> <fasta> <output_tsv> <idle_timeout>
+#
+# sends the classification of the fasta to the worker of the pipeline, starting it if it is not running.
+# The worker loads the sklearn pipeline once and serves the classification requests of all the tasks
+# of the node until it stays idle for <idle_timeout> seconds.
+#
+# The worker listens on an abstract unix socket (no file). Its key, lock and pid files are written next
+# to the pipeline, in the classifier store, and are named after the host when the store is shared.
+
+import fcntl
+import hashlib
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, answer_challenge, deliver_challenge
+
+# classify-sklearn parameters, as in 2_qiime2_taxonomic_assignment.sh
+CONFIDENCE = 0.7
+READ_ORIENTATION = "auto"
+START_TIMEOUT = 3600
+
+
+def get_worker_files(pipeline_dir):
+    """Return the socket address, and the key, lock and pid files of the worker of the pipeline."""
+    pipeline_dir = os.path.abspath(pipeline_dir)
+    host = socket.gethostname()
+    name = hashlib.sha1(f"{host}:{pipeline_dir}".encode("utf-8")).hexdigest()[:16]
+    base_path = os.path.join(os.path.dirname(pipeline_dir), f".classifier_worker.{host}")
+    return "\0gws_ubiome_classifier_" + name, base_path + ".key", base_path + ".lock", base_path + ".pid"
+
+
+def get_worker_pid(pipeline_dir):
+    """Pid of the running worker of the pipeline, None if it is not running."""
+    _, _, _, pid_path = get_worker_files(pipeline_dir)
+    try:
+        with open(pid_path, encoding="utf-8") as pid_file:
+            pid = int(pid_file.read())
+        os.kill(pid, 0)
+    except (OSError, ValueError):
+        return None
+    return pid
+
+
+def read_authkey(key_path):
+    with open(key_path, "rb") as key_file:
+        return key_file.read()
+
+
+def request(pipeline_dir, fasta_path, output_path):
+    address, key_path, _, _ = get_worker_files(pipeline_dir)
+    connection = Client(address, family="AF_UNIX", authkey=read_authkey(key_path))
+    try:
+        connection.send({"fasta": os.path.abspath(fasta_path), "output": os.path.abspath(output_path)})
+        error = connection.recv()
+    finally:
+        connection.close()
+    if error:
+        raise Exception(error)
+
+
+def classify(pipeline_dir, fasta_path, output_path, idle_timeout):
+    _, _, lock_path, pid_path = get_worker_files(pipeline_dir)
+    try:
+        request(pipeline_dir, fasta_path, output_path)
+        return
+    except (OSError, EOFError, AuthenticationError):
+        pass
+
+    # no worker, start one (only one task starts it)
+    with open(lock_path, "w", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                request(pipeline_dir, fasta_path, output_path)
+                return
+            except (OSError, EOFError, AuthenticationError):
+                pass
+            if os.path.exists(pid_path):
+                os.remove(pid_path)
+            worker = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", pipeline_dir, str(idle_timeout)],
+                                      start_new_session=True, stdin=subprocess.DEVNULL,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            start = time.time()
+            # the pid file is written once the worker listens
+            while not os.path.exists(pid_path):
+                if worker.poll() is not None or time.time() - start > START_TIMEOUT:
+                    raise Exception("The classifier worker did not start")
+                time.sleep(1)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    request(pipeline_dir, fasta_path, output_path)
+
+
+def serve(pipeline_dir, idle_timeout):
+    import joblib
+    from q2_feature_classifier.classifier import classify_sklearn
+    from q2_types.feature_data import DNAFASTAFormat
+
+    address, key_path, _, pid_path = get_worker_files(pipeline_dir)
+    pipeline = joblib.load(os.path.join(pipeline_dir, "sklearn_pipeline.pkl"))
+
+    authkey = secrets.token_bytes(32)
+    with open(os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as key_file:
+        key_file.write(authkey)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(address)
+    listener.listen()
+    listener.settimeout(idle_timeout)
+    with open(pid_path, "w", encoding="utf-8") as pid_file:
+        pid_file.write(str(os.getpid()))
+    try:
+        while True:
+            try:
+                client_socket, _ = listener.accept()
+            except socket.timeout:
+                # idle timeout
+                break
+            client_socket.settimeout(None)
+            # the handshake of multiprocessing.connection.Listener.accept
+            connection = Connection(client_socket.detach())
+            try:
+                deliver_challenge(connection, authkey)
+                answer_challenge(connection, authkey)
+                message = connection.recv()
+                error = None
+                try:
+                    taxonomy = classify_sklearn(DNAFASTAFormat(message["fasta"], mode="r"), pipeline,
+                                                confidence=CONFIDENCE, read_orientation=READ_ORIENTATION)
+                    taxonomy.to_csv(message["output"], sep="\t", index_label="Feature ID")
+                except Exception as exception:
+                    error = "Classification failed: " + str(exception)
+                connection.send(error)
+            except (OSError, EOFError, AuthenticationError):
+                pass
+            finally:
+                connection.close()
+    finally:
+        # removed before closing the socket, they never belong to a worker started meanwhile
+        for path in [pid_path, key_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        listener.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == "serve":
+        serve(sys.argv[2], float(sys.argv[3]))
+    else:
+        classify(sys.argv[2], sys.argv[3], sys.argv[4], float(sys.argv[5]))
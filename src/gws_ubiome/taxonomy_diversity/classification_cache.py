@@ -0,0 +1,177 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import hashlib
+import os
+import sqlite3
+import zipfile
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from pandas import DataFrame, read_csv
+
+
+def read_fasta(path: str) -> dict[str, str]:
+    """Read a fasta file, sequences by id."""
+    with open(path, encoding="utf-8") as fasta_file:
+        return _parse_fasta(fasta_file)
+
+
+def _parse_fasta(lines: Iterable[str]) -> dict[str, str]:
+    sequences = {}
+    current_id = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith(">"):
+            current_id = line[1:].split()[0]
+            sequences[current_id] = []
+        elif current_id is not None and line:
+            sequences[current_id].append(line)
+    return {sequence_id: "".join(parts) for sequence_id, parts in sequences.items()}
+
+
+def read_qza_sequences(path: str) -> dict[str, str]:
+    """Read the sequences of a Qiime2 ``FeatureData[Sequence]`` artifact (e.g. rep-seqs.qza), by feature id."""
+    with zipfile.ZipFile(path) as archive:
+        fasta_files = [name for name in archive.namelist() if name.endswith("/data/dna-sequences.fasta")]
+        if not fasta_files:
+            raise Exception(f"No sequences found in the artifact '{path}'")
+        with archive.open(fasta_files[0]) as fasta_file:
+            return _parse_fasta(line.decode("utf-8") for line in fasta_file)
+
+
+def write_fasta(path: str, sequences: dict[str, str]) -> None:
+    with open(path, "w", encoding="utf-8") as fasta_file:
+        for sequence_id, sequence in sequences.items():
+            fasta_file.write(f">{sequence_id}\n{sequence}\n")
+
+
+class ClassificationCache:
+    """
+    Persistent store of ASV taxonomic classifications, in a SQLite file shared by the runs.
+
+    - ``classifications``: result of the classifier for an ASV, keyed on (sequence hash, database,
+      classifier parameters)
+    - ``reference_sequences``: taxonomy of the reference sequences of a database, by sequence hash,
+      used to resolve the ASVs identical to a reference sequence without running the classifier.
+      When several reference sequences are identical, the ASV gets their common taxonomy.
+    """
+
+    FILE_NAME = "classification_cache.sqlite"
+    # SQLite limit of the number of variables of a query
+    QUERY_CHUNK_SIZE = 900
+    EXACT_MATCH_CONFIDENCE = 1.0
+
+    _path: str
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS classifications ("
+                "sequence_hash TEXT NOT NULL, database TEXT NOT NULL, classifier_params TEXT NOT NULL, "
+                "taxon TEXT NOT NULL, confidence REAL, "
+                "PRIMARY KEY (sequence_hash, database, classifier_params))")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS reference_sequences ("
+                "sequence_hash TEXT NOT NULL, database TEXT NOT NULL, taxon TEXT NOT NULL, "
+                "PRIMARY KEY (sequence_hash, database, taxon))")
+
+    @staticmethod
+    def hash_sequence(sequence: str) -> str:
+        return hashlib.sha256(sequence.strip().upper().encode("utf-8")).hexdigest()
+
+    def get_classifications(self, sequence_hashes: list[str], database: str,
+                            classifier_params: str) -> dict[str, tuple[str, float]]:
+        """Cached (taxon, confidence) of the sequences classified before with the same database and parameters."""
+        found = {}
+        with self._connect() as connection:
+            for chunk in self._chunks(sequence_hashes):
+                rows = connection.execute(
+                    "SELECT sequence_hash, taxon, confidence FROM classifications "
+                    f"WHERE database = ? AND classifier_params = ? AND sequence_hash IN ({self._placeholders(chunk)})",
+                    [database, classifier_params, *chunk])
+                found.update({sequence_hash: (taxon, confidence) for sequence_hash, taxon, confidence in rows})
+        return found
+
+    def set_classifications(self, classifications: dict[str, tuple[str, float]], database: str,
+                            classifier_params: str) -> None:
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO classifications VALUES (?, ?, ?, ?, ?)",
+                [(sequence_hash, database, classifier_params, taxon, confidence)
+                 for sequence_hash, (taxon, confidence) in classifications.items()])
+
+    def has_reference(self, database: str) -> bool:
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT 1 FROM reference_sequences WHERE database = ? LIMIT 1", [database]).fetchone() is not None
+
+    def import_reference(self, database: str, fasta_path: str, taxonomy_path: str) -> None:
+        """
+        Import the reference sequences of a database.
+
+        :param taxonomy_path: tab separated file without header: sequence id, taxonomy
+        """
+        sequences = read_fasta(fasta_path)
+        taxonomy = read_csv(taxonomy_path, sep="\t", header=None, index_col=0, dtype=str).iloc[:, 0]
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO reference_sequences VALUES (?, ?, ?)",
+                [(self.hash_sequence(sequence), database, taxonomy[sequence_id].strip())
+                 for sequence_id, sequence in sequences.items() if sequence_id in taxonomy.index])
+
+    def get_exact_matches(self, sequence_hashes: list[str], database: str) -> dict[str, tuple[str, float]]:
+        """(taxon, confidence) of the sequences identical to reference sequences of the database."""
+        taxa: dict[str, list[str]] = {}
+        with self._connect() as connection:
+            for chunk in self._chunks(sequence_hashes):
+                rows = connection.execute(
+                    "SELECT sequence_hash, taxon FROM reference_sequences "
+                    f"WHERE database = ? AND sequence_hash IN ({self._placeholders(chunk)})",
+                    [database, *chunk])
+                for sequence_hash, taxon in rows:
+                    taxa.setdefault(sequence_hash, []).append(taxon)
+        return {sequence_hash: (self.get_consensus(sequence_taxa), self.EXACT_MATCH_CONFIDENCE)
+                for sequence_hash, sequence_taxa in taxa.items()}
+
+    @staticmethod
+    def get_consensus(taxa: list[str]) -> str:
+        """Common ranks of ``;`` separated taxonomies, from the root."""
+        ranks = [[rank.strip() for rank in taxon.split(";")] for taxon in taxa]
+        consensus = []
+        for level_ranks in zip(*ranks):
+            if len(set(level_ranks)) > 1:
+                break
+            consensus.append(level_ranks[0])
+        return "; ".join(consensus) if consensus else "Unassigned"
+
+    @staticmethod
+    def read_taxonomy(path: str) -> DataFrame:
+        """Read a Qiime2 taxonomy TSV (Feature ID, Taxon, Confidence)."""
+        return read_csv(path, sep="\t", index_col=0, dtype={"Feature ID": str, "Taxon": str})
+
+    @staticmethod
+    def write_taxonomy(path: str, taxonomy: DataFrame) -> None:
+        taxonomy.to_csv(path, sep="\t", index_label="Feature ID")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection committed on success and closed at the end."""
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        # several tasks may use the cache at the same time
+        connection = sqlite3.connect(self._path, timeout=60)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _chunks(self, values: list[str]) -> list[list[str]]:
+        return [values[i:i + self.QUERY_CHUNK_SIZE] for i in range(0, len(values), self.QUERY_CHUNK_SIZE)]
+
+    @staticmethod
+    def _placeholders(values: list[str]) -> str:
+        return ", ".join("?" * len(values))
@@ -0,0 +1,261 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterator
+
+from ..base_env.data_root import DataRoot
+
+
+class ClassifierStore(DataRoot):
+    """
+    Shared directory of the pre-fitted taxonomy classifiers, used by all the runs of the lab.
+
+    Each database has a sub-directory with the classifier ``.qza``, its pre-extracted sklearn pipeline
+    (``pipeline/``, loaded by the classifier worker without unzipping the artifact again) and its
+    classification cache. The ``manifest.json`` file lists the databases with the checksum, size and
+    source of their classifier. The classifier is checked against its recorded checksum whenever its
+    size or modification time change, and re-acquired when it is corrupted.
+
+    A classifier is acquired from the first registered mirror (a local directory or file share holding
+    the classifier files, e.g. to provision offline nodes) that has it, and downloaded otherwise (the
+    downloaded file is moved into the store). Before it is recorded, the acquired classifier is checked
+    against the ``<file name>.sha256`` file of the mirror if any, and against the checksums of its files
+    listed in the Qiime2 artifact (``checksums.md5``). The other files of the mirror named after the
+    classifier (e.g. its reference sequences) are copied with it.
+
+    Each database is acquired under its own lock, the runs using other databases are not blocked.
+    """
+
+    ROOT_ENV = "GWS_UBIOME_CLASSIFIER_STORE"
+    MIRROR_ENV = "GWS_UBIOME_CLASSIFIER_MIRROR"
+    DEFAULT_ROOT = "/data/gws_ubiome/classifier_store"
+    MANIFEST_FILE_NAME = "manifest.json"
+    PIPELINE_DIR_NAME = "pipeline"
+    PIPELINE_ARCHIVE_NAME = "sklearn_pipeline.tar"
+    CHECKSUM_SUFFIX = ".sha256"
+    HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+    _root_dir: str
+
+    def __init__(self, root_dir: str) -> None:
+        self._root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+
+    @classmethod
+    def get_default(cls) -> 'ClassifierStore':
+        """Store of the ``GWS_UBIOME_CLASSIFIER_STORE`` directory, with the ``GWS_UBIOME_CLASSIFIER_MIRROR`` mirror."""
+        store = cls(cls.get_root())
+        mirror = os.environ.get(cls.MIRROR_ENV)
+        if mirror:
+            store.register_mirror(mirror)
+        return store
+
+    @property
+    def root_dir(self) -> str:
+        return self._root_dir
+
+    def get_database_dir(self, database: str) -> str:
+        return os.path.join(self._root_dir, database)
+
+    def get_pipeline_dir(self, database: str) -> str:
+        return os.path.join(self.get_database_dir(database), self.PIPELINE_DIR_NAME)
+
+    def get_mirrors(self) -> list[str]:
+        return self._read_manifest().get("mirrors", [])
+
+    def register_mirror(self, directory: str) -> None:
+        """Register a directory holding classifier files, searched before downloading a classifier."""
+        directory = os.path.abspath(directory)
+        if not os.path.isdir(directory):
+            raise Exception(f"The classifier mirror '{directory}' is not a directory")
+
+        def add_mirror(manifest: dict) -> None:
+            mirrors = manifest.setdefault("mirrors", [])
+            if directory not in mirrors:
+                mirrors.append(directory)
+        self._update_manifest(add_mirror)
+
+    def get_classifier(self, database: str, file_name: str, download: Callable[[], str]) -> str:
+        """
+        Path of the verified classifier of the database, acquired and extracted if needed.
+
+        :param download: downloads the classifier when no mirror has it, returns the downloaded file path
+        """
+        with self._lock(f".{database}.lock"):
+            manifest = self._read_manifest()
+            entry = manifest.get("classifiers", {}).get(database)
+            path = os.path.join(self.get_database_dir(database), file_name)
+            if entry is not None and entry["file_name"] == file_name and self._is_valid(path, entry):
+                if not os.path.isdir(self.get_pipeline_dir(database)):
+                    self._extract_pipeline(path, self.get_pipeline_dir(database))
+                return path
+
+            expected_checksum = entry["sha256"] if entry is not None and entry["file_name"] == file_name else None
+            source = self._acquire(path, file_name, manifest.get("mirrors", []), download)
+            checksum = self.compute_checksum(path)
+            if expected_checksum is not None and checksum != expected_checksum:
+                os.remove(path)
+                raise Exception(
+                    f"The checksum of the classifier '{file_name}' from {source} does not match the store manifest")
+
+            shutil.rmtree(self.get_pipeline_dir(database), ignore_errors=True)
+            self._extract_pipeline(path, self.get_pipeline_dir(database))
+            stat = os.stat(path)
+
+            def set_entry(manifest: dict) -> None:
+                manifest.setdefault("classifiers", {})[database] = {
+                    "file_name": file_name,
+                    "sha256": checksum,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "source": source,
+                    "added_at": datetime.now(timezone.utc).isoformat()
+                }
+            self._update_manifest(set_entry)
+            return path
+
+    @classmethod
+    def compute_checksum(cls, path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(cls.HASH_BLOCK_SIZE), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def _is_valid(self, path: str, entry: dict) -> bool:
+        if not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]:
+            return True
+        # the file changed since it was verified
+        return stat.st_size == entry["size"] and self.compute_checksum(path) == entry["sha256"]
+
+    def _acquire(self, path: str, file_name: str, mirrors: list[str], download: Callable[[], str]) -> str:
+        """Copy the classifier from a mirror, or download it, to ``path`` and verify it. Return its source."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for mirror in mirrors:
+            mirror_path = os.path.join(mirror, file_name)
+            if not os.path.isfile(mirror_path):
+                continue
+            self._copy(mirror_path, path)
+            checksum_path = mirror_path + self.CHECKSUM_SUFFIX
+            if os.path.isfile(checksum_path):
+                with open(checksum_path, encoding="utf-8") as checksum_file:
+                    expected_checksum = checksum_file.read().split()[0].lower()
+                if self.compute_checksum(path) != expected_checksum:
+                    os.remove(path)
+                    raise Exception(f"The checksum of the classifier '{mirror_path}' does not match its '.sha256' file")
+            self._verify_artifact(path, mirror_path)
+            self._copy_companion_files(mirror, file_name, os.path.dirname(path))
+            return mirror_path
+
+        downloaded_path = download()
+        # moved, the classifier is not kept twice on the node
+        temp_path = path + ".part"
+        shutil.move(downloaded_path, temp_path)
+        os.replace(temp_path, path)
+        self._verify_artifact(path, downloaded_path)
+        return downloaded_path
+
+    def _verify_artifact(self, path: str, source: str) -> None:
+        """
+        Check that the classifier is a complete ``TaxonomicClassifier`` artifact: the files listed in its
+        ``checksums.md5`` match their checksum (the CRC of the archive members for the artifacts without it).
+        The classifier is removed if not.
+        """
+        try:
+            with zipfile.ZipFile(path) as archive:
+                names = archive.namelist()
+                artifact_dir = names[0].split("/")[0] if names else ""
+                if "type: TaxonomicClassifier" not in archive.read(f"{artifact_dir}/metadata.yaml").decode("utf-8"):
+                    raise Exception("it is not a TaxonomicClassifier artifact")
+                checksums_name = f"{artifact_dir}/checksums.md5"
+                if checksums_name not in names:
+                    corrupted_name = archive.testzip()
+                    if corrupted_name is not None:
+                        raise Exception(f"'{corrupted_name}' is corrupted")
+                    return
+                for line in archive.read(checksums_name).decode("utf-8").splitlines():
+                    expected_checksum, member_name = line.split("  ", 1)
+                    md5 = hashlib.md5()
+                    with archive.open(f"{artifact_dir}/{member_name}") as member:
+                        for block in iter(lambda: member.read(self.HASH_BLOCK_SIZE), b""):
+                            md5.update(block)
+                    if md5.hexdigest() != expected_checksum:
+                        raise Exception(f"the checksum of '{member_name}' does not match")
+        except Exception as exception:
+            os.remove(path)
+            raise Exception(f"The classifier '{source}' is not a valid Qiime2 classifier: {exception}") from exception
+
+    def _copy_companion_files(self, mirror: str, file_name: str, destination_dir: str) -> None:
+        base_name = file_name.removesuffix(".qza")
+        for name in os.listdir(mirror):
+            if name.startswith(base_name + ".") and name != file_name and not name.endswith(self.CHECKSUM_SUFFIX):
+                self._copy(os.path.join(mirror, name), os.path.join(destination_dir, name))
+
+    @staticmethod
+    def _copy(source: str, destination: str) -> None:
+        # copy then rename, a reader never sees a partial file
+        temp_path = destination + ".part"
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+
+    def _extract_pipeline(self, classifier_path: str, pipeline_dir: str) -> None:
+        """Extract the sklearn pipeline archive of a ``TaxonomicClassifier`` artifact."""
+        with zipfile.ZipFile(classifier_path) as archive:
+            archive_names = [name for name in archive.namelist()
+                             if name.endswith("/data/" + self.PIPELINE_ARCHIVE_NAME)]
+            if not archive_names:
+                raise Exception(f"No sklearn pipeline found in the classifier '{classifier_path}'")
+            extract_dir = tempfile.mkdtemp(dir=os.path.dirname(pipeline_dir))
+            try:
+                with archive.open(archive_names[0]) as pipeline_archive, \
+                        tarfile.open(fileobj=pipeline_archive, mode="r|") as tar:
+                    tar.extractall(extract_dir, filter="data")
+                os.replace(extract_dir, pipeline_dir)
+            except BaseException:
+                shutil.rmtree(extract_dir, ignore_errors=True)
+                raise
+
+    @contextmanager
+    def _lock(self, lock_name: str) -> Iterator[None]:
+        """Exclusive lock of a file of the store, shared by the processes of the node."""
+        with open(os.path.join(self._root_dir, lock_name), "w", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _update_manifest(self, update: Callable[[dict], None]) -> None:
+        """Read, update and write the manifest under the manifest lock, held only for the update."""
+        with self._lock(".manifest.lock"):
+            manifest = self._read_manifest()
+            update(manifest)
+            self._write_manifest(manifest)
+
+    def _read_manifest(self) -> dict:
+        path = os.path.join(self._root_dir, self.MANIFEST_FILE_NAME)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+
+    def _write_manifest(self, manifest: dict) -> None:
+        # written then renamed, the manifest is read without the lock
+        path = os.path.join(self._root_dir, self.MANIFEST_FILE_NAME)
+        with open(path + ".part", "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(path + ".part", path)
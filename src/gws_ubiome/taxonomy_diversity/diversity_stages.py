@@ -0,0 +1,362 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import os
+from typing import Callable
+
+from gws_core import ConfigParams, MessageDispatcher, ShellProxy
+from pandas import DataFrame
+
+from ..base_env.file_links import clone_or_copy
+from ..base_env.qiime2_env_task import Qiime2ShellProxyHelper
+from ..diversity_engine.alpha_diversity import AlphaDiversityEngine
+from ..diversity_engine.beta_diversity import BetaDiversityEngine
+from ..diversity_engine.count_matrix import CountMatrix
+from ..diversity_engine.distance_matrix import DistanceMatrix
+from ..diversity_engine.phylogenetic_tree import PhylogeneticTree
+from ..diversity_engine.repeated_rarefaction import RepeatedRarefaction
+from ..diversity_engine.unifrac import UniFracEngine
+from .classification_cache import read_qza_sequences
+from .classifier_store import ClassifierStore
+from .intermediate_store import IntermediateStore
+from .resource_estimator import StageMonitor
+
+
+class DiversityStages:
+    """
+    Phylogeny and diversity stages of the Q2 Taxonomy Diversity task, written in the working directory of
+    its shell proxy. Their results are reused from the ``IntermediateStore``.
+    """
+
+    # Diversity output files
+    DIVERSITY_PATHS = {
+        "Alpha Diversity - Shannon": "shannon_vector.qza.diversity_metrics.alpha-diversity.tsv",
+        "Alpha Diversity - Chao1": "chao1.qza.diversity_metrics.alpha-diversity.tsv",
+        "Alpha Diversity - Evenness": "evenness_vector.qza.diversity_metrics.alpha-diversity.tsv",
+        "Alpha Diversity - Faith pd": "faith_pd_vector.qza.diversity_metrics.alpha-diversity.tsv",
+        "Alpha Diversity - Observed features": "observed_features_vector.qza.diversity_metrics.alpha-diversity.tsv",
+        "Alpha Diversity - Simpson": "simpson.qza.diversity_metrics.alpha-diversity.tsv",
+        "Alpha Diversity - Inv Simpson": "invSimpson.tab.tsv",
+        "Alpha Diversity - Good's coverage": "goods_coverage.alpha-diversity.tsv",
+        "Alpha Diversity - Rarefaction SD": "rarefaction_sd.alpha-diversity.tsv",
+        "Beta Diversity - Bray Curtis": "bray_curtis_distance_matrix.qza.diversity_metrics.distance-matrix.tsv",
+        "Beta Diversity - Jaccard distance": "jaccard_distance_matrix.qza.diversity_metrics.distance-matrix.tsv",
+        "Beta Diversity - Jaccard unweighted unifrac": "jaccard_unweighted_unifrac_distance_matrix.qza.diversity_metrics.distance-matrix.tsv",
+        "Beta Diversity - Weighted unifrac": "weighted_unifrac_distance_matrix.qza.diversity_metrics.distance-matrix.tsv",
+        "Beta Diversity - Unweighted unifrac": "unweighted_unifrac_distance_matrix.qza.diversity_metrics.distance-matrix.tsv"
+    }
+
+    # Alpha diversity indices computed on the rarefied tables (as core-metrics-phylogenetic)
+    RAREFIED_ALPHA_METRICS = {
+        "shannon_entropy": "Alpha Diversity - Shannon",
+        "pielou_evenness": "Alpha Diversity - Evenness",
+        "faith_pd": "Alpha Diversity - Faith pd",
+        "observed_features": "Alpha Diversity - Observed features"
+    }
+    # Alpha diversity indices computed on the filtered, non rarefied, table
+    FILTERED_ALPHA_METRICS = {
+        "chao1": "Alpha Diversity - Chao1",
+        "simpson": "Alpha Diversity - Simpson",
+        "goods_coverage": "Alpha Diversity - Good's coverage"
+    }
+    # Beta diversity distances computed in-process, on the rarefied and on the filtered tables
+    RAREFIED_BETA_METRICS = {
+        "Beta Diversity - Bray Curtis": BetaDiversityEngine.BRAY_CURTIS,
+        "Beta Diversity - Jaccard distance": BetaDiversityEngine.JACCARD
+    }
+    FILTERED_BETA_METRICS = {
+        "Beta Diversity - Jaccard unweighted unifrac": BetaDiversityEngine.JACCARD
+    }
+    # UniFrac distances computed in-process on the rarefied tables
+    UNIFRAC_METRICS = {
+        "Beta Diversity - Weighted unifrac": UniFracEngine.WEIGHTED,
+        "Beta Diversity - Unweighted unifrac": UniFracEngine.UNWEIGHTED
+    }
+
+    DISTANCE_MATRIX_KEYS = [*RAREFIED_BETA_METRICS, *UNIFRAC_METRICS, *FILTERED_BETA_METRICS]
+
+    # Files of sh/1_qiime2_phylogeny.sh, with their folder in the working directory
+    PHYLOGENY_METHOD = "align-to-tree-mafft-fasttree;parttree"
+    PHYLOGENY_FILES = {
+        "aligned-rep-seqs.qza": os.path.join("taxonomy_and_diversity", "raw_files"),
+        "masked-aligned-rep-seqs.qza": os.path.join("taxonomy_and_diversity", "raw_files"),
+        "unrooted-tree.qza": "",
+        "rooted-tree.qza": ""
+    }
+
+    _shell_proxy: ShellProxy
+    _script_file_dir: str
+    _message_dispatcher: MessageDispatcher
+    _record_stage: Callable[[str, StageMonitor], None]
+
+    def __init__(self, shell_proxy: ShellProxy, script_file_dir: str, message_dispatcher: MessageDispatcher,
+                 record_stage: Callable[[str, StageMonitor], None]) -> None:
+        """
+        :param script_file_dir: directory of the ``sh`` scripts of the task
+        :param record_stage: called with the measures of the stages actually computed, for the run history
+        """
+        self._shell_proxy = shell_proxy
+        self._script_file_dir = script_file_dir
+        self._message_dispatcher = message_dispatcher
+        self._record_stage = record_stage
+
+    @property
+    def working_dir(self) -> str:
+        return self._shell_proxy.working_dir
+
+    @staticmethod
+    def hash_sequences(rep_seqs_path: str) -> str:
+        """Checksum of the ASV sequences of ``rep-seqs.qza``, independent of the artifact uuid and provenance."""
+        sequences = read_qza_sequences(rep_seqs_path)
+        return IntermediateStore.hash_key(dict(sorted(sequences.items())))
+
+    @classmethod
+    def get_distance_matrix_path(cls, working_dir: str, key: str) -> str:
+        # e.g. bray_curtis_distance_matrix.dist
+        return os.path.join(working_dir, "taxonomy_and_diversity", "raw_files",
+                            cls.DIVERSITY_PATHS[key].split(".")[0] + ".dist")
+
+    @classmethod
+    def get_diversity_files(cls) -> list[str]:
+        """Files of the filtering and diversity stage, relative to the ``taxonomy_and_diversity`` folder."""
+        files = [os.path.join("raw_files", "filtered-table.qza")]
+        for key, file_name in cls.DIVERSITY_PATHS.items():
+            if key in cls.DISTANCE_MATRIX_KEYS:
+                matrix_name = os.path.basename(cls.get_distance_matrix_path("", key))
+                files += [os.path.join("raw_files", matrix_name),
+                          os.path.join("raw_files", matrix_name + DistanceMatrix.IDS_SUFFIX)]
+            else:
+                files.append(os.path.join("table_files", file_name))
+        return files
+
+    def open_distance_matrices(self) -> dict[str, DistanceMatrix]:
+        """Distance matrices of the working directory, by ``DIVERSITY_PATHS`` key."""
+        return {key: DistanceMatrix.open(self.get_distance_matrix_path(self.working_dir, key))
+                for key in self.DISTANCE_MATRIX_KEYS}
+
+    def prepare_phylogeny(self, qiime2_folder_path: str) -> None:
+        """
+        Write the alignment and the trees of the ASVs in the working directory. They only depend on the ASV
+        sequences and are read from the intermediate store when a previous run built them, the files of the
+        store entry are cloned (see ``clone_or_copy``).
+        """
+        rep_seqs_path = os.path.join(qiime2_folder_path, "rep-seqs.qza")
+        key = {"sequences": self.hash_sequences(rep_seqs_path), "method": self.PHYLOGENY_METHOD}
+        monitor = StageMonitor()
+
+        def create_phylogeny(entry_dir: str) -> None:
+            cmd_1 = [
+                "bash",
+                os.path.join(self._script_file_dir,
+                             "./sh/1_qiime2_phylogeny.sh"),
+                rep_seqs_path,
+                entry_dir
+            ]
+            self._message_dispatcher.notify_info_message("Building the phylogeny of the ASVs")
+            with monitor:
+                res = self._shell_proxy.run(cmd_1)
+            if res != 0 or not os.path.exists(os.path.join(entry_dir, "rooted-tree.qza")):
+                raise Exception(
+                    "Phylogeny generation did not finished. This is likely due to insufficient RAM memory.")
+
+        with IntermediateStore.get_default().open_entry(
+                IntermediateStore.PHYLOGENY, key, create_phylogeny) as (entry_dir, created):
+            if created:
+                self._record_stage("phylogeny", monitor)
+            else:
+                self._message_dispatcher.notify_info_message("Phylogeny of the ASVs read from the intermediate store")
+
+            for file_name, destination_dir in self.PHYLOGENY_FILES.items():
+                os.makedirs(os.path.join(self.working_dir, destination_dir), exist_ok=True)
+                clone_or_copy(os.path.join(entry_dir, file_name),
+                              os.path.join(self.working_dir, destination_dir, file_name))
+
+    def prepare_diversity(self, qiime2_folder_path: str, params: ConfigParams, workers: int,
+                          update_progress: Callable[[float, str], None] | None = None,
+                          tmp_dir: str | None = None) -> dict[str, DistanceMatrix]:
+        """
+        Filter the samples below the rarefaction depth and compute the diversity (see ``compute_diversity``).
+
+        With a ``random_seed``, the diversity is reproducible: it is stored in the intermediate store and
+        read from it by the runs with the same feature table, depth, rarefactions and seed, whatever their
+        taxonomic database (e.g. the runs of a parameter sweep).
+
+        :param update_progress: called with the progress of the rarefactions, from 0 to 100
+        :param tmp_dir: directory of the intermediate files, e.g. the ``ScratchSpace``, the working directory by default
+        :return: the distance matrices by ``DIVERSITY_PATHS`` key
+        """
+        result_dir = os.path.join(self.working_dir, "taxonomy_and_diversity")
+        if params["random_seed"] is None:
+            return self.compute_filtered_diversity(qiime2_folder_path, params, workers, update_progress, tmp_dir)
+
+        key = {
+            "table": ClassifierStore.compute_checksum(os.path.join(qiime2_folder_path, "table.qza")),
+            "sequences": self.hash_sequences(os.path.join(qiime2_folder_path, "rep-seqs.qza")),
+            "depth": params["rarefaction_plateau_value"],
+            "iterations": params["rarefaction_iterations"],
+            "seed": params["random_seed"]
+        }
+        computed = {}
+
+        def create_diversity(entry_dir: str) -> None:
+            computed.update(self.compute_filtered_diversity(qiime2_folder_path, params, workers, update_progress,
+                                                            tmp_dir))
+            for distance_matrix in computed.values():
+                distance_matrix.flush()
+            for relative_path in self.get_diversity_files():
+                os.makedirs(os.path.join(entry_dir, os.path.dirname(relative_path)), exist_ok=True)
+                clone_or_copy(os.path.join(result_dir, relative_path), os.path.join(entry_dir, relative_path))
+
+        with IntermediateStore.get_default().open_entry(
+                IntermediateStore.DIVERSITY, key, create_diversity) as (entry_dir, created):
+            if created:
+                return computed
+
+            self._message_dispatcher.notify_info_message(
+                f"Filtered table and diversity at {params['rarefaction_plateau_value']} reads read from the "
+                "intermediate store")
+            for relative_path in self.get_diversity_files():
+                os.makedirs(os.path.join(result_dir, os.path.dirname(relative_path)), exist_ok=True)
+                clone_or_copy(os.path.join(entry_dir, relative_path), os.path.join(result_dir, relative_path))
+        distance_matrices = self.open_distance_matrices()
+        if params["export_distance_matrices"]:
+            for key, distance_matrix in distance_matrices.items():
+                distance_matrix.export_tsv(os.path.join(result_dir, "table_files", self.DIVERSITY_PATHS[key]))
+        return distance_matrices
+
+    def compute_filtered_diversity(self, qiime2_folder_path: str, params: ConfigParams, workers: int,
+                                   update_progress: Callable[[float, str], None] | None = None,
+                                   tmp_dir: str | None = None) -> dict[str, DistanceMatrix]:
+        # This script filters the samples below the rarefaction depth
+        cmd_1 = [
+            "bash",
+            os.path.join(self._script_file_dir,
+                         "./sh/1_qiime2_diversity_indexes.sh"),
+            qiime2_folder_path,
+            params["rarefaction_plateau_value"]
+        ]
+        res = self._shell_proxy.run(cmd_1)
+        if res != 0:
+            raise Exception(
+                "Core diversity indexes generation did not finished.")
+
+        # Verify that critical intermediate files were generated
+        self._verify_diversity_files_generated()
+
+        filtered_matrix = CountMatrix.from_tsv(Qiime2ShellProxyHelper.export_feature_table(
+            self._shell_proxy,
+            os.path.join(self.working_dir, "taxonomy_and_diversity", "raw_files", "filtered-table.qza"),
+            os.path.join(tmp_dir or self.working_dir, "filtered-table.tsv")))
+        tree = PhylogeneticTree.from_qza(os.path.join(self.working_dir, "rooted-tree.qza"))
+
+        self._message_dispatcher.notify_info_message(
+            f"Rarefying the feature table {params['rarefaction_iterations']} time(s) at "
+            f"{params['rarefaction_plateau_value']} reads, computing alpha diversity, Bray-Curtis, Jaccard and "
+            "UniFrac distances")
+        with StageMonitor() as monitor:
+            distance_matrices = self.compute_diversity(filtered_matrix, tree, params, workers, update_progress,
+                                                       tmp_dir)
+        self._record_stage("diversity", monitor)
+        return distance_matrices
+
+    def compute_diversity(self, filtered_matrix: CountMatrix, tree: PhylogeneticTree, params: ConfigParams,
+                          workers: int | None = None,
+                          update_progress: Callable[[float, str], None] | None = None,
+                          tmp_dir: str | None = None) -> dict[str, DistanceMatrix]:
+        """
+        Compute all the alpha and beta diversity indices in-process and write the alpha diversity in the
+        ``DIVERSITY_PATHS`` files. The distance matrices are written in memory-mapped files of the raw_files
+        folder, and as TSV files only when ``export_distance_matrices`` is set.
+
+        :param workers: number of worker threads and processes, ``threads`` by default
+        :param update_progress: called with the progress of the rarefactions, from 0 to 100
+        :param tmp_dir: directory of the distance matrices of the rarefactions, the working directory by default
+
+        :return: the distance matrices by ``DIVERSITY_PATHS`` key
+        """
+        workers = workers or params["threads"]
+        table_files_dir = os.path.join(self.working_dir, "taxonomy_and_diversity", "table_files")
+
+        def get_distance_matrix_path(key: str) -> str:
+            return self.get_distance_matrix_path(self.working_dir, key)
+
+        # indices averaged over the rarefactions
+        rarefied_beta_metrics = {**self.RAREFIED_BETA_METRICS, **self.UNIFRAC_METRICS}
+        repeated_rarefaction = RepeatedRarefaction(
+            filtered_matrix, params["rarefaction_plateau_value"], params["rarefaction_iterations"],
+            tree=tree, workers=workers, seed=params["random_seed"])
+        alpha_mean, alpha_sd, mean_distances = repeated_rarefaction.compute(
+            {metric: get_distance_matrix_path(key) for key, metric in rarefied_beta_metrics.items()},
+            os.path.join(tmp_dir or self.working_dir, "rarefaction_iterations"),
+            update_progress)
+
+        self._write_alpha_diversity(alpha_mean, self.RAREFIED_ALPHA_METRICS, table_files_dir)
+        alpha_sd[list(self.RAREFIED_ALPHA_METRICS)].to_csv(
+            os.path.join(table_files_dir, self.DIVERSITY_PATHS["Alpha Diversity - Rarefaction SD"]),
+            sep="\t", na_rep="NA")
+        distance_matrices = {key: mean_distances[metric] for key, metric in rarefied_beta_metrics.items()}
+
+        # indices of the filtered table
+        filtered_alpha = AlphaDiversityEngine(filtered_matrix).compute()
+        self._write_alpha_diversity(filtered_alpha, self.FILTERED_ALPHA_METRICS, table_files_dir)
+
+        # Simpson (D) is the Gini-Simpson index, undefined ratios are reported as NA
+        simpson = filtered_alpha["simpson"].where(filtered_alpha["simpson"] != 0)
+        inv_simpson = DataFrame({
+            "Simpson(D)": simpson,
+            "Inverse-Simpson_(1-D)": 1 - simpson,
+            "Reciprocal-Simpson_(1/D)": 1 / simpson
+        })
+        inv_simpson.to_csv(os.path.join(table_files_dir, self.DIVERSITY_PATHS["Alpha Diversity - Inv Simpson"]),
+                           sep="\t", na_rep="NA")
+
+        for key, metric in self.FILTERED_BETA_METRICS.items():
+            engine = BetaDiversityEngine(filtered_matrix, metric, workers=workers)
+            distance_matrices[key] = engine.compute(get_distance_matrix_path(key))
+
+        if params["export_distance_matrices"]:
+            for key, distance_matrix in distance_matrices.items():
+                distance_matrix.export_tsv(os.path.join(table_files_dir, self.DIVERSITY_PATHS[key]))
+        return distance_matrices
+
+    def _write_alpha_diversity(self, alpha_diversity: DataFrame, metrics: dict[str, str],
+                               table_files_dir: str) -> None:
+        for metric, key in metrics.items():
+            alpha_diversity[[metric]].to_csv(os.path.join(table_files_dir, self.DIVERSITY_PATHS[key]), sep="\t")
+
+    def _verify_diversity_files_generated(self) -> None:
+        """
+        Verify that critical diversity files were generated after the diversity indexes step.
+        If files are missing, raise an exception indicating insufficient RAM.
+
+        :raises Exception: If critical files are missing
+        """
+        # List of critical files that should exist after the phylogeny and filtering step
+        critical_files = [
+            "rooted-tree.qza",
+            os.path.join("taxonomy_and_diversity", "raw_files", "filtered-table.qza")
+        ]
+
+        # Check for missing critical files
+        missing_files = []
+        for file_name in critical_files:
+            file_path = os.path.join(self.working_dir, file_name)
+            if not os.path.exists(file_path):
+                missing_files.append(file_name)
+
+        if missing_files:
+            self._message_dispatcher.notify_error_message(
+                f"Critical diversity files were not generated: {', '.join(missing_files)}. "
+                "This usually indicates insufficient RAM memory for the diversity calculations."
+            )
+            raise Exception(
+                f"Diversity calculation failed: {len(missing_files)} critical file(s) missing. "
+                "This is likely due to insufficient RAM memory. "
+                "Please increase the RAM capacity and try again. "
+                f"Missing files: {', '.join(missing_files[:3])}{'...' if len(missing_files) > 3 else ''}"
+            )
+
+        self._message_dispatcher.notify_info_message(
+            f"All {len(critical_files)} critical diversity files were successfully generated."
+        )
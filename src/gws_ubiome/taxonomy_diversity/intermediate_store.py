@@ -0,0 +1,168 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterator
+
+from ..base_env.data_root import DataRoot
+
+
+class IntermediateStore(DataRoot):
+    """
+    Shared directory of the intermediate results of the taxonomy and diversity runs that only depend on
+    part of the inputs and parameters, reused by the runs of the lab (e.g. the runs of a parameter sweep):
+
+    - ``phylogeny``: alignment and trees of the ASVs, keyed on their sequences
+    - ``diversity``: filtered table, alpha diversity and distance matrices, keyed on the feature table,
+      the sequences, the rarefaction depth, the rarefactions and their seed
+
+    An entry is a directory ``<step>/<checksum of the key>`` holding the result files and a ``key.json``
+    file. It is created in a temporary directory and renamed when complete, so a run never reads a partial
+    entry. The runs creating the same entry wait for the first one.
+
+    The store is bounded to ``max_size`` bytes (``GWS_UBIOME_INTERMEDIATE_STORE_MAX_GB``, 50 GB by default):
+    after an entry is created, the least recently used entries are removed until the store fits.
+    """
+
+    ROOT_ENV = "GWS_UBIOME_INTERMEDIATE_STORE"
+    DEFAULT_ROOT = "/data/gws_ubiome/intermediate_store"
+    MAX_SIZE_ENV = "GWS_UBIOME_INTERMEDIATE_STORE_MAX_GB"
+    DEFAULT_MAX_SIZE_GB = 50
+    KEY_FILE_NAME = "key.json"
+    PHYLOGENY = "phylogeny"
+    DIVERSITY = "diversity"
+
+    _root_dir: str
+    _max_size: int
+
+    def __init__(self, root_dir: str, max_size: int | None = None) -> None:
+        """
+        :param max_size: maximum size of the entries in bytes, ``GWS_UBIOME_INTERMEDIATE_STORE_MAX_GB`` by default
+        """
+        self._root_dir = root_dir
+        if max_size is None:
+            max_size = int(float(os.environ.get(self.MAX_SIZE_ENV) or self.DEFAULT_MAX_SIZE_GB) * 1024 ** 3)
+        self._max_size = max_size
+        os.makedirs(root_dir, exist_ok=True)
+
+    @classmethod
+    def get_default(cls) -> 'IntermediateStore':
+        """Store of the ``GWS_UBIOME_INTERMEDIATE_STORE`` directory."""
+        return cls(cls.get_root())
+
+    @property
+    def root_dir(self) -> str:
+        return self._root_dir
+
+    @staticmethod
+    def hash_key(key: dict) -> str:
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get_entry_dir(self, step: str, key: dict) -> str:
+        return os.path.join(self._root_dir, step, self.hash_key(key))
+
+    def has_entry(self, step: str, key: dict) -> bool:
+        return os.path.isfile(os.path.join(self.get_entry_dir(step, key), self.KEY_FILE_NAME))
+
+    @contextmanager
+    def open_entry(self, step: str, key: dict, create: Callable[[str], None]) -> Iterator[tuple[str, bool]]:
+        """
+        Directory of the entry, created if missing. The entry is locked in the context, so that it is not
+        removed while its files are read.
+
+        :param create: writes the result files of the entry in the given directory
+        :return: the entry directory and whether it was created by this call
+        """
+        entry_dir = self.get_entry_dir(step, key)
+        with self._lock(step, self.hash_key(key)):
+            if self.has_entry(step, key):
+                # the modification time of the key file is the last use of the entry
+                os.utime(os.path.join(entry_dir, self.KEY_FILE_NAME))
+                yield entry_dir, False
+                return
+
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            temp_dir = tempfile.mkdtemp(dir=os.path.dirname(entry_dir))
+            try:
+                create(temp_dir)
+                with open(os.path.join(temp_dir, self.KEY_FILE_NAME), "w", encoding="utf-8") as key_file:
+                    json.dump({"key": key, "created_at": datetime.now(timezone.utc).isoformat(),
+                               "size": self.get_size(temp_dir)}, key_file, indent=2)
+                os.replace(temp_dir, entry_dir)
+            except BaseException:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                raise
+            yield entry_dir, True
+        self.evict()
+
+    def evict(self) -> list[str]:
+        """
+        Remove the least recently used entries until the store fits in its maximum size. The entries in use
+        are skipped.
+
+        :return: the removed entry directories
+        """
+        entries = []
+        for step in os.listdir(self._root_dir):
+            step_dir = os.path.join(self._root_dir, step)
+            if not os.path.isdir(step_dir):
+                continue
+            for name in os.listdir(step_dir):
+                key_path = os.path.join(step_dir, name, self.KEY_FILE_NAME)
+                try:
+                    last_used = os.path.getmtime(key_path)
+                    with open(key_path, encoding="utf-8") as key_file:
+                        size = json.load(key_file).get("size")
+                except (OSError, ValueError):
+                    # being created, or removed
+                    continue
+                if size is None:
+                    size = self.get_size(os.path.dirname(key_path))
+                entries.append((last_used, size, step, name))
+
+        total_size = sum(size for _, size, _, _ in entries)
+        removed = []
+        for _, size, step, name in sorted(entries):
+            if total_size <= self._max_size:
+                break
+            with self._lock(step, name, blocking=False) as locked:
+                if not locked:
+                    continue
+                shutil.rmtree(os.path.join(self._root_dir, step, name), ignore_errors=True)
+            total_size -= size
+            removed.append(os.path.join(self._root_dir, step, name))
+        return removed
+
+    @staticmethod
+    def get_size(path: str) -> int:
+        return sum(os.lstat(os.path.join(dir_path, file_name)).st_size
+                   for dir_path, _, file_names in os.walk(path) for file_name in file_names)
+
+    @contextmanager
+    def _lock(self, step: str, entry_name: str, blocking: bool = True) -> Iterator[bool]:
+        """
+        Exclusive lock of an entry, the other entries can be created at the same time.
+
+        :return: whether the lock was acquired, always True when blocking
+        """
+        os.makedirs(os.path.join(self._root_dir, step), exist_ok=True)
+        lock_path = os.path.join(self._root_dir, step, f".{entry_name}.lock")
+        with open(lock_path, "w", encoding="utf-8") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,233 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+import numpy as np
+from pandas import DataFrame, read_csv
+
+from .classification_cache import read_fasta
+
+# 2-bit code of the nucleotides, 255 for the ambiguous ones
+_NUCLEOTIDE_CODES = np.full(256, 255, dtype=np.uint8)
+for _code, _nucleotides in enumerate(["Aa", "Cc", "Gg", "TtUu"]):
+    for _nucleotide in _nucleotides:
+        _NUCLEOTIDE_CODES[ord(_nucleotide)] = _code
+
+
+def get_kmers(sequence: str, k: int) -> np.ndarray:
+    """Sorted unique k-mer codes of a sequence, the k-mers with ambiguous nucleotides are skipped."""
+    codes = _NUCLEOTIDE_CODES[np.frombuffer(sequence.encode("ascii"), dtype=np.uint8)]
+    if codes.size < k:
+        return np.empty(0, dtype=np.int32)
+    windows = np.lib.stride_tricks.sliding_window_view(codes, k)
+    valid = (windows != 255).all(axis=1)
+    kmers = windows[valid].astype(np.int64) @ (4 ** np.arange(k - 1, -1, -1, dtype=np.int64))
+    return np.unique(kmers).astype(np.int32)
+
+
+def _gather(array: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of the ``array[start:end]`` slices."""
+    lengths = ends - starts
+    positions = np.arange(lengths.sum()) + np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return array[positions]
+
+
+class KmerIndex:
+    """
+    Memory-mapped k-mer inverted index of the reference sequences of a database, for a top-hit
+    taxonomic assignment.
+
+    The index directory holds, as raw arrays:
+
+    - ``kmer_offsets`` / ``postings``: the references containing each k-mer (CSR by k-mer code)
+    - ``reference_offsets`` / ``reference_kmers``: the sorted k-mers of each reference (CSR by reference)
+
+    and the taxonomy of the references in ``taxonomy.json``. It is built once per database version.
+
+    An ASV is searched in two steps. The candidate references are the ones sharing the most informative
+    k-mers with the ASV (the k-mers found in less than ``MAX_KMER_FREQUENCY`` of the references), counted
+    for a batch of ASVs at once. The identity to each candidate is then estimated from the fraction ``f``
+    of the k-mers of the ASV found in the candidate, as ``f ** (1 / k)``. The taxonomy is the consensus
+    of the best hits above the identity threshold: the deepest rank shared by at least ``min_consensus``
+    of the hits, its confidence being the fraction of the hits that share it.
+    """
+
+    K = 8
+    META_FILE_NAME = "meta.json"
+    TAXONOMY_FILE_NAME = "taxonomy.json"
+    MAX_KMER_FREQUENCY = 0.05
+    CANDIDATE_COUNT = 32
+    # cells of the (ASVs x references) count matrix of a batch
+    BATCH_CELLS = 1 << 24
+    UNASSIGNED = "Unassigned"
+
+    _index_dir: str
+    _k: int
+    _taxonomy: list[str]
+    _kmer_offsets: np.ndarray
+    _postings: np.ndarray
+    _reference_offsets: np.ndarray
+    _reference_kmers: np.ndarray
+
+    def __init__(self, index_dir: str) -> None:
+        """Open an index built by ``build``."""
+        with open(os.path.join(index_dir, self.META_FILE_NAME), encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        with open(os.path.join(index_dir, self.TAXONOMY_FILE_NAME), encoding="utf-8") as taxonomy_file:
+            self._taxonomy = json.load(taxonomy_file)
+        self._index_dir = index_dir
+        self._k = meta["k"]
+        self._kmer_offsets = self._open_array(index_dir, "kmer_offsets", np.int64)
+        self._postings = self._open_array(index_dir, "postings", np.int32)
+        self._reference_offsets = self._open_array(index_dir, "reference_offsets", np.int64)
+        self._reference_kmers = self._open_array(index_dir, "reference_kmers", np.int32)
+
+    @property
+    def reference_count(self) -> int:
+        return len(self._taxonomy)
+
+    @classmethod
+    def exists(cls, index_dir: str) -> bool:
+        return os.path.exists(os.path.join(index_dir, cls.META_FILE_NAME))
+
+    @classmethod
+    def build(cls, index_dir: str, fasta_path: str, taxonomy_path: str, k: int = K) -> 'KmerIndex':
+        """
+        Build the index of the reference sequences in ``index_dir``.
+
+        :param taxonomy_path: tab separated file without header: sequence id, taxonomy
+        """
+        sequences = read_fasta(fasta_path)
+        taxonomy = read_csv(taxonomy_path, sep="\t", header=None, index_col=0, dtype=str).iloc[:, 0]
+        reference_ids = [sequence_id for sequence_id in sequences if sequence_id in taxonomy.index]
+
+        os.makedirs(os.path.dirname(os.path.abspath(index_dir)), exist_ok=True)
+        build_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(index_dir)))
+        try:
+            # first pass: k-mers of each reference and number of references of each k-mer
+            kmer_counts = np.zeros(4 ** k, dtype=np.int64)
+            reference_offsets = np.zeros(len(reference_ids) + 1, dtype=np.int64)
+            with open(os.path.join(build_dir, "reference_kmers.dat"), "wb") as kmers_file:
+                for i, reference_id in enumerate(reference_ids):
+                    kmers = get_kmers(sequences[reference_id], k)
+                    kmers_file.write(kmers.tobytes())
+                    kmer_counts[kmers] += 1
+                    reference_offsets[i + 1] = reference_offsets[i] + kmers.size
+            cls._write_array(build_dir, "reference_offsets", reference_offsets)
+            kmer_offsets = np.concatenate([[0], np.cumsum(kmer_counts)])
+            cls._write_array(build_dir, "kmer_offsets", kmer_offsets)
+
+            # second pass: fill the postings of each k-mer, the references are added in order
+            reference_kmers = cls._open_array(build_dir, "reference_kmers", np.int32)
+            postings = np.memmap(os.path.join(build_dir, "postings.dat"), dtype=np.int32, mode="w+",
+                                 shape=(max(int(kmer_offsets[-1]), 1),))
+            cursors = kmer_offsets[:-1].copy()
+            for i in range(len(reference_ids)):
+                kmers = reference_kmers[reference_offsets[i]:reference_offsets[i + 1]]
+                postings[cursors[kmers]] = i
+                cursors[kmers] += 1
+            postings.flush()
+            del postings, reference_kmers
+
+            with open(os.path.join(build_dir, cls.TAXONOMY_FILE_NAME), "w", encoding="utf-8") as taxonomy_file:
+                json.dump([taxonomy[reference_id].strip() for reference_id in reference_ids], taxonomy_file)
+            # written last, marks a complete index
+            with open(os.path.join(build_dir, cls.META_FILE_NAME), "w", encoding="utf-8") as meta_file:
+                json.dump({"k": k, "reference_count": len(reference_ids)}, meta_file)
+            shutil.rmtree(index_dir, ignore_errors=True)
+            os.replace(build_dir, index_dir)
+        except BaseException:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+        return cls(index_dir)
+
+    def classify(self, sequences: dict[str, str], identity_threshold: float = 0.97,
+                 max_hits: int = 10, min_consensus: float = 0.51) -> DataFrame:
+        """
+        :param sequences: sequences by feature id
+        :return: the ``Taxon`` and ``Confidence`` of each sequence, indexed by feature id
+        """
+        feature_ids = list(sequences)
+        query_kmers = [get_kmers(sequences[feature_id], self._k) for feature_id in feature_ids]
+        frequent = np.diff(self._kmer_offsets) > max(self.MAX_KMER_FREQUENCY * self.reference_count, 1)
+        batch_size = max(self.BATCH_CELLS // max(self.reference_count, 1), 1)
+
+        rows = []
+        for start in range(0, len(feature_ids), batch_size):
+            batch_kmers = query_kmers[start:start + batch_size]
+            candidates = self._get_candidates(batch_kmers, frequent)
+            for kmers, batch_candidates in zip(batch_kmers, candidates):
+                identities = self._get_identities(kmers, batch_candidates)
+                order = np.argsort(-identities, kind="stable")[:max_hits]
+                hits = [self._taxonomy[batch_candidates[i]] for i in order if identities[i] >= identity_threshold]
+                rows.append(self.get_consensus(hits, min_consensus))
+        return DataFrame(rows, index=feature_ids, columns=["Taxon", "Confidence"])
+
+    def _get_candidates(self, batch_kmers: list[np.ndarray], frequent: np.ndarray) -> list[np.ndarray]:
+        """References sharing the most informative k-mers with each ASV of the batch."""
+        reference_count = self.reference_count
+        keys = []
+        for row, kmers in enumerate(batch_kmers):
+            informative = kmers[~frequent[kmers]]
+            if informative.size == 0:
+                # only conserved k-mers, use all of them
+                informative = kmers
+            references = _gather(self._postings, self._kmer_offsets[informative], self._kmer_offsets[informative + 1])
+            keys.append(references.astype(np.int64) + row * reference_count)
+        counts = np.bincount(np.concatenate(keys), minlength=len(batch_kmers) * reference_count)
+        counts = counts.reshape(len(batch_kmers), reference_count)
+
+        candidate_count = min(self.CANDIDATE_COUNT, reference_count)
+        top = np.argpartition(-counts, candidate_count - 1, axis=1)[:, :candidate_count]
+        return [row_top[counts[row, row_top] > 0] for row, row_top in enumerate(top)]
+
+    def _get_identities(self, kmers: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """Estimated identity of the ASV to each candidate reference."""
+        if kmers.size == 0 or candidates.size == 0:
+            return np.zeros(candidates.size)
+        starts = self._reference_offsets[candidates]
+        ends = self._reference_offsets[candidates + 1]
+        candidate_kmers = _gather(self._reference_kmers, starts, ends)
+        found = np.isin(candidate_kmers, kmers, assume_unique=True)
+        boundaries = np.concatenate([[0], np.cumsum(ends - starts)])
+        shared = np.add.reduceat(np.append(found, False).astype(np.int64), boundaries[:-1])
+        # reduceat gives the next value for the empty references
+        shared[ends == starts] = 0
+        return (shared / kmers.size) ** (1 / self._k)
+
+    @classmethod
+    def get_consensus(cls, hits: list[str], min_consensus: float) -> tuple[str, float]:
+        """Deepest rank shared by ``min_consensus`` of the hits, and the fraction of the hits sharing it."""
+        if not hits:
+            return cls.UNASSIGNED, 0.0
+        ranks = [[rank.strip() for rank in hit.split(";")] for hit in hits]
+        consensus = []
+        confidence = 1.0
+        for level in range(max(len(hit_ranks) for hit_ranks in ranks)):
+            level_ranks = Counter(tuple(hit_ranks[:level + 1]) for hit_ranks in ranks if len(hit_ranks) > level)
+            lineage, count = level_ranks.most_common(1)[0]
+            if count / len(hits) < min_consensus:
+                break
+            consensus = list(lineage)
+            confidence = count / len(hits)
+        if not consensus:
+            return cls.UNASSIGNED, 0.0
+        return "; ".join(consensus), confidence
+
+    @staticmethod
+    def _write_array(directory: str, name: str, array: np.ndarray) -> None:
+        array.tofile(os.path.join(directory, name + ".dat"))
+
+    @staticmethod
+    def _open_array(directory: str, name: str, dtype: type) -> np.ndarray:
+        path = os.path.join(directory, name + ".dat")
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        # plain array view of the mapping, slicing a memmap object is slow
+        return np.asarray(np.memmap(path, dtype=dtype, mode="r"))
@@ -1,11 +1,15 @@
 
 import os
+from typing import ContextManager
 
 import plotly.graph_objects as go
+import psutil
 from gws_core import (
+    BoolParam,
     ConfigParams,
     ConfigSpecs,
     File,
+    FloatParam,
     Folder,
     InputSpec,
     InputSpecs,
@@ -25,8 +29,18 @@ from gws_core import (
     task_decorator,
 )
 from gws_core.impl.plotly.plotly_resource import PlotlyResource
+from pandas import DataFrame
 
+from ..base_env.file_links import reference_upstream_file, resolve_file
 from ..base_env.qiime2_env_task import Qiime2ShellProxyHelper
+from ..base_env.scratch_space import ScratchSpace
+from ..base_env.stage_checkpoint import StageCheckpoint
+from ..beta_diversity_statistics.distance_matrix_file import DistanceMatrixFile
+from ..dashboard_bundle.dashboard_bundle import DashboardBundle, DashboardBundleBuilder
+from .classifier_store import ClassifierStore
+from .diversity_stages import DiversityStages
+from .resource_estimator import ResourceEstimator, RunSize, StageMonitor
+from .taxonomy_assignment import TaxonomyAssignment
 
 
 @task_decorator("Qiime2TaxonomyDiversity", human_name="Q2 Taxonomy Diversity",
@@ -35,7 +49,11 @@ class Qiime2TaxonomyDiversity(Task):
     """
     Qiime2TaxonomyDiversity class.
 
-    This task classifies reads by taxon using a pre-fitted sklearn-based taxonomy classifier. By default, we suggest a pre-fitted Naive Bayes classifier for the database RDP (in version 18).
+    This task classifies reads by taxon using a pre-fitted sklearn-based taxonomy classifier. By default, we suggest a pre-fitted Naive Bayes classifier for the database RDP (in version 18). The classifiers are kept in a shared classifier store (`GWS_UBIOME_CLASSIFIER_STORE`), and the classification of the ASVs is cached by sequence and database (see `TaxonomyAssignment`).
+
+    The alpha and beta diversity (Bray-Curtis, Jaccard, weighted and unweighted UniFrac) are computed in-process over `threads` workers, averaged over `rarefaction_iterations` rarefactions at `rarefaction_plateau_value`. The phylogeny, and the diversity when `random_seed` is set, are reused across runs from a shared intermediate store (see `DiversityStages`). The beta diversity matrices of `diversity_tables` are distance matrix files, read memory-mapped by the `Beta diversity PCoA` and `Beta diversity group significance` tasks. Set `export_distance_matrices` to also write them as TSV files.
+
+    A preflight check estimates the memory and time of the run and reduces the diversity workers to fit in the available memory. With `resume_from_checkpoint`, a retry of a failed run skips its completed stages.
 
     **Minimum required configuration:** Digital lab SC2
 
@@ -60,21 +78,8 @@ class Qiime2TaxonomyDiversity(Task):
     DB_RDP_LOCATION = "https://storage.gra.cloud.ovh.net/v1/AUTH_a0286631d7b24afba3f3cdebed2992aa/opendata/ubiome/qiime2/RDP_OTUs_classifier.taxa_no_space.v18.202208.qza"
     DB_RDP_DESTINATION = "RDP_OTUs_classifier.taxa_no_space.v18.202208.qza"
 
-    # Diversity output files
-    DIVERSITY_PATHS = {
-        "Alpha Diversity - Shannon": "shannon_vector.qza.diversity_metrics.alpha-diversity.tsv",
-        "Alpha Diversity - Chao1": "chao1.qza.diversity_metrics.alpha-diversity.tsv",
-        "Alpha Diversity - Evenness": "evenness_vector.qza.diversity_metrics.alpha-diversity.tsv",
-        "Alpha Diversity - Faith pd": "faith_pd_vector.qza.diversity_metrics.alpha-diversity.tsv",
-        "Alpha Diversity - Observed features": "observed_features_vector.qza.diversity_metrics.alpha-diversity.tsv",
-        "Alpha Diversity - Simpson": "simpson.qza.diversity_metrics.alpha-diversity.tsv",
-        "Alpha Diversity - Inv Simpson": "invSimpson.tab.tsv",
-        "Beta Diversity - Bray Curtis": "bray_curtis_distance_matrix.qza.diversity_metrics.distance-matrix.tsv",
-        "Beta Diversity - Jaccard distance": "jaccard_distance_matrix.qza.diversity_metrics.distance-matrix.tsv",
-        "Beta Diversity - Jaccard unweighted unifrac": "jaccard_unweighted_unifrac_distance_matrix.qza.diversity_metrics.distance-matrix.tsv",
-        "Beta Diversity - Weighted unifrac": "weighted_unifrac_distance_matrix.qza.diversity_metrics.distance-matrix.tsv",
-        "Beta Diversity - Unweighted unifrac": "unweighted_unifrac_distance_matrix.qza.diversity_metrics.distance-matrix.tsv"
-    }
+    # Diversity output tables, by name
+    DIVERSITY_PATHS = DiversityStages.DIVERSITY_PATHS
 
     # Taxo stacked barplot
     TAXO_PATHS = {
@@ -90,6 +95,21 @@ class Qiime2TaxonomyDiversity(Task):
     FEATURE_TABLES_PATH = {
         "ASV_features_count": "asv_table.csv"
     }
+
+    # files of the feature inference folder referenced by the raw files (see reference_upstream_file)
+    UPSTREAM_FILES = ["rep-seqs.qza", "demux.qza", "table.qza"]
+
+    # Expected seconds of the stages of a run, in their order. The phylogeny, diversity and classification
+    # ones are replaced by the estimates of the ResourceEstimator when the size of the run is known
+    STAGE_WEIGHTS = {
+        "phylogeny": 300,
+        "diversity": 300,
+        "classification": 300,
+        "extra_diversity": 60,
+        "barplot": 20,
+        "asv_files": 60,
+        "save_outputs": 10
+    }
     input_specs: InputSpecs = InputSpecs({
         'rarefaction_analysis_result_folder':
         InputSpec(
@@ -99,7 +119,9 @@ class Qiime2TaxonomyDiversity(Task):
     output_specs: OutputSpecs = OutputSpecs({
         'diversity_tables': OutputSpec(ResourceSet),
         'taxonomy_tables': OutputSpec(ResourceSet),
-        'result_folder': OutputSpec(Folder)
+        'result_folder': OutputSpec(Folder),
+        'dashboard_bundle': OutputSpec(DashboardBundle, human_name="Dashboard bundle",
+                                       short_description="Compact preview of the results, read by the dashboard")
     })
     config_specs: ConfigSpecs = ConfigSpecs({
         "rarefaction_plateau_value":
@@ -109,65 +131,119 @@ class Qiime2TaxonomyDiversity(Task):
         "taxonomic_affiliation_database":
         StrParam(allowed_values=["RDP-v18.202208", "Silva-v13.8", "NCBI-16S_rRNA.20220712", "GreenGenes-v13.8"], default_value="RDP-v18.202208",
                  short_description="Database for taxonomic affiliation"),  # TO DO: add ram related options for "RDP", "Silva", , "NCBI-16S"
-        "threads": IntParam(default_value=2, min_value=2, short_description="Number of threads")
+        "classification_method": StrParam(
+            default_value=TaxonomyAssignment.NAIVE_BAYES,
+            allowed_values=[TaxonomyAssignment.NAIVE_BAYES, TaxonomyAssignment.KMER_TOP_HIT],
+            visibility=StrParam.PROTECTED_VISIBILITY,
+            short_description="Naive Bayes classifier, or fast consensus of the best reference hits in a k-mer index "
+            "(needs the reference sequences of the database in the classifier mirror)"),
+        "kmer_identity_threshold": FloatParam(
+            default_value=TaxonomyAssignment.KMER_IDENTITY_THRESHOLD, min_value=0.5, max_value=1.0,
+            visibility=FloatParam.PROTECTED_VISIBILITY,
+            short_description="Minimum estimated identity of the reference hits of the k-mer top-hit assignment"),
+        "threads": IntParam(default_value=2, min_value=2, short_description="Number of threads"),
+        "rarefaction_iterations": IntParam(
+            default_value=1, min_value=1,
+            short_description="Number of rarefactions averaged for the alpha and beta diversity"),
+        "random_seed": IntParam(
+            optional=True, visibility=IntParam.PROTECTED_VISIBILITY,
+            short_description="Seed of the rarefactions, set it to get reproducible diversity values"),
+        "export_distance_matrices": BoolParam(
+            default_value=False, visibility=BoolParam.PROTECTED_VISIBILITY,
+            short_description="Also write the distance matrices as TSV files in the result folder"),
+        "resume_from_checkpoint": BoolParam(
+            default_value=False, visibility=BoolParam.PROTECTED_VISIBILITY,
+            short_description="Resume a failed run after its last completed stage")
     })
 
-    def _verify_diversity_files_generated(self, working_dir: str) -> None:
+    @classmethod
+    def get_resource_estimator(cls) -> ResourceEstimator:
+        """Estimator calibrated on the runs recorded in the run history directory."""
+        return ResourceEstimator.get_default()
+
+    @classmethod
+    def get_run_size(cls, feature_folder_path: str, params: dict) -> RunSize:
+        return RunSize.from_feature_folder(
+            feature_folder_path, params["rarefaction_plateau_value"], params["rarefaction_iterations"],
+            params["threads"], params["taxonomic_affiliation_database"], params["classification_method"])
+
+    @classmethod
+    def estimate_resources(cls, feature_folder_path: str, params: dict) -> DataFrame:
+        """Peak memory and wall time estimate of each stage of a run, e.g. before creating it."""
+        return cls.get_resource_estimator().estimate(cls.get_run_size(feature_folder_path, params))
+
+    def _run_preflight(self, estimator: ResourceEstimator, qiime2_folder_path: str, classifier_path: str,
+                       params: ConfigParams) -> RunSize | None:
         """
-        Verify that critical diversity files were generated after the diversity indexes step.
-        If files are missing, raise an exception indicating insufficient RAM.
+        Estimate the peak memory and the wall time of the stages. Reduce the workers of the diversity
+        stage if the run does not fit in the available memory. The memory of the classifier worker, when
+        it already has the classifier loaded, is in use but not needed again by the classification.
 
-        :param working_dir: The working directory where files should be located
-        :raises Exception: If critical files are missing
+        :raises Exception: if the run does not fit in the available memory even with a single worker
+        :return: the size of the run with the adjusted workers, None if the size could not be read
         """
-        # List of critical files that should exist in core-metrics-results after the diversity step
-        critical_files = [
-            "shannon_vector.qza",
-            "evenness_vector.qza",
-            "faith_pd_vector.qza",
-            "observed_features_vector.qza",
-            "bray_curtis_distance_matrix.qza",
-            "jaccard_distance_matrix.qza",
-            "weighted_unifrac_distance_matrix.qza",
-            "unweighted_unifrac_distance_matrix.qza"
-        ]
+        try:
+            run_size = self.get_run_size(qiime2_folder_path, params)
+        except Exception as exception:
+            self.log_warning_message(f"Preflight check skipped, the size of the run could not be read: {exception}")
+            return None
+
+        resident_memory = self.get_resident_classifier_memory_gb(classifier_path, params)
+        run_size.warm_classifier = resident_memory is not None
+        estimate = estimator.estimate(run_size)
+        available_memory = ResourceEstimator.get_available_memory_gb()
+        self.log_info_message(
+            f"Preflight estimate for {run_size.asv_count} ASVs and {run_size.sample_count} samples, "
+            f"{available_memory:.1f} GB of memory available"
+            + (f", classifier already loaded ({resident_memory:.1f} GB)" if resident_memory is not None else "")
+            + ": " + ", ".join(f"{stage} {row['peak_memory_gb']} GB / {row['wall_time_seconds']} s"
+                               for stage, row in estimate.iterrows()))
+
+        workers = estimator.adjust_workers(run_size, available_memory, resident_memory or 0.0)
+        if workers < run_size.workers:
+            self.log_warning_message(
+                f"Using {workers} worker(s) instead of {run_size.workers} for the diversity to fit in the available memory")
+            run_size.workers = workers
+        return run_size
+
+    @staticmethod
+    def get_resident_classifier_memory_gb(classifier_path: str, params: ConfigParams) -> float | None:
+        """Memory of the classifier worker used by the run, None if it has not loaded the classifier."""
+        if params["classification_method"] != TaxonomyAssignment.NAIVE_BAYES:
+            return None
+        worker = TaxonomyAssignment.get_classifier_worker(classifier_path)
+        if worker is None:
+            return None
+        try:
+            return worker.memory_info().rss / 1024 ** 3
+        except psutil.NoSuchProcess:
+            return None
+
+    def _record_stage(self, estimator: ResourceEstimator, stage: str, run_size: RunSize | None,
+                      monitor: StageMonitor) -> None:
+        self.log_info_message(
+            f"Stage {stage}: {monitor.seconds:.0f} s, peak memory {monitor.peak_memory_gb:.2f} GB")
+        if run_size is None:
+            return
+        try:
+            estimator.record(stage, run_size, monitor)
+        except OSError as exception:
+            self.log_warning_message(f"Could not record the {stage} stage in the run history: {exception}")
+
+    def get_classifier_path(self, db_taxo: str) -> str:
+        """Path of the verified classifier of the database from the shared store, downloaded if no mirror has it."""
+        if db_taxo not in self.DB_LOCATIONS or db_taxo not in self.DB_DESTINATIONS:
+            raise Exception("Unknown taxonomic affiliation database")
 
-        core_metrics_dir = os.path.join(working_dir, "core-metrics-results")
-
-        # Check if core-metrics-results directory exists
-        if not os.path.exists(core_metrics_dir):
-            self.log_error_message(
-                "The core-metrics-results directory was not created. "
-                "This usually indicates insufficient RAM memory for the diversity calculations."
-            )
-            raise Exception(
-                "Diversity calculation failed: core-metrics-results directory not found. "
-                "This is likely due to insufficient RAM memory. "
-                "Please increase the RAM capacity and try again."
-            )
-
-        # Check for missing critical files
-        missing_files = []
-        for file_name in critical_files:
-            file_path = os.path.join(core_metrics_dir, file_name)
-            if not os.path.exists(file_path):
-                missing_files.append(file_name)
-
-        if missing_files:
-            self.log_error_message(
-                f"Critical diversity files were not generated: {', '.join(missing_files)}. "
-                "This usually indicates insufficient RAM memory for the diversity calculations."
-            )
-            raise Exception(
-                f"Diversity calculation failed: {len(missing_files)} critical file(s) missing. "
-                "This is likely due to insufficient RAM memory. "
-                "Please increase the RAM capacity and try again. "
-                f"Missing files: {', '.join(missing_files[:3])}{'...' if len(missing_files) > 3 else ''}"
-            )
+        # create the file_downloader from a task.
+        file_downloader = TaskFileDownloader(
+            Qiime2TaxonomyDiversity.get_brick_name(),
+            self.message_dispatcher)
 
-        self.log_info_message(
-            f"All {len(critical_files)} critical diversity files were successfully generated."
-        )
+        self.log_info_message(f"Getting the {db_taxo} classifier from the classifier store")
+        return ClassifierStore.get_default().get_classifier(
+            db_taxo, self.DB_DESTINATIONS[db_taxo],
+            lambda: file_downloader.download_file_if_missing(self.DB_LOCATIONS[db_taxo], self.DB_DESTINATIONS[db_taxo]))
 
     def run(self, params: ConfigParams, inputs: TaskInputs) -> TaskOutputs:
         qiime2_folder: Folder = inputs["rarefaction_analysis_result_folder"]
@@ -176,69 +252,113 @@ class Qiime2TaxonomyDiversity(Task):
         script_file_dir = os.path.dirname(os.path.realpath(__file__))
         qiime2_folder_path = qiime2_folder.path
 
-        shell_proxy = Qiime2ShellProxyHelper.create_proxy(
-            self.message_dispatcher)
-
-        if db_taxo not in self.DB_LOCATIONS or db_taxo not in self.DB_DESTINATIONS:
-            raise Exception("Unknown taxonomic affiliation database")
-
-        # create the file_downloader from a task.
-        file_downloader = TaskFileDownloader(
-            Qiime2TaxonomyDiversity.get_brick_name(),
-            self.message_dispatcher)
-
-        # download a file
-        file_path = file_downloader.download_file_if_missing(
-            self.DB_LOCATIONS[db_taxo], self.DB_DESTINATIONS[db_taxo])
-        return self.run_cmd_lines(shell_proxy,
-                                  script_file_dir,
-                                  qiime2_folder_path,
-                                  plateau_val,
-                                  file_path,
-                                  params
-                                  )
+        # the attempts of the run share a working directory, a retry resumes after the last completed stage
+        with self.open_checkpoint_run_dir(qiime2_folder_path, params) as working_dir:
+            shell_proxy = Qiime2ShellProxyHelper.create_proxy(
+                self.message_dispatcher, working_dir)
+
+            file_path = self.get_classifier_path(db_taxo)
+            TaxonomyAssignment.check_method(file_path, db_taxo, params["classification_method"])
+            with ScratchSpace(shell_proxy.working_dir, self.log_info_message) as scratch:
+                outputs = self.run_cmd_lines(shell_proxy,
+                                             script_file_dir,
+                                             qiime2_folder_path,
+                                             plateau_val,
+                                             file_path,
+                                             params,
+                                             scratch
+                                             )
+
+        # the taxonomy tables are reduced to their most abundant taxa
+        bundle_builder = DashboardBundleBuilder()
+        bundle_builder.add_outputs(outputs)
+        bundle_builder.add_stats({"rarefaction_plateau_value": plateau_val,
+                                  "taxonomic_affiliation_database": db_taxo})
+        outputs["dashboard_bundle"] = bundle_builder.build()
+        return outputs
+
+    def run_script(self, shell_proxy: ShellProxy, scratch: ScratchSpace, cmd: list, stage: str,
+                   step_name: str) -> None:
+        res = scratch.run(shell_proxy, cmd, stage)
+        if res != 0:
+            raise Exception(f"{step_name} did not finished")
+
+    def open_checkpoint_run_dir(self, qiime2_folder_path: str, params: dict) -> ContextManager[str | None]:
+        """Checkpoint directory of the run (see ``StageCheckpoint``), None to run in a temporary directory."""
+        return StageCheckpoint.open_task_run_dir(Qiime2TaxonomyDiversity.get_brick_name(), [qiime2_folder_path],
+                                                 params, self.log_warning_message)
+
+    def get_stage_weights(self, estimator: ResourceEstimator, run_size: RunSize | None) -> dict[str, float]:
+        """Expected seconds of the stages, from the estimates of the run when its size is known."""
+        weights = dict(self.STAGE_WEIGHTS)
+        if run_size is not None:
+            estimate = estimator.estimate(run_size)
+            for stage in ResourceEstimator.STAGES:
+                weights[stage] = max(float(estimate.loc[stage, "wall_time_seconds"]), 1)
+        return weights
 
     def run_cmd_lines(self, shell_proxy: ShellProxy,
                       script_file_dir: str,
                       qiime2_folder_path: str,
                       plateau_val: int,
                       db_name: str,
-                      params: ConfigParams) -> TaskOutputs:
-
-        # This script create Qiime2 core diversity metrics based on clustering
-        cmd_1 = [
-            "bash",
-            os.path.join(script_file_dir,
-                         "./sh/1_qiime2_diversity_indexes.sh"),
-            qiime2_folder_path,
-            plateau_val
-        ]
+                      params: ConfigParams,
+                      scratch: ScratchSpace) -> TaskOutputs:
+
+        # Estimate the memory and time of the run, reduce the workers or stop if the memory is insufficient
+        estimator = self.get_resource_estimator()
+        run_size = self._run_preflight(estimator, qiime2_folder_path, db_name, params)
+        workers = run_size.workers if run_size else params["threads"]
+        checkpoint = StageCheckpoint(shell_proxy.working_dir, self.get_stage_weights(estimator, run_size),
+                                     self.update_progress_value, self.log_info_message)
+
+        def record_stage(stage: str, monitor: StageMonitor) -> None:
+            self._record_stage(estimator, stage, run_size, monitor)
+        diversity_stages = DiversityStages(shell_proxy, script_file_dir, self.message_dispatcher, record_stage)
+        taxonomy_assignment = TaxonomyAssignment(shell_proxy, script_file_dir, self.message_dispatcher)
+        rep_seqs_path = os.path.join(qiime2_folder_path, "rep-seqs.qza")
+        raw_files_dir = os.path.join("taxonomy_and_diversity", "raw_files")
+        table_files_dir = os.path.join("taxonomy_and_diversity", "table_files")
+
+        # Phylogeny of the ASVs, then filtering and diversity, both reused from the intermediate store.
+        # The outputs checked on resume are the files not moved by 6_qiime2_save_extra_output_files.sh
         self.log_info_message("Creating Qiime2 core diversity indexes")
-        res = shell_proxy.run(cmd_1)
-        if res != 0:
-            raise Exception(
-                "Core diversity indexes generation did not finished.")
-
-        # Verify that critical intermediate files were generated
-        self._verify_diversity_files_generated(shell_proxy.working_dir)
-
-        self.update_progress_value(16, "Done")
 
-        # This script perform Qiime2 taxonomix assignment using pre-trained taxonomic DB
-
-        cmd_2 = [
-            "bash",
-            os.path.join(script_file_dir,
-                         "./sh/2_qiime2_taxonomic_assignment.sh"),
-            qiime2_folder_path,
-            db_name
-        ]
-        self.log_info_message(
-            "Performing Qiime2 taxonomic assignment with pre-trained model")
-        res = shell_proxy.run(cmd_2)
-        if res != 0:
-            raise Exception("Taxonomic assignment step did not finished")
-        self.update_progress_value(32, "Done")
+        def run_phylogeny() -> None:
+            with scratch.measure("phylogeny"):
+                diversity_stages.prepare_phylogeny(qiime2_folder_path)
+        checkpoint.run_stage(
+            "phylogeny", run_phylogeny,
+            inputs=[rep_seqs_path],
+            outputs=[os.path.join(folder, file_name) for file_name, folder in DiversityStages.PHYLOGENY_FILES.items()
+                     if folder])
+
+        def run_diversity() -> None:
+            with scratch.measure("diversity"):
+                diversity_stages.prepare_diversity(qiime2_folder_path, params, workers,
+                                                   checkpoint.get_progress_callback("diversity"), scratch.path)
+        checkpoint.run_stage(
+            "diversity", run_diversity,
+            inputs=[os.path.join(qiime2_folder_path, "table.qza"), rep_seqs_path],
+            outputs=[os.path.join("taxonomy_and_diversity", path) for path in DiversityStages.get_diversity_files()])
+        distance_matrices = diversity_stages.open_distance_matrices()
+
+        # Qiime2 taxonomic assignment using pre-trained taxonomic DB, for the ASVs not found in the cache.
+        # The classifier worker is measured with the stage, whether it was already loaded or not
+        def get_classifier_worker() -> list[psutil.Process]:
+            worker = TaxonomyAssignment.get_classifier_worker(db_name)
+            return [worker] if worker is not None else []
+
+        def run_classification() -> None:
+            if run_size is not None:
+                run_size.warm_classifier = self.get_resident_classifier_memory_gb(db_name, params) is not None
+            with scratch.measure("classification"), StageMonitor(get_classifier_worker) as monitor:
+                taxonomy_assignment.assign_taxonomy(
+                    qiime2_folder_path, db_name, params["taxonomic_affiliation_database"],
+                    params["classification_method"], params["kmer_identity_threshold"], scratch.path)
+            record_stage("classification", monitor)
+        checkpoint.run_stage("classification", run_classification, inputs=[rep_seqs_path, db_name],
+                             outputs=["gg.taxonomy.tsv"])
 
         # This script perform extra diversity assessment via qiime2
         cmd_3 = [
@@ -249,8 +369,14 @@ class Qiime2TaxonomyDiversity(Task):
             shell_proxy.working_dir
         ]
         self.log_info_message("Calculating Qiime2 extra diversity indexes")
-        res = shell_proxy.run(cmd_3)
-        self.update_progress_value(48, "Done")
+
+        def run_extra_diversity() -> None:
+            # the exit code is not checked, the exported tables are checked by the checkpoint
+            scratch.run(shell_proxy, cmd_3, "extra_diversity")
+        checkpoint.run_stage(
+            "extra_diversity", run_extra_diversity,
+            inputs=[os.path.join(qiime2_folder_path, "qiime2_manifest.csv")],
+            outputs=[os.path.join(table_files_dir, value.removesuffix(".parsed.tsv")) for value in self.TAXO_PATHS.values()])
 
         # Converting Qiime2 barplot output compatible with constellab front
         cmd_4 = [
@@ -264,10 +390,9 @@ class Qiime2TaxonomyDiversity(Task):
         ]
         self.log_info_message(
             "Converting Qiime2 taxonomic barplot for visualisation")
-        res = shell_proxy.run(cmd_4)
-        if res != 0:
-            raise Exception("Barplot convertion did not finished")
-        self.update_progress_value(68, "Done")
+        checkpoint.run_stage(
+            "barplot", lambda: self.run_script(shell_proxy, scratch, cmd_4, "barplot", "Barplot convertion"),
+            outputs=[os.path.join(table_files_dir, value) for value in self.TAXO_PATHS.values()])
 
         # Getting Qiime2 ASV output files
         cmd_5 = [
@@ -277,10 +402,10 @@ class Qiime2TaxonomyDiversity(Task):
             shell_proxy.working_dir
         ]
         self.log_info_message("Qiime2 ASV output file generation")
-        res = shell_proxy.run(cmd_5)
-        if res != 0:
-            raise Exception("ASV output file generation did not finished")
-        self.update_progress_value(84, "Done")
+        checkpoint.run_stage(
+            "asv_files", lambda: self.run_script(shell_proxy, scratch, cmd_5, "asv_files", "ASV output file generation"),
+            outputs=[os.path.join(raw_files_dir, "asv_dict.csv"),
+                     *[os.path.join(table_files_dir, value) for value in self.FEATURE_TABLES_PATH.values()]])
 
         # Saving output files in the final output result folder Folder
         cmd_6 = [
@@ -291,10 +416,17 @@ class Qiime2TaxonomyDiversity(Task):
             shell_proxy.working_dir
         ]
         self.log_info_message("Moving files in the output directory")
-        res = shell_proxy.run(cmd_6)
-        if res != 0:
-            raise Exception("Moving files did not finished")
-        self.update_progress_value(100, "Done")
+
+        def run_save_outputs() -> None:
+            self.run_script(shell_proxy, scratch, cmd_6, "save_outputs", "Moving files")
+            # the large files of the feature inference folder are referenced, not copied
+            for file_name in self.UPSTREAM_FILES:
+                reference_upstream_file(resolve_file(qiime2_folder_path, file_name),
+                                        os.path.join(shell_proxy.working_dir, raw_files_dir))
+        checkpoint.run_stage(
+            "save_outputs", run_save_outputs,
+            inputs=[qiime2_folder_path],
+            outputs=[os.path.join(raw_files_dir, "gws_metadata.csv"), os.path.join(raw_files_dir, "gg.taxonomy.qza")])
 
         # Output object creation and Table annotation
 
@@ -313,27 +445,21 @@ class Qiime2TaxonomyDiversity(Task):
 
         # Parcourir les éléments de DIVERSITY_PATHS
         for key, value in self.DIVERSITY_PATHS.items():
+            if key in distance_matrices:
+                # the matrix stays in its memory-mapped file, read directly by the PCoA and significance tasks
+                distance_matrix = distance_matrices[key]
+                samples_table = TableAnnotatorHelper.annotate_rows(
+                    Table(DataFrame({"sample": distance_matrix.ids}, index=distance_matrix.ids)), metadata_table,
+                    use_table_row_names_as_ref=True)
+                diversity_resource_table_set.add_resource(DistanceMatrixFile.move_from(
+                    distance_matrix, os.path.join(shell_proxy.working_dir, "distance_matrices"),
+                    samples_table.get_row_tags(), key))
+                continue
+
             path = os.path.join(shell_proxy.working_dir,
                                 "taxonomy_and_diversity", "table_files", value)
-
-            # Si la clé est égale à "Alpha Diversity - Faith pd", ajustez le traitement de la colonne Faith PD
-            if key == "Alpha Diversity - Faith pd":
-                # Lisez le contenu du fichier pour déterminer sa structure
-                with open(path) as file:
-                    first_line = file.readline().strip()  # Lire la première ligne du fichier
-                    # Si la première ligne commence par '#SampleID', la structure est différente
-                    if first_line.startswith('#SampleID'):
-                        table: Table = TableImporter.call(
-                            File(path=path),
-                            {'delimiter': 'tab', "index_column": 0, 'header': -1, 'comment': '#'})
-                        raw_table_columns = ["faith_pd"]
-                        table.set_all_column_names(raw_table_columns)
-                    else:
-                        table: Table = TableImporter.call(
-                            File(path=path), {'delimiter': 'tab', "index_column": 0})
-            else:
-                table: Table = TableImporter.call(
-                    File(path=path), {'delimiter': 'tab', "index_column": 0})
+            table: Table = TableImporter.call(
+                File(path=path), {'delimiter': 'tab', "index_column": 0})
 
             table_annotated = TableAnnotatorHelper.annotate_rows(
                 table, metadata_table, use_table_row_names_as_ref=True)
@@ -379,6 +505,7 @@ class Qiime2TaxonomyDiversity(Task):
             table_annotated.name = key
             taxo_resource_table_set.add_resource(table_annotated)
 
+        checkpoint.complete()
         return {
             'result_folder': result_folder,
             'diversity_tables': diversity_resource_table_set,
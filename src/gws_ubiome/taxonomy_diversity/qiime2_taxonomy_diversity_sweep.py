@@ -0,0 +1,210 @@
+import os
+import secrets
+
+from gws_core import (
+    BoolParam,
+    ConfigParams,
+    ConfigSpecs,
+    FloatParam,
+    Folder,
+    InputSpec,
+    InputSpecs,
+    IntParam,
+    OutputSpec,
+    OutputSpecs,
+    ResourceSet,
+    StrParam,
+    Table,
+    TaskInputs,
+    TaskOutputs,
+    task_decorator,
+)
+from pandas import DataFrame
+
+from ..base_env.qiime2_env_task import Qiime2ShellProxyHelper
+from ..base_env.scratch_space import ScratchSpace
+from .qiime2_taxonomy_diversity import Qiime2TaxonomyDiversity
+from .taxonomy_assignment import TaxonomyAssignment
+
+
+@task_decorator("Qiime2TaxonomyDiversitySweep", human_name="Q2 Taxonomy Diversity Sweep",
+                short_description="Taxonomy and diversity for a grid of rarefaction depths and databases")
+class Qiime2TaxonomyDiversitySweep(Qiime2TaxonomyDiversity):
+    """
+    Qiime2TaxonomyDiversitySweep class.
+
+    Runs the Q2 Taxonomy Diversity task for each combination of the `rarefaction_plateau_values` and of the `taxonomic_affiliation_databases`, e.g. 3 depths x 2 databases. Each sub-step runs once for the parameters it depends on:
+
+    - the phylogeny of the ASVs depends on none of them, it is built once
+    - the filtering and the diversity only depend on the depth, they are computed once per depth
+    - the classification only depends on the database, the ASVs are classified once per database (classification cache)
+
+    All the combinations share the same rarefactions (`random_seed`, drawn when not set), so their diversity values can be compared. The combinations are run by depth, then by database. With `resume_from_checkpoint`, set the `random_seed` to resume a failed sweep: the failed combination resumes after its last completed stage, and the completed ones reuse the intermediate store.
+
+    The `result_folders` set holds the result folder of each combination (e.g. `Depth 1000 - RDP-v18.202208`), which can be used as input of the next steps. The `comparison_table` gives, for each combination, the samples kept, the mean alpha diversity and the number of genera.
+    """
+
+    COMPARISON_ALPHA_METRICS = {
+        "shannon_entropy": "Alpha Diversity - Shannon",
+        "observed_features": "Alpha Diversity - Observed features",
+        "faith_pd": "Alpha Diversity - Faith pd",
+        "chao1": "Alpha Diversity - Chao1"
+    }
+    GENUS_TABLE_NAME = "6_Genus"
+    # Parameters of the Q2 Taxonomy Diversity task shared by all the combinations
+    SHARED_PARAM_NAMES = ["classification_method", "kmer_identity_threshold", "threads", "rarefaction_iterations",
+                          "export_distance_matrices"]
+
+    input_specs: InputSpecs = InputSpecs({
+        'rarefaction_analysis_result_folder':
+        InputSpec(
+            Folder,
+            short_description="Feature freq. folder",
+            human_name="feature_freq_folder")})
+    output_specs: OutputSpecs = OutputSpecs({
+        'result_folders': OutputSpec(ResourceSet, human_name="Result folders",
+                                     short_description="Result folder of each combination"),
+        'comparison_table': OutputSpec(Table, human_name="Comparison table",
+                                       short_description="Summary of the diversity and taxonomy of each combination")
+    })
+    config_specs: ConfigSpecs = ConfigSpecs({
+        "rarefaction_plateau_values":
+        StrParam(short_description="Comma-separated depths of coverage to compare, e.g. 1000, 2000, 5000"),
+        "taxonomic_affiliation_databases":
+        StrParam(default_value="RDP-v18.202208",
+                 short_description="Comma-separated databases to compare, among RDP-v18.202208, Silva-v13.8, "
+                 "NCBI-16S_rRNA.20220712 and GreenGenes-v13.8"),
+        "classification_method": StrParam(
+            default_value=TaxonomyAssignment.NAIVE_BAYES,
+            allowed_values=[TaxonomyAssignment.NAIVE_BAYES, TaxonomyAssignment.KMER_TOP_HIT],
+            visibility=StrParam.PROTECTED_VISIBILITY,
+            short_description="Naive Bayes classifier, or fast consensus of the best reference hits in a k-mer index "
+            "(needs the reference sequences of the database in the classifier mirror)"),
+        "kmer_identity_threshold": FloatParam(
+            default_value=TaxonomyAssignment.KMER_IDENTITY_THRESHOLD, min_value=0.5, max_value=1.0,
+            visibility=FloatParam.PROTECTED_VISIBILITY,
+            short_description="Minimum estimated identity of the reference hits of the k-mer top-hit assignment"),
+        "threads": IntParam(default_value=2, min_value=2, short_description="Number of threads"),
+        "rarefaction_iterations": IntParam(
+            default_value=1, min_value=1,
+            short_description="Number of rarefactions averaged for the alpha and beta diversity"),
+        "random_seed": IntParam(
+            optional=True, visibility=IntParam.PROTECTED_VISIBILITY,
+            short_description="Seed of the rarefactions shared by the combinations, drawn when not set"),
+        "export_distance_matrices": BoolParam(
+            default_value=False, visibility=BoolParam.PROTECTED_VISIBILITY,
+            short_description="Also write the distance matrices as TSV files in the result folders"),
+        "resume_from_checkpoint": BoolParam(
+            default_value=False, visibility=BoolParam.PROTECTED_VISIBILITY,
+            short_description="Resume a failed sweep after the last completed stage of its combinations")
+    })
+
+    _progress_range: tuple[float, float] = (0, 100)
+
+    @classmethod
+    def parse_plateau_values(cls, value: str) -> list[int]:
+        try:
+            plateau_values = [int(item) for item in value.replace(";", ",").split(",") if item.strip()]
+        except ValueError as exception:
+            raise Exception(f"The rarefaction plateau values must be integers: '{value}'") from exception
+        if not plateau_values or min(plateau_values) < 20:
+            raise Exception("At least one rarefaction plateau value is required, all of them at least 20")
+        return list(dict.fromkeys(plateau_values))
+
+    @classmethod
+    def parse_databases(cls, value: str) -> list[str]:
+        databases = [item.strip() for item in value.replace(";", ",").split(",") if item.strip()]
+        unknown_databases = [database for database in databases if database not in cls.DB_LOCATIONS]
+        if not databases or unknown_databases:
+            raise Exception(
+                f"Unknown taxonomic affiliation database(s) {', '.join(unknown_databases)}, "
+                f"available databases: {', '.join(cls.DB_LOCATIONS)}")
+        return list(dict.fromkeys(databases))
+
+    @classmethod
+    def get_combinations(cls, params: dict) -> list[tuple[int, str]]:
+        """(depth, database) combinations of the sweep, by depth then by database."""
+        databases = cls.parse_databases(params["taxonomic_affiliation_databases"])
+        return [(plateau_value, database)
+                for plateau_value in cls.parse_plateau_values(params["rarefaction_plateau_values"])
+                for database in databases]
+
+    @classmethod
+    def get_combination_params(cls, params: dict, plateau_value: int, database: str, random_seed: int) -> dict:
+        """Config of the Q2 Taxonomy Diversity task for a combination of the sweep."""
+        combination_params = {name: params[name] for name in cls.SHARED_PARAM_NAMES}
+        combination_params.update({
+            "rarefaction_plateau_value": plateau_value,
+            "taxonomic_affiliation_database": database,
+            "random_seed": random_seed,
+            "resume_from_checkpoint": params["resume_from_checkpoint"]
+        })
+        return combination_params
+
+    @staticmethod
+    def get_combination_name(plateau_value: int, database: str) -> str:
+        return f"Depth {plateau_value} - {database}"
+
+    def run(self, params: ConfigParams, inputs: TaskInputs) -> TaskOutputs:
+        qiime2_folder: Folder = inputs["rarefaction_analysis_result_folder"]
+        combinations = self.get_combinations(params)
+        databases = list(dict.fromkeys(database for _, database in combinations))
+        script_file_dir = os.path.dirname(os.path.realpath(__file__))
+
+        # the same rarefactions for all the combinations, the diversity of a depth is computed once
+        random_seed = params["random_seed"] if params["random_seed"] is not None else secrets.randbits(31)
+        self.log_info_message(
+            f"Sweeping {len(combinations)} combination(s) of {len(combinations) // len(databases)} depth(s) and "
+            f"{len(databases)} database(s), with the random seed {random_seed}")
+        classifier_paths = {database: self.get_classifier_path(database) for database in databases}
+        for database, classifier_path in classifier_paths.items():
+            TaxonomyAssignment.check_method(classifier_path, database, params["classification_method"])
+
+        result_folders = ResourceSet()
+        result_folders.name = "Result folders of the taxonomy and diversity sweep"
+        comparison_rows = []
+        for index, (plateau_value, database) in enumerate(combinations):
+            name = self.get_combination_name(plateau_value, database)
+            self.log_info_message(f"Combination {index + 1}/{len(combinations)}: {name}")
+            self._progress_range = (100 * index / len(combinations), 100 * (index + 1) / len(combinations))
+
+            combination_params = self.get_combination_params(params, plateau_value, database, random_seed)
+            # the checkpoint directory of a combination is the one of the Q2 Taxonomy Diversity run of its params
+            with self.open_checkpoint_run_dir(qiime2_folder.path, combination_params) as working_dir:
+                shell_proxy = Qiime2ShellProxyHelper.create_proxy(self.message_dispatcher, working_dir)
+                with ScratchSpace(shell_proxy.working_dir, self.log_info_message) as scratch:
+                    outputs = self.run_cmd_lines(shell_proxy, script_file_dir, qiime2_folder.path, plateau_value,
+                                                 classifier_paths[database], combination_params, scratch)
+
+            result_folder: Folder = outputs["result_folder"]
+            result_folder.name = name
+            result_folders.add_resource(result_folder)
+            comparison_rows.append(self.summarize_combination(
+                plateau_value, database, outputs["diversity_tables"], outputs["taxonomy_tables"]))
+
+        comparison_table = Table(DataFrame(comparison_rows).set_index("Combination"))
+        comparison_table.name = "Taxonomy and diversity sweep comparison"
+        return {
+            'result_folders': result_folders,
+            'comparison_table': comparison_table
+        }
+
+    def summarize_combination(self, plateau_value: int, database: str, diversity_tables: ResourceSet,
+                              taxonomy_tables: ResourceSet) -> dict:
+        diversity_resources = diversity_tables.get_resources()
+        row = {
+            "Combination": self.get_combination_name(plateau_value, database),
+            "Rarefaction plateau value": plateau_value,
+            "Database": database,
+            "Samples": diversity_resources["Alpha Diversity - Shannon"].get_data().shape[0]
+        }
+        for metric, table_name in self.COMPARISON_ALPHA_METRICS.items():
+            row[f"Mean {metric}"] = float(diversity_resources[table_name].get_data()[metric].mean())
+        genus_data = taxonomy_tables.get_resources()[self.GENUS_TABLE_NAME].get_data()
+        row["Genera"] = int((genus_data.select_dtypes("number").sum() > 0).sum())
+        return row
+
+    def update_progress_value(self, value: float, message: str | None = None) -> None:
+        # progress of the current combination, within the range of the combination
+        start, end = self._progress_range
+        super().update_progress_value(start + (end - start) * value / 100, message)
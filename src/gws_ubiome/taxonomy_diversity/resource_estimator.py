@@ -0,0 +1,340 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+import numpy as np
+import psutil
+from pandas import DataFrame, read_csv
+from scipy.optimize import nnls
+
+from ..base_env.data_root import DataRoot
+from .classification_cache import read_qza_sequences
+
+
+class RunSize:
+    """
+    Size of a taxonomy and diversity run, read from the feature inference folder and the task parameters.
+    ``warm_classifier`` is set when the classifier is already loaded by the classifier worker.
+    """
+
+    asv_count: int
+    sample_count: int
+    depth: int
+    iterations: int
+    workers: int
+    database: str
+    method: str
+    warm_classifier: bool
+
+    def __init__(self, asv_count: int, sample_count: int, depth: int, iterations: int, workers: int,
+                 database: str, method: str, warm_classifier: bool = False) -> None:
+        self.asv_count = asv_count
+        self.sample_count = sample_count
+        self.depth = depth
+        self.iterations = iterations
+        self.workers = max(workers, 1)
+        self.database = database
+        self.method = method
+        self.warm_classifier = warm_classifier
+
+    @classmethod
+    def from_feature_folder(cls, folder_path: str, depth: int, iterations: int, workers: int,
+                            database: str, method: str) -> 'RunSize':
+        """
+        Count the ASVs of ``rep-seqs.qza`` and the samples of ``sample-frequency-detail.tsv`` with at least
+        ``depth`` reads (the samples kept by the diversity indexes step).
+        """
+        asv_count = len(read_qza_sequences(os.path.join(folder_path, "rep-seqs.qza")))
+        frequencies = read_csv(os.path.join(folder_path, "sample-frequency-detail.tsv"), sep="\t",
+                               header=None, index_col=0).iloc[:, 0]
+        frequencies = frequencies[frequencies.index.notna()]
+        sample_count = int((frequencies.astype(float) >= depth).sum())
+        return cls(asv_count, sample_count, depth, iterations, workers, database, method)
+
+    def to_dict(self) -> dict:
+        return {"asv_count": self.asv_count, "sample_count": self.sample_count, "depth": self.depth,
+                "iterations": self.iterations, "workers": self.workers, "database": self.database,
+                "method": self.method, "warm_classifier": self.warm_classifier}
+
+
+class StageMonitor:
+    """
+    Wall time and peak resident memory (current process and its children, and the processes of
+    ``get_extra_processes`` such as the classifier worker) of a stage, polled by a background thread:
+
+        with StageMonitor() as monitor:
+            ...
+        monitor.seconds, monitor.peak_memory_gb
+    """
+
+    POLL_INTERVAL_SECONDS = 1
+
+    seconds: float
+    peak_memory_gb: float
+    _peak_rss: int
+    _started_at: float
+    _stop: threading.Event
+    _thread: threading.Thread | None
+    _get_extra_processes: Callable[[], list[psutil.Process]] | None
+
+    def __init__(self, get_extra_processes: Callable[[], list[psutil.Process]] | None = None) -> None:
+        self.seconds = 0.0
+        self.peak_memory_gb = 0.0
+        self._peak_rss = 0
+        self._started_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._get_extra_processes = get_extra_processes
+
+    def __enter__(self) -> 'StageMonitor':
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._peak_rss = max(self._peak_rss, self._get_rss())
+        self.seconds = time.monotonic() - self._started_at
+        self.peak_memory_gb = self._peak_rss / 1024 ** 3
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.POLL_INTERVAL_SECONDS):
+            self._peak_rss = max(self._peak_rss, self._get_rss())
+
+    def _get_rss(self) -> int:
+        process = psutil.Process(os.getpid())
+        processes = {child.pid: child for child in process.children(recursive=True)}
+        if self._get_extra_processes is not None:
+            # an extra process can also be a child, e.g. a worker started by the stage
+            processes.update((extra.pid, extra) for extra in self._get_extra_processes())
+        total_rss = process.memory_info().rss
+        for child in processes.values():
+            try:
+                total_rss += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                # the process ended between the listing and the memory read
+                continue
+        return total_rss
+
+
+class ResourceEstimator(DataRoot):
+    """
+    Peak memory and wall time model of the stages of ``Qiime2TaxonomyDiversity``.
+
+    Each stage is modelled as non-negative linear combinations of size features of the run:
+
+    - ``phylogeny`` (alignment and tree): memory ~ ASVs, time ~ ASVs log(ASVs)
+    - ``diversity`` (repeated rarefaction, alpha and beta diversity): memory ~ workers x samples^2
+      (distance blocks and per-worker matrices) + samples x ASVs (count matrix), time ~ iterations x
+      samples^2 x log(ASVs) / workers
+    - ``classification``: memory constant per database and method (the loaded classifier, counted
+      whether the classifier worker was already loaded or not), time ~ ASVs + loading of the classifier
+      when the worker was not loaded
+
+    The coefficients start from conservative defaults and are fitted (non-negative least squares) on the
+    stages recorded by the previous runs, in a JSON lines history file of the
+    ``GWS_UBIOME_RUN_HISTORY_DIR`` directory, as soon as ``MIN_RECORDS`` runs of the same kind are
+    recorded. The predicted memory includes a ``MEMORY_MARGIN``.
+    """
+
+    ROOT_ENV = "GWS_UBIOME_RUN_HISTORY_DIR"
+    DEFAULT_ROOT = "/data/gws_ubiome/run_history"
+    HISTORY_FILE_NAME = "run_history.jsonl"
+    STAGES = ["phylogeny", "diversity", "classification"]
+    MIN_RECORDS = 3
+    MEMORY_MARGIN = 1.2
+    # Memory (GB) of the loaded classifiers, before calibration. The sklearn pipelines of the Naive Bayes
+    # classifiers take several times the size of their artifact once loaded; the Silva 138 99% one
+    # (full length 16S, ~400k reference sequences) is the largest and needs over 20 GB, the RDP, NCBI and
+    # GreenGenes ones a few GB. The values are rounded up, the fit replaces them after MIN_RECORDS runs
+    DATABASE_MEMORY_GB = {
+        "RDP-v18.202208": 8.0,
+        "Silva-v13.8": 24.0,
+        "NCBI-16S_rRNA.20220712": 8.0,
+        "GreenGenes-v13.8": 8.0
+    }
+    DEFAULT_DATABASE_MEMORY_GB = 16.0
+    # Memory (GB) of the k-mer index search, a compact index of the reference sequences
+    KMER_METHOD_MEMORY_GB = 2.0
+    # Default coefficients of the memory (GB) and time (s) features of each stage, in the order of
+    # get_memory_features and get_time_features:
+    # - phylogeny: 0.5 GB + 100 kB per ASV (alignment), 30 s + 2 ms x ASVs log2(ASVs) (MAFFT and FastTree)
+    # - diversity: 0.5 GB + ~20 bytes x workers x samples^2 (float64 distance matrices of each worker)
+    #   + ~10 bytes x samples x ASVs (sparse count matrix); 10 s + 1 us x iterations x samples^2 x log2(ASVs)
+    #   / workers (rarefactions and pairwise distances)
+    # - classification: the classifier memory above; 30 s + 50 ms per ASV (classify-sklearn on 2 threads)
+    #   + 60 s to load the classifier when the worker is not loaded
+    DEFAULT_COEFFICIENTS = {
+        "phylogeny": {"memory": [0.5, 1e-4], "time": [30.0, 2e-3]},
+        "diversity": {"memory": [0.5, 2e-8, 1e-8], "time": [10.0, 1e-6]},
+        "classification": {"memory": [1.0], "time": [30.0, 0.05, 60.0]},
+    }
+
+    _history_path: str
+    _records: list[dict]
+
+    def __init__(self, history_path: str) -> None:
+        self._history_path = history_path
+        self._records = self._read_history()
+
+    @classmethod
+    def get_default(cls) -> 'ResourceEstimator':
+        """Estimator of the history of the ``GWS_UBIOME_RUN_HISTORY_DIR`` directory."""
+        return cls(os.path.join(cls.get_root(), cls.HISTORY_FILE_NAME))
+
+    @staticmethod
+    def get_memory_features(stage: str, size: RunSize) -> list[float]:
+        if stage == "phylogeny":
+            return [1.0, size.asv_count]
+        if stage == "diversity":
+            return [1.0, size.workers * size.sample_count ** 2, size.sample_count * size.asv_count]
+        return [1.0]
+
+    @staticmethod
+    def get_time_features(stage: str, size: RunSize) -> list[float]:
+        log_asvs = math.log2(size.asv_count + 2)
+        if stage == "phylogeny":
+            return [1.0, size.asv_count * log_asvs]
+        if stage == "diversity":
+            return [1.0, size.iterations * size.sample_count ** 2 * log_asvs / size.workers]
+        return [1.0, size.asv_count, 0.0 if size.warm_classifier else 1.0]
+
+    @staticmethod
+    def get_model_key(stage: str, size: RunSize) -> str:
+        """Runs sharing a model: the classification depends on the database and method."""
+        return f"{stage}:{size.database}:{size.method}" if stage == "classification" else stage
+
+    def estimate(self, size: RunSize) -> DataFrame:
+        """
+        :return: the predicted peak memory (GB) and wall time (s) of each stage, with the number of
+        recorded runs the prediction is calibrated on, and a ``Total`` row (max memory, sum of the times)
+        """
+        rows = []
+        for stage in self.STAGES:
+            records = self._get_records(self.get_model_key(stage, size))
+            memory_coefficients, time_coefficients = self._get_coefficients(stage, size, records)
+            memory = float(np.dot(memory_coefficients, self.get_memory_features(stage, size)))
+            rows.append({
+                "stage": stage,
+                "peak_memory_gb": round(memory * self.MEMORY_MARGIN, 2),
+                "wall_time_seconds": round(float(np.dot(time_coefficients, self.get_time_features(stage, size)))),
+                "calibration_runs": len(records)
+            })
+        rows.append({
+            "stage": "Total",
+            "peak_memory_gb": max(row["peak_memory_gb"] for row in rows),
+            "wall_time_seconds": sum(row["wall_time_seconds"] for row in rows),
+            "calibration_runs": min(row["calibration_runs"] for row in rows)
+        })
+        return DataFrame(rows).set_index("stage")
+
+    @staticmethod
+    def get_required_memory_gb(estimate: DataFrame, resident_memory_gb: float = 0.0) -> float:
+        """
+        Memory the run needs on top of the memory in use: the peak of its stages, the classification one
+        less the ``resident_memory_gb`` of the classifier worker, already loaded and counted as used.
+        """
+        stages = estimate.drop(index="Total")["peak_memory_gb"].copy()
+        stages["classification"] = max(stages["classification"] - resident_memory_gb, 0.0)
+        return float(stages.max())
+
+    def adjust_workers(self, size: RunSize, available_memory_gb: float, resident_memory_gb: float = 0.0) -> int:
+        """
+        Largest number of workers, up to the requested one, for which the run fits in the available memory.
+
+        :param resident_memory_gb: memory of the classifier worker already loaded for the run
+        :raises Exception: if the run does not fit even with a single worker
+        """
+        for workers in range(size.workers, 0, -1):
+            candidate = RunSize(size.asv_count, size.sample_count, size.depth, size.iterations, workers,
+                                size.database, size.method, size.warm_classifier)
+            peak_memory = self.get_required_memory_gb(self.estimate(candidate), resident_memory_gb)
+            if peak_memory <= available_memory_gb:
+                return workers
+        raise Exception(
+            f"The run needs about {peak_memory:.1f} GB of memory (with 1 worker) but only "
+            f"{available_memory_gb:.1f} GB are available. Please increase the RAM capacity, "
+            "use a higher rarefaction depth (fewer samples) or the k-mer top-hit classification.")
+
+    def record(self, stage: str, size: RunSize, monitor: StageMonitor) -> None:
+        """Append the measured stage to the history."""
+        record = {
+            "stage": stage,
+            "model_key": self.get_model_key(stage, size),
+            **size.to_dict(),
+            "peak_memory_gb": round(monitor.peak_memory_gb, 3),
+            "wall_time_seconds": round(monitor.seconds, 1),
+            "recorded_at": datetime.now(timezone.utc).isoformat()
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self._history_path)), exist_ok=True)
+        with open(self._history_path, "a", encoding="utf-8") as history_file:
+            fcntl.flock(history_file, fcntl.LOCK_EX)
+            try:
+                history_file.write(json.dumps(record) + "\n")
+            finally:
+                fcntl.flock(history_file, fcntl.LOCK_UN)
+        self._records.append(record)
+
+    @staticmethod
+    def get_available_memory_gb() -> float:
+        """Available memory, within the cgroup limit of the container if any."""
+        available = psutil.virtual_memory().available
+        for limit_path, usage_path in [("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+                                       ("/sys/fs/cgroup/memory/memory.limit_in_bytes",
+                                        "/sys/fs/cgroup/memory/memory.usage_in_bytes")]:
+            try:
+                with open(limit_path, encoding="utf-8") as limit_file, \
+                        open(usage_path, encoding="utf-8") as usage_file:
+                    limit, usage = limit_file.read().strip(), usage_file.read().strip()
+            except OSError:
+                continue
+            if limit.isdigit() and usage.isdigit():
+                available = min(available, int(limit) - int(usage))
+            break
+        return available / 1024 ** 3
+
+    def _get_coefficients(self, stage: str, size: RunSize, records: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+        memory_coefficients = np.array(self.DEFAULT_COEFFICIENTS[stage]["memory"])
+        time_coefficients = np.array(self.DEFAULT_COEFFICIENTS[stage]["time"])
+        if stage == "classification":
+            memory_coefficients = np.array([self.KMER_METHOD_MEMORY_GB if size.method == "kmer_top_hit"
+                                            else self.DATABASE_MEMORY_GB.get(size.database,
+                                                                             self.DEFAULT_DATABASE_MEMORY_GB)])
+        if len(records) < self.MIN_RECORDS:
+            return memory_coefficients, time_coefficients
+
+        sizes = [RunSize(record["asv_count"], record["sample_count"], record["depth"], record["iterations"],
+                         record["workers"], record["database"], record["method"],
+                         record.get("warm_classifier", False)) for record in records]
+        memory_features = np.array([self.get_memory_features(stage, record_size) for record_size in sizes])
+        time_features = np.array([self.get_time_features(stage, record_size) for record_size in sizes])
+        memory_coefficients, _ = nnls(memory_features, np.array([record["peak_memory_gb"] for record in records]))
+        time_coefficients, _ = nnls(time_features, np.array([record["wall_time_seconds"] for record in records]))
+        return memory_coefficients, time_coefficients
+
+    def _get_records(self, model_key: str) -> list[dict]:
+        return [record for record in self._records if record["model_key"] == model_key]
+
+    def _read_history(self) -> list[dict]:
+        if not os.path.exists(self._history_path):
+            return []
+        records = []
+        with open(self._history_path, encoding="utf-8") as history_file:
+            for line in history_file:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # line being written by another run
+                    continue
+        return records
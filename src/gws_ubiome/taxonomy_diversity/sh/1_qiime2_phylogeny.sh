@@ -0,0 +1,19 @@
+#!/usr/bin/bash
+
+# This software is the exclusive property of Gencovery SAS. 
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+#Phylogeny of the ASVs, only depends on their sequences (shared by the runs in the intermediate store)
+
+
+rep_seqs=$1
+output_dir=$2
+
+qiime phylogeny align-to-tree-mafft-fasttree \
+  --i-sequences $rep_seqs \
+  --p-parttree \
+  --o-alignment $output_dir/aligned-rep-seqs.qza \
+  --o-masked-alignment $output_dir/masked-aligned-rep-seqs.qza \
+  --o-tree $output_dir/unrooted-tree.qza \
+  --o-rooted-tree $output_dir/rooted-tree.qza
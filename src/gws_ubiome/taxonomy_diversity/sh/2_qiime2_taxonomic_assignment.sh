@@ -6,19 +6,30 @@
 
 #Final steps, qiime2
 
+# Classify the ASVs missing from the classification cache (fasta file), the merged taxonomy is imported by 2_qiime2_taxonomy_import.sh
 
-qiime_dir=$1
+unclassified_fasta=$1
 gg_db=$2
-#output_folder=$3
+output_tsv=$3
+# scratch directory of the run (ScratchSpace), for the temporary files of qiime2
+scratch_dir=${4:-/data/tmp}
 
-export TMPDIR="/data/tmp"
+export TMPDIR=$scratch_dir
+
+qiime tools import \
+  --type 'FeatureData[Sequence]' \
+  --input-path $unclassified_fasta \
+  --output-path unclassified-seqs.qza
 
 qiime feature-classifier classify-sklearn \
   --p-n-jobs 1 \
   --i-classifier $gg_db \
-  --i-reads $qiime_dir/rep-seqs.qza \
-  --o-classification gg.taxonomy.qza
+  --i-reads unclassified-seqs.qza \
+  --o-classification unclassified.taxonomy.qza
+
+qiime tools export \
+  --input-path unclassified.taxonomy.qza \
+  --output-path unclassified_taxonomy_export
 
-qiime metadata tabulate \
-  --m-input-file gg.taxonomy.qza \
-  --o-visualization gg.taxonomy.qzv
+mv unclassified_taxonomy_export/taxonomy.tsv $output_tsv
+rm -rf unclassified_taxonomy_export unclassified-seqs.qza unclassified.taxonomy.qza
@@ -0,0 +1,21 @@
+#!/usr/bin/bash
+
+# This software is the exclusive property of Gencovery SAS. 
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+#Final steps, qiime2
+
+# Import the merged taxonomy (cache, exact matches and classifier) as gg.taxonomy.qza
+
+taxonomy_tsv=$1
+
+qiime tools import \
+  --type 'FeatureData[Taxonomy]' \
+  --input-format TSVTaxonomyFormat \
+  --input-path $taxonomy_tsv \
+  --output-path gg.taxonomy.qza
+
+qiime metadata tabulate \
+  --m-input-file gg.taxonomy.qza \
+  --o-visualization gg.taxonomy.qzv
@@ -8,10 +8,12 @@
 
 
 output_folder=$1
+# scratch directory of the run (ScratchSpace), for the unzipped and exported artifacts
+scratch_dir=${2:-.}
 
 ### geenrate asv annot file ###
 
-unzip $output_folder/gg.taxonomy.qza  -d gg_taxo_files
+unzip -o $output_folder/gg.taxonomy.qza  -d $scratch_dir/gg_taxo_files
 
 qiime feature-table transpose \
   --i-table $output_folder/taxonomy_and_diversity/raw_files/filtered-table.qza \
@@ -25,9 +27,9 @@ qiime metadata tabulate \
 
 qiime tools export \
   --input-path merged-data.qzv \
-  --output-path merged-data
+  --output-path $scratch_dir/merged-data
 
-ls ./merged-data
+ls $scratch_dir/merged-data
 
-cat ./merged-data/metadata.tsv | egrep  -v '^#q2:types' | cut -f1,2 | sed 's/ //g'  > ./taxonomy_and_diversity/raw_files/asv_dict.csv
-cat ./merged-data/metadata.tsv | egrep  -v '^#q2:types' | cut -f1,4-  > ./taxonomy_and_diversity/table_files/asv_table.csv
+cat $scratch_dir/merged-data/metadata.tsv | egrep  -v '^#q2:types' | cut -f1,2 | sed 's/ //g'  > ./taxonomy_and_diversity/raw_files/asv_dict.csv
+cat $scratch_dir/merged-data/metadata.tsv | egrep  -v '^#q2:types' | cut -f1,4-  > ./taxonomy_and_diversity/table_files/asv_table.csv
@@ -9,16 +9,20 @@
 qiime_dir=$1
 output_folder=$2
 
+# copy of a small file of the upstream folder, sharing its data blocks (reflink) when the filesystem supports it.
+# The copy is an independent file: the upstream file is never modified through it.
+# rep-seqs.qza, demux.qza and table.qza are not copied, the task references them (upstream_files.json)
+clone_or_copy() {
+  rm -f "$2/$(basename "$1")" ;
+  cp --reflink=auto "$1" "$2" ;
+}
+
 cp ./merged-data.qzv ./taxonomy_and_diversity/raw_files
 cp ./transposed-table.qza ./taxonomy_and_diversity/raw_files
 
 mv ./*.qza ./taxonomy_and_diversity/raw_files ;
 mv ./*.qzv ./taxonomy_and_diversity/raw_files ;
 
-cp $qiime_dir/rep-seqs.qza ./taxonomy_and_diversity/raw_files ;
-cp $qiime_dir/demux.qza ./taxonomy_and_diversity/raw_files ;
-
-cp $qiime_dir/qiime2_manifest.csv ./taxonomy_and_diversity/raw_files ;
-cp $qiime_dir/gws_metadata.csv  ./taxonomy_and_diversity/raw_files ;
-cp $qiime_dir/qiime2_metadata.csv ./taxonomy_and_diversity/raw_files ;
-cp $qiime_dir/table.qza ./taxonomy_and_diversity/raw_files ;
\ No newline at end of file
+clone_or_copy $qiime_dir/qiime2_manifest.csv ./taxonomy_and_diversity/raw_files ;
+clone_or_copy $qiime_dir/gws_metadata.csv ./taxonomy_and_diversity/raw_files ;
+clone_or_copy $qiime_dir/qiime2_metadata.csv ./taxonomy_and_diversity/raw_files ;
\ No newline at end of file
@@ -0,0 +1,248 @@
+# This software is the exclusive property of Gencovery SAS.
+# The use and distribution of this software is prohibited without the prior consent of Gencovery SAS.
+# About us: https://gencovery.com
+
+import os
+
+import psutil
+from gws_core import MessageDispatcher, ShellProxy
+from pandas import DataFrame
+
+from ._classifier_worker import get_worker_pid
+from .classification_cache import ClassificationCache, read_qza_sequences, write_fasta
+from .classifier_store import ClassifierStore
+from .kmer_index import KmerIndex
+
+
+class TaxonomyAssignment:
+    """
+    Classification stage of the Q2 Taxonomy Diversity task: writes the taxonomy of the ASVs in the working
+    directory of its shell proxy, reusing the ``ClassificationCache`` of the database.
+    """
+
+    # Reference sequences of a database (fasta, and tab separated id / taxonomy without header), looked
+    # up next to the classifier as <classifier name without .qza><suffix>, for the exact-match and the
+    # k-mer top-hit assignments. The classifier artifacts do not contain them: they are provisioned with
+    # the classifier in a mirror of the classifier store, which copies them with the classifier
+    DB_REFERENCE_SUFFIXES = (".reference-seqs.fasta", ".reference-taxonomy.tsv")
+    # Parameters of classify-sklearn in 2_qiime2_taxonomic_assignment.sh, part of the classification cache key
+    CLASSIFIER_PARAMS = "classify-sklearn;confidence=0.7;read-orientation=auto"
+
+    # Taxonomic assignment methods of the ASVs missing from the classification cache
+    NAIVE_BAYES = "naive_bayes"
+    KMER_TOP_HIT = "kmer_top_hit"
+    KMER_IDENTITY_THRESHOLD = 0.97
+    KMER_MAX_HITS = 10
+    KMER_MIN_CONSENSUS = 0.51
+    KMER_INDEX_DIR_NAME = "kmer_index"
+
+    # Seconds the classifier worker keeps the classifier loaded without requests, long enough for the
+    # tasks of a batch of runs to share it. 0 disables the worker, each task loads the classifier
+    CLASSIFIER_WORKER_IDLE_TIMEOUT_ENV = "GWS_UBIOME_CLASSIFIER_WORKER_IDLE_TIMEOUT"
+    CLASSIFIER_WORKER_IDLE_TIMEOUT = 300
+
+    classifier_worker_path = os.path.join(
+        os.path.abspath(os.path.dirname(__file__)),
+        "_classifier_worker.py"
+    )
+
+    _shell_proxy: ShellProxy
+    _script_file_dir: str
+    _message_dispatcher: MessageDispatcher
+
+    def __init__(self, shell_proxy: ShellProxy, script_file_dir: str, message_dispatcher: MessageDispatcher) -> None:
+        """
+        :param script_file_dir: directory of the ``sh`` scripts of the task
+        """
+        self._shell_proxy = shell_proxy
+        self._script_file_dir = script_file_dir
+        self._message_dispatcher = message_dispatcher
+
+    def assign_taxonomy(self, qiime2_folder_path: str, classifier_path: str, database: str,
+                        method: str = NAIVE_BAYES, identity_threshold: float = KMER_IDENTITY_THRESHOLD,
+                        scratch_dir: str | None = None) -> None:
+        """
+        Write the taxonomy of the ASVs in ``gg.taxonomy.qza``.
+
+        The ASVs already classified with the same database and classifier parameters are read from the
+        classification cache, stored next to the classifier. The ASVs identical to a reference sequence
+        of the database get its taxonomy, when the reference sequences are provisioned (see
+        ``DB_REFERENCE_SUFFIXES``). Only the remaining ASVs go through the classifier: classify-sklearn
+        (``NAIVE_BAYES``) or the top-hit search in the k-mer index of the reference sequences
+        (``KMER_TOP_HIT``, see ``check_method``).
+
+        :param scratch_dir: directory of the temporary files of the classifier, see ``ScratchSpace``
+        """
+        working_dir = self._shell_proxy.working_dir
+        if method == self.KMER_TOP_HIT:
+            classifier_params = (f"kmer-top-hit;k={KmerIndex.K};identity={identity_threshold};"
+                                 f"max-hits={self.KMER_MAX_HITS};consensus={self.KMER_MIN_CONSENSUS}")
+        else:
+            classifier_params = self.CLASSIFIER_PARAMS
+        sequences = read_qza_sequences(os.path.join(qiime2_folder_path, "rep-seqs.qza"))
+        sequence_hashes = {feature_id: ClassificationCache.hash_sequence(sequence)
+                           for feature_id, sequence in sequences.items()}
+        cache = ClassificationCache(os.path.join(os.path.dirname(classifier_path), ClassificationCache.FILE_NAME))
+        self._import_reference_sequences(cache, classifier_path, database)
+
+        unique_hashes = list(set(sequence_hashes.values()))
+        classifications = cache.get_classifications(unique_hashes, database, classifier_params)
+        exact_matches = cache.get_exact_matches(
+            [sequence_hash for sequence_hash in unique_hashes if sequence_hash not in classifications], database)
+        classifications.update(exact_matches)
+        self._message_dispatcher.notify_info_message(
+            f"{len(classifications) - len(exact_matches)} unique ASV sequence(s) found in the classification cache, "
+            f"{len(exact_matches)} identical to reference sequences, out of {len(unique_hashes)}")
+
+        unclassified = {}
+        for feature_id, sequence_hash in sequence_hashes.items():
+            if sequence_hash not in classifications and sequence_hash not in unclassified:
+                unclassified[sequence_hash] = sequences[feature_id]
+        if unclassified and method == self.KMER_TOP_HIT:
+            self._message_dispatcher.notify_info_message(
+                f"Performing k-mer top-hit taxonomic assignment on {len(unclassified)} ASV sequence(s)")
+            kmer_taxonomy = self._get_kmer_index(classifier_path, database).classify(
+                unclassified, identity_threshold, self.KMER_MAX_HITS, self.KMER_MIN_CONSENSUS)
+            new_classifications = {sequence_hash: (row["Taxon"], float(row["Confidence"]))
+                                   for sequence_hash, row in kmer_taxonomy.iterrows()}
+            cache.set_classifications(new_classifications, database, classifier_params)
+            classifications.update(new_classifications)
+        elif unclassified:
+            self._message_dispatcher.notify_info_message(
+                f"Performing Qiime2 taxonomic assignment with pre-trained model on {len(unclassified)} ASV sequence(s)")
+            unclassified_fasta = os.path.join(working_dir, "unclassified-seqs.fasta")
+            unclassified_taxonomy = os.path.join(working_dir, "unclassified.taxonomy.tsv")
+            write_fasta(unclassified_fasta, unclassified)
+            self.classify_sequences(classifier_path, unclassified_fasta, unclassified_taxonomy, scratch_dir)
+            new_classifications = {
+                sequence_hash: (row["Taxon"], float(row["Confidence"]))
+                for sequence_hash, row in ClassificationCache.read_taxonomy(unclassified_taxonomy).iterrows()}
+            cache.set_classifications(new_classifications, database, classifier_params)
+            classifications.update(new_classifications)
+
+        taxonomy = DataFrame(
+            [classifications[sequence_hash] for sequence_hash in sequence_hashes.values()],
+            index=list(sequence_hashes), columns=["Taxon", "Confidence"])
+        taxonomy_path = os.path.join(working_dir, "gg.taxonomy.tsv")
+        ClassificationCache.write_taxonomy(taxonomy_path, taxonomy)
+        cmd_2_import = [
+            "bash",
+            os.path.join(self._script_file_dir,
+                         "./sh/2_qiime2_taxonomy_import.sh"),
+            taxonomy_path
+        ]
+        res = self._shell_proxy.run(cmd_2_import)
+        if res != 0:
+            raise Exception("Taxonomy import did not finished")
+
+    def classify_sequences(self, classifier_path: str, fasta_path: str, output_path: str,
+                           scratch_dir: str | None = None) -> None:
+        """
+        Classify the sequences of a fasta file with the warm classifier worker of the classifier store,
+        which keeps the classifier loaded between the tasks. Fall back to classify-sklearn when the
+        worker is disabled, when the classifier has no extracted pipeline or when the worker fails.
+        """
+        pipeline_dir = os.path.join(os.path.dirname(classifier_path), ClassifierStore.PIPELINE_DIR_NAME)
+        idle_timeout = self.get_classifier_worker_idle_timeout()
+        if idle_timeout > 0 and os.path.isdir(pipeline_dir):
+            cmd_worker = [
+                "python3",
+                self.classifier_worker_path,
+                "classify",
+                pipeline_dir,
+                fasta_path,
+                output_path,
+                str(idle_timeout)
+            ]
+            res = self._shell_proxy.run(cmd_worker)
+            if res == 0:
+                worker = self.get_classifier_worker(classifier_path)
+                if worker is not None:
+                    self._message_dispatcher.notify_info_message(
+                        f"The classifier worker (pid {worker.pid}) keeps "
+                        f"{worker.memory_info().rss / 1024 ** 3:.1f} GB of memory for {idle_timeout} s "
+                        "after its last request")
+                return
+            self._message_dispatcher.notify_warning_message("The classifier worker failed, running classify-sklearn")
+
+        cmd_2 = [
+            "bash",
+            os.path.join(self._script_file_dir,
+                         "./sh/2_qiime2_taxonomic_assignment.sh"),
+            fasta_path,
+            classifier_path,
+            output_path
+        ]
+        if scratch_dir:
+            cmd_2.append(scratch_dir)
+        res = self._shell_proxy.run(cmd_2)
+        if res != 0:
+            raise Exception("Taxonomic assignment step did not finished")
+
+    @classmethod
+    def get_classifier_worker_idle_timeout(cls) -> int:
+        """Idle timeout of the classifier worker, from ``GWS_UBIOME_CLASSIFIER_WORKER_IDLE_TIMEOUT``."""
+        value = os.environ.get(cls.CLASSIFIER_WORKER_IDLE_TIMEOUT_ENV)
+        return int(value) if value else cls.CLASSIFIER_WORKER_IDLE_TIMEOUT
+
+    @staticmethod
+    def get_classifier_worker(classifier_path: str) -> psutil.Process | None:
+        """Running classifier worker of the classifier, None if the classifier is not loaded."""
+        pid = get_worker_pid(os.path.join(os.path.dirname(classifier_path), ClassifierStore.PIPELINE_DIR_NAME))
+        if pid is None:
+            return None
+        try:
+            return psutil.Process(pid)
+        except psutil.NoSuchProcess:
+            return None
+
+    @classmethod
+    def get_reference_paths(cls, classifier_path: str) -> tuple[str, str] | None:
+        """Reference sequences and taxonomy files of the database of the classifier, None if not provisioned."""
+        base_path = classifier_path.removesuffix(".qza")
+        paths = tuple(base_path + suffix for suffix in cls.DB_REFERENCE_SUFFIXES)
+        return paths if all(os.path.isfile(path) for path in paths) else None
+
+    @classmethod
+    def check_method(cls, classifier_path: str, database: str, method: str) -> None:
+        """
+        Check, before the run, that the assignment method can be used with the database: the k-mer
+        top-hit assignment needs the k-mer index or the reference sequences of the database.
+
+        :raises Exception: if the reference sequences of the database are not provisioned
+        """
+        if method != cls.KMER_TOP_HIT or KmerIndex.exists(cls.get_kmer_index_dir(classifier_path)) \
+                or cls.get_reference_paths(classifier_path) is not None:
+            return
+        fasta_suffix, taxonomy_suffix = cls.DB_REFERENCE_SUFFIXES
+        base_name = os.path.basename(classifier_path).removesuffix(".qza")
+        raise Exception(
+            f"The reference sequences of {database} are not provisioned, the k-mer top-hit assignment cannot be used. "
+            f"Add '{base_name}{fasta_suffix}' and '{base_name}{taxonomy_suffix}' next to the classifier in the "
+            "classifier mirror, or use the Naive Bayes classifier")
+
+    @classmethod
+    def get_kmer_index_dir(cls, classifier_path: str) -> str:
+        return os.path.join(os.path.dirname(classifier_path), cls.KMER_INDEX_DIR_NAME)
+
+    def _get_kmer_index(self, classifier_path: str, database: str) -> KmerIndex:
+        """K-mer index of the reference sequences of the database, built next to the classifier on first use."""
+        index_dir = self.get_kmer_index_dir(classifier_path)
+        if KmerIndex.exists(index_dir):
+            return KmerIndex(index_dir)
+        self.check_method(classifier_path, database, self.KMER_TOP_HIT)
+        self._message_dispatcher.notify_info_message(f"Building the k-mer index of the {database} reference sequences")
+        return KmerIndex.build(index_dir, *self.get_reference_paths(classifier_path))
+
+    def _import_reference_sequences(self, cache: ClassificationCache, classifier_path: str, database: str) -> None:
+        if cache.has_reference(database):
+            return
+        reference_paths = self.get_reference_paths(classifier_path)
+        if reference_paths is None:
+            self._message_dispatcher.notify_info_message(
+                f"The reference sequences of {database} are not provisioned in the classifier store, "
+                "the ASVs identical to a reference sequence are not resolved without the classifier")
+            return
+        self._message_dispatcher.notify_info_message(
+            f"Importing the reference sequences of {database} for the exact matches")
+        cache.import_reference(database, *reference_paths)
@@ -1,5 +1,5 @@
 import streamlit as st
-from gws_core import File, Folder, ProtocolProxy, Scenario, ScenarioProxy, ScenarioStatus, Settings
+from gws_core import File, Folder, ProtocolProxy, Scenario, ScenarioStatus, Settings
 from gws_core.tag.entity_tag_list import EntityTagList
 from gws_core.tag.tag_entity_type import TagEntityType
 from gws_streamlit_main import (
@@ -11,11 +11,10 @@ from gws_streamlit_main import (
 
 from ..functions_steps import (
     build_scenarios_by_step_dict,
-    get_status_emoji,
-    get_status_prettify,
     search_updated_metadata_table,
 )
 from ..state import State
+from ..status_poller import render_scenario_status
 from ..steps.ancom_step import render_ancom_step
 from ..steps.db_annotator_step import (
     render_db_annotator_step,
@@ -77,9 +76,8 @@ def build_analysis_tree_menu(ubiome_state: State):
 
     # Set in the state if data is single-end or paired-end
     metadata_scenario = ubiome_state.get_scenario_step_metadata()[0]
-    scenario_metadata_proxy = ScenarioProxy.from_existing_scenario(metadata_scenario.id)
     config_sequencing_type = (
-        scenario_metadata_proxy.get_protocol()
+        ubiome_state.get_scenario_protocol(metadata_scenario)
         .get_process("metadata_process")
         .get_param("sequencing_type")
     )
@@ -450,9 +448,8 @@ def render_analysis_page(ubiome_state: State):
             return
 
         # Get fastq and metadata table
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_analysis.id)
         # Retrieve the protocol
-        protocol_proxy: ProtocolProxy = scenario_proxy.get_protocol()
+        protocol_proxy: ProtocolProxy = ubiome_state.get_scenario_protocol(selected_analysis)
 
         # Retrieve outputs
         # Fastq
@@ -540,10 +537,8 @@ def render_analysis_page(ubiome_state: State):
                     with col_title:
                         st.markdown(f"#### {selected_scenario.get_short_name()}")
                     with col_status:
-                        status_emoji = get_status_emoji(selected_scenario.status)
-                        st.markdown(
-                            f"#### **{translate_service.translate('status')}:** {status_emoji} {get_status_prettify(selected_scenario.status)}"
-                        )
+                        # Status refreshed in place while the scenarios of the pipeline run
+                        render_scenario_status(selected_scenario, ubiome_state)
                         # Add a button to redirect to the scenario page
                         virtual_host = Settings.get_instance().get_virtual_host()
                         if Settings.get_instance().is_prod_mode():
@@ -572,6 +567,8 @@ def render_analysis_page(ubiome_state: State):
                                 st.rerun()
                 else:
                     selected_scenario = None
+                    # Rebuild the step tables when a scenario of the pipeline starts or finishes
+                    render_scenario_status(None, ubiome_state)
 
                 if ubiome_state.get_step_pipeline() == ubiome_state.TAG_METADATA:
                     # Render metadata table
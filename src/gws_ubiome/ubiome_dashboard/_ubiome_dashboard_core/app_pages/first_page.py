@@ -1,7 +1,5 @@
 import streamlit as st
 from gws_core import Scenario, ScenarioSearchBuilder, Tag
-from gws_core.tag.entity_tag_list import EntityTagList
-from gws_core.tag.tag_entity_type import TagEntityType
 from gws_streamlit_main import StreamlitContainers, StreamlitRouter
 from streamlit_slickgrid import (
     ExportServices,
@@ -13,6 +11,7 @@ from ..functions_steps import (
     build_scenarios_by_step_dict,
     get_status_emoji,
 )
+from ..scenario_tag_index import ScenarioTagIndex
 from ..state import State
 
 
@@ -51,105 +50,71 @@ def render_first_page(ubiome_state: State):
 
         # Add the table to retrieve the previous analysis
 
+        # All the ubiome scenarios with their tags, loaded at once and grouped in memory
         search_scenario_builder = (
             ScenarioSearchBuilder()
             .add_tag_filter(Tag(key=ubiome_state.TAG_BRICK, value=ubiome_state.TAG_UBIOME))
-            .add_tag_filter(Tag(key=ubiome_state.TAG_UBIOME, value=ubiome_state.TAG_METADATA))
             .add_is_archived_filter(False)
         )
+        tag_index = ScenarioTagIndex.load(search_scenario_builder.search_all())
+        scenarios_by_pipeline = tag_index.group_by_tag(ubiome_state.TAG_UBIOME_PIPELINE_ID)
 
         # We got here all the metadata scenarios
-        list_scenario_user: list[Scenario] = search_scenario_builder.search_all()
+        list_scenario_user: list[Scenario] = tag_index.filter_by_tag(
+            ubiome_state.TAG_UBIOME, ubiome_state.TAG_METADATA
+        )
+
+        # Check each step type and add status to row data
+        step_types = [
+            (ubiome_state.TAG_QC, "quality_control"),
+            (ubiome_state.TAG_MULTIQC, "multiqc"),
+            (ubiome_state.TAG_FEATURE_INFERENCE, "feature_inference"),
+            (ubiome_state.TAG_RAREFACTION, "rarefaction"),
+            (ubiome_state.TAG_TAXONOMY, "taxonomy"),
+            (ubiome_state.TAG_PCOA_DIVERSITY, "pcoa_diversity"),
+            (ubiome_state.TAG_ANCOM, "ancom"),
+            (ubiome_state.TAG_DB_ANNOTATOR, "db_annotator"),
+        ]
+
+        # Add ratio step if enabled (before 16S steps)
+        if ubiome_state.get_has_ratio_step():
+            step_types.append((ubiome_state.TAG_RATIO, "ratio"))
+
+        # Add 16S steps at the end
+        step_types.extend(
+            [
+                (ubiome_state.TAG_16S, "16s"),
+                (ubiome_state.TAG_16S_VISU, "16s_visualization"),
+            ]
+        )
 
         # Create data for SlickGrid table
         table_data = []
         for scenario in list_scenario_user:
-            entity_tag_list = EntityTagList.find_by_entity(TagEntityType.SCENARIO, scenario.id)
-            tag_analysis_name = entity_tag_list.get_tags_by_key(ubiome_state.TAG_ANALYSIS_NAME)[
-                0
-            ].to_simple_tag()
-
             # Initialize row data with basic info
             row_data = {
                 "id": scenario.id,
-                "Name given": tag_analysis_name.value,
+                "Name given": tag_index.get_tag_value(scenario.id, ubiome_state.TAG_ANALYSIS_NAME),
                 "Folder": scenario.folder.name if scenario.folder else "",
                 "metadata": get_status_emoji(scenario.status),
             }
 
-            # Get pipeline ID to find all related scenarios
-            pipeline_id_tags = entity_tag_list.get_tags_by_key(ubiome_state.TAG_UBIOME_PIPELINE_ID)
-            if pipeline_id_tags:
-                pipeline_id = pipeline_id_tags[0].to_simple_tag().value
-
-                # Search for all scenarios with this pipeline ID
-                pipeline_search_builder = (
-                    ScenarioSearchBuilder()
-                    .add_tag_filter(Tag(key=ubiome_state.TAG_UBIOME_PIPELINE_ID, value=pipeline_id))
-                    .add_is_archived_filter(False)
-                )
-
-                pipeline_scenarios = pipeline_search_builder.search_all()
-
-                # Check each step type and add status to row data
-                step_types = [
-                    (ubiome_state.TAG_QC, "quality_control"),
-                    (ubiome_state.TAG_MULTIQC, "multiqc"),
-                    (ubiome_state.TAG_FEATURE_INFERENCE, "feature_inference"),
-                    (ubiome_state.TAG_RAREFACTION, "rarefaction"),
-                    (ubiome_state.TAG_TAXONOMY, "taxonomy"),
-                    (ubiome_state.TAG_PCOA_DIVERSITY, "pcoa_diversity"),
-                    (ubiome_state.TAG_ANCOM, "ancom"),
-                    (ubiome_state.TAG_DB_ANNOTATOR, "db_annotator"),
-                ]
-
-                # Add ratio step if enabled (before 16S steps)
-                if ubiome_state.get_has_ratio_step():
-                    step_types.append((ubiome_state.TAG_RATIO, "ratio"))
-
-                # Add 16S steps at the end
-                step_types.extend(
-                    [
-                        (ubiome_state.TAG_16S, "16s"),
-                        (ubiome_state.TAG_16S_VISU, "16s_visualization"),
-                    ]
-                )
-
-                for tag_value, field_name in step_types:
-                    step_scenarios = [
-                        s
-                        for s in pipeline_scenarios
-                        if any(
-                            tag.tag_key == ubiome_state.TAG_UBIOME and tag.tag_value == tag_value
-                            for tag in EntityTagList.find_by_entity(
-                                TagEntityType.SCENARIO, s.id
-                            ).get_tags()
-                        )
-                    ]
-
-                    if step_scenarios:
-                        # Get the most recent scenario for this step
-                        latest_scenario = max(step_scenarios, key=lambda x: x.created_at)
-                        row_data[field_name] = get_status_emoji(latest_scenario.status)
-                    else:
-                        row_data[field_name] = ""
-            else:
-                # Initialize empty status for other steps when no pipeline ID
-                step_fields = [
-                    "quality_control",
-                    "multiqc",
-                    "feature_inference",
-                    "rarefaction",
-                    "taxonomy",
-                    "pcoa_diversity",
-                    "ancom",
-                    "db_annotator",
-                ]
-                if ubiome_state.get_has_ratio_step():
-                    step_fields.append("ratio")
-                step_fields.extend(["16s", "16s_visualization"])
-                for field in step_fields:
-                    row_data[field] = ""
+            # Get all the scenarios of the pipeline, grouped by step
+            pipeline_id = tag_index.get_tag_value(scenario.id, ubiome_state.TAG_UBIOME_PIPELINE_ID)
+            pipeline_scenarios = scenarios_by_pipeline.get(pipeline_id, []) if pipeline_id else []
+            scenarios_by_step: dict[str, list[Scenario]] = {}
+            for pipeline_scenario in pipeline_scenarios:
+                step_name = tag_index.get_tag_value(pipeline_scenario.id, ubiome_state.TAG_UBIOME)
+                scenarios_by_step.setdefault(step_name, []).append(pipeline_scenario)
+
+            for tag_value, field_name in step_types:
+                step_scenarios = scenarios_by_step.get(tag_value)
+                if step_scenarios:
+                    # Get the most recent scenario for this step
+                    latest_scenario = max(step_scenarios, key=lambda x: x.created_at)
+                    row_data[field_name] = get_status_emoji(latest_scenario.status)
+                else:
+                    row_data[field_name] = ""
 
             table_data.append(row_data)
 
@@ -327,16 +292,10 @@ def render_first_page(ubiome_state: State):
                                     (s for s in list_scenario_user if s.id == row_id), None
                                 )
                                 ubiome_state.set_selected_analysis(selected_scenario)
-                                # Get analysis name from scenario tag
-                                entity_tag_list = EntityTagList.find_by_entity(
-                                    TagEntityType.SCENARIO, selected_scenario.id
-                                )
-
                                 # Get ubiome pipeline id from scenario tag
-                                tag_ubiome_pipeline_id = entity_tag_list.get_tags_by_key(
-                                    ubiome_state.TAG_UBIOME_PIPELINE_ID
-                                )[0].to_simple_tag()
-                                ubiome_pipeline_id = tag_ubiome_pipeline_id.value
+                                ubiome_pipeline_id = tag_index.get_tag_value(
+                                    selected_scenario.id, ubiome_state.TAG_UBIOME_PIPELINE_ID
+                                )
 
                                 # Build scenarios_by_step dictionary using helper function
                                 scenarios_by_step = build_scenarios_by_step_dict(
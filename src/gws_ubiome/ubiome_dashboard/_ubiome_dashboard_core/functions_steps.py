@@ -25,12 +25,14 @@ from gws_core.tag.entity_tag_list import EntityTagList
 from gws_core.tag.tag import TagOrigin
 from gws_core.tag.tag_entity_type import TagEntityType
 from gws_streamlit_main import StreamlitTaskRunner
+from gws_ubiome.ubiome_dashboard.pipeline_scheduler import PipelineScheduler
 from streamlit_slickgrid import (
     ExportServices,
     FieldType,
     slickgrid,
 )
 
+from .scenario_tag_index import ScenarioTagIndex
 from .state import State
 
 
@@ -63,7 +65,9 @@ def get_status_prettify(status: ScenarioStatus) -> str:
 
 
 # Generic helper functions
-def create_scenario_table_data(scenarios: list[Scenario], process_name: str) -> tuple:
+def create_scenario_table_data(
+    scenarios: list[Scenario], process_name: str, ubiome_state: State
+) -> tuple:
     """Generic function to create table data from scenarios with their parameters."""
     table_data = []
     all_param_keys = set()
@@ -71,13 +75,12 @@ def create_scenario_table_data(scenarios: list[Scenario], process_name: str) ->
 
     # First pass: collect all parameter data and unique keys
     for scenario in scenarios:
-        scenario_proxy = ScenarioProxy.from_existing_scenario(scenario.id)
-        protocol_proxy = scenario_proxy.get_protocol()
-        process = protocol_proxy.get_process(process_name)
-        config_params = process._process_model.config.to_simple_dto().values
+        # Copy of the cached config, the PCOA column is added to it
+        config_params = dict(ubiome_state.get_process_config(scenario, process_name))
 
         # For PCOA scenarios, add diversity table name from input resource
         if process_name == "pcoa_process":
+            process = ubiome_state.get_scenario_protocol(scenario).get_process(process_name)
             config_params["Diversity Table"] = process.get_input("distance_table").name.split(
                 " - "
             )[1]
@@ -164,7 +167,7 @@ def render_scenario_table(
     """Generic function to render a scenario table with parameters."""
     translate_service = ubiome_state.get_translate_service()
     if scenarios:
-        table_data, all_param_keys = create_scenario_table_data(scenarios, process_name)
+        table_data, all_param_keys = create_scenario_table_data(scenarios, process_name, ubiome_state)
         columns = create_slickgrid_columns(all_param_keys, ubiome_state)
 
         options = {
@@ -201,10 +204,8 @@ def render_scenario_table(
 def display_scenario_parameters(scenario: Scenario, process_name: str, ubiome_state: State) -> None:
     """Generic function to display scenario parameters in an expander."""
     translate_service = ubiome_state.get_translate_service()
-    scenario_proxy = ScenarioProxy.from_existing_scenario(scenario.id)
-    protocol_proxy = scenario_proxy.get_protocol()
-    process = protocol_proxy.get_process(process_name)
-    config_params = process._process_model.config.to_simple_dto().values
+    process = ubiome_state.get_scenario_protocol(scenario).get_process(process_name)
+    config_params = ubiome_state.get_process_config(scenario, process_name)
 
     # Add task name to parameters
     readable_task_name = process._process_model.name
@@ -408,9 +409,7 @@ def search_updated_metadata_table(ubiome_state: State) -> File | None:
     Returns the File resource if found, None otherwise.
     """
     scenario_step_metadata = ubiome_state.get_scenario_step_metadata()
-    protocol_proxy: ProtocolProxy = ScenarioProxy.from_existing_scenario(
-        scenario_step_metadata[0].id
-    ).get_protocol()
+    protocol_proxy: ProtocolProxy = ubiome_state.get_scenario_protocol(scenario_step_metadata[0])
     try:
         updated_metadata_resource: File = protocol_proxy.get_process("updated_metadata").get_output(
             "resource"
@@ -451,11 +450,13 @@ def build_scenarios_by_step_dict(
     )
 
     all_scenarios: list[Scenario] = search_scenario_builder.search_all()
+    # Tags of all the scenarios of the pipeline in one query, reused on the reruns
+    tag_index = ScenarioTagIndex.load(all_scenarios, ScenarioTagIndex.PIPELINE_SESSION_KEY)
 
     # Group scenarios by step type with parent relationships
     scenarios_by_step = {}
     for scenario in all_scenarios:
-        entity_tag_list = EntityTagList.find_by_entity(TagEntityType.SCENARIO, scenario.id)
+        entity_tag_list = tag_index.get_tags(scenario.id)
         tag_step_name = entity_tag_list.get_tags_by_key(ubiome_state.TAG_UBIOME)[0].to_simple_tag()
         step_name = tag_step_name.value
 
@@ -532,10 +533,14 @@ def display_saved_scenario_actions(scenario: Scenario, ubiome_state: State) -> N
     # so the lab large need to be open
     if step_tag == ubiome_state.TAG_16S and ubiome_state.get_credentials_lab_large():
         st.info(translate_service.translate("lab_large_must_be_open"))
+    # the scenarios of a pipeline recipe are queued by the scheduler, their inputs are not set yet
+    is_scheduled = PipelineScheduler.is_scheduled(scenario, entity_tag_list)
+    if is_scheduled:
+        st.info(translate_service.translate("pipeline_scenario_scheduled"))
     col1, col2 = st.columns(2)
 
     with col1:
-        if st.button(
+        if not is_scheduled and st.button(
             translate_service.translate("run"),
             icon=":material/play_arrow:",
             key=f"run_{scenario.id}",
@@ -549,6 +554,7 @@ def display_saved_scenario_actions(scenario: Scenario, ubiome_state: State) -> N
                 )
             else:
                 scenario_proxy.add_to_queue()
+            ubiome_state.invalidate_scenario_cache(scenario.id)
             ubiome_state.reset_tree_analysis()
             ubiome_state.set_tree_default_item(scenario.id)
             st.rerun()
@@ -569,7 +575,7 @@ def dialog_edit_scenario_params(scenario: Scenario, ubiome_state: State):
     translate_service = ubiome_state.get_translate_service()
 
     scenario_proxy = ScenarioProxy.from_existing_scenario(scenario.id)
-    protocol_proxy = scenario_proxy.get_protocol()
+    protocol_proxy = ubiome_state.get_scenario_protocol(scenario)
 
     # Detect the process type based on scenario tags
     entity_tag_list = EntityTagList.find_by_entity(TagEntityType.SCENARIO, scenario.id)
@@ -597,7 +603,7 @@ def dialog_edit_scenario_params(scenario: Scenario, ubiome_state: State):
     try:
         process = protocol_proxy.get_process(process_name)
         task_class = process.get_process_type()
-        current_config = process._process_model.config.to_simple_dto().values
+        current_config = ubiome_state.get_process_config(scenario, process_name)
     except Exception as e:
         st.error(f"Could not retrieve process configuration: {str(e)}")
         return
@@ -628,7 +634,8 @@ def dialog_edit_scenario_params(scenario: Scenario, ubiome_state: State):
         )
 
     with col2:
-        run_clicked = st.button(
+        # a scheduled scenario is queued by the scheduler when its parents succeed
+        run_clicked = not PipelineScheduler.is_scheduled(scenario, entity_tag_list) and st.button(
             translate_service.translate("save_and_run"),
             icon=":material/play_arrow:",
             width="stretch",
@@ -645,6 +652,7 @@ def dialog_edit_scenario_params(scenario: Scenario, ubiome_state: State):
 
         # Update the process configuration
         process.set_config_params(updated_config)
+        ubiome_state.invalidate_scenario_cache(scenario.id)
 
         if run_clicked:
             # If run is clicked, also add to queue
@@ -0,0 +1,311 @@
+import streamlit as st
+from gws_core import FsNodeExtractor, InputTask, ResourceModel, Scenario, ScenarioProxy, TableImporter, Tag, Task
+from gws_core.tag.entity_tag_list import EntityTagList
+from gws_core.tag.tag_entity_type import TagEntityType
+from gws_streamlit_main import StreamlitResourceSelect, StreamlitTaskRunner
+from gws_ubiome import (
+    BetaDiversityPCoA,
+    Picrust2FunctionalAnalysis,
+    Qiime2DifferentialAnalysis,
+    Qiime2RarefactionAnalysis,
+    Qiime2TableDbAnnotator,
+    Qiime2TaxonomyDiversity,
+)
+from gws_ubiome.ubiome_dashboard.pipeline_scheduler import PipelineScheduler
+from gws_ubiome.ubiome_dashboard.queue_next_pipeline_steps import QueueNextPipelineSteps
+
+from .functions_steps import create_base_scenario_with_tags
+from .state import State
+from .ubiome_config import UbiomeConfig
+
+
+def get_recipe_config_key(step: str) -> str:
+    return f"{State.PIPELINE_RECIPE_CONFIG_KEY}_{step}"
+
+
+def render_recipe_config_form(task: type[Task], step: str, default_config_values: dict | None = None) -> None:
+    if default_config_values is None:
+        default_config_values = task.config_specs.get_default_values()
+    form_config = StreamlitTaskRunner(task)
+    form_config.generate_config_form_without_run(
+        session_state_key=get_recipe_config_key(step),
+        default_config_values=default_config_values,
+        is_default_config_valid=task.config_specs.mandatory_values_are_set(default_config_values))
+
+
+def get_recipe_config(step: str) -> dict:
+    return st.session_state.get(get_recipe_config_key(step), {})
+
+
+def create_scheduled_scenario(ubiome_state: State, step: str, title: str,
+                              parent_ids: dict[str, str]) -> ScenarioProxy:
+    """Draft scenario of a recipe step, queued by its parents when they all succeed."""
+    scenario = create_base_scenario_with_tags(ubiome_state, step, title)
+    for parent_tag, parent_id in parent_ids.items():
+        scenario.add_tag(Tag(parent_tag, parent_id, is_propagable=False, auto_parse=True))
+    scenario.add_tag(PipelineScheduler.get_auto_run_tag())
+    return scenario
+
+
+def add_queue_next_steps_process(scenario: ScenarioProxy, step: str) -> None:
+    """The scheduled steps depending on the scenario are queued by its last task."""
+    process_name, output_name = PipelineScheduler.STEP_OUTPUTS[step]
+    protocol = scenario.get_protocol()
+    queue_process = protocol.add_process(QueueNextPipelineSteps, PipelineScheduler.QUEUE_PROCESS_NAME,
+                                         {"scenario_id": scenario.get_model_id()})
+    protocol.add_connector(out_port=protocol.get_process(process_name) >> output_name,
+                           in_port=queue_process << 'step_output')
+
+
+def create_feature_inference_scenario(ubiome_state: State, task_feature_inference: type[Task], title: str,
+                                      qc_scenario_id: str) -> str:
+    scenario = create_scheduled_scenario(ubiome_state, ubiome_state.TAG_FEATURE_INFERENCE, title,
+                                         {ubiome_state.TAG_QC_ID: qc_scenario_id})
+    scenario.add_tag(Tag(ubiome_state.TAG_FEATURE_INFERENCE_ID, scenario.get_model_id(), is_propagable=False, auto_parse=True))
+    protocol = scenario.get_protocol()
+
+    qiime2_feature_process = protocol.add_process(task_feature_inference, 'feature_process',
+                                                  config_params=get_recipe_config(ubiome_state.TAG_FEATURE_INFERENCE)["config"])
+    # filled with the qc output when the scenario is queued
+    qc_resource = protocol.add_process(InputTask, 'qc_resource')
+    protocol.add_connector(out_port=qc_resource >> 'resource', in_port=qiime2_feature_process << 'quality_check_folder')
+
+    protocol.add_output('qiime2_feature_process_boxplot_output', qiime2_feature_process >> 'boxplot', flag_resource=False)
+    protocol.add_output('qiime2_feature_process_stats_output', qiime2_feature_process >> 'stats', flag_resource=False)
+    protocol.add_output('qiime2_feature_process_folder_output', qiime2_feature_process >> 'result_folder', flag_resource=False)
+    add_queue_next_steps_process(scenario, ubiome_state.TAG_FEATURE_INFERENCE)
+    return scenario.get_model_id()
+
+
+def create_rarefaction_scenario(ubiome_state: State, title: str, feature_scenario_id: str) -> str:
+    scenario = create_scheduled_scenario(ubiome_state, ubiome_state.TAG_RAREFACTION, title,
+                                         {ubiome_state.TAG_FEATURE_INFERENCE_ID: feature_scenario_id})
+    protocol = scenario.get_protocol()
+
+    rarefaction_process = protocol.add_process(Qiime2RarefactionAnalysis, 'rarefaction_process',
+                                               config_params=get_recipe_config(ubiome_state.TAG_RAREFACTION)["config"])
+    feature_resource = protocol.add_process(InputTask, 'feature_resource')
+    protocol.add_connector(out_port=feature_resource >> 'resource', in_port=rarefaction_process << 'feature_frequency_folder')
+
+    protocol.add_output('rarefaction_table_output', rarefaction_process >> 'rarefaction_table', flag_resource=False)
+    protocol.add_output('rarefaction_folder_output', rarefaction_process >> 'result_folder', flag_resource=False)
+    protocol.add_output('rarefaction_plateau_output', rarefaction_process >> 'plateau_table', flag_resource=False)
+    add_queue_next_steps_process(scenario, ubiome_state.TAG_RAREFACTION)
+    return scenario.get_model_id()
+
+
+def create_16s_scenario(ubiome_state: State, title: str, feature_scenario_id: str) -> str:
+    scenario = create_scheduled_scenario(ubiome_state, ubiome_state.TAG_16S, title,
+                                         {ubiome_state.TAG_FEATURE_INFERENCE_ID: feature_scenario_id})
+    scenario.add_tag(Tag(ubiome_state.TAG_16S_ID, scenario.get_model_id(), is_propagable=False, auto_parse=True))
+    if ubiome_state.get_credentials_lab_large():
+        # sent to the lab large when queued, as with the Run button of the step
+        scenario.add_tag(Tag(ubiome_state.TAG_LAB_LARGE, ubiome_state.get_credentials_lab_large(),
+                             is_propagable=False, auto_parse=True))
+    protocol = scenario.get_protocol()
+
+    feature_resource = protocol.add_process(InputTask, 'feature_resource')
+    fs_node_extractor_table = protocol.add_process(FsNodeExtractor, "fs_node_extractor_table", {"fs_node_path": "table.qza"})
+    fs_node_extractor_asv = protocol.add_process(FsNodeExtractor, "fs_node_extractor_asv", {"fs_node_path": "ASV-sequences.fasta"})
+    protocol.add_connector(out_port=feature_resource >> "resource", in_port=fs_node_extractor_table << "source")
+    protocol.add_connector(out_port=feature_resource >> "resource", in_port=fs_node_extractor_asv << "source")
+
+    functional_analysis_process = protocol.add_process(
+        Picrust2FunctionalAnalysis, "functional_analysis_process",
+        config_params=get_recipe_config(ubiome_state.TAG_16S)["config"])
+    protocol.add_connector(out_port=fs_node_extractor_table >> "target",
+                           in_port=functional_analysis_process << "ASV_count_abundance")
+    protocol.add_connector(out_port=fs_node_extractor_asv >> "target",
+                           in_port=functional_analysis_process << "FASTA_of_asv")
+
+    protocol.add_output("functional_analysis_result_output", functional_analysis_process >> "Folder_result", flag_resource=False)
+    return scenario.get_model_id()
+
+
+def create_taxonomy_scenario(ubiome_state: State, title: str, feature_scenario_id: str,
+                             rarefaction_scenario_id: str | None) -> str:
+    parent_ids = {ubiome_state.TAG_FEATURE_INFERENCE_ID: feature_scenario_id}
+    if rarefaction_scenario_id:
+        # the rarefaction depth is set to the recommended depth when the rarefaction succeeds
+        parent_ids[ubiome_state.TAG_RAREFACTION_ID] = rarefaction_scenario_id
+    scenario = create_scheduled_scenario(ubiome_state, ubiome_state.TAG_TAXONOMY, title, parent_ids)
+    scenario.add_tag(Tag(ubiome_state.TAG_TAXONOMY_ID, scenario.get_model_id(), is_propagable=False, auto_parse=True))
+    if rarefaction_scenario_id:
+        scenario.add_tag(Tag(ubiome_state.TAG_RECOMMENDED_DEPTH, "true", is_propagable=False, auto_parse=True))
+    protocol = scenario.get_protocol()
+
+    taxonomy_process = protocol.add_process(Qiime2TaxonomyDiversity, 'taxonomy_process',
+                                            config_params=get_recipe_config(ubiome_state.TAG_TAXONOMY)["config"])
+    feature_resource = protocol.add_process(InputTask, 'feature_resource')
+    protocol.add_connector(out_port=feature_resource >> 'resource', in_port=taxonomy_process << 'rarefaction_analysis_result_folder')
+
+    protocol.add_output('taxonomy_diversity_tables_output', taxonomy_process >> 'diversity_tables', flag_resource=False)
+    protocol.add_output('taxonomy_taxonomy_tables_output', taxonomy_process >> 'taxonomy_tables', flag_resource=False)
+    protocol.add_output('taxonomy_folder_output', taxonomy_process >> 'result_folder', flag_resource=False)
+    add_queue_next_steps_process(scenario, ubiome_state.TAG_TAXONOMY)
+    return scenario.get_model_id()
+
+
+def create_pcoa_scenario(ubiome_state: State, title: str, feature_scenario_id: str, taxonomy_scenario_id: str,
+                         diversity_table: str) -> str:
+    scenario = create_scheduled_scenario(ubiome_state, ubiome_state.TAG_PCOA_DIVERSITY, title,
+                                         {ubiome_state.TAG_FEATURE_INFERENCE_ID: feature_scenario_id,
+                                          ubiome_state.TAG_TAXONOMY_ID: taxonomy_scenario_id})
+    scenario.add_tag(Tag(ubiome_state.TAG_PCOA_DIVERSITY_TABLE, diversity_table, is_propagable=False, auto_parse=True))
+    protocol = scenario.get_protocol()
+
+    pcoa_process = protocol.add_process(BetaDiversityPCoA, 'pcoa_process',
+                                        config_params=get_recipe_config(ubiome_state.TAG_PCOA_DIVERSITY)["config"])
+    diversity_table_resource = protocol.add_process(InputTask, 'diversity_table_resource')
+    protocol.add_connector(out_port=diversity_table_resource >> 'resource', in_port=pcoa_process << 'distance_table')
+
+    protocol.add_output('pcoa_result_output', pcoa_process >> 'transformed_table', flag_resource=False)
+    return scenario.get_model_id()
+
+
+def create_ancom_scenario(ubiome_state: State, title: str, feature_scenario_id: str, taxonomy_scenario_id: str) -> str:
+    scenario = create_scheduled_scenario(ubiome_state, ubiome_state.TAG_ANCOM, title,
+                                         {ubiome_state.TAG_FEATURE_INFERENCE_ID: feature_scenario_id,
+                                          ubiome_state.TAG_TAXONOMY_ID: taxonomy_scenario_id})
+    protocol = scenario.get_protocol()
+
+    ancom_process = protocol.add_process(Qiime2DifferentialAnalysis, 'ancom_process',
+                                         config_params=get_recipe_config(ubiome_state.TAG_ANCOM)["config"])
+    taxonomy_folder_resource = protocol.add_process(InputTask, 'taxonomy_folder_resource')
+    metadata_file_resource = protocol.add_process(InputTask, 'metadata_file_resource',
+                                                  {InputTask.config_name: ubiome_state.get_resource_id_metadata_table()})
+    protocol.add_connector(out_port=taxonomy_folder_resource >> 'resource', in_port=ancom_process << 'taxonomy_diversity_folder')
+    protocol.add_connector(out_port=metadata_file_resource >> 'resource', in_port=ancom_process << 'metadata_file')
+
+    protocol.add_output('ancom_result_tables_output', ancom_process >> 'result_tables', flag_resource=False)
+    protocol.add_output('ancom_result_folder_output', ancom_process >> 'result_folder', flag_resource=False)
+    return scenario.get_model_id()
+
+
+def create_db_annotator_scenario(ubiome_state: State, title: str, feature_scenario_id: str, taxonomy_scenario_id: str,
+                                 annotation_table_id: str) -> str:
+    scenario = create_scheduled_scenario(ubiome_state, ubiome_state.TAG_DB_ANNOTATOR, title,
+                                         {ubiome_state.TAG_FEATURE_INFERENCE_ID: feature_scenario_id,
+                                          ubiome_state.TAG_TAXONOMY_ID: taxonomy_scenario_id})
+    protocol = scenario.get_protocol()
+
+    db_annotator_process = protocol.add_process(Qiime2TableDbAnnotator, "db_annotator_process")
+    taxonomy_folder_resource = protocol.add_process(InputTask, "taxonomy_folder_resource")
+    annotation_table_resource = protocol.add_process(InputTask, "annotation_table_resource",
+                                                     {InputTask.config_name: annotation_table_id})
+    protocol.add_connector(out_port=taxonomy_folder_resource >> "resource", in_port=db_annotator_process << "diversity_folder")
+    protocol.add_connector(out_port=annotation_table_resource >> "resource", in_port=db_annotator_process << "annotation_table")
+
+    protocol.add_output("relative_abundance_table_output", db_annotator_process >> "relative_abundance_table", flag_resource=False)
+    protocol.add_output("relative_abundance_plotly_output", db_annotator_process >> "relative_abundance_plotly_resource", flag_resource=False)
+    protocol.add_output("absolute_abundance_table_output", db_annotator_process >> "absolute_abundance_table", flag_resource=False)
+    protocol.add_output("absolute_abundance_plotly_output", db_annotator_process >> "absolute_abundance_plotly_resource", flag_resource=False)
+    return scenario.get_model_id()
+
+
+@st.dialog("Pipeline recipe", width="large")
+def dialog_pipeline_recipe(task_feature_inference: type[Task], ubiome_state: State):
+    """
+    Configure all the steps from the feature inference at once. The steps are saved as draft scenarios
+    and queued by the last task of their parents as soon as these succeed (see PipelineScheduler).
+    """
+    translate_service = ubiome_state.get_translate_service()
+    analysis_name = ubiome_state.get_current_analysis_name()
+    st.info(translate_service.translate("pipeline_recipe_description"))
+
+    st.markdown(f"##### {translate_service.translate('feature_inference')}")
+    render_recipe_config_form(task_feature_inference, ubiome_state.TAG_FEATURE_INFERENCE)
+    steps = [ubiome_state.TAG_FEATURE_INFERENCE]
+
+    if st.checkbox(translate_service.translate("rarefaction"), value=True, key="recipe_rarefaction"):
+        render_recipe_config_form(Qiime2RarefactionAnalysis, ubiome_state.TAG_RAREFACTION)
+        steps.append(ubiome_state.TAG_RAREFACTION)
+
+    if st.checkbox(translate_service.translate("16s_functional"), value=False, key="recipe_16s"):
+        if ubiome_state.get_credentials_lab_large():
+            st.info(translate_service.translate("lab_large_must_be_open"))
+        render_recipe_config_form(Picrust2FunctionalAnalysis, ubiome_state.TAG_16S)
+        steps.append(ubiome_state.TAG_16S)
+
+    use_recommended_depth = False
+    if st.checkbox(translate_service.translate("taxonomy"), value=True, key="recipe_taxonomy"):
+        default_config_values = Qiime2TaxonomyDiversity.config_specs.get_default_values()
+        if ubiome_state.TAG_RAREFACTION in steps:
+            use_recommended_depth = st.checkbox(translate_service.translate("pipeline_recipe_recommended_depth"),
+                                                value=True, key="recipe_recommended_depth")
+        if use_recommended_depth:
+            # replaced by the recommended depth when the rarefaction succeeds, used if it recommends none
+            default_config_values["rarefaction_plateau_value"] = get_recipe_config(
+                ubiome_state.TAG_RAREFACTION).get("config", {}).get("min_coverage", 20)
+        render_recipe_config_form(Qiime2TaxonomyDiversity, ubiome_state.TAG_TAXONOMY, default_config_values)
+        steps.append(ubiome_state.TAG_TAXONOMY)
+
+    diversity_table = None
+    annotation_table_selected = None
+    if ubiome_state.TAG_TAXONOMY in steps:
+        if st.checkbox(translate_service.translate("pcoa"), value=True, key="recipe_pcoa"):
+            beta_diversity_tables = [name for name in Qiime2TaxonomyDiversity.DIVERSITY_PATHS if "beta" in name.lower()]
+            diversity_table = st.selectbox(translate_service.translate("select_diversity_table_pcoa"),
+                                           options=beta_diversity_tables, key="recipe_pcoa_diversity_table")
+            render_recipe_config_form(BetaDiversityPCoA, ubiome_state.TAG_PCOA_DIVERSITY)
+            steps.append(ubiome_state.TAG_PCOA_DIVERSITY)
+
+        if st.checkbox(translate_service.translate("ancom"), value=False, key="recipe_ancom"):
+            metadata_file = ResourceModel.get_by_id(ubiome_state.get_resource_id_metadata_table()).get_resource()
+            st.write(translate_service.translate("reminder_metadata_columns"),
+                     ', '.join(TableImporter.call(metadata_file).get_data().columns.tolist()))
+            render_recipe_config_form(Qiime2DifferentialAnalysis, ubiome_state.TAG_ANCOM)
+            steps.append(ubiome_state.TAG_ANCOM)
+
+        if st.checkbox(translate_service.translate("taxa_composition"), value=False, key="recipe_db_annotator"):
+            resource_select = StreamlitResourceSelect()
+            resource_select.add_filter("resourceTypingNames", ["RESOURCE.gws_core.File"])
+            default_annotation_table = UbiomeConfig.get_instance().get_default_annotation_table_resource(resource_select)
+            annotation_table_selected = resource_select.select_resource(
+                placeholder=translate_service.translate("select_annotation_table_placeholder"),
+                key="recipe_annotation_table",
+                default_resource=default_annotation_table,
+            ) or default_annotation_table
+            steps.append(ubiome_state.TAG_DB_ANNOTATOR)
+
+    if not st.button(translate_service.translate("pipeline_recipe_schedule"), width="stretch",
+                     icon=":material/schedule:", key="button_pipeline_recipe"):
+        return
+
+    if not all(get_recipe_config(step).get("is_valid") for step in steps if step != ubiome_state.TAG_DB_ANNOTATOR):
+        st.warning(translate_service.translate("fill_mandatory_fields"))
+        return
+    if ubiome_state.TAG_DB_ANNOTATOR in steps and not annotation_table_selected:
+        st.warning(translate_service.translate("select_annotation_table_required"))
+        return
+
+    qc_scenario_id = ubiome_state.get_scenario_step_qc()[0].id
+    feature_scenario_id = create_feature_inference_scenario(
+        ubiome_state, task_feature_inference, f"{analysis_name} - Feature Inference", qc_scenario_id)
+    rarefaction_scenario_id = None
+    if ubiome_state.TAG_RAREFACTION in steps:
+        rarefaction_scenario_id = create_rarefaction_scenario(
+            ubiome_state, f"{analysis_name} - Rarefaction", feature_scenario_id)
+    if ubiome_state.TAG_16S in steps:
+        create_16s_scenario(ubiome_state, f"{analysis_name} - 16S Functional Analysis", feature_scenario_id)
+    if ubiome_state.TAG_TAXONOMY in steps:
+        taxonomy_scenario_id = create_taxonomy_scenario(
+            ubiome_state, f"{analysis_name} - Taxonomy", feature_scenario_id,
+            rarefaction_scenario_id if use_recommended_depth else None)
+        if ubiome_state.TAG_PCOA_DIVERSITY in steps:
+            create_pcoa_scenario(ubiome_state, f"{analysis_name} - PCOA", feature_scenario_id,
+                                 taxonomy_scenario_id, diversity_table)
+        if ubiome_state.TAG_ANCOM in steps:
+            create_ancom_scenario(ubiome_state, f"{analysis_name} - ANCOM", feature_scenario_id, taxonomy_scenario_id)
+        if ubiome_state.TAG_DB_ANNOTATOR in steps:
+            create_db_annotator_scenario(
+                ubiome_state, f"{analysis_name} - Taxa Composition", feature_scenario_id, taxonomy_scenario_id,
+                annotation_table_selected.get_resource().get_model_id())
+
+    # the qc already succeeded, the next steps are queued by the scenarios of the pipeline
+    feature_scenario = Scenario.get_by_id_and_check(feature_scenario_id)
+    PipelineScheduler.submit_if_ready(
+        feature_scenario, EntityTagList.find_by_entity(TagEntityType.SCENARIO, feature_scenario_id))
+    ubiome_state.reset_tree_analysis()
+    ubiome_state.set_tree_default_item(feature_scenario_id)
+    st.rerun()
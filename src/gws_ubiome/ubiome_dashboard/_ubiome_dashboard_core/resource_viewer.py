@@ -0,0 +1,185 @@
+import math
+
+import pandas as pd
+import streamlit as st
+from gws_core import Logger, Resource, ResourceModel, ResourceSet, Scenario
+
+from .state import State
+
+TABLE_TYPING_NAME = "RESOURCE.gws_core.Table"
+PLOTLY_TYPING_NAME = "RESOURCE.gws_core.PlotlyResource"
+# beta diversity matrices, displayed as tables
+DISTANCE_MATRIX_TYPING_NAME = "RESOURCE.gws_ubiome.DistanceMatrixFile"
+PAGE_SIZES = [50, 100, 500]
+# columns displayed by default, the others can be added with the column selector
+MAX_DEFAULT_COLUMNS = 50
+
+
+def get_resource_ids_by_name(resource_set: ResourceSet) -> dict[str, str]:
+    """
+    Model ids of the resources of the set by name, without loading the resources.
+
+    ResourceSet has no public accessor of the ids by name and get_resources() loads every resource of the
+    set, so its stored ids are read here only. If the attribute is missing (e.g. after a change of gws_core),
+    the ids are taken from the loaded resources.
+    """
+    resource_ids = getattr(resource_set, "_resource_ids", None)
+    if isinstance(resource_ids, dict):
+        return dict(resource_ids)
+    Logger.warning("The resource ids of the resource set could not be read, loading its resources")
+    return {name: resource.get_model_id() for name, resource in resource_set.get_resources().items()}
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def load_resource(resource_id: str) -> Resource:
+    """Resource of the model, shared by the reruns and the sessions (resources of a finished scenario do not change)."""
+    return ResourceModel.get_by_id_and_check(resource_id).get_resource()
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def load_table_data(resource_id: str) -> pd.DataFrame:
+    """Data of a table resource, must not be modified."""
+    return load_resource(resource_id).get_data()
+
+
+def get_dashboard_bundle_id(scenario: Scenario, process_name: str, ubiome_state: State) -> str | None:
+    """Model id of the dashboard bundle of the process, None for the scenarios run without bundle."""
+    # None for the tasks of the older scenarios, without dashboard_bundle output
+    return ubiome_state.get_process_output_id(scenario, process_name, "dashboard_bundle")
+
+
+def get_bundle_table_info(bundle_id: str | None, group: str, name: str) -> dict | None:
+    if not bundle_id:
+        return None
+    return load_resource(bundle_id).get_table_info(group, name)
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def load_bundle_table(bundle_id: str, group: str, name: str) -> pd.DataFrame:
+    """Reduced table of the dashboard bundle, must not be modified."""
+    return load_resource(bundle_id).get_table(group, name)
+
+
+def get_table_data(
+    resource_id: str, key: str, ubiome_state: State, bundle_id: str | None = None, group: str = "", name: str = ""
+) -> pd.DataFrame:
+    """
+    Data of a table, from the dashboard bundle when it holds the table: a reduced table is displayed
+    first and the full table is loaded on demand.
+    """
+    info = get_bundle_table_info(bundle_id, group, name)
+    if info is None:
+        return load_table_data(resource_id)
+    if not info["reduced"]:
+        return load_bundle_table(bundle_id, group, name)
+
+    translate_service = ubiome_state.get_translate_service()
+    if st.toggle(translate_service.translate("table_load_full"), key=f"{key}_full"):
+        return load_table_data(resource_id)
+    data = load_bundle_table(bundle_id, group, name)
+    st.caption(
+        translate_service.translate("table_preview").format(
+            rows=data.shape[0], total_rows=info["rows"], columns=data.shape[1], total_columns=info["columns"]
+        )
+    )
+    return data
+
+
+def filter_rows(data: pd.DataFrame, row_filter: str) -> pd.DataFrame:
+    """Rows of the table whose name contains the filter (case insensitive)."""
+    if not row_filter:
+        return data
+    return data[data.index.astype(str).str.contains(row_filter, case=False, regex=False)]
+
+
+def render_table(
+    resource_id: str, key: str, ubiome_state: State, bundle_id: str | None = None, group: str = "", name: str = ""
+) -> None:
+    """Paginated view of a table, only the rows and columns of the page are sent to the browser."""
+    translate_service = ubiome_state.get_translate_service()
+    data = get_table_data(resource_id, key, ubiome_state, bundle_id, group, name)
+    all_columns = list(data.columns)
+
+    col_columns, col_filter = st.columns([2, 1])
+    with col_columns:
+        columns = st.multiselect(
+            translate_service.translate("table_columns"),
+            options=all_columns,
+            default=all_columns[:MAX_DEFAULT_COLUMNS],
+            key=f"{key}_columns",
+        )
+    with col_filter:
+        row_filter = st.text_input(translate_service.translate("table_filter_rows"), key=f"{key}_filter")
+    filtered_data = filter_rows(data, row_filter)
+
+    col_page_size, col_page = st.columns(2)
+    with col_page_size:
+        page_size = st.selectbox(
+            translate_service.translate("table_rows_per_page"), options=PAGE_SIZES, key=f"{key}_page_size"
+        )
+    with col_page:
+        page = st.number_input(
+            translate_service.translate("table_page"),
+            min_value=1,
+            max_value=max(math.ceil(len(filtered_data) / page_size), 1),
+            value=1,
+            step=1,
+            key=f"{key}_page",
+        )
+
+    start = (int(page) - 1) * page_size
+    st.dataframe(filtered_data.iloc[start : start + page_size][columns])
+    st.caption(
+        translate_service.translate("table_rows_shown").format(
+            start=min(start + 1, len(filtered_data)),
+            end=min(start + page_size, len(filtered_data)),
+            total=len(filtered_data),
+            columns=len(columns),
+            total_columns=len(all_columns),
+        )
+    )
+
+
+def render_resource(
+    resource_id: str, key: str, ubiome_state: State, bundle_id: str | None = None, group: str = "", name: str = ""
+) -> None:
+    """Table or figure of a resource, loaded when it is displayed (the tables of the bundle are not loaded)."""
+    if get_bundle_table_info(bundle_id, group, name) is not None:
+        render_table(resource_id, key, ubiome_state, bundle_id, group, name)
+        return
+    resource = load_resource(resource_id)
+    if resource.get_typing_name() in (TABLE_TYPING_NAME, DISTANCE_MATRIX_TYPING_NAME):
+        render_table(resource_id, key, ubiome_state)
+    elif resource.get_typing_name() == PLOTLY_TYPING_NAME:
+        st.plotly_chart(resource.get_figure(), key=f"{key}_figure")
+
+
+def render_resource_set(
+    resource_set: ResourceSet,
+    key: str,
+    ubiome_state: State,
+    label: str | None = None,
+    bundle_id: str | None = None,
+    group: str = "",
+) -> None:
+    """
+    View of a resource set: one resource selected at a time, only its model is loaded and only its
+    table or figure is built.
+
+    Without label, the resources are selected with tab-like buttons, otherwise with a select box.
+    With a dashboard bundle, the tables of the set are first displayed from the ``group`` of the bundle.
+    """
+    resource_ids = get_resource_ids_by_name(resource_set)
+    if not resource_ids:
+        return
+    names = list(resource_ids.keys())
+    if label is None:
+        selected_name = st.segmented_control(
+            "resources", options=names, default=names[0], key=key, label_visibility="collapsed"
+        )
+    else:
+        selected_name = st.selectbox(label, options=names, key=key)
+    if selected_name:
+        render_resource(
+            resource_ids[selected_name], f"{key}_{selected_name}", ubiome_state, bundle_id, group, selected_name
+        )
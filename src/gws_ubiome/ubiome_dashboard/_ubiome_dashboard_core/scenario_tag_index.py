@@ -0,0 +1,88 @@
+import streamlit as st
+from gws_core import Scenario
+from gws_core.tag.entity_tag import EntityTag
+from gws_core.tag.entity_tag_list import EntityTagList
+from gws_core.tag.tag_entity_type import TagEntityType
+
+
+class ScenarioTagIndex:
+    """
+    Tags of a set of scenarios, loaded with a single query and grouped in memory by pipeline id and step.
+
+    The index is kept in the session and reused on the reruns as long as the scenarios are the same
+    (same ids, status and last modification): a created, updated or deleted scenario invalidates it.
+    """
+
+    SESSION_KEY = "scenario_tag_index"
+    # index of the scenarios of the selected pipeline
+    PIPELINE_SESSION_KEY = "pipeline_scenario_tag_index"
+    # index of the scenarios listed by a step
+    STEP_SESSION_KEY = "step_scenario_tag_index"
+    # limit of the number of variables of a query
+    QUERY_CHUNK_SIZE = 900
+
+    _scenarios: dict[str, Scenario]
+    _tags: dict[str, EntityTagList]
+
+    def __init__(self, scenarios: list[Scenario], tags: dict[str, EntityTagList]) -> None:
+        self._scenarios = {scenario.id: scenario for scenario in scenarios}
+        self._tags = tags
+
+    @classmethod
+    def load(cls, scenarios: list[Scenario], session_key: str = SESSION_KEY) -> "ScenarioTagIndex":
+        """Index of the scenarios, from the session if it is still valid."""
+        signature = cls.get_signature(scenarios)
+        cached = st.session_state.get(session_key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        index = cls(scenarios, cls.find_tags([scenario.id for scenario in scenarios]))
+        st.session_state[session_key] = (signature, index)
+        return index
+
+    @classmethod
+    def find_tags(cls, scenario_ids: list[str]) -> dict[str, EntityTagList]:
+        """Tags of the scenarios, by scenario id."""
+        tags_by_scenario: dict[str, list[EntityTag]] = {scenario_id: [] for scenario_id in scenario_ids}
+        for i in range(0, len(scenario_ids), cls.QUERY_CHUNK_SIZE):
+            entity_tags = EntityTag.select().where(
+                (EntityTag.entity_type == TagEntityType.SCENARIO)
+                & (EntityTag.entity_id.in_(scenario_ids[i : i + cls.QUERY_CHUNK_SIZE]))
+            )
+            for entity_tag in entity_tags:
+                tags_by_scenario[entity_tag.entity_id].append(entity_tag)
+        return {
+            scenario_id: EntityTagList(TagEntityType.SCENARIO, scenario_id, tags)
+            for scenario_id, tags in tags_by_scenario.items()
+        }
+
+    @staticmethod
+    def get_signature(scenarios: list[Scenario]) -> tuple:
+        return tuple(
+            sorted((scenario.id, str(scenario.status), str(scenario.last_modified_at)) for scenario in scenarios)
+        )
+
+    def get_scenarios(self) -> list[Scenario]:
+        return list(self._scenarios.values())
+
+    def get_tags(self, scenario_id: str) -> EntityTagList:
+        return self._tags.get(scenario_id) or EntityTagList(TagEntityType.SCENARIO, scenario_id, [])
+
+    def get_tag_value(self, scenario_id: str, key: str) -> str | None:
+        """Value of the first tag of the key of the scenario, None if it has no such tag."""
+        tags = self.get_tags(scenario_id).get_tags_by_key(key)
+        return tags[0].to_simple_tag().value if tags else None
+
+    def filter_by_tag(self, key: str, value: str) -> list[Scenario]:
+        return [
+            scenario for scenario in self._scenarios.values() if self.get_tag_value(scenario.id, key) == value
+        ]
+
+    def group_by_tag(self, key: str) -> dict[str, list[Scenario]]:
+        """Scenarios by value of the tag, the scenarios without the tag are left out."""
+        groups: dict[str, list[Scenario]] = {}
+        for scenario in self._scenarios.values():
+            value = self.get_tag_value(scenario.id, key)
+            if value is not None:
+                groups.setdefault(value, []).append(scenario)
+        return groups
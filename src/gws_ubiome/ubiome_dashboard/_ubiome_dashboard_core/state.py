@@ -4,44 +4,16 @@ import tempfile
 
 import pandas as pd
 import streamlit as st
-from gws_core import ResourceModel, Scenario
+from gws_core import ProcessProxy, ProtocolProxy, ResourceModel, Scenario, ScenarioProxy
 from gws_core.tag.entity_tag_list import EntityTagList
 from gws_core.tag.tag_entity_type import TagEntityType
 from gws_streamlit_main import StreamlitTranslateLang, StreamlitTranslateService
+from gws_ubiome.ubiome_dashboard.ubiome_tags import UbiomeTags
 
 
-class State:
+class State(UbiomeTags):
     """Class to manage the state of the app."""
 
-    TAG_BRICK = "brick"
-    TAG_UBIOME = "ubiome"
-    TAG_SEQUENCING_TYPE = "sequencing_type"
-    TAG_FASTQ = "fastq_name"
-    TAG_ANALYSIS_NAME = "analysis_name"
-
-    # step tags
-    TAG_METADATA = "metadata"
-    TAG_QC = "quality_control"
-    TAG_MULTIQC = "multiqc"
-    TAG_FEATURE_INFERENCE = "feature_inference"
-    TAG_RAREFACTION = "rarefaction"
-    TAG_TAXONOMY = "taxonomy"
-    TAG_PCOA_DIVERSITY = "pcoa_diversity"
-    TAG_ANCOM = "ancom"
-    TAG_DB_ANNOTATOR = "db_annotator"
-    TAG_16S = "16s"
-    TAG_16S_VISU = "16s_visualization"
-    TAG_RATIO = "ratio"
-
-    # Tags unique ids
-    TAG_UBIOME_PIPELINE_ID = "ubiome_pipeline_id"
-    TAG_FEATURE_INFERENCE_ID = "feature_inference_id"
-    TAG_RAREFACTION_ID = "rarefaction_id"
-    TAG_TAXONOMY_ID = "taxonomy_id"
-    TAG_DB_ANNOTATOR_ID = "db_annotator_id"
-    TAG_PCOA_ID = "pcoa_id"
-    TAG_16S_ID = "16s_id"
-
     # Scenario names
     FEATURE_SCENARIO_NAME_INPUT_KEY = "feature_scenario_name_input"
     RAREFACTION_SCENARIO_NAME_INPUT_KEY = "rarefaction_scenario_name_input"
@@ -93,12 +65,17 @@ class State:
     ANCOM_CONFIG_KEY = "ancom_config"
     FUNCTIONAL_ANALYSIS_CONFIG_KEY = "functional_analysis_config"
     FUNCTIONAL_ANALYSIS_VISU_CONFIG_KEY = "functional_analysis_visu_config"
+    PIPELINE_RECIPE_CONFIG_KEY = "pipeline_recipe_config"
+    TAXONOMY_SWEEP_CONFIG_KEY = "taxonomy_sweep_config"
 
     LANG_KEY = "lang_select"
     TRANSLATE_SERVICE = "translate_service"
 
     HAS_RATIO_STEP_KEY = "has_ratio_step"
 
+    # Protocols, process configs and output resource ids of the scenarios, by scenario id
+    SCENARIO_PROTOCOL_CACHE_KEY = "scenario_protocol_cache"
+
     def __init__(cls, file_lang: str, lang_specific_folder_path: str | None = None):
         if lang_specific_folder_path:
             temp_dir = tempfile.mkdtemp(prefix="translations_")
@@ -361,6 +338,10 @@ class State:
     def get_taxonomy_config(cls) -> dict:
         return st.session_state.get(cls.TAXONOMY_CONFIG_KEY, {})
 
+    @classmethod
+    def get_taxonomy_sweep_config(cls) -> dict:
+        return st.session_state.get(cls.TAXONOMY_SWEEP_CONFIG_KEY, {})
+
     @classmethod
     def get_pcoa_config(cls) -> dict:
         return st.session_state.get(cls.PCOA_CONFIG_KEY, {})
@@ -592,3 +573,69 @@ class State:
         if scenario_id:
             return Scenario.get_by_id(scenario_id)
         return None
+
+    # Protocols of the scenarios, reused on the reruns while the scenario is unchanged
+
+    @classmethod
+    def _get_scenario_cache_entry(cls, scenario: Scenario | str) -> dict:
+        """
+        Cache entry of the scenario, reloaded when its status or last modification changed
+        (e.g. the scenario was edited, queued or finished).
+        """
+        if isinstance(scenario, str):
+            scenario = Scenario.get_by_id(scenario)
+        signature = (str(scenario.status), str(scenario.last_modified_at))
+        cache = st.session_state.setdefault(cls.SCENARIO_PROTOCOL_CACHE_KEY, {})
+        entry = cache.get(scenario.id)
+        if entry is None or entry["signature"] != signature:
+            entry = {
+                "signature": signature,
+                "protocol": ScenarioProxy.from_existing_scenario(scenario.id).get_protocol(),
+                "configs": {},
+                "outputs": {},
+            }
+            cache[scenario.id] = entry
+        return entry
+
+    @classmethod
+    def get_scenario_protocol(cls, scenario: Scenario | str) -> ProtocolProxy:
+        """Protocol of the scenario (or scenario id), loaded once while the scenario is unchanged."""
+        return cls._get_scenario_cache_entry(scenario)["protocol"]
+
+    @classmethod
+    def get_process_config(cls, scenario: Scenario | str, process_name: str) -> dict:
+        entry = cls._get_scenario_cache_entry(scenario)
+        if process_name not in entry["configs"]:
+            process = entry["protocol"].get_process(process_name)
+            entry["configs"][process_name] = process._process_model.config.to_simple_dto().values
+        return entry["configs"][process_name]
+
+    @classmethod
+    def get_process_output_id(
+        cls, scenario: Scenario | str, process_name: str, output_name: str
+    ) -> str | None:
+        """
+        Model id of an output resource of a process of the scenario, None if it is not generated or if the
+        process has no such output.
+        """
+        entry = cls._get_scenario_cache_entry(scenario)
+        key = (process_name, output_name)
+        if key not in entry["outputs"]:
+            process = entry["protocol"].get_process(process_name)
+            resource = process.get_output(output_name) if cls.has_output(process, output_name) else None
+            entry["outputs"][key] = resource.get_model_id() if resource else None
+        return entry["outputs"][key]
+
+    @staticmethod
+    def has_output(process: ProcessProxy, output_name: str) -> bool:
+        """Whether the process has the output, the processes of the older scenarios lack the newer outputs."""
+        return process._process_model.outputs.port_exists(output_name)
+
+    @classmethod
+    def invalidate_scenario_cache(cls, scenario_id: str | None = None) -> None:
+        """Drop the cached protocol of the scenario, or of all the scenarios."""
+        cache = st.session_state.get(cls.SCENARIO_PROTOCOL_CACHE_KEY, {})
+        if scenario_id is None:
+            cache.clear()
+        else:
+            cache.pop(scenario_id, None)
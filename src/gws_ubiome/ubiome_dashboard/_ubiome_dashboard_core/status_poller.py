@@ -0,0 +1,110 @@
+import streamlit as st
+from gws_core import Scenario, ScenarioStatus
+from gws_ubiome.ubiome_dashboard.pipeline_scheduler import PipelineScheduler
+
+from .functions_steps import get_status_emoji, get_status_prettify
+from .scenario_tag_index import ScenarioTagIndex
+from .state import State
+
+ACTIVE_STATUSES = [
+    ScenarioStatus.RUNNING,
+    ScenarioStatus.WAITING_FOR_CLI_PROCESS,
+    ScenarioStatus.IN_QUEUE,
+]
+POLL_INTERVAL_SECONDS = 10
+
+
+def get_pipeline_scenarios(scenarios_by_step: dict) -> list[Scenario]:
+    scenarios = []
+    for step_scenarios in scenarios_by_step.values():
+        # the steps with a parent are grouped by parent id
+        scenario_lists = step_scenarios.values() if isinstance(step_scenarios, dict) else [step_scenarios]
+        for step_scenario_list in scenario_lists:
+            scenarios.extend(step_scenario_list)
+    return scenarios
+
+
+def get_active_statuses(scenarios_by_step: dict) -> dict[str, ScenarioStatus]:
+    """Status of the running and queued scenarios of the pipeline, by scenario id."""
+    return {
+        scenario.id: scenario.status
+        for scenario in get_pipeline_scenarios(scenarios_by_step)
+        if scenario.status in ACTIVE_STATUSES
+    }
+
+
+def get_scheduled_statuses(scenarios_by_step: dict) -> dict[str, ScenarioStatus]:
+    """Status of the draft scenarios of the pipeline waiting to be queued by their parents."""
+    scenarios = get_pipeline_scenarios(scenarios_by_step)
+    tag_index = ScenarioTagIndex.load(scenarios, ScenarioTagIndex.PIPELINE_SESSION_KEY)
+    return {
+        scenario.id: scenario.status
+        for scenario in scenarios
+        if PipelineScheduler.is_scheduled(scenario, tag_index.get_tags(scenario.id))
+    }
+
+
+def fetch_statuses(scenario_ids: list[str]) -> dict[str, ScenarioStatus]:
+    """Current status of the scenarios, in one query."""
+    if not scenario_ids:
+        return {}
+    query = Scenario.select(Scenario.id, Scenario.status).where(Scenario.id.in_(scenario_ids))
+    return {scenario.id: scenario.status for scenario in query}
+
+
+def render_scenario_status(selected_scenario: Scenario | None, ubiome_state: State) -> None:
+    """
+    Status of the selected scenario, refreshed in place while scenarios of the pipeline are running,
+    queued or scheduled. Only the status of these scenarios is fetched; the page (tree, tables) is
+    rebuilt when one of them changes status.
+    """
+    scenarios_by_step = ubiome_state.get_scenarios_by_step_dict()
+    known_statuses = get_active_statuses(scenarios_by_step)
+    scheduled_statuses = get_scheduled_statuses(scenarios_by_step)
+    if scheduled_statuses:
+        known_statuses.update(scheduled_statuses)
+    if selected_scenario is not None:
+        known_statuses[selected_scenario.id] = selected_scenario.status
+
+    run_every = POLL_INTERVAL_SECONDS if scheduled_statuses or any(
+        status in ACTIVE_STATUSES for status in known_statuses.values()) else None
+    st.fragment(_render_polled_status, run_every=run_every)(
+        selected_scenario, known_statuses, len(scheduled_statuses), ubiome_state
+    )
+
+
+def _render_polled_status(
+    selected_scenario: Scenario | None,
+    known_statuses: dict[str, ScenarioStatus],
+    scheduled_count: int,
+    ubiome_state: State,
+) -> None:
+    translate_service = ubiome_state.get_translate_service()
+    statuses = fetch_statuses(list(known_statuses))
+    changed_ids = [
+        scenario_id for scenario_id, status in known_statuses.items() if statuses.get(scenario_id) != status
+    ]
+    if changed_ids:
+        # a scenario started or finished, rebuild the page on the same item
+        for scenario_id in changed_ids:
+            ubiome_state.invalidate_scenario_cache(scenario_id)
+        ubiome_state.reset_tree_analysis()
+        ubiome_state.set_tree_default_item(
+            selected_scenario.id if selected_scenario else ubiome_state.get_step_pipeline()
+        )
+        st.rerun(scope="app")
+
+    if selected_scenario is not None:
+        status = statuses.get(selected_scenario.id, selected_scenario.status)
+        st.markdown(
+            f"#### **{translate_service.translate('status')}:** {get_status_emoji(status)} {get_status_prettify(status)}"
+        )
+    active_count = sum(status in ACTIVE_STATUSES for status in statuses.values())
+    if active_count:
+        st.caption(
+            translate_service.translate("status_polling").format(
+                count=active_count, seconds=POLL_INTERVAL_SECONDS
+            )
+        )
+    if scheduled_count:
+        st.caption(translate_service.translate("status_scheduled").format(count=scheduled_count))
@@ -4,19 +4,20 @@ from gws_core import (
     InputTask,
     ResourceModel,
     Scenario,
-    ScenarioProxy,
     ScenarioStatus,
     TableImporter,
     Tag,
 )
 from gws_streamlit_main import StreamlitTaskRunner
 from gws_ubiome import Qiime2DifferentialAnalysis
+from pandas import DataFrame
 from ..functions_steps import (
     create_base_scenario_with_tags,
     display_saved_scenario_actions,
     display_scenario_parameters,
     render_scenario_table,
 )
+from ..resource_viewer import get_dashboard_bundle_id, get_resource_ids_by_name, get_table_data
 from ..state import State
 
 
@@ -72,8 +73,7 @@ def dialog_ancom_params(ubiome_state: State):
                                            config_params=ubiome_state.get_ancom_config()["config"])
 
         # Get the taxonomy diversity folder
-        scenario_proxy_tax = ScenarioProxy.from_existing_scenario(taxonomy_scenario_id)
-        protocol_proxy_tax = scenario_proxy_tax.get_protocol()
+        protocol_proxy_tax = ubiome_state.get_scenario_protocol(taxonomy_scenario_id)
         taxonomy_folder_output = protocol_proxy_tax.get_process('taxonomy_process').get_output('result_folder')
 
         # Add input resources
@@ -101,6 +101,17 @@ def dialog_ancom_params(ubiome_state: State):
 
         st.rerun()
 
+def get_ancom_table_data(resource_ids: dict[str, str], name: str, bundle_id: str | None,
+                         ubiome_state: State) -> DataFrame:
+    """Table of the ANCOM results, from the dashboard bundle of the scenario if it has one."""
+    data = get_table_data(resource_ids[name], f"ancom_{name}", ubiome_state, bundle_id, "result_tables", name)
+    # Convert boolean columns to string to avoid checkbox display (already done in the bundle)
+    bool_columns = [col for col in data.columns if data[col].dtype == 'bool']
+    if bool_columns:
+        data = data.astype({col: str for col in bool_columns})
+    return data
+
+
 def render_ancom_step(selected_scenario: Scenario, ubiome_state: State) -> None:
     translate_service = ubiome_state.get_translate_service()
 
@@ -138,27 +149,19 @@ def render_ancom_step(selected_scenario: Scenario, ubiome_state: State) -> None:
             return
 
         # Display results if scenario is successful
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-        protocol_proxy = scenario_proxy.get_protocol()
+        protocol_proxy = ubiome_state.get_scenario_protocol(selected_scenario)
 
-        # Get ANCOM results
+        # Get ANCOM results, the tables are read from the dashboard bundle and loaded on demand
         ancom_result_tables = protocol_proxy.get_process('ancom_process').get_output('result_tables')
 
         if ancom_result_tables:
-            resource_set_result_dict = ancom_result_tables.get_resources()
+            resource_ids = get_resource_ids_by_name(ancom_result_tables)
+            bundle_id = get_dashboard_bundle_id(selected_scenario, 'ancom_process', ubiome_state)
 
             # Separate different types of results
-            ancom_stats = {}
-            volcano_plots = {}
-            percentile_abundances = {}
-
-            for key, resource in resource_set_result_dict.items():
-                if "ANCOM Stat" in key:
-                    ancom_stats[key] = resource
-                elif "Volcano plot" in key:
-                    volcano_plots[key] = resource
-                elif "Percentile abundances" in key:
-                    percentile_abundances[key] = resource
+            ancom_stats = [key for key in resource_ids if "ANCOM Stat" in key]
+            volcano_plots = [key for key in resource_ids if "Volcano plot" in key]
+            percentile_abundances = [key for key in resource_ids if "Percentile abundances" in key]
 
             tab_stats, tab_volcano, tab_percentile = st.tabs([translate_service.translate("ancom_statistics"), translate_service.translate("volcano_plots"), translate_service.translate("percentile_abundances")])
 
@@ -166,14 +169,10 @@ def render_ancom_step(selected_scenario: Scenario, ubiome_state: State) -> None:
                 st.markdown(f"##### {translate_service.translate('ancom_statistical_results')}")
                 if ancom_stats:
                     selected_stat = st.selectbox(translate_service.translate("select_taxonomic_level_ancom"),
-                                                options=list(ancom_stats.keys()),
+                                                options=ancom_stats,
                                                 key="ancom_stats_select")
                     if selected_stat:
-                        ancom_data = ancom_stats[selected_stat].get_data()
-                        # Convert boolean columns to string to avoid checkbox display
-                        for col in ancom_data.columns:
-                            if ancom_data[col].dtype == 'bool':
-                                ancom_data[col] = ancom_data[col].astype(str)
+                        ancom_data = get_ancom_table_data(resource_ids, selected_stat, bundle_id, ubiome_state)
                         st.dataframe(ancom_data)
                 else:
                     st.info(translate_service.translate("no_ancom_statistics"))
@@ -182,14 +181,10 @@ def render_ancom_step(selected_scenario: Scenario, ubiome_state: State) -> None:
                 st.markdown(f"##### {translate_service.translate('volcano_plot_data')}")
                 if volcano_plots:
                     selected_volcano = st.selectbox(translate_service.translate("select_taxonomic_level_volcano"),
-                                                    options=list(volcano_plots.keys()),
+                                                    options=volcano_plots,
                                                     key="volcano_plot_select")
                     if selected_volcano:
-                        volcano_data = volcano_plots[selected_volcano].get_data()
-                        # Convert boolean columns to string to avoid checkbox display
-                        for col in volcano_data.columns:
-                            if volcano_data[col].dtype == 'bool':
-                                volcano_data[col] = volcano_data[col].astype(str)
+                        volcano_data = get_ancom_table_data(resource_ids, selected_volcano, bundle_id, ubiome_state)
                         st.dataframe(volcano_data)
 
                         # Create a simple volcano plot if data has the right columns
@@ -209,14 +204,10 @@ def render_ancom_step(selected_scenario: Scenario, ubiome_state: State) -> None:
                 st.markdown(f"##### {translate_service.translate('percentile_abundances')}")
                 if percentile_abundances:
                     selected_percentile = st.selectbox(translate_service.translate("select_taxonomic_level_percentile"),
-                                                        options=list(percentile_abundances.keys()),
+                                                        options=percentile_abundances,
                                                         key="percentile_select")
                     if selected_percentile:
-                        percentile_data = percentile_abundances[selected_percentile].get_data()
-                        # Convert boolean columns to string to avoid checkbox display
-                        for col in percentile_data.columns:
-                            if percentile_data[col].dtype == 'bool':
-                                percentile_data[col] = percentile_data[col].astype(str)
+                        percentile_data = get_ancom_table_data(resource_ids, selected_percentile, bundle_id, ubiome_state)
                         st.dataframe(percentile_data)
                 else:
                     st.info(translate_service.translate("no_percentile_abundance_data"))
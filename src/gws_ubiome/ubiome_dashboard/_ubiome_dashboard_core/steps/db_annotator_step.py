@@ -1,5 +1,5 @@
 import streamlit as st
-from gws_core import InputTask, Scenario, ScenarioProxy, ScenarioStatus, Tag
+from gws_core import InputTask, Scenario, ScenarioStatus, Tag
 from gws_streamlit_main import StreamlitResourceSelect
 from gws_ubiome import Qiime2TableDbAnnotator
 
@@ -95,8 +95,7 @@ def dialog_db_annotator_params(ubiome_state: State):
         db_annotator_process = protocol.add_process(Qiime2TableDbAnnotator, "db_annotator_process")
 
         # Get the taxonomy diversity folder
-        scenario_proxy_tax = ScenarioProxy.from_existing_scenario(taxonomy_scenario_id)
-        protocol_proxy_tax = scenario_proxy_tax.get_protocol()
+        protocol_proxy_tax = ubiome_state.get_scenario_protocol(taxonomy_scenario_id)
         taxonomy_folder_output = protocol_proxy_tax.get_process("taxonomy_process").get_output(
             "result_folder"
         )
@@ -202,8 +201,7 @@ def render_db_annotator_step(selected_scenario: Scenario, ubiome_state: State) -
             return
 
         # Display results if scenario is successful
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-        protocol_proxy = scenario_proxy.get_protocol()
+        protocol_proxy = ubiome_state.get_scenario_protocol(selected_scenario)
 
         tab_relative, tab_absolute = st.tabs(
             [
@@ -1,5 +1,5 @@
 import streamlit as st
-from gws_core import InputTask, Scenario, ScenarioProxy, ScenarioStatus, Tag, Task
+from gws_core import InputTask, Scenario, ScenarioStatus, Tag, Task
 from gws_streamlit_main import StreamlitTaskRunner
 from gws_ubiome import Qiime2FeatureTableExtractorPE, Qiime2FeatureTableExtractorSE
 from ..functions_steps import (
@@ -8,6 +8,7 @@ from ..functions_steps import (
     display_scenario_parameters,
     render_scenario_table,
 )
+from ..pipeline_recipe import dialog_pipeline_recipe
 from ..state import State
 
 
@@ -46,8 +47,7 @@ def dialog_feature_inference_params(task_feature_inference: Task, ubiome_state:
 
         # Retrieve qc output and connect
         scenario_qc_id = ubiome_state.get_scenario_step_qc()[0].id
-        scenario_proxy_qc = ScenarioProxy.from_existing_scenario(scenario_qc_id)
-        protocol_proxy_qc = scenario_proxy_qc.get_protocol()
+        protocol_proxy_qc = ubiome_state.get_scenario_protocol(scenario_qc_id)
         qc_output = protocol_proxy_qc.get_process('qc_process').get_output('result_folder')
 
         qc_resource = protocol.add_process(InputTask, 'qc_resource', {InputTask.config_name: qc_output.get_model_id()})
@@ -79,6 +79,9 @@ def render_feature_inference_step(selected_scenario: Scenario, ubiome_state: Sta
             # On click, open a dialog to allow the user to select params of feature inference
             st.button(translate_service.translate("configure_new_feature_inference_scenario"), icon=":material/edit:", width="content",
                     on_click=lambda task=task_feature_inference, state=ubiome_state: dialog_feature_inference_params(task, state))
+            # Or configure all the following steps, chained as soon as their parents succeed
+            st.button(translate_service.translate("configure_pipeline_recipe"), icon=":material/account_tree:", width="content",
+                    on_click=lambda task=task_feature_inference, state=ubiome_state: dialog_pipeline_recipe(task, state))
 
         # Display table of existing Feature Inference scenarios
         st.markdown(f"### {translate_service.translate('list_scenarios')}")
@@ -97,8 +100,7 @@ def render_feature_inference_step(selected_scenario: Scenario, ubiome_state: Sta
             return
 
         # Display results if scenario is successful
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-        protocol_proxy = scenario_proxy.get_protocol()
+        protocol_proxy = ubiome_state.get_scenario_protocol(selected_scenario)
 
         tab_boxplot, tab_table = st.tabs([translate_service.translate("boxplot"), translate_service.translate("table")])
 
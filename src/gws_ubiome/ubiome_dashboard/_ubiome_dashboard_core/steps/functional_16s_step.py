@@ -3,7 +3,6 @@ from gws_core import (
     FsNodeExtractor,
     InputTask,
     Scenario,
-    ScenarioProxy,
     ScenarioStatus,
     Tag,
 )
@@ -92,8 +91,7 @@ def dialog_16s_params(ubiome_state: State):
         protocol = scenario.get_protocol()
 
         # Retrieve feature inference outputs and extract table.qza and asv
-        scenario_proxy_fi = ScenarioProxy.from_existing_scenario(feature_scenario_id)
-        protocol_proxy_fi = scenario_proxy_fi.get_protocol()
+        protocol_proxy_fi = ubiome_state.get_scenario_protocol(feature_scenario_id)
         feature_output = protocol_proxy_fi.get_process("feature_process").get_output(
             "result_folder"
         )
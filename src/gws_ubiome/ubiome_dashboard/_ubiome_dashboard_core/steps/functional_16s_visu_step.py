@@ -6,7 +6,6 @@ from gws_core import (
     InputTask,
     ResourceModel,
     Scenario,
-    ScenarioProxy,
     ScenarioStatus,
     TableImporter,
     Tag,
@@ -113,8 +112,7 @@ def dialog_16s_visu_params(ubiome_state: State):
         )
 
         # Get the 16S functional analysis results folder
-        scenario_proxy_16s = ScenarioProxy.from_existing_scenario(functional_scenario_id)
-        protocol_proxy_16s = scenario_proxy_16s.get_protocol()
+        protocol_proxy_16s = ubiome_state.get_scenario_protocol(functional_scenario_id)
         functional_result_folder = protocol_proxy_16s.get_process(
             "functional_analysis_process"
         ).get_output("Folder_result")
@@ -191,8 +189,7 @@ def render_16s_visu_step(selected_scenario: Scenario, ubiome_state: State) -> No
         ko_file_available = False
         if functional_scenario_id:
             try:
-                scenario_proxy_16s = ScenarioProxy.from_existing_scenario(functional_scenario_id)
-                protocol_proxy_16s = scenario_proxy_16s.get_protocol()
+                protocol_proxy_16s = ubiome_state.get_scenario_protocol(functional_scenario_id)
                 functional_result_folder = protocol_proxy_16s.get_process(
                     "functional_analysis_process"
                 ).get_output("Folder_result")
@@ -240,8 +237,7 @@ def render_16s_visu_step(selected_scenario: Scenario, ubiome_state: State) -> No
             return
 
         # Display results if scenario is successful
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-        protocol_proxy = scenario_proxy.get_protocol()
+        protocol_proxy = ubiome_state.get_scenario_protocol(selected_scenario)
 
         resource_set_output = protocol_proxy.get_process("functional_visu_process").get_output(
             "resource_set"
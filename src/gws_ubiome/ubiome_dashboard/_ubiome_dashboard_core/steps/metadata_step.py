@@ -1,6 +1,6 @@
 import pandas as pd
 import streamlit as st
-from gws_core import File, ProtocolProxy, Scenario, ScenarioProxy, TableImporter
+from gws_core import File, ProtocolProxy, Scenario, TableImporter
 
 from ..functions_steps import (
     add_new_column_dialog,
@@ -13,8 +13,7 @@ from ..state import State
 def render_metadata_step(selected_scenario: Scenario, ubiome_state: State) -> None:
     translate_service = ubiome_state.get_translate_service()
 
-    scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-    protocol_proxy: ProtocolProxy = scenario_proxy.get_protocol()
+    protocol_proxy: ProtocolProxy = ubiome_state.get_scenario_protocol(selected_scenario)
 
     # Check if there's an updated metadata table first
     file_metadata = search_updated_metadata_table(ubiome_state)
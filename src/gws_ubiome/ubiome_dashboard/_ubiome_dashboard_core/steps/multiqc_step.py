@@ -6,7 +6,6 @@ from gws_core import (
     ProcessProxy,
     ProtocolProxy,
     Scenario,
-    ScenarioProxy,
     ScenarioStatus,
     ShareLinkEntityType,
     ShareLinkService,
@@ -79,8 +78,7 @@ def render_multiqc_step(selected_scenario: Scenario, ubiome_state: State) -> Non
         if selected_scenario.status != ScenarioStatus.SUCCESS:
             return
 
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-        protocol_proxy: ProtocolProxy = scenario_proxy.get_protocol()
+        protocol_proxy: ProtocolProxy = ubiome_state.get_scenario_protocol(selected_scenario)
 
         # Retrieve html output
         multiqc_output = protocol_proxy.get_process('fs_node_extractor_html').get_output('target')
@@ -1,8 +1,9 @@
 import plotly.express as px
 import streamlit as st
-from gws_core import InputTask, Scenario, ScenarioProxy, ScenarioStatus, Tag
+from gws_core import InputTask, ProtocolProxy, Scenario, ScenarioStatus, Tag
 from gws_streamlit_main import StreamlitTaskRunner
-from gws_gaia import PCoATrainer
+from gws_ubiome import BetaDiversityPCoA
+from pandas import DataFrame
 from ..functions_steps import (
     create_base_scenario_with_tags,
     display_saved_scenario_actions,
@@ -19,8 +20,7 @@ def dialog_pcoa_params(ubiome_state: State):
     taxonomy_scenario_id = ubiome_state.get_current_taxonomy_scenario_id_parent()
 
     # Get available diversity tables from taxonomy results
-    scenario_proxy_tax = ScenarioProxy.from_existing_scenario(taxonomy_scenario_id)
-    protocol_proxy_tax = scenario_proxy_tax.get_protocol()
+    protocol_proxy_tax = ubiome_state.get_scenario_protocol(taxonomy_scenario_id)
     diversity_resource_set = protocol_proxy_tax.get_process('taxonomy_process').get_output('diversity_tables')
 
     resource_set_result_dict = diversity_resource_set.get_resources()
@@ -35,12 +35,12 @@ def dialog_pcoa_params(ubiome_state: State):
     )
 
     # Standard PCOA configuration
-    form_config = StreamlitTaskRunner(PCoATrainer)
+    form_config = StreamlitTaskRunner(BetaDiversityPCoA)
     form_config.generate_config_form_without_run(
         session_state_key=ubiome_state.PCOA_CONFIG_KEY,
-        default_config_values=PCoATrainer.config_specs.get_default_values(),
-        is_default_config_valid=PCoATrainer.config_specs.mandatory_values_are_set(
-            PCoATrainer.config_specs.get_default_values())
+        default_config_values=BetaDiversityPCoA.config_specs.get_default_values(),
+        is_default_config_valid=BetaDiversityPCoA.config_specs.mandatory_values_are_set(
+            BetaDiversityPCoA.config_specs.get_default_values())
     )
 
     # Add both Save and Run buttons
@@ -69,7 +69,7 @@ def dialog_pcoa_params(ubiome_state: State):
         protocol = scenario.get_protocol()
 
         # Add PCOA process
-        pcoa_process = protocol.add_process(PCoATrainer, 'pcoa_process',
+        pcoa_process = protocol.add_process(BetaDiversityPCoA, 'pcoa_process',
                                           config_params=ubiome_state.get_pcoa_config()["config"])
 
         # Get the selected diversity table as input
@@ -84,7 +84,7 @@ def dialog_pcoa_params(ubiome_state: State):
                              in_port=pcoa_process << 'distance_table')
 
         # Add outputs
-        protocol.add_output('pcoa_result_output', pcoa_process >> 'result', flag_resource=False)
+        protocol.add_output('pcoa_result_output', pcoa_process >> 'transformed_table', flag_resource=False)
 
         # Only add to queue if Run was clicked
         if run_clicked:
@@ -94,6 +94,31 @@ def dialog_pcoa_params(ubiome_state: State):
         st.rerun()
 
 
+@st.cache_data(show_spinner=False)
+def load_pcoa_tables(distance_table_id: str, nb_components: int,
+                     _protocol_proxy: ProtocolProxy) -> tuple[DataFrame | None, DataFrame | None]:
+    """
+    Load the transformed and variance tables of a PCoA scenario.
+
+    The result only depends on the distance table and the number of axes, so it is memoised on
+    (distance table id, nb_components) and reopening a PCoA scenario does not reload the tables.
+    """
+    process = _protocol_proxy.get_process('pcoa_process')
+    if State.has_output(process, 'transformed_table'):
+        transformed_table = process.get_output('transformed_table')
+        variance_table = process.get_output('variance_table')
+    else:
+        # scenarios created with the gws_gaia PCoATrainer expose a single 'result' output
+        pcoa_result = process.get_output('result')
+        if not pcoa_result:
+            return None, None
+        transformed_table = pcoa_result.get_transformed_table()
+        variance_table = pcoa_result.get_variance_table()
+
+    return (transformed_table.get_data() if transformed_table else None,
+            variance_table.get_data() if variance_table else None)
+
+
 def render_pcoa_step(selected_scenario: Scenario, ubiome_state: State) -> None:
     translate_service = ubiome_state.get_translate_service()
 
@@ -126,8 +151,7 @@ def render_pcoa_step(selected_scenario: Scenario, ubiome_state: State) -> None:
         if selected_scenario.status == ScenarioStatus.DRAFT and not ubiome_state.get_is_standalone():
             display_saved_scenario_actions(selected_scenario, ubiome_state)
 
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-        protocol_proxy = scenario_proxy.get_protocol()
+        protocol_proxy = ubiome_state.get_scenario_protocol(selected_scenario)
         process = protocol_proxy.get_process('pcoa_process')
         st.write(f"Diversity Table: {process.get_input('distance_table').name}")
 
@@ -135,24 +159,18 @@ def render_pcoa_step(selected_scenario: Scenario, ubiome_state: State) -> None:
         if selected_scenario.status != ScenarioStatus.SUCCESS:
             return
 
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-        protocol_proxy = scenario_proxy.get_protocol()
-
         # Get PCOA results
-        pcoa_result = protocol_proxy.get_process('pcoa_process').get_output('result')
+        config_params = ubiome_state.get_process_config(selected_scenario, 'pcoa_process')
+        data, variance_data = load_pcoa_tables(
+            process.get_input('distance_table').get_model_id(), config_params.get('nb_components', 2),
+            protocol_proxy)
 
-        if pcoa_result:
+        if data is not None:
             tab_plot, tab_table = st.tabs([translate_service.translate("2d_score_plot"), translate_service.translate("tables")])
-            transformed_table = pcoa_result.get_transformed_table()
-            variance_table = pcoa_result.get_variance_table()
 
             with tab_plot:
                 # Manual plot creation
-                if transformed_table and variance_table:
-
-                    data = transformed_table.get_data()
-                    variance_data = variance_table.get_data()
-
+                if variance_data is not None and 'PC2' in data.columns:
                     # Add sample names from index to the data for plotting
                     data_with_samples = data.copy()
                     data_with_samples['Sample'] = data.index
@@ -193,10 +211,9 @@ def render_pcoa_step(selected_scenario: Scenario, ubiome_state: State) -> None:
                     st.plotly_chart(fig)
             with tab_table:
                 # Display the transformed data table
-                if transformed_table:
-                    st.dataframe(transformed_table.get_data())
+                st.dataframe(data)
 
                 # Also show variance table
                 st.markdown(f"##### {translate_service.translate('variance_explained')}")
-                if variance_table:
-                    st.dataframe(variance_table.get_data())
+                if variance_data is not None:
+                    st.dataframe(variance_data)
@@ -5,7 +5,6 @@ from gws_core import (
     ProtocolProxy,
     ResourceSet,
     Scenario,
-    ScenarioProxy,
     ScenarioStatus,
 )
 from gws_ubiome import Qiime2QualityCheck
@@ -13,6 +12,7 @@ from ..functions_steps import (
     create_base_scenario_with_tags,
     search_updated_metadata_table,
 )
+from ..resource_viewer import get_dashboard_bundle_id, render_resource_set
 from ..state import State
 
 
@@ -65,23 +65,12 @@ def render_qc_step(selected_scenario: Scenario, ubiome_state: State) -> None:
         if selected_scenario.status != ScenarioStatus.SUCCESS:
             return
 
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-        protocol_proxy: ProtocolProxy = scenario_proxy.get_protocol()
+        protocol_proxy: ProtocolProxy = ubiome_state.get_scenario_protocol(selected_scenario)
 
         # Retrieve the resource set and save in a variable each visualization
         # Retrieve outputs
         resource_set_output : ResourceSet = protocol_proxy.get_process('qc_process').get_output('quality_table')
-        resource_set_result_dict = resource_set_output.get_resources()
-
-        # Create tabs for each result
-
-        tab_names = list(resource_set_result_dict.keys())
-        tabs = st.tabs(tab_names)
-
-        for tab, result_name in zip(tabs, tab_names):
-            with tab:
-                selected_resource = resource_set_result_dict.get(result_name)
-                if selected_resource.get_typing_name() == "RESOURCE.gws_core.Table":
-                    st.dataframe(selected_resource.get_data())
-                elif selected_resource.get_typing_name() == "RESOURCE.gws_core.PlotlyResource":
-                    st.plotly_chart(selected_resource.get_figure())
+        # Only the selected result is loaded and displayed
+        render_resource_set(resource_set_output, "qc_result_select", ubiome_state,
+                            bundle_id=get_dashboard_bundle_id(selected_scenario, 'qc_process', ubiome_state),
+                            group="quality_table")
@@ -1,5 +1,5 @@
 import streamlit as st
-from gws_core import InputTask, Scenario, ScenarioProxy, ScenarioStatus, Tag
+from gws_core import InputTask, Scenario, ScenarioStatus, Tag
 from gws_streamlit_main import StreamlitTaskRunner
 from gws_ubiome import Qiime2RarefactionAnalysis
 from ..functions_steps import (
@@ -8,6 +8,7 @@ from ..functions_steps import (
     display_scenario_parameters,
     render_scenario_table,
 )
+from ..resource_viewer import get_dashboard_bundle_id, render_resource_set
 from ..state import State
 
 
@@ -46,8 +47,7 @@ def dialog_rarefaction_params(ubiome_state: State):
                                                  config_params=ubiome_state.get_rarefaction_config()["config"])
 
         # Retrieve feature inference output and connect
-        scenario_proxy_fi = ScenarioProxy.from_existing_scenario(feature_scenario_id)
-        protocol_proxy_fi = scenario_proxy_fi.get_protocol()
+        protocol_proxy_fi = ubiome_state.get_scenario_protocol(feature_scenario_id)
         feature_output = protocol_proxy_fi.get_process('feature_process').get_output('result_folder')
 
         feature_resource = protocol.add_process(InputTask, 'feature_resource', {InputTask.config_name: feature_output.get_model_id()})
@@ -56,6 +56,7 @@ def dialog_rarefaction_params(ubiome_state: State):
         # Add outputs
         protocol.add_output('rarefaction_table_output', rarefaction_process >> 'rarefaction_table', flag_resource=False)
         protocol.add_output('rarefaction_folder_output', rarefaction_process >> 'result_folder', flag_resource=False)
+        protocol.add_output('rarefaction_plateau_output', rarefaction_process >> 'plateau_table', flag_resource=False)
 
         # Only add to queue if Run was clicked
         if run_clicked:
@@ -99,22 +100,13 @@ def render_rarefaction_step(selected_scenario: Scenario, ubiome_state: State) ->
             return
 
         # Display results if scenario is successful
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-        protocol_proxy = scenario_proxy.get_protocol()
+        protocol_proxy = ubiome_state.get_scenario_protocol(selected_scenario)
         # Display rarefaction table
         rarefaction_resource_set = protocol_proxy.get_process('rarefaction_process').get_output('rarefaction_table')
         if not rarefaction_resource_set:
             return
 
-        resource_set_result_dict = rarefaction_resource_set.get_resources()
-        # Create tabs for each result
-        tab_names = list(resource_set_result_dict.keys())
-        tabs = st.tabs(tab_names)
-
-        for tab, result_name in zip(tabs, tab_names):
-            with tab:
-                selected_resource = resource_set_result_dict.get(result_name)
-                if selected_resource.get_typing_name() == "RESOURCE.gws_core.Table":
-                    st.dataframe(selected_resource.get_data())
-                elif selected_resource.get_typing_name() == "RESOURCE.gws_core.PlotlyResource":
-                    st.plotly_chart(selected_resource.get_figure())
+        # Only the selected result is loaded and displayed
+        render_resource_set(rarefaction_resource_set, "rarefaction_result_select", ubiome_state,
+                            bundle_id=get_dashboard_bundle_id(selected_scenario, 'rarefaction_process', ubiome_state),
+                            group="rarefaction_table")
@@ -1,26 +1,127 @@
+import secrets
+from datetime import datetime
+
+import pandas as pd
 import streamlit as st
-from gws_core import InputTask, Scenario, ScenarioProxy, ScenarioStatus, Tag
+from gws_core import InputTask, Logger, ResourceModel, Scenario, ScenarioProxy, ScenarioStatus, Table, Tag
 from gws_streamlit_main import StreamlitTaskRunner
-from gws_ubiome import Qiime2TaxonomyDiversity
+from gws_ubiome import Qiime2TaxonomyDiversity, Qiime2TaxonomyDiversitySweep
 from ..functions_steps import (
     create_base_scenario_with_tags,
     display_saved_scenario_actions,
     display_scenario_parameters,
     render_scenario_table,
 )
+from ..resource_viewer import get_dashboard_bundle_id, render_resource_set
+from ..scenario_tag_index import ScenarioTagIndex
 from ..state import State
 
 
+def get_rarefaction_plateau_table(ubiome_state: State) -> pd.DataFrame | None:
+    """Return the plateau table of the latest successful rarefaction of the current feature inference."""
+    list_scenario_rarefaction = [scenario for scenario in ubiome_state.get_scenario_step_rarefaction()
+                                 if scenario.status == ScenarioStatus.SUCCESS]
+    if not list_scenario_rarefaction:
+        return None
+
+    latest_scenario = max(list_scenario_rarefaction, key=lambda x: x.created_at)
+    rarefaction_process = ubiome_state.get_scenario_protocol(latest_scenario).get_process('rarefaction_process')
+    if not ubiome_state.has_output(rarefaction_process, 'plateau_table'):
+        # rarefaction run before the plateau detection was added
+        return None
+    plateau_table: Table = rarefaction_process.get_output('plateau_table')
+    if not plateau_table:
+        return None
+    return plateau_table.get_data()
+
+
+# the estimate is calibrated on the recorded runs, it is refreshed as new runs are recorded
+@st.cache_data(show_spinner=False, ttl=600)
+def estimate_taxonomy_resources(feature_folder_id: str, config: dict) -> pd.DataFrame | None:
+    """
+    Preflight estimate of a taxonomy run of the feature inference folder, memoised on (folder id, config)
+    as it reads the files of the folder. None if the folder has no ASV or sample frequency file.
+    """
+    feature_folder = ResourceModel.get_by_id_and_check(feature_folder_id).get_resource()
+    try:
+        return Qiime2TaxonomyDiversity.estimate_resources(feature_folder.path, config)
+    except FileNotFoundError:
+        return None
+
+
+def render_resource_estimate(ubiome_state: State) -> None:
+    """Show the preflight peak memory and wall time estimate of the configured taxonomy run."""
+    translate_service = ubiome_state.get_translate_service()
+    taxonomy_config = ubiome_state.get_taxonomy_config()
+    if not taxonomy_config.get("is_valid"):
+        return
+    feature_folder_id = ubiome_state.get_process_output_id(
+        ubiome_state.get_current_feature_scenario_id_parent(), 'feature_process', 'result_folder')
+    if not feature_folder_id:
+        return
+    try:
+        estimate = estimate_taxonomy_resources(feature_folder_id, taxonomy_config["config"])
+    except Exception as exception:
+        # the estimate is informative, the dialog stays usable
+        Logger.error(f"Could not estimate the resources of the taxonomy run: {exception}")
+        return
+    if estimate is None:
+        return
+
+    total = estimate.loc["Total"]
+    st.info(translate_service.translate("taxonomy_resource_estimate").format(
+        memory=total["peak_memory_gb"], minutes=max(round(total["wall_time_seconds"] / 60), 1)))
+    with st.expander(translate_service.translate("taxonomy_resource_estimate_details")):
+        st.dataframe(estimate)
+
+
+def create_taxonomy_scenario(ubiome_state: State, title: str, config: dict) -> ScenarioProxy:
+    """Taxonomy scenario of the current feature inference, with the config of the taxonomy process."""
+    scenario = create_base_scenario_with_tags(ubiome_state, ubiome_state.TAG_TAXONOMY, title)
+    feature_scenario_id = ubiome_state.get_current_feature_scenario_id_parent()
+    scenario.add_tag(Tag(ubiome_state.TAG_FEATURE_INFERENCE_ID, feature_scenario_id, is_propagable=False, auto_parse=True))
+    scenario.add_tag(Tag(ubiome_state.TAG_TAXONOMY_ID, scenario.get_model_id(), is_propagable=False, auto_parse=True))
+    protocol = scenario.get_protocol()
+
+    # Add taxonomy process
+    taxonomy_process = protocol.add_process(Qiime2TaxonomyDiversity, 'taxonomy_process', config_params=config)
+
+    # Retrieve feature inference output and connect
+    protocol_proxy_fi = ubiome_state.get_scenario_protocol(feature_scenario_id)
+    feature_output = protocol_proxy_fi.get_process('feature_process').get_output('result_folder')
+
+    feature_resource = protocol.add_process(InputTask, 'feature_resource', {InputTask.config_name: feature_output.get_model_id()})
+    protocol.add_connector(out_port=feature_resource >> 'resource', in_port=taxonomy_process << 'rarefaction_analysis_result_folder')
+
+    # Add outputs
+    protocol.add_output('taxonomy_diversity_tables_output', taxonomy_process >> 'diversity_tables', flag_resource=False)
+    protocol.add_output('taxonomy_taxonomy_tables_output', taxonomy_process >> 'taxonomy_tables', flag_resource=False)
+    protocol.add_output('taxonomy_folder_output', taxonomy_process >> 'result_folder', flag_resource=False)
+    return scenario
+
+
 @st.dialog("Taxonomy parameters")
 def dialog_taxonomy_params(ubiome_state: State):
     translate_service = ubiome_state.get_translate_service()
     st.text_input(translate_service.translate("taxonomy_scenario_name"), placeholder=translate_service.translate("enter_taxonomy_name"), value=f"{ubiome_state.get_current_analysis_name()} - Taxonomy", key=ubiome_state.TAXONOMY_SCENARIO_NAME_INPUT_KEY)
+
+    default_config_values = Qiime2TaxonomyDiversity.config_specs.get_default_values()
+    plateau_table = get_rarefaction_plateau_table(ubiome_state)
+    if plateau_table is not None:
+        recommended_depth = int(plateau_table.loc[plateau_table["recommended"], "depth"].iloc[0])
+        default_config_values["rarefaction_plateau_value"] = recommended_depth
+        st.info(translate_service.translate("rarefaction_plateau_recommended").format(depth=recommended_depth))
+        with st.expander(translate_service.translate("rarefaction_plateau_trade_off")):
+            st.dataframe(plateau_table, hide_index=True)
+
     form_config = StreamlitTaskRunner(Qiime2TaxonomyDiversity)
     form_config.generate_config_form_without_run(
         session_state_key=ubiome_state.TAXONOMY_CONFIG_KEY,
-        default_config_values=Qiime2TaxonomyDiversity.config_specs.get_default_values(),
+        default_config_values=default_config_values,
         is_default_config_valid=Qiime2TaxonomyDiversity.config_specs.mandatory_values_are_set(
-            Qiime2TaxonomyDiversity.config_specs.get_default_values()))
+            default_config_values))
+
+    render_resource_estimate(ubiome_state)
 
     # Add both Save and Run buttons
     col1, col2 = st.columns(2)
@@ -36,28 +137,9 @@ def dialog_taxonomy_params(ubiome_state: State):
             st.warning(translate_service.translate("fill_mandatory_fields"))
             return
 
-        scenario = create_base_scenario_with_tags(ubiome_state, ubiome_state.TAG_TAXONOMY, ubiome_state.get_scenario_user_name(ubiome_state.TAXONOMY_SCENARIO_NAME_INPUT_KEY))
-        feature_scenario_id = ubiome_state.get_current_feature_scenario_id_parent()
-        scenario.add_tag(Tag(ubiome_state.TAG_FEATURE_INFERENCE_ID, feature_scenario_id, is_propagable=False, auto_parse=True))
-        scenario.add_tag(Tag(ubiome_state.TAG_TAXONOMY_ID, scenario.get_model_id(), is_propagable=False, auto_parse=True))
-        protocol = scenario.get_protocol()
-
-        # Add taxonomy process
-        taxonomy_process = protocol.add_process(Qiime2TaxonomyDiversity, 'taxonomy_process',
-                                              config_params=ubiome_state.get_taxonomy_config()["config"])
-
-        # Retrieve feature inference output and connect
-        scenario_proxy_fi = ScenarioProxy.from_existing_scenario(feature_scenario_id)
-        protocol_proxy_fi = scenario_proxy_fi.get_protocol()
-        feature_output = protocol_proxy_fi.get_process('feature_process').get_output('result_folder')
-
-        feature_resource = protocol.add_process(InputTask, 'feature_resource', {InputTask.config_name: feature_output.get_model_id()})
-        protocol.add_connector(out_port=feature_resource >> 'resource', in_port=taxonomy_process << 'rarefaction_analysis_result_folder')
-
-        # Add outputs
-        protocol.add_output('taxonomy_diversity_tables_output', taxonomy_process >> 'diversity_tables', flag_resource=False)
-        protocol.add_output('taxonomy_taxonomy_tables_output', taxonomy_process >> 'taxonomy_tables', flag_resource=False)
-        protocol.add_output('taxonomy_folder_output', taxonomy_process >> 'result_folder', flag_resource=False)
+        scenario = create_taxonomy_scenario(
+            ubiome_state, ubiome_state.get_scenario_user_name(ubiome_state.TAXONOMY_SCENARIO_NAME_INPUT_KEY),
+            ubiome_state.get_taxonomy_config()["config"])
 
         # Only add to queue if Run was clicked
         if run_clicked:
@@ -67,6 +149,86 @@ def dialog_taxonomy_params(ubiome_state: State):
 
         st.rerun()
 
+@st.dialog("Taxonomy parameter sweep", width="large")
+def dialog_taxonomy_sweep(ubiome_state: State):
+    """
+    Queue a taxonomy scenario for each combination of rarefaction depths and databases. The scenarios share
+    the phylogeny, the diversity of a depth and the classifications of a database (intermediate store and
+    classification cache), and are tagged with the id of the sweep to be compared side by side.
+    """
+    translate_service = ubiome_state.get_translate_service()
+    st.info(translate_service.translate("taxonomy_sweep_description"))
+
+    default_config_values = Qiime2TaxonomyDiversitySweep.config_specs.get_default_values()
+    plateau_table = get_rarefaction_plateau_table(ubiome_state)
+    if plateau_table is not None:
+        recommended_depth = int(plateau_table.loc[plateau_table["recommended"], "depth"].iloc[0])
+        default_config_values["rarefaction_plateau_values"] = str(recommended_depth)
+        st.info(translate_service.translate("rarefaction_plateau_recommended").format(depth=recommended_depth))
+        with st.expander(translate_service.translate("rarefaction_plateau_trade_off")):
+            st.dataframe(plateau_table, hide_index=True)
+
+    form_config = StreamlitTaskRunner(Qiime2TaxonomyDiversitySweep)
+    form_config.generate_config_form_without_run(
+        session_state_key=ubiome_state.TAXONOMY_SWEEP_CONFIG_KEY,
+        default_config_values=default_config_values,
+        is_default_config_valid=Qiime2TaxonomyDiversitySweep.config_specs.mandatory_values_are_set(
+            default_config_values))
+
+    if not st.button(translate_service.translate("taxonomy_sweep_run"), width="stretch",
+                     icon=":material/play_arrow:", key="button_taxonomy_sweep_run"):
+        return
+    sweep_config = ubiome_state.get_taxonomy_sweep_config()
+    if not sweep_config.get("is_valid"):
+        st.warning(translate_service.translate("fill_mandatory_fields"))
+        return
+    try:
+        combinations = Qiime2TaxonomyDiversitySweep.get_combinations(sweep_config["config"])
+    except Exception as exception:
+        st.warning(str(exception))
+        return
+
+    # the same rarefactions for all the scenarios, the diversity of a depth is computed once
+    random_seed = sweep_config["config"].get("random_seed")
+    if random_seed is None:
+        random_seed = secrets.randbits(31)
+    sweep_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+    analysis_name = ubiome_state.get_current_analysis_name()
+    scenario_ids = []
+    # by depth then by database, as the sweep task
+    for plateau_value, database in combinations:
+        config = Qiime2TaxonomyDiversitySweep.get_combination_params(
+            sweep_config["config"], plateau_value, database, random_seed)
+        scenario = create_taxonomy_scenario(
+            ubiome_state,
+            f"{analysis_name} - Taxonomy - {Qiime2TaxonomyDiversitySweep.get_combination_name(plateau_value, database)}",
+            config)
+        scenario.add_tag(Tag(ubiome_state.TAG_TAXONOMY_SWEEP_ID, sweep_id, is_propagable=False, auto_parse=True))
+        scenario.add_to_queue()
+        scenario_ids.append(scenario.get_model_id())
+
+    ubiome_state.reset_tree_analysis()
+    ubiome_state.set_tree_default_item(scenario_ids[0])
+    st.rerun()
+
+
+def filter_taxonomy_sweep(scenarios: list[Scenario], ubiome_state: State) -> list[Scenario]:
+    """Scenarios of the sweep selected by the user, all the scenarios when no sweep is selected."""
+    translate_service = ubiome_state.get_translate_service()
+    tag_index = ScenarioTagIndex.load(scenarios, ScenarioTagIndex.STEP_SESSION_KEY)
+    sweeps = tag_index.group_by_tag(ubiome_state.TAG_TAXONOMY_SWEEP_ID)
+    if not sweeps:
+        return scenarios
+    sweep_id = st.selectbox(
+        translate_service.translate("taxonomy_sweep_filter"),
+        options=[None] + sorted(sweeps, reverse=True),
+        format_func=lambda value: translate_service.translate("taxonomy_sweep_all") if value is None else
+        translate_service.translate("taxonomy_sweep_label").format(sweep=value, count=len(sweeps[value])),
+        key="taxonomy_sweep_filter",
+    )
+    return scenarios if sweep_id is None else sweeps[sweep_id]
+
+
 def render_taxonomy_step(selected_scenario: Scenario, ubiome_state: State) -> None:
     translate_service = ubiome_state.get_translate_service()
 
@@ -83,11 +245,13 @@ def render_taxonomy_step(selected_scenario: Scenario, ubiome_state: State) -> No
             # On click, open a dialog to allow the user to select params of taxonomy
             st.button(translate_service.translate("configure_new_taxonomy_scenario"), icon=":material/edit:", width="content",
                         on_click=lambda state=ubiome_state: dialog_taxonomy_params(state))
+            st.button(translate_service.translate("configure_taxonomy_sweep"), icon=":material/grid_view:", width="content",
+                        on_click=lambda state=ubiome_state: dialog_taxonomy_sweep(state))
 
         # Display table of existing Taxonomy scenarios
         st.markdown(f"### {translate_service.translate('list_scenarios')}")
 
-        list_scenario_taxonomy = ubiome_state.get_scenario_step_taxonomy()
+        list_scenario_taxonomy = filter_taxonomy_sweep(ubiome_state.get_scenario_step_taxonomy(), ubiome_state)
         render_scenario_table(list_scenario_taxonomy, 'taxonomy_process', 'taxonomy_grid', ubiome_state)
     else:
         # Display details about scenario taxonomy
@@ -101,8 +265,8 @@ def render_taxonomy_step(selected_scenario: Scenario, ubiome_state: State) -> No
             return
 
         # Display results if scenario is successful
-        scenario_proxy = ScenarioProxy.from_existing_scenario(selected_scenario.id)
-        protocol_proxy = scenario_proxy.get_protocol()
+        protocol_proxy = ubiome_state.get_scenario_protocol(selected_scenario)
+        bundle_id = get_dashboard_bundle_id(selected_scenario, 'taxonomy_process', ubiome_state)
 
         tab_diversity, tab_taxonomy = st.tabs([translate_service.translate("diversity_tables"), translate_service.translate("taxonomy_tables")])
 
@@ -110,24 +274,14 @@ def render_taxonomy_step(selected_scenario: Scenario, ubiome_state: State) -> No
             # Display diversity tables
             diversity_resource_set = protocol_proxy.get_process('taxonomy_process').get_output('diversity_tables')
             if diversity_resource_set:
-                resource_set_result_dict = diversity_resource_set.get_resources()
-                selected_result = st.selectbox(translate_service.translate("select_diversity_table"), options=resource_set_result_dict.keys(), key="diversity_select")
-                if selected_result:
-                    selected_resource = resource_set_result_dict.get(selected_result)
-                    if selected_resource.get_typing_name() == "RESOURCE.gws_core.Table":
-                        st.dataframe(selected_resource.get_data())
-                    elif selected_resource.get_typing_name() == "RESOURCE.gws_core.PlotlyResource":
-                        st.plotly_chart(selected_resource.get_figure())
+                render_resource_set(diversity_resource_set, "diversity_select", ubiome_state,
+                                    label=translate_service.translate("select_diversity_table"),
+                                    bundle_id=bundle_id, group="diversity_tables")
 
         with tab_taxonomy:
             # Display taxonomy tables
             taxonomy_resource_set = protocol_proxy.get_process('taxonomy_process').get_output('taxonomy_tables')
             if taxonomy_resource_set:
-                resource_set_result_dict = taxonomy_resource_set.get_resources()
-                selected_result = st.selectbox(translate_service.translate("select_result_display"), options=resource_set_result_dict.keys(), key="taxonomy_select")
-                if selected_result:
-                    selected_resource = resource_set_result_dict.get(selected_result)
-                    if selected_resource.get_typing_name() == "RESOURCE.gws_core.Table":
-                        st.dataframe(selected_resource.get_data())
-                    elif selected_resource.get_typing_name() == "RESOURCE.gws_core.PlotlyResource":
-                        st.plotly_chart(selected_resource.get_figure())
+                render_resource_set(taxonomy_resource_set, "taxonomy_select", ubiome_state,
+                                    label=translate_service.translate("select_result_display"),
+                                    bundle_id=bundle_id, group="taxonomy_tables")
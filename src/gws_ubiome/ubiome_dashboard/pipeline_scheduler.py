@@ -0,0 +1,274 @@
+from gws_core import (
+    InputTask,
+    Logger,
+    MessageDispatcher,
+    ProtocolProxy,
+    Resource,
+    ResourceSet,
+    Scenario,
+    ScenarioProxy,
+    ScenarioSearchBuilder,
+    ScenarioStatus,
+    ScenarioTransfertService,
+    SendScenarioToLab,
+    Tag,
+)
+from gws_core.tag.entity_tag_list import EntityTagList
+from gws_core.tag.tag_entity_type import TagEntityType
+from pandas import DataFrame
+
+from .ubiome_tags import UbiomeTags
+
+
+class PipelineScheduler:
+    """
+    Chain the scenarios of a pipeline recipe of the 16S rRNA-seq app.
+
+    Each step of the recipe is saved as a draft scenario tagged ``TAG_AUTO_RUN`` and with the ids of its
+    parent scenarios (the tags already used to build the analysis tree). The steps with children end with
+    a ``QueueNextPipelineSteps`` task: when the step succeeds, the task queues the drafts whose parents all
+    succeeded, after filling their input tasks with the parent outputs. The independent branches (e.g.
+    rarefaction and 16S) are queued together. A 16S step tagged with a lab large is sent to it.
+
+    The steps are queued by the scenarios of the pipeline, for the user running them, without the app.
+    A step that cannot be queued is reported as a warning by the task of its parent, which still succeeds
+    so that the other steps depending on it are queued, and is no longer scheduled: it can be run from
+    the app. A step with a failed or deleted parent is not scheduled either until the parent is run again.
+    """
+
+    AUTO_RUN_VALUE = "true"
+    QUEUE_PROCESS_NAME = "queue_next_steps_process"
+
+    # input tasks of a step filled with the output of a parent:
+    # (input task name, tag of the parent scenario id, parent process name, parent output name)
+    STEP_INPUTS = {
+        UbiomeTags.TAG_FEATURE_INFERENCE: [("qc_resource", UbiomeTags.TAG_QC_ID, "qc_process", "result_folder")],
+        UbiomeTags.TAG_RAREFACTION: [
+            ("feature_resource", UbiomeTags.TAG_FEATURE_INFERENCE_ID, "feature_process", "result_folder")
+        ],
+        UbiomeTags.TAG_16S: [
+            ("feature_resource", UbiomeTags.TAG_FEATURE_INFERENCE_ID, "feature_process", "result_folder")
+        ],
+        UbiomeTags.TAG_TAXONOMY: [
+            ("feature_resource", UbiomeTags.TAG_FEATURE_INFERENCE_ID, "feature_process", "result_folder")
+        ],
+        UbiomeTags.TAG_PCOA_DIVERSITY: [
+            ("diversity_table_resource", UbiomeTags.TAG_TAXONOMY_ID, "taxonomy_process", "diversity_tables")
+        ],
+        UbiomeTags.TAG_ANCOM: [
+            ("taxonomy_folder_resource", UbiomeTags.TAG_TAXONOMY_ID, "taxonomy_process", "result_folder")
+        ],
+        UbiomeTags.TAG_DB_ANNOTATOR: [
+            ("taxonomy_folder_resource", UbiomeTags.TAG_TAXONOMY_ID, "taxonomy_process", "result_folder")
+        ],
+    }
+    # parents without input: the taxonomy waits for the rarefaction to use its recommended depth
+    STEP_DEPENDENCIES = {
+        UbiomeTags.TAG_TAXONOMY: [UbiomeTags.TAG_RAREFACTION_ID],
+    }
+    # status of a parent that can still succeed without action of the user
+    WAITING_STATUSES = [
+        ScenarioStatus.DRAFT,
+        ScenarioStatus.IN_QUEUE,
+        ScenarioStatus.RUNNING,
+        ScenarioStatus.WAITING_FOR_CLI_PROCESS,
+    ]
+    # output of the steps with children, the QueueNextPipelineSteps task runs once it is generated
+    STEP_OUTPUTS = {
+        UbiomeTags.TAG_FEATURE_INFERENCE: ("feature_process", "result_folder"),
+        UbiomeTags.TAG_RAREFACTION: ("rarefaction_process", "plateau_table"),
+        UbiomeTags.TAG_TAXONOMY: ("taxonomy_process", "result_folder"),
+    }
+
+    @classmethod
+    def get_auto_run_tag(cls) -> Tag:
+        return Tag(UbiomeTags.TAG_AUTO_RUN, cls.AUTO_RUN_VALUE, is_propagable=False, auto_parse=True)
+
+    @classmethod
+    def is_scheduled(cls, scenario: Scenario, tags: EntityTagList) -> bool:
+        """Whether the scenario is a draft waiting for parents that can still succeed."""
+        if scenario.status != ScenarioStatus.DRAFT or not tags.get_tags_by_key(UbiomeTags.TAG_AUTO_RUN):
+            return False
+        parent_ids = list(cls.get_parent_ids(tags).values())
+        statuses = cls._fetch_statuses(parent_ids)
+        return not cls.is_blocked([statuses.get(parent_id) for parent_id in parent_ids])
+
+    @staticmethod
+    def is_ready(parent_statuses: list[ScenarioStatus | None]) -> bool:
+        """Whether all the parents succeeded, a deleted parent (no status) never does."""
+        return all(status == ScenarioStatus.SUCCESS for status in parent_statuses)
+
+    @classmethod
+    def is_blocked(cls, parent_statuses: list[ScenarioStatus | None]) -> bool:
+        """Whether a parent failed or was deleted, the step then waits until the parent is run again."""
+        return any(status != ScenarioStatus.SUCCESS and status not in cls.WAITING_STATUSES
+                   for status in parent_statuses)
+
+    @classmethod
+    def get_step(cls, tags: EntityTagList) -> str:
+        return tags.get_tags_by_key(UbiomeTags.TAG_UBIOME)[0].to_simple_tag().value
+
+    @classmethod
+    def get_parent_ids(cls, tags: EntityTagList) -> dict[str, str]:
+        """Ids of the parent scenarios of a scheduled step, by tag."""
+        step = cls.get_step(tags)
+        parent_tags = [parent_tag for _, parent_tag, _, _ in cls.STEP_INPUTS.get(step, [])]
+        parent_tags += cls.STEP_DEPENDENCIES.get(step, [])
+        parent_ids = {}
+        for parent_tag in parent_tags:
+            values = tags.get_tags_by_key(parent_tag)
+            if values:
+                parent_ids[parent_tag] = values[0].to_simple_tag().value
+        return parent_ids
+
+    @classmethod
+    def find_scheduled_children(cls, parent_id: str) -> list[tuple[Scenario, EntityTagList]]:
+        """Scheduled scenarios with the scenario as parent, with their tags."""
+        search_scenario_builder = (
+            ScenarioSearchBuilder().add_tag_filter(cls.get_auto_run_tag()).add_is_archived_filter(False)
+        )
+        children = []
+        for scenario in search_scenario_builder.search_all():
+            if scenario.status != ScenarioStatus.DRAFT:
+                continue
+            tags = EntityTagList.find_by_entity(TagEntityType.SCENARIO, scenario.id)
+            if parent_id in cls.get_parent_ids(tags).values():
+                children.append((scenario, tags))
+        return children
+
+    @classmethod
+    def submit_ready_children(cls, parent_id: str, message_dispatcher: MessageDispatcher) -> None:
+        """
+        Queue the scheduled children of a scenario that just succeeded, once all their parents succeeded.
+
+        A child that cannot be queued is reported as a warning and is no longer scheduled. The scenario
+        still succeeds, so the children also waiting for another parent are queued when that one succeeds.
+        """
+        for scenario, tags in cls.find_scheduled_children(parent_id):
+            try:
+                if cls.submit_if_ready(scenario, tags, message_dispatcher, succeeded_parent_id=parent_id):
+                    message_dispatcher.notify_info_message(f"Scenario '{scenario.title}' queued")
+                else:
+                    message_dispatcher.notify_info_message(
+                        f"Scenario '{scenario.title}' waits for its other parents to succeed")
+            except Exception as exception:
+                message_dispatcher.notify_warning_message(
+                    f"Could not queue the scenario '{scenario.title}', run it from the app: {exception}")
+
+    @classmethod
+    def submit_if_ready(cls, scenario: Scenario, tags: EntityTagList,
+                        message_dispatcher: MessageDispatcher | None = None,
+                        succeeded_parent_id: str | None = None) -> bool:
+        """
+        Queue the scheduled scenario if all its parents succeeded.
+
+        :param succeeded_parent_id: parent that succeeded, still running the task queuing its children
+        :raises Exception: if the scenario could not be queued, it is then no longer scheduled
+        :return: whether the scenario was queued
+        """
+        parent_ids = cls.get_parent_ids(tags)
+        statuses = cls._fetch_statuses(list(parent_ids.values()))
+        if succeeded_parent_id is not None:
+            statuses[succeeded_parent_id] = ScenarioStatus.SUCCESS
+        if not cls.is_ready([statuses.get(parent_id) for parent_id in parent_ids.values()]):
+            return False
+        try:
+            cls.submit_scenario(scenario, tags, parent_ids, message_dispatcher)
+        except Exception:
+            # the Run buttons of the app are shown again
+            cls.unschedule(scenario.id)
+            raise
+        return True
+
+    @classmethod
+    def submit_scenario(cls, scenario: Scenario, tags: EntityTagList, parent_ids: dict[str, str],
+                        message_dispatcher: MessageDispatcher | None = None) -> None:
+        """Fill the input tasks of the scenario with the outputs of its parents and queue it."""
+        scenario_proxy = ScenarioProxy.from_existing_scenario(scenario.id)
+        protocol = scenario_proxy.get_protocol()
+        step = cls.get_step(tags)
+
+        for input_task_name, parent_tag, process_name, output_name in cls.STEP_INPUTS.get(step, []):
+            parent_protocol = ScenarioProxy.from_existing_scenario(parent_ids[parent_tag]).get_protocol()
+            resource = parent_protocol.get_process(process_name).get_output(output_name)
+            if step == UbiomeTags.TAG_PCOA_DIVERSITY:
+                table_tags = tags.get_tags_by_key(UbiomeTags.TAG_PCOA_DIVERSITY_TABLE)
+                resource = cls._get_resource_by_tag_value(resource, table_tags[0].to_simple_tag().value)
+            protocol.get_process(input_task_name).set_config_params({InputTask.config_name: resource.get_model_id()})
+
+        if tags.get_tags_by_key(UbiomeTags.TAG_RECOMMENDED_DEPTH) and UbiomeTags.TAG_RAREFACTION_ID in parent_ids:
+            rarefaction_protocol = ScenarioProxy.from_existing_scenario(
+                parent_ids[UbiomeTags.TAG_RAREFACTION_ID]).get_protocol()
+            cls._set_recommended_depth(protocol, rarefaction_protocol, message_dispatcher)
+
+        lab_large_tags = tags.get_tags_by_key(UbiomeTags.TAG_LAB_LARGE)
+        if lab_large_tags:
+            # as the Run button of the app: the scenario is run by the lab large, the draft stays in this lab
+            ScenarioTransfertService.export_scenario_to_lab(
+                scenario_id=scenario.id,
+                values=SendScenarioToLab.build_config(
+                    lab_large_tags[0].to_simple_tag().value, "All", "Force new scenario", True),
+            )
+            cls.unschedule(scenario.id)
+        else:
+            scenario_proxy.add_to_queue()
+
+    @classmethod
+    def unschedule(cls, scenario_id: str) -> None:
+        EntityTagList.find_by_entity(TagEntityType.SCENARIO, scenario_id).delete_tag(cls.get_auto_run_tag())
+
+    @staticmethod
+    def get_recommended_depth(plateau_data: DataFrame | None) -> int | None:
+        """Depth recommended by a rarefaction plateau table, None if it recommends none."""
+        if plateau_data is None or "recommended" not in plateau_data.columns:
+            return None
+        recommended = plateau_data.loc[plateau_data["recommended"].astype(bool), "depth"]
+        return int(recommended.iloc[0]) if not recommended.empty else None
+
+    @classmethod
+    def get_taxonomy_depth(cls, plateau_data: DataFrame | None, configured_depth: int | None) -> int:
+        """
+        Rarefaction depth of a taxonomy step using the recommended depth: the recommended one, the
+        configured one when the rarefaction recommends none.
+
+        :raises Exception: if the rarefaction recommends no depth and none is configured
+        """
+        recommended_depth = cls.get_recommended_depth(plateau_data)
+        if recommended_depth is not None:
+            return recommended_depth
+        if configured_depth is None:
+            raise Exception("The rarefaction recommended no depth, set the rarefaction depth of the taxonomy step")
+        return configured_depth
+
+    @staticmethod
+    def _fetch_statuses(scenario_ids: list[str]) -> dict[str, ScenarioStatus]:
+        if not scenario_ids:
+            return {}
+        query = Scenario.select(Scenario.id, Scenario.status).where(Scenario.id.in_(scenario_ids))
+        return {scenario.id: scenario.status for scenario in query}
+
+    @staticmethod
+    def _get_resource_by_tag_value(resource_set: ResourceSet, tag_value: str) -> Resource:
+        """Resource of the set whose name, parsed as a tag value, is the value."""
+        for name, resource in resource_set.get_resources().items():
+            if Tag.parse_tag(name) == tag_value:
+                return resource
+        raise Exception(f"No resource '{tag_value}' in the resource set '{resource_set.name}'")
+
+    @classmethod
+    def _set_recommended_depth(cls, protocol: ProtocolProxy, rarefaction_protocol: ProtocolProxy,
+                               message_dispatcher: MessageDispatcher | None) -> None:
+        """Use the depth recommended by the rarefaction plateau as taxonomy rarefaction depth."""
+        plateau_table = rarefaction_protocol.get_process("rarefaction_process").get_output("plateau_table")
+        plateau_data = plateau_table.get_data() if plateau_table else None
+        taxonomy_process = protocol.get_process("taxonomy_process")
+        config = dict(taxonomy_process._process_model.config.to_simple_dto().values)
+        depth = cls.get_taxonomy_depth(plateau_data, config.get("rarefaction_plateau_value"))
+        if depth == config.get("rarefaction_plateau_value") and cls.get_recommended_depth(plateau_data) is None:
+            message = f"The rarefaction recommended no depth, the configured depth {depth} is used"
+            if message_dispatcher is not None:
+                message_dispatcher.notify_warning_message(message)
+            else:
+                Logger.warning(message)
+        config["rarefaction_plateau_value"] = depth
+        taxonomy_process.set_config_params(config)
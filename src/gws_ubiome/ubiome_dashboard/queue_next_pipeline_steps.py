@@ -0,0 +1,50 @@
+from gws_core import (
+    ConfigParams,
+    ConfigSpecs,
+    InputSpec,
+    InputSpecs,
+    OutputSpecs,
+    Resource,
+    StrParam,
+    Task,
+    TaskInputs,
+    TaskOutputs,
+    task_decorator,
+)
+
+from .pipeline_scheduler import PipelineScheduler
+
+
+@task_decorator(
+    "QueueNextPipelineSteps",
+    human_name="Queue the next pipeline steps",
+    short_description="Queue the scheduled steps of a 16S rRNA-seq pipeline recipe depending on this scenario",
+)
+class QueueNextPipelineSteps(Task):
+    """
+    Last task of a step of a pipeline recipe of the Constellab 16S rRNA-seq app.
+
+    The task runs once the output of the step is generated and queues the scheduled steps depending on
+    the scenario whose other parents also succeeded. A step that cannot be queued is reported as a warning,
+    without failing the task, and can then be run from the app.
+    """
+
+    input_specs = InputSpecs(
+        {
+            "step_output": InputSpec(
+                Resource, human_name="Step output", short_description="Output of the step of the scenario"
+            )
+        }
+    )
+    output_specs = OutputSpecs()
+    config_specs = ConfigSpecs(
+        {
+            "scenario_id": StrParam(
+                human_name="Scenario id", short_description="Id of the scenario of the step"
+            )
+        }
+    )
+
+    def run(self, params: ConfigParams, inputs: TaskInputs) -> TaskOutputs:
+        PipelineScheduler.submit_ready_children(params["scenario_id"], self.message_dispatcher)
+        return {}
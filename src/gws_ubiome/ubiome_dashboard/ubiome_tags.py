@@ -0,0 +1,46 @@
+class UbiomeTags:
+    """
+    Keys of the tags of the scenarios of the 16S rRNA-seq app, shared by the app and by the tasks
+    chaining the scenarios of a pipeline recipe.
+    """
+
+    TAG_BRICK = "brick"
+    TAG_UBIOME = "ubiome"
+    TAG_SEQUENCING_TYPE = "sequencing_type"
+    TAG_FASTQ = "fastq_name"
+    TAG_ANALYSIS_NAME = "analysis_name"
+
+    # step tags
+    TAG_METADATA = "metadata"
+    TAG_QC = "quality_control"
+    TAG_MULTIQC = "multiqc"
+    TAG_FEATURE_INFERENCE = "feature_inference"
+    TAG_RAREFACTION = "rarefaction"
+    TAG_TAXONOMY = "taxonomy"
+    TAG_PCOA_DIVERSITY = "pcoa_diversity"
+    TAG_ANCOM = "ancom"
+    TAG_DB_ANNOTATOR = "db_annotator"
+    TAG_16S = "16s"
+    TAG_16S_VISU = "16s_visualization"
+    TAG_RATIO = "ratio"
+
+    # Tags unique ids
+    TAG_UBIOME_PIPELINE_ID = "ubiome_pipeline_id"
+    TAG_FEATURE_INFERENCE_ID = "feature_inference_id"
+    TAG_RAREFACTION_ID = "rarefaction_id"
+    TAG_TAXONOMY_ID = "taxonomy_id"
+    TAG_DB_ANNOTATOR_ID = "db_annotator_id"
+    TAG_PCOA_ID = "pcoa_id"
+    TAG_16S_ID = "16s_id"
+    TAG_QC_ID = "quality_control_id"
+
+    # Scenarios of a pipeline recipe, queued when their parents succeed
+    TAG_AUTO_RUN = "ubiome_auto_run"
+    TAG_PCOA_DIVERSITY_TABLE = "pcoa_diversity_table"
+    # the taxonomy uses the depth recommended by its rarefaction parent
+    TAG_RECOMMENDED_DEPTH = "use_recommended_depth"
+    # id of the lab large the 16S step is sent to
+    TAG_LAB_LARGE = "lab_large_id"
+
+    # Taxonomy scenarios of a parameter sweep, compared side by side
+    TAG_TAXONOMY_SWEEP_ID = "taxonomy_sweep_id"
@@ -0,0 +1,44 @@
+import math
+
+import numpy as np
+from gws_core import BaseTestCase
+from gws_ubiome.diversity_engine.alpha_diversity import AlphaDiversityEngine
+from gws_ubiome.diversity_engine.count_matrix import CountMatrix
+from gws_ubiome.diversity_engine.phylogenetic_tree import PhylogeneticTree
+from scipy.sparse import csr_matrix
+
+
+class TestAlphaDiversity(BaseTestCase):
+    def test_alpha_diversity(self):
+        # S1: counts 1, 1, 2 -> N = 4, S = 3, F1 = 2, F2 = 1, p = 1/4, 1/4, 1/2
+        # S2: a single feature
+        count_matrix = CountMatrix(["S1", "S2"], ["a", "b", "c"], csr_matrix(np.array([[1, 1, 2], [0, 5, 0]])))
+        tree = PhylogeneticTree.from_newick("((a:1,b:2):0.5,c:3);")
+        alpha = AlphaDiversityEngine(count_matrix, tree).compute()
+
+        self.assertEqual(["S1", "S2"], alpha.index.tolist())
+        s1 = alpha.loc["S1"]
+        self.assertAlmostEqual(1.5, s1["shannon_entropy"])
+        self.assertAlmostEqual(1 - (1 / 16 + 1 / 16 + 1 / 4), s1["simpson"])
+        self.assertAlmostEqual(1.5 / math.log2(3), s1["pielou_evenness"])
+        self.assertAlmostEqual(3 + 2 * 1 / (2 * (1 + 1)), s1["chao1"])
+        self.assertEqual(3, s1["observed_features"])
+        self.assertAlmostEqual(1 - 2 / 4, s1["goods_coverage"])
+        # all the branches
+        self.assertAlmostEqual(1 + 2 + 0.5 + 3, s1["faith_pd"])
+
+        s2 = alpha.loc["S2"]
+        self.assertAlmostEqual(0, s2["shannon_entropy"])
+        self.assertAlmostEqual(0, s2["simpson"])
+        self.assertTrue(math.isnan(s2["pielou_evenness"]))
+        self.assertEqual(1, s2["chao1"])
+        self.assertEqual(1, s2["observed_features"])
+        self.assertEqual(1, s2["goods_coverage"])
+        # branch of b and the branch above it
+        self.assertAlmostEqual(2 + 0.5, s2["faith_pd"])
+
+    def test_alpha_diversity_without_tree(self):
+        count_matrix = CountMatrix(["S1"], ["a", "b"], csr_matrix(np.array([[3, 1]])))
+        alpha = AlphaDiversityEngine(count_matrix).compute()
+        self.assertNotIn("faith_pd", alpha.columns)
+        self.assertAlmostEqual(-(0.75 * math.log2(0.75) + 0.25 * math.log2(0.25)), alpha.loc["S1", "shannon_entropy"])
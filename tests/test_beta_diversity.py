@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+import numpy as np
+from unittest.mock import patch
+
+from gws_core import BaseTestCase
+from gws_ubiome.diversity_engine.beta_diversity import BetaDiversityEngine
+from gws_ubiome.diversity_engine.count_matrix import CountMatrix
+from gws_ubiome.diversity_engine.distance_matrix import DistanceMatrix
+from scipy.sparse import csr_matrix
+from scipy.spatial.distance import pdist
+
+
+class TestBetaDiversity(BaseTestCase):
+    def test_bray_curtis_and_jaccard(self):
+        generator = np.random.default_rng(0)
+        # sparse counts, with an empty sample
+        counts = generator.integers(0, 20, size=(7, 12)) * (generator.random((7, 12)) < 0.5)
+        counts[3] = 0
+        count_matrix = CountMatrix([f"S{i}" for i in range(7)], [f"F{i}" for i in range(12)], csr_matrix(counts))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for metric, expected in [
+                (BetaDiversityEngine.BRAY_CURTIS, pdist(counts, "braycurtis")),
+                (BetaDiversityEngine.JACCARD, pdist(counts > 0, "jaccard"))
+            ]:
+                # blocks of 3 samples over 2 threads, so that the block pairs are written by different threads
+                path = os.path.join(tmp_dir, f"{metric}.dist")
+                BetaDiversityEngine(count_matrix, metric, workers=2, block_size=3).compute(path)
+                distance_matrix = DistanceMatrix.open(path)
+
+                self.assertEqual(count_matrix.sample_ids, distance_matrix.ids)
+                np.testing.assert_allclose(expected, distance_matrix.condensed, atol=1e-6)
+                np.testing.assert_allclose(distance_matrix.to_square(), distance_matrix.get_rows(0, 7), atol=1e-6)
+
+    def test_count_matrix_from_tsv(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "feature-table.tsv")
+            with open(path, "w", encoding="utf-8") as tsv_file:
+                tsv_file.write("# Constructed from biom file\n#OTU ID\tS1\tS2\n")
+                tsv_file.write("F1\t1.0\t0.0\nF2\t0.0\t0.0\nF3\t2.0\t5.0\nF4\t0.0\t3.0\nF5\t7.0\t0.0\n")
+
+            # features parsed 2 at a time, over several chunks
+            with patch.object(CountMatrix, "CHUNK_ROWS", 2):
+                count_matrix = CountMatrix.from_tsv(path)
+
+        self.assertEqual(["S1", "S2"], count_matrix.sample_ids)
+        self.assertEqual(["F1", "F2", "F3", "F4", "F5"], count_matrix.feature_ids)
+        np.testing.assert_array_equal([[1, 0, 2, 0, 7], [0, 0, 5, 3, 0]], count_matrix.counts.toarray())
+        # only the non-zero counts are stored
+        self.assertEqual(5, count_matrix.counts.nnz)
+
+    def test_submatrix(self):
+        points = np.random.default_rng(0).random((6, 2))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "matrix.dist")
+            distance_matrix = DistanceMatrix.create(path, [f"S{i}" for i in range(6)])
+            distance_matrix.condensed[:] = pdist(points)
+            distance_matrix.flush()
+
+            distance_matrix = DistanceMatrix.open(path, ids=[f"S{i}" for i in range(6)])
+            self.assertEqual((6, 6), distance_matrix.shape)
+            indices = [4, 0, 2]
+            np.testing.assert_allclose(distance_matrix.to_square()[np.ix_(indices, indices)],
+                                       distance_matrix.get_submatrix(indices))
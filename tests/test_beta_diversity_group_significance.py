@@ -0,0 +1,62 @@
+import os
+import tempfile
+
+import numpy
+import pandas
+from gws_core import BaseTestCase, Table, TaskRunner
+from gws_ubiome import BetaDiversityGroupSignificance, DistanceMatrixFile
+from gws_ubiome.diversity_engine.distance_matrix import DistanceMatrix
+from scipy.spatial.distance import pdist, squareform
+
+
+class TestBetaDiversityGroupSignificance(BaseTestCase):
+    def test_group_significance(self):
+        # 2 well separated groups of 10 samples
+        generator = numpy.random.default_rng(0)
+        points = generator.normal(size=(20, 3))
+        points[:10] += 5
+        sample_ids = [f"sample_{i}" for i in range(20)]
+        distances = pandas.DataFrame(squareform(pdist(points)), index=sample_ids, columns=sample_ids)
+        table = Table(distances)
+        table.set_all_row_tags([{"site": "A" if i < 10 else "B"} for i in range(20)])
+
+        tester = TaskRunner(
+            params={"metadata_column": "site", "permutations": 199, "threads": 2, "random_seed": 1},
+            inputs={"distance_table": table},
+            task_type=BetaDiversityGroupSignificance,
+        )
+        outputs = tester.run()
+        results = outputs["result_table"].get_data().set_index("method name")
+
+        self.assertEqual(["PERMANOVA", "PERMDISP", "ANOSIM"], results.index.tolist())
+        self.assertEqual(0.005, results.loc["PERMANOVA", "p-value"])
+        self.assertAlmostEqual(1.0, results.loc["ANOSIM", "test statistic"], places=1)
+        self.assertTrue((results["sample size"] == 20).all())
+
+    def test_group_significance_distance_matrix_file(self):
+        generator = numpy.random.default_rng(0)
+        points = generator.normal(size=(21, 3))
+        points[:10] += 5
+        sample_ids = [f"sample_{i}" for i in range(21)]
+        # the last sample has no group and is ignored
+        row_tags = [{"site": "A" if i < 10 else "B"} for i in range(20)] + [{}]
+        table = Table(pandas.DataFrame(squareform(pdist(points[:20])), index=sample_ids[:20], columns=sample_ids[:20]))
+        table.set_all_row_tags(row_tags[:20])
+        params = {"metadata_column": "site", "permutations": 99, "threads": 1, "random_seed": 1}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            distance_matrix = DistanceMatrix.create(os.path.join(tmp_dir, "matrix.dist"), sample_ids)
+            distance_matrix.condensed[:] = pdist(points)
+            distance_matrix.flush()
+            distance_matrix_file = DistanceMatrixFile.move_from(
+                distance_matrix, os.path.join(tmp_dir, "moved"), row_tags, "matrix")
+
+            results = TaskRunner(params=params, inputs={"distance_table": distance_matrix_file},
+                                 task_type=BetaDiversityGroupSignificance).run()["result_table"].get_data()
+        table_results = TaskRunner(params=params, inputs={"distance_table": table},
+                                   task_type=BetaDiversityGroupSignificance).run()["result_table"].get_data()
+
+        # same statistics as the table of the samples with a group, the distances are stored as float32
+        self.assertTrue((results["sample size"] == 20).all())
+        numpy.testing.assert_allclose(table_results["test statistic"], results["test statistic"], rtol=1e-4)
+        numpy.testing.assert_array_equal(table_results["p-value"], results["p-value"])
@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+import numpy
+import pandas
+from gws_core import BaseTestCase, Table, TaskRunner
+from gws_ubiome import BetaDiversityPCoA, DistanceMatrixFile
+from gws_ubiome.diversity_engine.distance_matrix import DistanceMatrix
+from scipy.spatial.distance import pdist, squareform
+
+
+class TestBetaDiversityPCoA(BaseTestCase):
+    def test_pcoa(self):
+        # points spread along 2 axes in a 4 dimensions space
+        generator = numpy.random.default_rng(0)
+        points = generator.normal(size=(50, 4)) * [10, 5, 0.1, 0.1]
+        sample_ids = [f"sample_{i}" for i in range(50)]
+        distances = pandas.DataFrame(squareform(pdist(points)), index=sample_ids, columns=sample_ids)
+
+        tester = TaskRunner(
+            params={"nb_components": 3},
+            inputs={"distance_table": Table(distances)},
+            task_type=BetaDiversityPCoA,
+        )
+        outputs = tester.run()
+        transformed = outputs["transformed_table"].get_data()
+        variance = outputs["variance_table"].get_data()
+
+        self.assertEqual((50, 3), transformed.shape)
+        self.assertEqual(["PC1", "PC2", "PC3"], variance.index.tolist())
+        # the 2 first axes explain almost all the variance
+        self.assertGreater(variance.loc["PC1", "ExplainedVariance"] + variance.loc["PC2", "ExplainedVariance"], 0.99)
+
+        # the distances are preserved by the coordinates
+        numpy.testing.assert_allclose(squareform(pdist(transformed.to_numpy())), distances.to_numpy(), atol=0.5)
+
+    def test_pcoa_distance_matrix_file(self):
+        points = numpy.random.default_rng(0).normal(size=(30, 3)) * [10, 5, 0.1]
+        sample_ids = [f"sample_{i}" for i in range(30)]
+        distances = pandas.DataFrame(squareform(pdist(points)), index=sample_ids, columns=sample_ids)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            distance_matrix = DistanceMatrix.create(os.path.join(tmp_dir, "matrix.dist"), sample_ids)
+            distance_matrix.condensed[:] = pdist(points)
+            distance_matrix.flush()
+            distance_matrix_file = DistanceMatrixFile.move_from(
+                distance_matrix, os.path.join(tmp_dir, "moved"), [{"site": str(i % 2)} for i in range(30)], "matrix")
+
+            # the memory-mapped matrix gives the coordinates of the square table
+            outputs = TaskRunner(params={"nb_components": 2}, inputs={"distance_table": distance_matrix_file},
+                                 task_type=BetaDiversityPCoA).run()
+            table_outputs = TaskRunner(params={"nb_components": 2}, inputs={"distance_table": Table(distances)},
+                                       task_type=BetaDiversityPCoA).run()
+
+        transformed = outputs["transformed_table"]
+        numpy.testing.assert_allclose(table_outputs["transformed_table"].get_data().to_numpy(),
+                                      transformed.get_data().to_numpy(), atol=1e-4)
+        self.assertEqual(sample_ids, transformed.get_data().index.tolist())
+        self.assertEqual("1", transformed.get_row_tags()[1]["site"])
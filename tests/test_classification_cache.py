@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+from gws_core import BaseTestCase
+from gws_ubiome.taxonomy_diversity.classification_cache import ClassificationCache, write_fasta
+
+
+class TestClassificationCache(BaseTestCase):
+    DATABASE = "Silva-v13.8"
+    PARAMS = "classify-sklearn;confidence=0.7;read-orientation=auto"
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ClassificationCache(os.path.join(self.tmp_dir.name, ClassificationCache.FILE_NAME))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_hits_and_misses(self):
+        first, second = ClassificationCache.hash_sequence("ACGT"), ClassificationCache.hash_sequence("GGCC")
+        self.cache.set_classifications({first: ("k__Bacteria; p__Firmicutes", 0.9)}, self.DATABASE, self.PARAMS)
+
+        # the same sequence, whatever its case, is a hit
+        self.assertEqual(first, ClassificationCache.hash_sequence("acgt\n"))
+        self.assertEqual({first: ("k__Bacteria; p__Firmicutes", 0.9)},
+                         self.cache.get_classifications([first, second], self.DATABASE, self.PARAMS))
+
+        # another database version or other classifier parameters are misses
+        self.assertEqual({}, self.cache.get_classifications([first], "Silva-v13.9", self.PARAMS))
+        self.assertEqual({}, self.cache.get_classifications([first], self.DATABASE, "classify-sklearn;confidence=0.9"))
+
+        # the cache is shared by the runs
+        other_cache = ClassificationCache(os.path.join(self.tmp_dir.name, ClassificationCache.FILE_NAME))
+        self.assertIn(first, other_cache.get_classifications([first], self.DATABASE, self.PARAMS))
+
+    def test_exact_matches(self):
+        fasta_path = os.path.join(self.tmp_dir.name, "reference-seqs.fasta")
+        taxonomy_path = os.path.join(self.tmp_dir.name, "reference-taxonomy.tsv")
+        write_fasta(fasta_path, {"ref1": "AAAA", "ref2": "AAAA", "ref3": "CCCC", "ref4": "GGGG"})
+        with open(taxonomy_path, "w", encoding="utf-8") as taxonomy_file:
+            # ref4 has no taxonomy, it is ignored
+            taxonomy_file.write("ref1\tk__Bacteria; g__Bacillus; s__subtilis\n"
+                                "ref2\tk__Bacteria; g__Bacillus; s__cereus\n"
+                                "ref3\tk__Bacteria; g__Listeria\n")
+        self.assertFalse(self.cache.has_reference(self.DATABASE))
+        self.cache.import_reference(self.DATABASE, fasta_path, taxonomy_path)
+        self.assertTrue(self.cache.has_reference(self.DATABASE))
+
+        hashes = [ClassificationCache.hash_sequence(sequence) for sequence in ["AAAA", "CCCC", "GGGG", "TTTT"]]
+        exact_matches = self.cache.get_exact_matches(hashes, self.DATABASE)
+        # identical references get their common ranks
+        self.assertEqual(("k__Bacteria; g__Bacillus", ClassificationCache.EXACT_MATCH_CONFIDENCE),
+                         exact_matches[hashes[0]])
+        self.assertEqual("k__Bacteria; g__Listeria", exact_matches[hashes[1]][0])
+        self.assertEqual(2, len(exact_matches))
+
+        # the references of a database do not match for another one
+        self.assertEqual({}, self.cache.get_exact_matches(hashes, "GreenGenes-v13.8"))
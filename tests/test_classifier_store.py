@@ -0,0 +1,80 @@
+import hashlib
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+
+from gws_core import BaseTestCase
+from gws_ubiome.taxonomy_diversity.classifier_store import ClassifierStore
+
+
+def write_classifier(path: str, corrupt: bool = False) -> None:
+    """Minimal TaxonomicClassifier artifact, with the checksums of its files."""
+    pipeline = io.BytesIO()
+    with tarfile.open(fileobj=pipeline, mode="w") as tar:
+        content = b"pipeline"
+        info = tarfile.TarInfo("sklearn_pipeline.pkl")
+        info.size = len(content)
+        tar.addfile(info, io.BytesIO(content))
+    files = {"metadata.yaml": b"uuid: 1\ntype: TaxonomicClassifier\nformat: TaxonomicClassiferTemporaryPickleDirFmt\n",
+             "data/" + ClassifierStore.PIPELINE_ARCHIVE_NAME: pipeline.getvalue()}
+    checksums = "".join(f"{hashlib.md5(content).hexdigest()}  {name}\n" for name, content in files.items())
+    if corrupt:
+        files["metadata.yaml"] += b"# changed"
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(f"artifact/{name}", content)
+        archive.writestr("artifact/checksums.md5", checksums)
+
+
+class TestClassifierStore(BaseTestCase):
+    def setUp(self):
+        self.root_dir = tempfile.TemporaryDirectory()
+        self.download_dir = tempfile.TemporaryDirectory()
+        self.store = ClassifierStore(self.root_dir.name)
+
+    def tearDown(self):
+        self.root_dir.cleanup()
+        self.download_dir.cleanup()
+
+    def download(self, corrupt: bool = False):
+        def download_file() -> str:
+            path = os.path.join(self.download_dir.name, "classifier.qza")
+            write_classifier(path, corrupt)
+            return path
+        return download_file
+
+    def test_download(self):
+        path = self.store.get_classifier("db", "classifier.qza", self.download())
+        self.assertEqual(os.path.join(self.root_dir.name, "db", "classifier.qza"), path)
+        self.assertTrue(os.path.isfile(os.path.join(self.store.get_pipeline_dir("db"), "sklearn_pipeline.pkl")))
+        # the downloaded file is moved into the store
+        self.assertFalse(os.path.exists(os.path.join(self.download_dir.name, "classifier.qza")))
+
+        # the recorded classifier is reused
+        self.assertEqual(path, self.store.get_classifier("db", "classifier.qza", self.fail_download))
+
+        # a corrupted download is rejected
+        with self.assertRaises(Exception):
+            self.store.get_classifier("other_db", "classifier.qza", self.download(corrupt=True))
+        self.assertFalse(os.path.exists(os.path.join(self.root_dir.name, "other_db", "classifier.qza")))
+
+    def test_mirror_checksum(self):
+        with tempfile.TemporaryDirectory() as mirror_dir:
+            mirror_path = os.path.join(mirror_dir, "classifier.qza")
+            write_classifier(mirror_path)
+            with open(mirror_path + ClassifierStore.CHECKSUM_SUFFIX, "w", encoding="utf-8") as checksum_file:
+                checksum_file.write("0" * 64)
+            self.store.register_mirror(mirror_dir)
+            with self.assertRaises(Exception):
+                self.store.get_classifier("db", "classifier.qza", self.fail_download)
+
+            with open(mirror_path + ClassifierStore.CHECKSUM_SUFFIX, "w", encoding="utf-8") as checksum_file:
+                checksum_file.write(ClassifierStore.compute_checksum(mirror_path) + "  classifier.qza\n")
+            path = self.store.get_classifier("db", "classifier.qza", self.fail_download)
+            self.assertEqual(ClassifierStore.compute_checksum(mirror_path), ClassifierStore.compute_checksum(path))
+
+    @staticmethod
+    def fail_download() -> str:
+        raise Exception("Unexpected download")
@@ -0,0 +1,83 @@
+import os
+import tempfile
+
+import numpy as np
+from gws_core import BaseTestCase
+from gws_ubiome.beta_diversity_statistics.distance_matrix_file import DistanceMatrixFile
+from gws_ubiome.dashboard_bundle.dashboard_bundle import DashboardBundle, DashboardBundleBuilder
+from gws_ubiome.diversity_engine.distance_matrix import DistanceMatrix
+from pandas import DataFrame
+from scipy.spatial.distance import pdist, squareform
+
+
+class TestDashboardBundle(BaseTestCase):
+    def test_reduce_top_rows(self):
+        data = DataFrame({"taxon": ["a", "b", "c", "d"], "s1": [1, 10, 5, 0], "s2": [1, 10, 0, 7]},
+                         index=["r1", "r2", "r3", "r4"])
+        reduced = DashboardBundleBuilder.reduce(data, max_rows=2, max_columns=10, sample=False)
+        # the rows with the largest total, in their original order
+        self.assertEqual(["r2", "r4"], reduced.index.tolist())
+        self.assertEqual(["taxon", "s1", "s2"], reduced.columns.tolist())
+
+        # the text columns are kept first, then the columns with the largest total
+        reduced = DashboardBundleBuilder.reduce(data, max_rows=10, max_columns=2, sample=False)
+        self.assertEqual(["taxon", "s2"], reduced.columns.tolist())
+
+    def test_reduce_spaced_points(self):
+        data = DataFrame({"depth": np.arange(101), "value": np.arange(101) * 2.0})
+        reduced = DashboardBundleBuilder.reduce(data, max_rows=11, max_columns=10, sample=True)
+        # evenly spaced rows, including the first and the last ones
+        self.assertEqual(list(range(0, 101, 10)), reduced["depth"].tolist())
+        # a table within the limits is unchanged
+        self.assertIs(data, DashboardBundleBuilder.reduce(data, max_rows=200, max_columns=10, sample=True))
+
+    def test_save_and_get_table(self):
+        builder = DashboardBundleBuilder()
+        data = DataFrame({"z_count": [3, 1], "a_recommended": [True, False], "label": ["x", "y"]},
+                         index=["row1", "row2"])
+        builder.add_table("tables", "Plateau", data)
+        builder.add_table("curves", "Curve", DataFrame({"value": np.arange(500.0)}), sample=True)
+        builder.add_stats({"sample_count": 2})
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "dashboard_bundle.npz")
+            builder.save(path)
+            bundle = DashboardBundle(path)
+
+            self.assertEqual({"sample_count": 2}, bundle.get_stats())
+            self.assertEqual(["Plateau"], bundle.get_table_names("tables"))
+            table = bundle.get_table("tables", "Plateau")
+            # the column order is kept and the booleans and text are stored as strings
+            self.assertEqual(["z_count", "a_recommended", "label"], table.columns.tolist())
+            self.assertEqual(["row1", "row2"], table.index.tolist())
+            self.assertEqual([3, 1], table["z_count"].tolist())
+            self.assertEqual(["True", "False"], table["a_recommended"].tolist())
+            self.assertEqual(["x", "y"], table["label"].tolist())
+            self.assertFalse(bundle.get_table_info("tables", "Plateau")["reduced"])
+
+            info = bundle.get_table_info("curves", "Curve")
+            self.assertTrue(info["reduced"])
+            self.assertEqual(500, info["rows"])
+            self.assertEqual(DashboardBundleBuilder.MAX_ROWS, bundle.get_table("curves", "Curve").shape[0])
+            self.assertIsNone(bundle.get_table("tables", "Missing"))
+
+    def test_add_distance_matrix(self):
+        points = np.random.default_rng(0).random((250, 2))
+        sample_ids = [f"S{i}" for i in range(250)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            distance_matrix = DistanceMatrix.create(os.path.join(tmp_dir, "matrix.dist"), sample_ids)
+            distance_matrix.condensed[:] = pdist(points)
+            distance_matrix.flush()
+            distance_matrix_file = DistanceMatrixFile.move_from(distance_matrix, os.path.join(tmp_dir, "moved"),
+                                                                [{} for _ in sample_ids], "Beta Diversity - Test")
+            builder = DashboardBundleBuilder()
+            builder.add_resource("diversity_tables", distance_matrix_file)
+            builder.save(os.path.join(tmp_dir, "dashboard_bundle.npz"))
+            bundle = DashboardBundle(os.path.join(tmp_dir, "dashboard_bundle.npz"))
+
+            # the distances between the first samples, with the shape of the full matrix
+            info = bundle.get_table_info("diversity_tables", "Beta Diversity - Test")
+            self.assertEqual((250, 250, True), (info["rows"], info["columns"], info["reduced"]))
+            preview = bundle.get_table("diversity_tables", "Beta Diversity - Test")
+            self.assertEqual(sample_ids[:200], preview.index.tolist())
+            np.testing.assert_allclose(squareform(pdist(points))[:200, :200], preview.to_numpy(), atol=1e-6)
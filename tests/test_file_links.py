@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+from gws_core import BaseTestCase
+from gws_ubiome.base_env.file_links import (
+    UPSTREAM_FILES_NAME,
+    clone_or_copy,
+    get_upstream_files,
+    reference_upstream_file,
+    resolve_file,
+)
+
+
+class TestFileLinks(BaseTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.upstream_dir = os.path.join(self.tmp_dir.name, "quality_check")
+        self.result_dir = os.path.join(self.tmp_dir.name, "sample_freq_details")
+        os.makedirs(self.upstream_dir)
+        os.makedirs(self.result_dir)
+        self.source = os.path.join(self.upstream_dir, "demux.qza")
+        with open(self.source, "wb") as source_file:
+            source_file.write(b"reads")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_reference_upstream_file(self):
+        method = reference_upstream_file(self.source, self.result_dir)
+        path = resolve_file(self.result_dir, "demux.qza")
+        with open(path, "rb") as resolved_file:
+            self.assertEqual(b"reads", resolved_file.read())
+
+        if method == "reference":
+            # the file is not copied, the manifest references it
+            self.assertFalse(os.path.exists(os.path.join(self.result_dir, "demux.qza")))
+            self.assertEqual({"demux.qza": self.source}, get_upstream_files(self.result_dir))
+            self.assertEqual(self.source, path)
+        else:
+            self.assertEqual("reflink", method)
+            self.assertEqual({}, get_upstream_files(self.result_dir))
+
+        # a folder referencing a file of another one resolves it too, e.g. a taxonomy folder
+        other_dir = os.path.join(self.tmp_dir.name, "raw_files")
+        os.makedirs(other_dir)
+        reference_upstream_file(path, other_dir)
+        with open(resolve_file(other_dir, "demux.qza"), "rb") as resolved_file:
+            self.assertEqual(b"reads", resolved_file.read())
+
+    def test_missing_files(self):
+        with self.assertRaises(FileNotFoundError):
+            resolve_file(self.result_dir, "demux.qza")
+        with open(os.path.join(self.result_dir, UPSTREAM_FILES_NAME), "w", encoding="utf-8") as manifest_file:
+            manifest_file.write('{"demux.qza": "%s"}' % os.path.join(self.upstream_dir, "missing.qza"))
+        with self.assertRaises(FileNotFoundError):
+            resolve_file(self.result_dir, "demux.qza")
+
+    def test_clone_or_copy(self):
+        destination = os.path.join(self.result_dir, "demux.qza")
+        self.assertIn(clone_or_copy(self.source, destination), ["reflink", "copy"])
+        # the copy is independent of the source
+        with open(destination, "wb") as destination_file:
+            destination_file.write(b"changed")
+        with open(self.source, "rb") as source_file:
+            self.assertEqual(b"reads", source_file.read())
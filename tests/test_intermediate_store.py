@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+from gws_core import BaseTestCase
+from gws_ubiome.taxonomy_diversity.intermediate_store import IntermediateStore
+
+
+def write_entry(size: int):
+    def create(entry_dir: str) -> None:
+        with open(os.path.join(entry_dir, "result"), "wb") as result_file:
+            result_file.write(b"0" * size)
+    return create
+
+
+class TestIntermediateStore(BaseTestCase):
+    def test_reuse_and_eviction(self):
+        with tempfile.TemporaryDirectory() as root_dir:
+            # room for two entries of 1000 bytes, with their key files
+            store = IntermediateStore(root_dir, max_size=2500)
+            with store.open_entry(IntermediateStore.PHYLOGENY, {"entry": 1}, write_entry(1000)) as (_, created):
+                self.assertTrue(created)
+            with store.open_entry(IntermediateStore.DIVERSITY, {"entry": 2}, write_entry(1000)) as (_, created):
+                self.assertTrue(created)
+            first_key_path = os.path.join(store.get_entry_dir(IntermediateStore.PHYLOGENY, {"entry": 1}),
+                                          IntermediateStore.KEY_FILE_NAME)
+            os.utime(first_key_path, (0, 0))
+
+            # a hit marks the entry as used
+            with store.open_entry(IntermediateStore.PHYLOGENY, {"entry": 1}, write_entry(1000)) as (entry_dir, created):
+                self.assertFalse(created)
+                self.assertEqual(1000, os.path.getsize(os.path.join(entry_dir, "result")))
+            self.assertGreater(os.path.getmtime(first_key_path), 0)
+
+            # the least recently used entry is removed for the new one
+            with store.open_entry(IntermediateStore.PHYLOGENY, {"entry": 3}, write_entry(1000)):
+                pass
+            self.assertTrue(store.has_entry(IntermediateStore.PHYLOGENY, {"entry": 1}))
+            self.assertFalse(store.has_entry(IntermediateStore.DIVERSITY, {"entry": 2}))
+            self.assertTrue(store.has_entry(IntermediateStore.PHYLOGENY, {"entry": 3}))
+
+    def test_entry_in_use_is_kept(self):
+        with tempfile.TemporaryDirectory() as root_dir:
+            store = IntermediateStore(root_dir, max_size=0)
+            with store.open_entry(IntermediateStore.PHYLOGENY, {"entry": 1}, write_entry(10)):
+                with store.open_entry(IntermediateStore.PHYLOGENY, {"entry": 2}, write_entry(10)):
+                    pass
+                # the entry being read is not removed by the other run
+                self.assertTrue(store.has_entry(IntermediateStore.PHYLOGENY, {"entry": 1}))
+                self.assertFalse(store.has_entry(IntermediateStore.PHYLOGENY, {"entry": 2}))
+            self.assertFalse(store.has_entry(IntermediateStore.PHYLOGENY, {"entry": 1}))
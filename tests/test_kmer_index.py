@@ -0,0 +1,81 @@
+import os
+import tempfile
+
+import numpy as np
+from gws_core import BaseTestCase
+from gws_ubiome.taxonomy_diversity.classification_cache import write_fasta
+from gws_ubiome.taxonomy_diversity.kmer_index import KmerIndex
+from gws_ubiome.taxonomy_diversity.taxonomy_assignment import TaxonomyAssignment
+
+
+def random_sequence(generator: np.random.Generator, length: int = 250) -> str:
+    return "".join(generator.choice(list("ACGT"), size=length))
+
+
+def mutate(generator: np.random.Generator, sequence: str, mismatches: int) -> str:
+    bases = list(sequence)
+    for position in generator.choice(len(bases), size=mismatches, replace=False):
+        bases[position] = "ACGT"[("ACGT".index(bases[position]) + 1) % 4]
+    return "".join(bases)
+
+
+class TestKmerIndex(BaseTestCase):
+    TAXA = {
+        "ref1": "k__Bacteria; p__Firmicutes; g__Bacillus",
+        "ref2": "k__Bacteria; p__Firmicutes; g__Bacillus",
+        "ref3": "k__Bacteria; p__Firmicutes; g__Listeria",
+        "ref4": "k__Bacteria; p__Proteobacteria; g__Escherichia",
+    }
+
+    def setUp(self):
+        self.generator = np.random.default_rng(0)
+        genus = random_sequence(self.generator)
+        # two close references of the same genus, the others unrelated
+        self.references = {"ref1": genus, "ref2": mutate(self.generator, genus, 2),
+                           "ref3": random_sequence(self.generator), "ref4": random_sequence(self.generator)}
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.classifier_path = os.path.join(self.tmp_dir.name, "classifier.qza")
+        fasta_suffix, taxonomy_suffix = TaxonomyAssignment.DB_REFERENCE_SUFFIXES
+        write_fasta(self.classifier_path.removesuffix(".qza") + fasta_suffix, self.references)
+        with open(self.classifier_path.removesuffix(".qza") + taxonomy_suffix, "w", encoding="utf-8") as taxonomy_file:
+            taxonomy_file.writelines(f"{reference_id}\t{taxon}\n" for reference_id, taxon in self.TAXA.items())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_build_and_classify(self):
+        reference_paths = TaxonomyAssignment.get_reference_paths(self.classifier_path)
+        index = KmerIndex.build(TaxonomyAssignment.get_kmer_index_dir(self.classifier_path), *reference_paths)
+        self.assertEqual(4, index.reference_count)
+        # the index is read back from its directory
+        index = KmerIndex(TaxonomyAssignment.get_kmer_index_dir(self.classifier_path))
+
+        taxonomy = index.classify({
+            "bacillus": mutate(self.generator, self.references["ref1"], 1),
+            "listeria": self.references["ref3"],
+            "escherichia_rna": self.references["ref4"].replace("T", "U"),
+            "unknown": random_sequence(self.generator),
+            "short": "ACG",
+        }, identity_threshold=0.97)
+
+        self.assertEqual("k__Bacteria; p__Firmicutes; g__Bacillus", taxonomy.loc["bacillus", "Taxon"])
+        self.assertEqual(1.0, taxonomy.loc["bacillus", "Confidence"])
+        self.assertEqual(self.TAXA["ref3"], taxonomy.loc["listeria", "Taxon"])
+        self.assertEqual(self.TAXA["ref4"], taxonomy.loc["escherichia_rna", "Taxon"])
+        self.assertEqual(KmerIndex.UNASSIGNED, taxonomy.loc["unknown", "Taxon"])
+        self.assertEqual(KmerIndex.UNASSIGNED, taxonomy.loc["short", "Taxon"])
+
+    def test_consensus(self):
+        hits = [self.TAXA["ref1"], self.TAXA["ref2"], self.TAXA["ref3"]]
+        self.assertEqual(("k__Bacteria; p__Firmicutes; g__Bacillus", 2 / 3), KmerIndex.get_consensus(hits, 0.51))
+        self.assertEqual(("k__Bacteria; p__Firmicutes", 1.0), KmerIndex.get_consensus(hits, 0.9))
+        self.assertEqual((KmerIndex.UNASSIGNED, 0.0), KmerIndex.get_consensus([], 0.51))
+
+    def test_check_method(self):
+        TaxonomyAssignment.check_method(self.classifier_path, "db", TaxonomyAssignment.KMER_TOP_HIT)
+        fasta_path, _ = TaxonomyAssignment.get_reference_paths(self.classifier_path)
+        os.remove(fasta_path)
+        with self.assertRaises(Exception):
+            TaxonomyAssignment.check_method(self.classifier_path, "db", TaxonomyAssignment.KMER_TOP_HIT)
+        # the Naive Bayes classifier does not need the references
+        TaxonomyAssignment.check_method(self.classifier_path, "db", TaxonomyAssignment.NAIVE_BAYES)
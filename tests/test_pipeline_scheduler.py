@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from gws_core import BaseTestCase, ScenarioStatus
+from gws_ubiome.ubiome_dashboard.pipeline_scheduler import PipelineScheduler
+from gws_ubiome.ubiome_dashboard.ubiome_tags import UbiomeTags
+from pandas import DataFrame
+
+
+class FakeTags:
+    """Tags of a scenario, as read by the scheduler."""
+
+    def __init__(self, values: dict[str, str]) -> None:
+        self._values = values
+
+    def get_tags_by_key(self, key: str) -> list:
+        if key not in self._values:
+            return []
+        return [SimpleNamespace(to_simple_tag=lambda value=self._values[key]: SimpleNamespace(value=value))]
+
+
+class TestPipelineScheduler(BaseTestCase):
+    @staticmethod
+    def get_plateau_data(recommended: list[bool]) -> DataFrame:
+        return DataFrame({"depth": [1000, 2000, 3000][:len(recommended)],
+                          "samples_at_plateau": [5, 8, 9][:len(recommended)],
+                          "recommended": recommended})
+
+    @staticmethod
+    def get_step(scenario_id: str, step: str, parent_ids: dict[str, str]) -> tuple:
+        scenario = SimpleNamespace(id=scenario_id, title=scenario_id, status=ScenarioStatus.DRAFT)
+        tags = FakeTags({UbiomeTags.TAG_UBIOME: step, UbiomeTags.TAG_AUTO_RUN: PipelineScheduler.AUTO_RUN_VALUE,
+                         **parent_ids})
+        return scenario, tags
+
+    def test_taxonomy_depth(self):
+        # the recommended depth replaces the configured one
+        self.assertEqual(2000, PipelineScheduler.get_taxonomy_depth(self.get_plateau_data([False, True, False]), 500))
+        self.assertEqual(2000, PipelineScheduler.get_taxonomy_depth(self.get_plateau_data([False, True, False]), None))
+
+        # without recommendation, the configured depth is used
+        self.assertIsNone(PipelineScheduler.get_recommended_depth(self.get_plateau_data([False, False])))
+        self.assertEqual(500, PipelineScheduler.get_taxonomy_depth(self.get_plateau_data([False, False]), 500))
+        # a rarefaction without plateau table recommends no depth
+        self.assertEqual(500, PipelineScheduler.get_taxonomy_depth(None, 500))
+        self.assertEqual(500, PipelineScheduler.get_taxonomy_depth(DataFrame({"depth": [1000]}), 500))
+        with self.assertRaises(Exception):
+            PipelineScheduler.get_taxonomy_depth(self.get_plateau_data([False, False]), None)
+
+    def test_is_ready(self):
+        self.assertTrue(PipelineScheduler.is_ready([]))
+        self.assertTrue(PipelineScheduler.is_ready([ScenarioStatus.SUCCESS, ScenarioStatus.SUCCESS]))
+        self.assertFalse(PipelineScheduler.is_ready([ScenarioStatus.SUCCESS, ScenarioStatus.RUNNING]))
+        self.assertFalse(PipelineScheduler.is_ready([ScenarioStatus.ERROR]))
+        # a deleted parent never succeeds
+        self.assertFalse(PipelineScheduler.is_ready([ScenarioStatus.SUCCESS, None]))
+
+        self.assertFalse(PipelineScheduler.is_blocked([ScenarioStatus.SUCCESS, ScenarioStatus.DRAFT]))
+        self.assertTrue(PipelineScheduler.is_blocked([ScenarioStatus.SUCCESS, ScenarioStatus.ERROR]))
+        self.assertTrue(PipelineScheduler.is_blocked([None]))
+
+    def test_failed_child_does_not_block_siblings(self):
+        """The feature inference queues the rarefaction although the 16S step fails, the taxonomy follows."""
+        statuses = {"feature": ScenarioStatus.RUNNING, "rarefaction": ScenarioStatus.DRAFT}
+        feature_parent = {UbiomeTags.TAG_FEATURE_INFERENCE_ID: "feature"}
+        steps = {
+            "16s": self.get_step("16s", UbiomeTags.TAG_16S, feature_parent),
+            "rarefaction": self.get_step("rarefaction", UbiomeTags.TAG_RAREFACTION, feature_parent),
+            "taxonomy": self.get_step("taxonomy", UbiomeTags.TAG_TAXONOMY,
+                                      {**feature_parent, UbiomeTags.TAG_RAREFACTION_ID: "rarefaction"}),
+        }
+        submitted = []
+        unscheduled = []
+
+        def find_scheduled_children(parent_id: str) -> list:
+            return [step for step in steps.values() if step[0].status == ScenarioStatus.DRAFT
+                    and step[0].id not in unscheduled
+                    and parent_id in PipelineScheduler.get_parent_ids(step[1]).values()]
+
+        def submit_scenario(scenario, tags, parent_ids, message_dispatcher=None) -> None:
+            if scenario.id == "16s":
+                raise Exception("The lab large is not reachable")
+            submitted.append(scenario.id)
+            scenario.status = ScenarioStatus.IN_QUEUE
+
+        with patch.object(PipelineScheduler, "find_scheduled_children", side_effect=find_scheduled_children), \
+                patch.object(PipelineScheduler, "_fetch_statuses",
+                             side_effect=lambda ids: {id_: statuses[id_] for id_ in ids if id_ in statuses}), \
+                patch.object(PipelineScheduler, "submit_scenario", side_effect=submit_scenario), \
+                patch.object(PipelineScheduler, "unschedule", side_effect=unscheduled.append):
+            message_dispatcher = MagicMock()
+            # the queue task of the feature inference does not fail
+            PipelineScheduler.submit_ready_children("feature", message_dispatcher)
+            statuses["feature"] = ScenarioStatus.SUCCESS
+            self.assertEqual(["rarefaction"], submitted)
+            self.assertEqual(["16s"], unscheduled)
+            message_dispatcher.notify_warning_message.assert_called_once()
+            self.assertTrue(PipelineScheduler.is_scheduled(*steps["taxonomy"]))
+
+            # the taxonomy is queued when the rarefaction succeeds
+            statuses["rarefaction"] = ScenarioStatus.RUNNING
+            PipelineScheduler.submit_ready_children("rarefaction", MagicMock())
+            self.assertEqual(["rarefaction", "taxonomy"], submitted)
+
+    def test_failed_parent_unblocks_run(self):
+        scenario, tags = self.get_step("taxonomy", UbiomeTags.TAG_TAXONOMY,
+                                       {UbiomeTags.TAG_FEATURE_INFERENCE_ID: "feature",
+                                        UbiomeTags.TAG_RAREFACTION_ID: "rarefaction"})
+        statuses = {"feature": ScenarioStatus.SUCCESS, "rarefaction": ScenarioStatus.RUNNING}
+        with patch.object(PipelineScheduler, "_fetch_statuses", side_effect=lambda ids: dict(statuses)):
+            self.assertTrue(PipelineScheduler.is_scheduled(scenario, tags))
+            # the Run button is shown again when a parent fails
+            statuses["rarefaction"] = ScenarioStatus.ERROR
+            self.assertFalse(PipelineScheduler.is_scheduled(scenario, tags))
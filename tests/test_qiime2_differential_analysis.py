@@ -43,5 +43,13 @@ class TestQiime2TaxonomyDiversityExtractor(BaseTestCase):
 
         self.assertEqual(t1.shape, t2.shape)
 
+        # the dashboard bundle holds the ANCOM tables, reduced to their top rows
+        bundle = outputs["dashboard_bundle"]
+        table_names = bundle.get_table_names("result_tables")
+        self.assertEqual(len(table_names), len(outputs["result_tables"].get_resources()))
+        for name in table_names:
+            self.assertLessEqual(bundle.get_table(name=name, group="result_tables").shape[0], 200)
+        self.assertIn("significant_features", bundle.get_stats())
+
 
 #        self.assertEqual(t1.iloc[0,:].to_list(), t2.iloc[0,:].to_list())
@@ -39,3 +39,10 @@ class TestQiime2SampleFrequencies(BaseTestCase):
         t2 = pandas.read_csv(expected_file_path, delimiter="\t")
 
         self.assertEqual(t1.shape, t2.shape)
+
+        # DADA2 stage metrics parsed from the verbose log
+        metrics_table = outputs["metrics"]
+        metrics = metrics_table.get_data()
+        self.assertIn("Denoising and merging samples", metrics.index)
+        self.assertIn("Total", metrics.index)
+        self.assertGreater(metrics.loc["Total", "wall_clock_seconds"], 0)
@@ -23,13 +23,51 @@ class TestQiime2RarefactionAnalysis(BaseTestCase):
         outputs = tester.run()
         result_dir = outputs["result_folder"]
 
-        boxplot_csv_file_path = os.path.join(result_dir.path, "shannon.for_boxplot.csv")
-        result_in_file = open(boxplot_csv_file_path, encoding="utf-8")
-        result_first_line = result_in_file.readline()
+        shannon_file_path = os.path.join(result_dir.path, "shannon.rarefaction.tsv")
+        shannon = pandas.read_csv(shannon_file_path, delimiter="\t")
 
-        # Get the expected file output
+        # long format: one row per sample, depth and iteration
+        self.assertEqual(["sample-id", "depth", "iteration", "value"], list(shannon.columns))
+        self.assertEqual(
+            ["341F-785R-P01-A09-P17", "341F-785R-P01-E04-P26", "341F-785R-P01-G07-P20"],
+            sorted(shannon["sample-id"].unique()))
+        self.assertEqual([20, 573, 1126, 1680, 2233, 2786, 3340, 3893, 4446, 5000],
+                         sorted(shannon["depth"].unique()))
+        self.assertEqual((300, 4), shannon.shape)
 
-        expected_first_line = '\t{"depth": 20 , "sample-id": "341F-785R-P01-A09-P17"}\t{"depth": 20 , "sample-id": "341F-785R-P01-E04-P26"}\t{"depth": 20 , "sample-id": "341F-785R-P01-G07-P20"}\t{"depth": 573 , "sample-id": "341F-785R-P01-A09-P17"}\t{"depth": 573 , "sample-id": "341F-785R-P01-E04-P26"}\t{"depth": 573 , "sample-id": "341F-785R-P01-G07-P20"}\t{"depth": 1126 , "sample-id": "341F-785R-P01-A09-P17"}\t{"depth": 1126 , "sample-id": "341F-785R-P01-E04-P26"}\t{"depth": 1126 , "sample-id": "341F-785R-P01-G07-P20"}\t{"depth": 1680 , "sample-id": "341F-785R-P01-A09-P17"}\t{"depth": 1680 , "sample-id": "341F-785R-P01-E04-P26"}\t{"depth": 1680 , "sample-id": "341F-785R-P01-G07-P20"}\t{"depth": 2233 , "sample-id": "341F-785R-P01-A09-P17"}\t{"depth": 2233 , "sample-id": "341F-785R-P01-E04-P26"}\t{"depth": 2233 , "sample-id": "341F-785R-P01-G07-P20"}\t{"depth": 2786 , "sample-id": "341F-785R-P01-A09-P17"}\t{"depth": 2786 , "sample-id": "341F-785R-P01-E04-P26"}\t{"depth": 2786 , "sample-id": "341F-785R-P01-G07-P20"}\t{"depth": 3340 , "sample-id": "341F-785R-P01-A09-P17"}\t{"depth": 3340 , "sample-id": "341F-785R-P01-E04-P26"}\t{"depth": 3340 , "sample-id": "341F-785R-P01-G07-P20"}\t{"depth": 3893 , "sample-id": "341F-785R-P01-A09-P17"}\t{"depth": 3893 , "sample-id": "341F-785R-P01-E04-P26"}\t{"depth": 3893 , "sample-id": "341F-785R-P01-G07-P20"}\t{"depth": 4446 , "sample-id": "341F-785R-P01-A09-P17"}\t{"depth": 4446 , "sample-id": "341F-785R-P01-E04-P26"}\t{"depth": 4446 , "sample-id": "341F-785R-P01-G07-P20"}\t{"depth": 5000 , "sample-id": "341F-785R-P01-A09-P17"}\t{"depth": 5000 , "sample-id": "341F-785R-P01-E04-P26"}\t{"depth": 5000 , "sample-id": "341F-785R-P01-G07-P20"}\n'
+        # Chao1 curves are computed in the same pass
+        chao1_file_path = os.path.join(result_dir.path, "chao1.rarefaction.tsv")
+        self.assertEqual((300, 4), pandas.read_csv(chao1_file_path, delimiter="\t").shape)
 
-        self.assertEqual(expected_first_line, result_first_line)
-        self.assertEqual((10, 31), pandas.read_csv(boxplot_csv_file_path, delimiter="\t").shape)
+        # one recommended depth among the 10 tested depths and the recommended one
+        plateau = outputs["plateau_table"].get_data()
+        self.assertEqual(1, int(plateau["recommended"].sum()))
+        self.assertIn(len(plateau), [10, 11])
+
+    def test_analytical_rarefaction(self):
+        settings = Settings.get_instance()
+        large_testdata_dir = settings.get_variable("gws_ubiome", "large_testdata_dir")
+        if not large_testdata_dir or not os.path.isdir(large_testdata_dir):
+            self.skipTest(f"large_testdata_dir not found: {large_testdata_dir}")
+        tester = TaskRunner(
+            params={"min_coverage": 20, "max_coverage": 5000, "rarefaction_mode": "analytical"},
+            inputs={
+                "feature_frequency_folder": Folder(
+                    path=os.path.join(large_testdata_dir, "sample_freq_details")
+                )
+            },
+            task_type=Qiime2RarefactionAnalysis,
+        )
+        outputs = tester.run()
+        result_dir = outputs["result_folder"]
+
+        # expected value +/- one standard deviation for the 3 samples x 10 depths
+        observed_file_path = os.path.join(result_dir.path, "observed_features.rarefaction.tsv")
+        observed = pandas.read_csv(observed_file_path, delimiter="\t")
+        self.assertEqual((90, 4), observed.shape)
+        observed = observed.pivot(index=["sample-id", "depth"], columns="iteration", values="value")
+        band_width = (observed["expected"] - observed["expected - sd"]).dropna()
+        self.assertTrue((band_width >= 0).all())
+
+        shannon_file_path = os.path.join(result_dir.path, "shannon.rarefaction.tsv")
+        self.assertEqual((30, 4), pandas.read_csv(shannon_file_path, delimiter="\t").shape)
@@ -24,6 +24,10 @@ class TestQiime2TaxonomyDiversityExtractor(BaseTestCase):
         outputs = tester.run()
         result_dir = outputs["result_folder"]
 
+        goods_coverage = pandas.read_csv(
+            os.path.join(result_dir.path, "table_files", "goods_coverage.alpha-diversity.tsv"), delimiter="\t")
+        self.assertTrue(goods_coverage["goods_coverage"].between(0, 1).all())
+
         boxplot_csv_file_path = os.path.join(
             result_dir.path,
             "table_files",
@@ -56,5 +60,30 @@ class TestQiime2TaxonomyDiversityExtractor(BaseTestCase):
 
         self.assertEqual(t1.shape, t2.shape)
 
+    def test_repeated_rarefaction(self):
+        settings = Settings.get_instance()
+        large_testdata_dir = settings.get_variable("gws_ubiome", "large_testdata_dir")
+        if not large_testdata_dir or not os.path.isdir(large_testdata_dir):
+            self.skipTest(f"large_testdata_dir not found: {large_testdata_dir}")
+        # without random_seed, the diversity is not written in the intermediate store
+        tester = TaskRunner(
+            params={"rarefaction_plateau_value": 100, "threads": 2, "rarefaction_iterations": 3},
+            inputs={
+                "rarefaction_analysis_result_folder": Folder(
+                    path=os.path.join(large_testdata_dir, "rarefaction")
+                )
+            },
+            task_type=Qiime2TaxonomyDiversity,
+        )
+        outputs = tester.run()
+        result_dir = outputs["result_folder"]
+
+        goods_coverage = pandas.read_csv(
+            os.path.join(result_dir.path, "table_files", "goods_coverage.alpha-diversity.tsv"), delimiter="\t")
+        # standard deviation of the indices over the 3 rarefactions
+        rarefaction_sd = pandas.read_csv(
+            os.path.join(result_dir.path, "table_files", "rarefaction_sd.alpha-diversity.tsv"), delimiter="\t")
+        self.assertEqual(len(goods_coverage), len(rarefaction_sd))
+        self.assertTrue((rarefaction_sd["shannon_entropy"] >= 0).all())
 
 #        self.assertEqual(t1.iloc[0,:].to_list(), t2.iloc[0,:].to_list())
@@ -0,0 +1,34 @@
+import os
+
+from gws_core import BaseTestCase, Folder, Settings, TaskRunner
+from gws_ubiome import Qiime2TaxonomyDiversitySweep
+
+
+class TestQiime2TaxonomyDiversitySweep(BaseTestCase):
+    def test_sweep(self):
+        settings = Settings.get_instance()
+        large_testdata_dir = settings.get_variable("gws_ubiome", "large_testdata_dir")
+        if not large_testdata_dir or not os.path.isdir(large_testdata_dir):
+            self.skipTest(f"large_testdata_dir not found: {large_testdata_dir}")
+        tester = TaskRunner(
+            params={"rarefaction_plateau_values": "100, 200", "taxonomic_affiliation_databases": "RDP-v18.202208",
+                    "threads": 2, "random_seed": 1},
+            inputs={
+                "rarefaction_analysis_result_folder": Folder(
+                    path=os.path.join(large_testdata_dir, "rarefaction")
+                )
+            },
+            task_type=Qiime2TaxonomyDiversitySweep,
+        )
+        outputs = tester.run()
+
+        result_folders = outputs["result_folders"].get_resources()
+        self.assertEqual(set(result_folders), {"Depth 100 - RDP-v18.202208", "Depth 200 - RDP-v18.202208"})
+        for result_folder in result_folders.values():
+            self.assertTrue(os.path.exists(
+                os.path.join(result_folder.path, "table_files", "goods_coverage.alpha-diversity.tsv")))
+
+        comparison = outputs["comparison_table"].get_data()
+        self.assertEqual(comparison["Rarefaction plateau value"].tolist(), [100, 200])
+        # fewer samples reach the deeper rarefaction
+        self.assertGreaterEqual(comparison["Samples"].iloc[0], comparison["Samples"].iloc[1])
@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+import numpy as np
+from gws_core import BaseTestCase
+from gws_ubiome.diversity_engine.alpha_diversity import AlphaDiversityEngine
+from gws_ubiome.diversity_engine.beta_diversity import BetaDiversityEngine
+from gws_ubiome.diversity_engine.count_matrix import CountMatrix
+from gws_ubiome.diversity_engine.repeated_rarefaction import RepeatedRarefaction
+from scipy.sparse import csr_matrix
+from scipy.spatial.distance import pdist
+
+
+class TestRepeatedRarefaction(BaseTestCase):
+    DEPTH = 30
+    ITERATIONS = 4
+    SEED = 7
+
+    def setUp(self):
+        generator = np.random.default_rng(0)
+        counts = generator.integers(0, 15, size=(6, 10)) * (generator.random((6, 10)) < 0.7)
+        # a sample below the depth, dropped
+        counts[2] = 0
+        counts[2, 0] = self.DEPTH - 1
+        self.count_matrix = CountMatrix([f"S{i}" for i in range(6)], [f"F{i}" for i in range(10)],
+                                        csr_matrix(counts))
+
+    def serial_rarefaction(self) -> tuple[list, list]:
+        """Alpha diversity and Bray-Curtis distances of each rarefaction, computed one at a time."""
+        keep = [i for i, total in enumerate(self.count_matrix.sample_totals) if total >= self.DEPTH]
+        counts = self.count_matrix.counts[keep].toarray()
+        sample_ids = [self.count_matrix.sample_ids[i] for i in keep]
+
+        alphas = []
+        distances = []
+        # one random stream per iteration, as RepeatedRarefaction
+        for seed in np.random.SeedSequence(self.SEED).spawn(self.ITERATIONS):
+            generator = np.random.default_rng(seed)
+            rarefied = np.zeros_like(counts)
+            for i, sample_counts in enumerate(counts):
+                present = sample_counts > 0
+                rarefied[i, present] = generator.multivariate_hypergeometric(
+                    sample_counts[present], self.DEPTH, method="marginals")
+            alphas.append(AlphaDiversityEngine(
+                CountMatrix(sample_ids, self.count_matrix.feature_ids, csr_matrix(rarefied))).compute())
+            distances.append(pdist(rarefied, "braycurtis"))
+        return alphas, distances
+
+    def test_mean_and_std(self):
+        alphas, distances = self.serial_rarefaction()
+        expected_mean = sum(alpha.to_numpy() for alpha in alphas) / self.ITERATIONS
+        expected_std = np.std([alpha.to_numpy() for alpha in alphas], axis=0, ddof=1)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mean, std, distance_matrices = RepeatedRarefaction(
+                self.count_matrix, self.DEPTH, self.ITERATIONS, workers=2, seed=self.SEED
+            ).compute({BetaDiversityEngine.BRAY_CURTIS: os.path.join(tmp_dir, "braycurtis.dist")},
+                      os.path.join(tmp_dir, "iterations"))
+
+            self.assertEqual(alphas[0].index.tolist(), mean.index.tolist())
+            self.assertNotIn("S2", mean.index)
+            np.testing.assert_allclose(expected_mean, mean.to_numpy(), rtol=1e-9)
+            np.testing.assert_allclose(expected_std, std.to_numpy(), rtol=1e-9)
+            np.testing.assert_allclose(sum(distances) / self.ITERATIONS,
+                                       distance_matrices[BetaDiversityEngine.BRAY_CURTIS].condensed, atol=1e-6)
+            # the iteration matrices are removed
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, "iterations")))
+
+    def test_independent_of_workers(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            means = [RepeatedRarefaction(self.count_matrix, self.DEPTH, self.ITERATIONS, workers=workers,
+                                         seed=self.SEED).compute({}, os.path.join(tmp_dir, "iterations"))[0]
+                     for workers in [1, 3]]
+        np.testing.assert_allclose(means[0].to_numpy(), means[1].to_numpy())
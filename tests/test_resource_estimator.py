@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+from gws_core import BaseTestCase
+from gws_ubiome.taxonomy_diversity.resource_estimator import ResourceEstimator, RunSize, StageMonitor
+
+
+class TestResourceEstimator(BaseTestCase):
+    def setUp(self):
+        self.history_dir = tempfile.TemporaryDirectory()
+        self.estimator = ResourceEstimator(os.path.join(self.history_dir.name, ResourceEstimator.HISTORY_FILE_NAME))
+
+    def tearDown(self):
+        self.history_dir.cleanup()
+
+    @staticmethod
+    def get_size(sample_count: int = 100, workers: int = 4, warm_classifier: bool = False) -> RunSize:
+        return RunSize(1000, sample_count, 5000, 10, workers, "Silva-v13.8", "naive_bayes", warm_classifier)
+
+    def record(self, stage: str, size: RunSize, peak_memory_gb: float, seconds: float) -> None:
+        monitor = StageMonitor()
+        monitor.peak_memory_gb = peak_memory_gb
+        monitor.seconds = seconds
+        self.estimator.record(stage, size, monitor)
+
+    def test_fit(self):
+        # diversity memory of 1 GB + 1e-6 GB x workers x samples^2, without the count matrix term
+        for sample_count, workers in [(100, 1), (200, 2), (400, 4), (300, 3)]:
+            size = self.get_size(sample_count, workers)
+            self.record("diversity", size, 1 + 1e-6 * workers * sample_count ** 2, 100)
+        # the classifier is measured with the stage, loaded or not, the warm runs are faster
+        for asv_count, warm_classifier in [(1000, False), (2000, True), (4000, True), (3000, False)]:
+            size = RunSize(asv_count, 100, 5000, 10, 4, "Silva-v13.8", "naive_bayes", warm_classifier)
+            self.record("classification", size, 20, 10 + 0.01 * asv_count + (0 if warm_classifier else 90))
+
+        # the history is read back by a new estimator
+        estimator = ResourceEstimator(os.path.join(self.history_dir.name, ResourceEstimator.HISTORY_FILE_NAME))
+        estimate = estimator.estimate(self.get_size(500, 2))
+        self.assertAlmostEqual((1 + 1e-6 * 2 * 500 ** 2) * ResourceEstimator.MEMORY_MARGIN,
+                               estimate.loc["diversity", "peak_memory_gb"], places=1)
+        self.assertEqual(4, estimate.loc["diversity", "calibration_runs"])
+        self.assertAlmostEqual(20 * ResourceEstimator.MEMORY_MARGIN,
+                               estimate.loc["classification", "peak_memory_gb"], places=1)
+        self.assertAlmostEqual(110, estimate.loc["classification", "wall_time_seconds"], delta=1)
+        warm_estimate = estimator.estimate(self.get_size(500, 2, warm_classifier=True))
+        self.assertAlmostEqual(20, warm_estimate.loc["classification", "wall_time_seconds"], delta=1)
+
+        # the phylogeny has too few records, it keeps the default coefficients
+        self.assertEqual(0, estimate.loc["phylogeny", "calibration_runs"])
+
+    def test_adjust_workers(self):
+        size = self.get_size(sample_count=30000, workers=4)
+
+        def get_memory(workers: int) -> float:
+            estimate = self.estimator.estimate(self.get_size(sample_count=30000, workers=workers))
+            return ResourceEstimator.get_required_memory_gb(estimate)
+
+        self.assertEqual(4, self.estimator.adjust_workers(size, get_memory(4)))
+        self.assertEqual(2, self.estimator.adjust_workers(size, get_memory(3) - 0.1))
+        with self.assertRaises(Exception):
+            self.estimator.adjust_workers(size, get_memory(1) - 0.1)
+
+    def test_resident_classifier(self):
+        # the Silva classifier, not the diversity, sets the peak of a small run
+        size = self.get_size(sample_count=10, workers=2)
+        estimate = self.estimator.estimate(size)
+        classifier_memory = estimate.loc["classification", "peak_memory_gb"]
+        self.assertEqual(classifier_memory, ResourceEstimator.get_required_memory_gb(estimate))
+        with self.assertRaises(Exception):
+            self.estimator.adjust_workers(size, classifier_memory - 1)
+
+        # a loaded classifier is not counted again
+        self.assertEqual(2, self.estimator.adjust_workers(size, classifier_memory - 1, classifier_memory))
+        self.assertLess(ResourceEstimator.get_required_memory_gb(estimate, classifier_memory), classifier_memory)
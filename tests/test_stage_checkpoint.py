@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from gws_core import BaseTestCase
+from gws_ubiome.base_env.stage_checkpoint import StageCheckpoint
+
+
+class TestStageCheckpoint(BaseTestCase):
+    WEIGHTS = {"first": 1, "second": 1}
+
+    def setUp(self):
+        self.root_dir = tempfile.TemporaryDirectory()
+        self.input_dir = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {StageCheckpoint.ROOT_ENV: self.root_dir.name})
+        self.env.start()
+        self.warnings = []
+
+    def tearDown(self):
+        self.env.stop()
+        self.root_dir.cleanup()
+        self.input_dir.cleanup()
+
+    def open_run_dir(self):
+        return StageCheckpoint.open_run_dir("task", [self.input_dir.name], {"param": 1}, self.warnings.append)
+
+    def run_stages(self, run_dir: str, fail_at: str | None = None) -> list[str]:
+        """Run the stages, return the ones actually run."""
+        checkpoint = StageCheckpoint(run_dir, self.WEIGHTS, lambda value, message: None, lambda message: None)
+        run = []
+
+        def stage(name: str):
+            def run_stage():
+                run.append(name)
+                if name == fail_at:
+                    raise Exception("Stage failed")
+                with open(os.path.join(run_dir, name), "w", encoding="utf-8") as output_file:
+                    output_file.write(name)
+            return run_stage
+
+        for name in self.WEIGHTS:
+            checkpoint.run_stage(name, stage(name), outputs=[name])
+        checkpoint.complete()
+        return run
+
+    def test_resume_and_lock(self):
+        with self.assertRaises(Exception):
+            with self.open_run_dir() as run_dir:
+                # the run is locked while in progress
+                with self.open_run_dir() as other_run_dir:
+                    self.assertIsNone(other_run_dir)
+                self.run_stages(run_dir, fail_at="second")
+
+        # the lock is released by the failure, the retry resumes after the first stage
+        with self.open_run_dir() as retry_run_dir:
+            self.assertEqual(run_dir, retry_run_dir)
+            self.assertEqual(["second"], self.run_stages(retry_run_dir))
+
+        # a completed run is neither reused nor removed
+        with self.open_run_dir() as completed_run_dir:
+            self.assertIsNone(completed_run_dir)
+        self.assertTrue(os.path.exists(os.path.join(run_dir, "second")))
+        self.assertEqual(2, len(self.warnings))
+
+    def test_remove_expired_runs(self):
+        with self.assertRaises(Exception):
+            with self.open_run_dir() as failed_run_dir:
+                self.run_stages(failed_run_dir, fail_at="first")
+
+        expired = time.time() - StageCheckpoint.FAILED_RUN_MAX_AGE_SECONDS - 60
+        os.utime(failed_run_dir, (expired, expired))
+        StageCheckpoint.remove_expired_runs()
+        self.assertFalse(os.path.exists(failed_run_dir))
+
+        # an expired completed run is kept
+        with self.open_run_dir() as completed_run_dir:
+            self.run_stages(completed_run_dir)
+        os.utime(os.path.join(completed_run_dir, StageCheckpoint.MANIFEST_FILE_NAME), (expired, expired))
+        StageCheckpoint.remove_expired_runs()
+        self.assertTrue(os.path.exists(completed_run_dir))
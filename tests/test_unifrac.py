@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+import numpy as np
+from gws_core import BaseTestCase
+from gws_ubiome.diversity_engine.count_matrix import CountMatrix
+from gws_ubiome.diversity_engine.distance_matrix import DistanceMatrix
+from gws_ubiome.diversity_engine.phylogenetic_tree import PhylogeneticTree
+from gws_ubiome.diversity_engine.unifrac import UniFracEngine
+from scipy.sparse import csr_matrix
+
+NEWICK = "((a:1,b:2)x:0.5,(c:1.5,d:0.25)y:0.75,e:4)root;"
+# branches of the tree: length and tips below the branch
+BRANCHES = [
+    (1, {"a"}), (2, {"b"}), (0.5, {"a", "b"}),
+    (1.5, {"c"}), (0.25, {"d"}), (0.75, {"c", "d"}),
+    (4, {"e"})
+]
+FEATURES = ["a", "b", "c", "d", "e"]
+
+
+def brute_force_unifrac(u: np.ndarray, v: np.ndarray, weighted: bool) -> float:
+    u_counts = dict(zip(FEATURES, u))
+    v_counts = dict(zip(FEATURES, v))
+    if weighted:
+        # branch length times the difference of the proportions of the samples below the branch
+        return sum(length * abs(sum(u_counts[tip] for tip in tips) / u.sum()
+                                - sum(v_counts[tip] for tip in tips) / v.sum())
+                   for length, tips in BRANCHES)
+    unique = 0
+    total = 0
+    for length, tips in BRANCHES:
+        in_u = any(u_counts[tip] > 0 for tip in tips)
+        in_v = any(v_counts[tip] > 0 for tip in tips)
+        unique += length * (in_u != in_v)
+        total += length * (in_u or in_v)
+    return unique / total
+
+
+class TestUniFrac(BaseTestCase):
+    def test_unifrac(self):
+        counts = np.array([
+            [5, 0, 1, 0, 2],
+            [0, 3, 0, 0, 0],
+            [1, 1, 1, 1, 1],
+            [0, 0, 4, 2, 0],
+            [7, 2, 0, 0, 1]
+        ])
+        count_matrix = CountMatrix([f"S{i}" for i in range(5)], FEATURES, csr_matrix(counts))
+        tree = PhylogeneticTree.from_newick(NEWICK)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for metric in UniFracEngine.METRICS:
+                # stripes of 2 samples over 2 processes
+                path = os.path.join(tmp_dir, f"{metric}.dist")
+                UniFracEngine(count_matrix, tree, metric, workers=2, stripe_size=2).compute(path)
+                distances = DistanceMatrix.open(path).to_square()
+
+                for i in range(5):
+                    for j in range(5):
+                        expected = 0 if i == j else brute_force_unifrac(
+                            counts[i], counts[j], metric == UniFracEngine.WEIGHTED)
+                        self.assertAlmostEqual(expected, distances[i, j], places=5, msg=f"{metric} {i} {j}")
+
+    def test_tip_ancestry(self):
+        tree = PhylogeneticTree.from_newick(NEWICK)
+        ancestry = tree.get_tip_ancestry().toarray()
+        for tip_index, tip_name in enumerate(tree.tip_names):
+            # length of the path between the tip and the root
+            expected = sum(length for length, tips in BRANCHES if tip_name in tips)
+            self.assertAlmostEqual(expected, ancestry[tip_index] @ tree.branch_lengths)